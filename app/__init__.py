@@ -17,18 +17,87 @@ def create_app(config_class=Config):
     db.init_app(app)
     CORS(app)
     
+    # Request latency, DB and serialization metrics (served at /metrics)
+    from app.instrumentation import init_instrumentation
+    init_instrumentation(app)
+    
+    # Runtime-toggled sampling profiler (opt-in)
+    from app.profiling import init_profiling
+    init_profiling(app)
+    
+    # Rate limits for the prediction, export and job endpoints
+    from app.request_control import init_request_control
+    init_request_control(app)
+    
+    # Fingerprinted, precompressed page bundles for the templates
+    from app.assets import init_assets
+    init_assets(app)
+    
+    # GET reads on the read replicas, with read-your-writes stickiness
+    from app.db_routing import init_db_routing
+    init_db_routing(app)
+    
+    # Task/anomaly/aggregate change events for /api/events
+    from app.events import init_events
+    init_events(app)
+    
     # Register blueprints
     from app.routes.dashboard import dashboard_bp
     from app.routes.analysis import analysis_bp
     from app.routes.prediction import prediction_bp
     from app.routes.policies import policies_bp
     from app.routes.todo import todo_bp
+    from app.routes.metrics import metrics_bp
+    from app.routes.profiling import profiling_bp
+    from app.routes.events import events_bp
+    from app.routes.partition import partition_bp
+    from app.routes.cluster import cluster_bp
+    from app.routes.assets import assets_bp
     
     app.register_blueprint(dashboard_bp)
     app.register_blueprint(analysis_bp, url_prefix='/analysis')
     app.register_blueprint(prediction_bp, url_prefix='/prediction')
     app.register_blueprint(policies_bp, url_prefix='/policies')
     app.register_blueprint(todo_bp, url_prefix='/todo')
+    app.register_blueprint(events_bp)
+    app.register_blueprint(partition_bp)
+    app.register_blueprint(assets_bp)
+    if app.config.get('PARTITION_NODES'):
+        app.register_blueprint(cluster_bp)
+    if app.config.get('METRICS_ENABLED', True):
+        app.register_blueprint(metrics_bp)
+    if app.config.get('PROFILING_ENABLED'):
+        app.register_blueprint(profiling_bp)
+    
+    # Load the trained risk model, if one has been built, and size the prediction cache
+    from app.ml.model import prediction_cache, predictor
+    from app.ml.training import latest_artifact
+    model_path = app.config.get('MODEL_PATH') or latest_artifact(app.config.get('MODEL_DIR'))
+    if model_path and model_path != predictor.model_path:
+        predictor.load(model_path)
+    prediction_cache.configure(
+        capacity=app.config.get('PREDICTION_CACHE_SIZE', 4096),
+        stripes=app.config.get('PREDICTION_CACHE_STRIPES', 16),
+        quantum=app.config.get('PREDICTION_CACHE_QUANTUM', 0)
+    )
+    
+    # Serve only this region's states, and scatter /api/cluster/* to the regional nodes
+    from app.services.analytics_service import analytics_service
+    from app.services.partition_service import partition_coordinator
+    analytics_service.configure(app.config.get('REGION_STATES'))
+    if app.config.get('PARTITION_NODES'):
+        partition_coordinator.configure(
+            app.config['PARTITION_NODES'],
+            timeout=app.config.get('PARTITION_TIMEOUT_SECONDS', 10)
+        )
+    
+    # Batched AnomalyLog writes
+    from app.services.anomaly_log_writer import anomaly_log_writer
+    anomaly_log_writer.configure(app)
+    
+    # Register CLI commands
+    from app.cli import register_commands
+    register_commands(app)
     
     # Create database tables
     with app.app_context():
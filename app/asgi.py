@@ -0,0 +1,476 @@
+"""
+ASGI Application
+Async serving mode with native async handlers for the hot read endpoints.
+
+Dashboard, analysis and to-do reads run on an async SQLAlchemy engine
+(aiosqlite, asyncpg), so one worker keeps many requests in flight while
+their queries wait instead of tying up a thread each. The bootstrap
+payload fans its summary, states and trends queries out concurrently,
+each on its own session. /api/events is a long-lived SSE stream fed by
+the process's EventBroker. Every other route (pages, writes, exports,
+predictions) is bridged to the Flask app on a thread pool, unchanged.
+
+Handlers reuse the query builders and payload shaping of the Flask routes,
+so both serving modes return the same JSON. The latest report and the
+state map rows are coalesced under the Flask routes' single-flight keys:
+concurrent requests share one in-flight task instead of each querying.
+"""
+
+import asyncio
+import io
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+from urllib.parse import parse_qsl
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app import create_app
+from app.config import Config
+from app.events import event_broker, format_event, format_reset, parse_event_id, parse_topics
+from app.instrumentation import metrics
+from app.models import AnalysisJob, StateStats
+from app.request_control import COALESCE_WAIT_SECONDS
+from app.routes.analysis import anomalies_page, distributions
+from app.routes.dashboard import state_map_rows, trend_params
+from app.routes.todo import task_list, task_query
+from app.services.job_service import job_manager
+from app.services.mock_data import get_mock_analysis_report, get_mock_dashboard_summary, get_mock_state_data, \
+    get_mock_tasks
+from app.services.risk_service import risk_service
+from app.services.trend_service import trends_query, trends_series
+
+# Async driver for each sync database dialect
+ASYNC_DRIVERS = {
+    'sqlite': 'sqlite+aiosqlite',
+    'postgresql': 'postgresql+asyncpg',
+    'postgres': 'postgresql+asyncpg',
+    'mysql': 'mysql+aiomysql'
+}
+
+# Response chunks buffered between a bridged Flask route and the client
+BRIDGE_BUFFER_CHUNKS = 16
+
+Handler = Callable[[Dict[str, str]], Awaitable[Tuple[int, Dict]]]
+
+
+def async_database_uri(uri: str) -> str:
+    """The async-driver URL for a sync SQLAlchemy database URL."""
+    scheme, sep, rest = uri.partition('://')
+    return ASYNC_DRIVERS.get(scheme.split('+')[0], scheme) + sep + rest
+
+
+def _int_arg(args: Dict[str, str], name: str, default: int) -> int:
+    # Same leniency as request.args.get(..., type=int)
+    try:
+        return int(args[name])
+    except (KeyError, ValueError):
+        return default
+
+
+class AsyncApp:
+    """ASGI callable: async read handlers in front of the Flask app."""
+
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        config = flask_app.config
+        self.engine = create_async_engine(
+            config.get('ASYNC_DATABASE_URI') or async_database_uri(config['SQLALCHEMY_DATABASE_URI']),
+            pool_size=config.get('ASYNC_POOL_SIZE', 10),
+            max_overflow=0
+        )
+        self.sessions = async_sessionmaker(self.engine, expire_on_commit=False)
+        self.executor = ThreadPoolExecutor(config.get('ASGI_WSGI_THREADS', 2), thread_name_prefix='asgi-wsgi')
+        self.metrics_enabled = config.get('METRICS_ENABLED', True)
+        self.heartbeat_seconds = config.get('EVENT_HEARTBEAT_SECONDS', 15)
+        # In-flight coalesced computations by key, on the serving event loop
+        self._in_flight: Dict[Tuple, asyncio.Task] = {}
+        self.routes: Dict[str, Tuple[str, Handler]] = {
+            '/api/dashboard/summary': ('asgi.dashboard_summary', self.dashboard_summary),
+            '/api/dashboard/states': ('asgi.dashboard_states', self.dashboard_states),
+            '/api/dashboard/state': ('asgi.dashboard_state', self.dashboard_state),
+            '/api/dashboard/state/districts': ('asgi.dashboard_districts', self.dashboard_districts),
+            '/api/dashboard/trends': ('asgi.dashboard_trends', self.dashboard_trends),
+            '/api/dashboard/bootstrap': ('asgi.dashboard_bootstrap', self.dashboard_bootstrap),
+            '/analysis/api/report': ('asgi.analysis_report', self.analysis_report),
+            '/analysis/api/anomalies': ('asgi.analysis_anomalies', self.analysis_anomalies),
+            '/analysis/api/distributions': ('asgi.analysis_distributions', self.analysis_distributions),
+            '/analysis/api/jobs': ('asgi.analysis_jobs', self.analysis_jobs),
+            '/todo/api/tasks': ('asgi.todo_tasks', self.todo_tasks)
+        }
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            return
+        if scope['path'] == '/api/events' and scope['method'] == 'GET':
+            await self.event_stream(scope, receive, send)
+            return
+        route = self.routes.get(scope['path']) if scope['method'] in ('GET', 'HEAD') else None
+        if route is None:
+            await self._bridge(scope, receive, send)
+        else:
+            await self._handle(scope, send, *route)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await asyncio.get_running_loop().run_in_executor(None, event_broker.start)
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.engine.dispose()
+                self.executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _handle(self, scope, send, endpoint: str, handler: Handler):
+        started = time.perf_counter()
+        args = dict(parse_qsl(scope.get('query_string', b'').decode('latin-1')))
+        try:
+            status, body = await handler(args)
+        except Exception as e:
+            status, body = 500, {'success': False, 'error': str(e)}
+        # Compact, newline-terminated: what jsonify sends outside debug mode
+        payload = (self.flask_app.json.dumps(body, separators=(',', ':')) + '\n').encode('utf-8')
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [
+                (b'content-type', b'application/json'),
+                (b'content-length', str(len(payload)).encode('latin-1')),
+                (b'access-control-allow-origin', b'*')
+            ]
+        })
+        await send({'type': 'http.response.body', 'body': b'' if scope['method'] == 'HEAD' else payload})
+        if self.metrics_enabled:
+            labels = (('endpoint', endpoint), ('method', scope['method']))
+            metrics.record([('http_requests_total', labels + (('status', str(status)),), 1)],
+                           [('http_request_duration_seconds', labels, time.perf_counter() - started)])
+
+    async def _bridge(self, scope, receive, send):
+        """Run a Flask route on the thread pool, streaming its response back."""
+        body = bytearray()
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return
+            body += message.get('body', b'')
+            if not message.get('more_body'):
+                break
+
+        loop = asyncio.get_running_loop()
+        # (status, headers) first, then body chunks, then None. The worker thread only
+        # waits for the loop when BRIDGE_BUFFER_CHUNKS are unsent, so a slow client
+        # holds back a streaming export instead of buffering all of it
+        queue: asyncio.Queue = asyncio.Queue()
+        slots = threading.Semaphore(BRIDGE_BUFFER_CHUNKS)
+        cancelled = False
+
+        def put(item):
+            slots.acquire()
+            loop.call_soon_threadsafe(queue.put_nowait, item)
+
+        def run():
+            # One thread iterates the whole response: stream_with_context keeps the
+            # request context in thread-local context variables
+            started = []
+
+            def start_response(status, headers, exc_info=None):
+                started[:] = [int(status.split(' ', 1)[0]), headers]
+
+            result = None
+            try:
+                result = self.flask_app(_environ(scope, bytes(body)), start_response)
+                for chunk in result:
+                    if started:
+                        put(tuple(started))
+                        started.clear()
+                    if cancelled:
+                        break
+                    if chunk:
+                        put(chunk)
+                if started:
+                    put(tuple(started))
+            finally:
+                if hasattr(result, 'close'):
+                    result.close()
+                loop.call_soon_threadsafe(queue.put_nowait, None)
+
+        async def get():
+            item = await queue.get()
+            if item is not None:
+                slots.release()
+            return item
+
+        future = loop.run_in_executor(self.executor, run)
+        finished = False
+        try:
+            started = await get()
+            if started is None:
+                finished = True
+                await future
+                raise RuntimeError(f"{scope['path']} returned without starting a response")
+            status, headers = started
+            await send({
+                'type': 'http.response.start',
+                'status': status,
+                'headers': [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in headers]
+            })
+            while (chunk := await get()) is not None:
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            finished = True
+            await send({'type': 'http.response.body', 'body': b''})
+        except BaseException:
+            cancelled = True
+            # Let the worker thread stop and release its request context
+            while not finished and await get() is not None:
+                pass
+            raise
+        finally:
+            await future
+
+    async def event_stream(self, scope, receive, send):
+        """Long-lived SSE stream of change events, fanned out by the process's broker."""
+        args = dict(parse_qsl(scope.get('query_string', b'').decode('latin-1')))
+        try:
+            topics = parse_topics(args.get('topics'))
+        except ValueError as e:
+            payload = (self.flask_app.json.dumps({'success': False, 'error': str(e)}) + '\n').encode('utf-8')
+            await send({'type': 'http.response.start', 'status': 400,
+                        'headers': [(b'content-type', b'application/json')]})
+            await send({'type': 'http.response.body', 'body': payload})
+            return
+        headers = dict(scope.get('headers', []))
+        after = parse_event_id(headers.get(b'last-event-id', b'').decode('latin-1') or args.get('after'))
+
+        loop = asyncio.get_running_loop()
+        if not event_broker.started:
+            await loop.run_in_executor(None, event_broker.start)
+        # Subscribe before reading the replay buffer so nothing falls in between
+        subscription = event_broker.subscribe(topics, loop)
+        disconnect = asyncio.ensure_future(_disconnected(receive))
+        try:
+            await send({
+                'type': 'http.response.start',
+                'status': 200,
+                'headers': [
+                    (b'content-type', b'text/event-stream'),
+                    (b'cache-control', b'no-cache'),
+                    (b'x-accel-buffering', b'no'),
+                    (b'access-control-allow-origin', b'*')
+                ]
+            })
+            # Ids already sent from the replay buffer, which the queue may repeat
+            replayed = set()
+            if after is None:
+                first = f'id: {event_broker.last_id}\n\n'
+            else:
+                backlog = event_broker.replay(after, topics)
+                if backlog is None:
+                    first = format_reset(event_broker.last_id)
+                else:
+                    first = ''.join(format_event(*item) for item in backlog)
+                    replayed = {item[0] for item in backlog}
+            await send({'type': 'http.response.body', 'body': first.encode('utf-8'), 'more_body': True})
+
+            while not disconnect.done():
+                get = asyncio.ensure_future(subscription.queue.get())
+                done, _ = await asyncio.wait((get, disconnect), timeout=self.heartbeat_seconds,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if get not in done:
+                    get.cancel()
+                    if disconnect in done:
+                        break
+                    chunk = ': keepalive\n\n'
+                elif subscription.lagged:
+                    # Fell too far behind: the client refetches instead
+                    while not subscription.queue.empty():
+                        subscription.queue.get_nowait()
+                    subscription.lagged = False
+                    chunk = format_reset(event_broker.last_id)
+                else:
+                    items = [get.result()]
+                    while not subscription.queue.empty():
+                        items.append(subscription.queue.get_nowait())
+                    items = [item for item in items if item[0] not in replayed]
+                    if not items:
+                        continue
+                    chunk = ''.join(format_event(*item) for item in items)
+                await send({'type': 'http.response.body', 'body': chunk.encode('utf-8'), 'more_body': True})
+        finally:
+            event_broker.unsubscribe(subscription)
+            disconnect.cancel()
+
+    async def _single_flight(self, key: Tuple, compute: Callable[[], Awaitable[Any]]):
+        """compute()'s result, or that of an identical computation already in flight (SingleFlight.do)."""
+        task = self._in_flight.get(key)
+        if task is None:
+            # A task of its own, so a caller that disconnects does not cancel the others
+            task = self._in_flight[key] = asyncio.ensure_future(compute())
+            task.add_done_callback(lambda done: self._finished(key, done))
+            return await asyncio.shield(task)
+        try:
+            result = await asyncio.wait_for(asyncio.shield(task), COALESCE_WAIT_SECONDS)
+        except asyncio.TimeoutError:
+            return await compute()
+        if self.metrics_enabled:
+            metrics.record([('coalesced_requests_total', (('name', str(key[0])),), 1)], [])
+        return result
+
+    def _finished(self, key: Tuple, task: asyncio.Task):
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        if not task.cancelled():
+            # Mark the error retrieved when every caller has gone
+            task.exception()
+
+    async def _scalars(self, query) -> List:
+        async with self.sessions() as session:
+            return list((await session.execute(query)).scalars())
+
+    async def _rows(self, query) -> List:
+        async with self.sessions() as session:
+            return list(await session.execute(query))
+
+    async def _latest_report(self) -> Dict:
+        return await self._single_flight(('analysis_report',), self._load_latest_report)
+
+    async def _load_latest_report(self) -> Dict:
+        async with self.sessions() as session:
+            latest_id = (await session.execute(job_manager.latest_query('analysis'))).scalar()
+            if latest_id is None:
+                return get_mock_analysis_report()
+            report = job_manager.cached_result('analysis', latest_id)
+            if report is None:
+                raw = (await session.execute(select(AnalysisJob.result).where(AnalysisJob.id == latest_id))).scalar()
+                report = job_manager.remember_result('analysis', latest_id, raw)
+            return report
+
+    async def _states(self) -> List[Dict]:
+        return await self._single_flight(('dashboard_states',), self._load_states)
+
+    async def _load_states(self) -> List[Dict]:
+        scores, stats = await asyncio.gather(
+            self._scalars(risk_service.state_scores_query()),
+            self._scalars(select(StateStats))
+        )
+        return state_map_rows({row.state: row for row in scores}, stats)
+
+    async def _trends(self, params: Dict) -> Dict:
+        query, resolved = trends_query(**params)
+        return trends_series(await self._rows(query), resolved)
+
+    async def dashboard_summary(self, args):
+        return 200, {'success': True, 'data': get_mock_dashboard_summary()}
+
+    async def dashboard_states(self, args):
+        return 200, {'success': True, 'data': await self._states()}
+
+    async def dashboard_state(self, args):
+        state = args.get('state', '')
+        if not state:
+            return 400, {'success': False, 'error': 'State parameter is required'}
+        return 200, {'success': True, 'data': get_mock_state_data(state)}
+
+    async def dashboard_districts(self, args):
+        state = args.get('state', '')
+        if not state:
+            return 400, {'success': False, 'error': 'State parameter is required'}
+        data = get_mock_state_data(state)
+        return 200, {'success': True, 'data': {'state': state, 'districts': data.get('district_distribution', [])}}
+
+    async def dashboard_trends(self, args):
+        try:
+            params = trend_params(args)
+        except ValueError as e:
+            return 400, {'success': False, 'error': str(e)}
+        return 200, {'success': True, 'data': await self._trends(params)}
+
+    async def dashboard_bootstrap(self, args):
+        try:
+            params = trend_params(args)
+        except ValueError as e:
+            return 400, {'success': False, 'error': str(e)}
+        states, trends = await asyncio.gather(self._states(), self._trends(params))
+        return 200, {
+            'success': True,
+            'data': {'summary': get_mock_dashboard_summary(), 'states': states, 'trends': trends}
+        }
+
+    async def analysis_report(self, args):
+        return 200, {'success': True, 'data': await self._latest_report()}
+
+    async def analysis_anomalies(self, args):
+        report = await self._latest_report()
+        data = anomalies_page(report, args.get('type'), _int_arg(args, 'page', 1), _int_arg(args, 'per_page', 50))
+        return 200, {'success': True, 'data': data}
+
+    async def analysis_distributions(self, args):
+        return 200, {'success': True, 'data': distributions(await self._latest_report())}
+
+    async def analysis_jobs(self, args):
+        limit = min(_int_arg(args, 'limit', 20), 100)
+        jobs = await self._scalars(job_manager.recent_query(limit=limit))
+        return 200, {'success': True, 'data': {'jobs': [j.to_dict() for j in jobs], 'total': len(jobs)}}
+
+    async def todo_tasks(self, args):
+        status, priority, state = args.get('status'), args.get('priority'), args.get('state')
+        try:
+            tasks = await self._scalars(task_query(status, priority, state))
+            data = task_list(tasks, status, priority, state)
+        except Exception:
+            # If database error, use mock data
+            mock_tasks = get_mock_tasks()
+            data = {'tasks': mock_tasks, 'total': len(mock_tasks)}
+        return 200, {'success': True, 'data': data}
+
+
+async def _disconnected(receive):
+    # The request body (empty for a GET) arrives first
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+def _environ(scope, body: bytes) -> Dict:
+    """WSGI environ for an ASGI HTTP scope."""
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0],
+        'REMOTE_PORT': str(client[1]),
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False
+    }
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name == 'CONTENT_TYPE':
+            environ['CONTENT_TYPE'] = value
+        elif name != 'CONTENT_LENGTH':
+            key = f'HTTP_{name}'
+            environ[key] = f'{environ[key]},{value}' if key in environ else value
+    return environ
+
+
+def create_asgi_app(config_class=Config) -> AsyncApp:
+    """Create the Flask app and wrap it for ASGI servers."""
+    return AsyncApp(create_app(config_class))
@@ -0,0 +1,496 @@
+"""
+Static Assets
+Per-page CSS/JS bundles: minified, content-hashed, precompressed and served as immutable.
+
+`flask --app run assets-build` writes one stylesheet and one script per page
+(PAGES) into ASSETS_DIR, named after a hash of their content, plus .gz and,
+when the brotli package is installed, .br variants and a manifest.json.
+Images and fonts referenced from the stylesheets are copied under hashed
+names too. base.html asks for the current page's bundle and falls back to
+the source files and CDN tags while no manifest has been built.
+
+Third-party libraries (Inter, Leaflet, Chart.js) are bundled from
+app/static/vendor, which `flask --app run assets-vendor` fills from their
+CDNs once; a library that is not vendored stays a CDN tag in front of the
+bundle. Pages only get the libraries they use.
+"""
+
+import gzip
+import hashlib
+import json
+import logging
+import os
+import posixpath
+import re
+import urllib.request
+from typing import Dict, List, Optional, Tuple
+
+from flask import current_app, url_for
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+MANIFEST = 'manifest.json'
+
+# Hex digits of the content hash in built file names
+HASH_LENGTH = 12
+
+# Served as-is: already compressed formats gain nothing from gzip/brotli
+COMPRESSED_SUFFIXES = ('.png', '.jpg', '.jpeg', '.gif', '.webp', '.woff', '.woff2')
+
+# Google Fonts picks the font format by User-Agent; this one gets woff2
+FONTS_USER_AGENT = ('Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+                    '(KHTML, like Gecko) Chrome/120.0 Safari/537.36')
+
+LEAFLET_CDN = 'https://unpkg.com/leaflet@1.9.4/dist/'
+
+
+class VendorLibrary:
+    """A third-party library: its CDN tags and the local files that replace them."""
+
+    __slots__ = ('name', 'css', 'js', 'cdn_css', 'cdn_js', 'preconnect', 'files')
+
+    def __init__(self, name: str, css: Optional[str] = None, js: Optional[str] = None,
+                 cdn_css: Optional[str] = None, cdn_js: Optional[str] = None,
+                 preconnect: Tuple[str, ...] = (), files: Optional[Dict[str, str]] = None):
+        self.name = name
+        # Paths under the static folder
+        self.css = css
+        self.js = js
+        self.cdn_css = cdn_css
+        self.cdn_js = cdn_js
+        self.preconnect = preconnect
+        # Static path -> URL it is downloaded from
+        self.files = files or {}
+
+
+VENDOR_LIBRARIES = {
+    'inter': VendorLibrary(
+        'inter',
+        css='vendor/inter/inter.css',
+        cdn_css='https://fonts.googleapis.com/css2?family=Inter:wght@300;400;500;600;700;800&display=swap',
+        preconnect=('https://fonts.googleapis.com', 'https://fonts.gstatic.com')
+    ),
+    'leaflet': VendorLibrary(
+        'leaflet',
+        css='vendor/leaflet/leaflet.css',
+        js='vendor/leaflet/leaflet.js',
+        cdn_css=LEAFLET_CDN + 'leaflet.css',
+        cdn_js=LEAFLET_CDN + 'leaflet.js',
+        files={
+            f'vendor/leaflet/{path}': LEAFLET_CDN + path
+            for path in ('leaflet.css', 'leaflet.js', 'images/layers.png', 'images/layers-2x.png',
+                         'images/marker-icon.png', 'images/marker-icon-2x.png', 'images/marker-shadow.png')
+        }
+    ),
+    'chart': VendorLibrary(
+        'chart',
+        js='vendor/chart/chart.umd.min.js',
+        cdn_js='https://cdn.jsdelivr.net/npm/chart.js@4.4.1/dist/chart.umd.min.js',
+        files={'vendor/chart/chart.umd.min.js': 'https://cdn.jsdelivr.net/npm/chart.js@4.4.1/dist/chart.umd.min.js'}
+    )
+}
+
+# Bundles per page (blueprint name): libraries, then the page's own stylesheets and scripts
+PAGES = {
+    'dashboard': {
+        'vendor': ['inter', 'leaflet', 'chart'],
+        'css': ['css/main.css', 'css/dashboard.css'],
+        'js': ['js/dashboard.js']
+    },
+    'analysis': {
+        'vendor': ['inter', 'chart'],
+        'css': ['css/main.css', 'css/analysis.css'],
+        'js': ['js/analysis.js']
+    },
+    'prediction': {
+        'vendor': ['inter'],
+        'css': ['css/main.css', 'css/prediction.css'],
+        'js': ['js/prediction.js']
+    },
+    'policies': {
+        'vendor': ['inter'],
+        'css': ['css/main.css', 'css/policies.css'],
+        'js': ['js/policies.js']
+    },
+    'todo': {
+        'vendor': ['inter'],
+        'css': ['css/main.css', 'css/todo.css'],
+        'js': ['js/todo.js']
+    }
+}
+
+
+# --- Minification -----------------------------------------------------------
+
+_CSS_TOKENS = re.compile(r'"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'|/\*.*?\*/|\s+|[^"\'/\s]+|/', re.S)
+
+# No space is needed on either side of these in CSS (not +, - or ( which calc() and @media need)
+_CSS_PUNCTUATION = set('{};:,>')
+
+
+def minify_css(source: str) -> str:
+    """Strip comments and the whitespace CSS does not need; strings are kept as written."""
+    out: List[str] = []
+    space = False
+    for token in _CSS_TOKENS.findall(source):
+        if token.isspace() or token.startswith('/*'):
+            space = True
+            continue
+        if space and out and out[-1][-1] not in _CSS_PUNCTUATION:
+            # "a :hover" selects descendants, unlike "a:hover"
+            if token[0] not in _CSS_PUNCTUATION or token.lstrip(':')[:1].isalpha():
+                out.append(' ')
+        space = False
+        if token[0] not in '"\'':
+            if token[0] == '}' and out and out[-1].endswith(';'):
+                out[-1] = out[-1][:-1]
+            token = token.replace(';}', '}')
+        out.append(token)
+    return ''.join(out)
+
+
+# A "/" after one of these (or a keyword) starts a regex literal, not a division
+_REGEX_PRECEDERS = set('(,=:[!&|?{};+-*%<>~^')
+_REGEX_KEYWORDS = ('return', 'typeof', 'case', 'do', 'else', 'in', 'of', 'new', 'delete', 'void', 'throw')
+
+# No space is needed on either side of these in JS (not + - / . which can merge into other operators)
+_JS_PUNCTUATION = set('{}()[];,:=<>?&|!*%^~')
+
+# A line break after or before these never ends a statement, so it can go
+_JS_CONTINUES_AFTER = set('{([,;')
+_JS_CONTINUES_BEFORE = set('})],.;')
+
+
+def minify_js(source: str) -> str:
+    """
+    Strip comments, indentation, blank lines and redundant spaces from a script.
+
+    Line breaks are kept, so automatic semicolon insertion works as before,
+    and strings, template literals and regex literals are copied untouched.
+    """
+    out: List[str] = []
+    # Brace depth inside each open template literal substitution
+    templates: List[int] = []
+    pending = ''
+    i, n = 0, len(source)
+
+    def last_significant() -> str:
+        for chunk in reversed(out):
+            stripped = chunk.rstrip()
+            if stripped:
+                return stripped
+        return ''
+
+    def emit(token: str):
+        nonlocal pending
+        if pending and out:
+            previous = out[-1][-1]
+            if pending == '\n':
+                if previous not in _JS_CONTINUES_AFTER and token[0] not in _JS_CONTINUES_BEFORE and previous != '\n':
+                    out.append('\n')
+            elif previous not in _JS_PUNCTUATION and previous != '\n' and token[0] not in _JS_PUNCTUATION:
+                out.append(' ')
+        pending = ''
+        out.append(token)
+
+    def template_tail(start: int) -> int:
+        # From inside a template literal to just past its closing backtick or a "${"
+        j = start
+        while j < n:
+            c = source[j]
+            if c == '\\':
+                j += 2
+            elif c == '`':
+                return j + 1
+            elif c == '$' and source.startswith('${', j):
+                templates.append(0)
+                return j + 2
+            else:
+                j += 1
+        return n
+
+    while i < n:
+        c = source[i]
+        if c in ' \t\r':
+            pending = pending or ' '
+            i += 1
+        elif c == '\n':
+            pending = '\n'
+            i += 1
+        elif source.startswith('//', i):
+            end = source.find('\n', i)
+            i = n if end < 0 else end
+        elif source.startswith('/*', i):
+            end = source.find('*/', i + 2)
+            i = n if end < 0 else end + 2
+            pending = pending or ' '
+        elif c in '"\'':
+            j = i + 1
+            while j < n and source[j] != c and source[j] != '\n':
+                j += 2 if source[j] == '\\' else 1
+            emit(source[i:j + 1])
+            i = j + 1
+        elif c == '`':
+            j = template_tail(i + 1)
+            emit(source[i:j])
+            i = j
+        elif c == '}' and templates and templates[-1] == 0:
+            templates.pop()
+            j = template_tail(i + 1)
+            emit(source[i:j])
+            i = j
+        elif c == '/':
+            previous = last_significant()
+            if not previous or previous[-1] in _REGEX_PRECEDERS or previous in _REGEX_KEYWORDS:
+                j, in_class = i + 1, False
+                while j < n and source[j] != '\n':
+                    if source[j] == '\\':
+                        j += 2
+                        continue
+                    if source[j] == '[':
+                        in_class = True
+                    elif source[j] == ']':
+                        in_class = False
+                    elif source[j] == '/' and not in_class:
+                        break
+                    j += 1
+                j += 1
+                while j < n and source[j].isalnum():
+                    j += 1
+                emit(source[i:j])
+                i = j
+            else:
+                emit(c)
+                i += 1
+        else:
+            if templates:
+                if c == '{':
+                    templates[-1] += 1
+                elif c == '}':
+                    templates[-1] -= 1
+            j = i + 1
+            if c.isalnum() or c in '_$':
+                while j < n and (source[j].isalnum() or source[j] in '_$'):
+                    j += 1
+            emit(source[i:j])
+            i = j
+    return ''.join(out).strip() + '\n'
+
+
+# --- Build ------------------------------------------------------------------
+
+_CSS_URL = re.compile(r'url\(\s*([\'"]?)([^\'")]+)\1\s*\)')
+
+_SOURCE_MAP = re.compile(r'^//# sourceMappingURL=.*$', re.M)
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+
+
+def hashed_name(name: str, data: bytes) -> str:
+    """"dashboard.css" -> "dashboard.<hash>.css"."""
+    stem, suffix = posixpath.splitext(posixpath.basename(name))
+    return f'{stem}.{content_hash(data)}{suffix}'
+
+
+class AssetBuilder:
+    """Writes the page bundles and the files they reference into an output directory."""
+
+    def __init__(self, static_dir: str, output_dir: str):
+        self.static_dir = static_dir
+        self.output_dir = output_dir
+        # Output file name -> size in bytes, plus its compressed variants
+        self.written: Dict[str, Dict[str, int]] = {}
+
+    def read(self, path: str) -> bytes:
+        with open(os.path.join(self.static_dir, path), 'rb') as f:
+            return f.read()
+
+    def vendored(self, path: Optional[str]) -> bool:
+        return bool(path) and os.path.exists(os.path.join(self.static_dir, path))
+
+    def write(self, name: str, data: bytes) -> str:
+        """Write data under its hashed name (and .gz/.br variants); returns that name."""
+        filename = hashed_name(name, data)
+        sizes = {'raw': len(data)}
+        variants = [(filename, data)]
+        if not filename.endswith(COMPRESSED_SUFFIXES):
+            compressed = gzip.compress(data, 9, mtime=0)
+            if len(compressed) < len(data):
+                variants.append((filename + '.gz', compressed))
+                sizes['gzip'] = len(compressed)
+            if brotli is not None:
+                compressed = brotli.compress(data, quality=11)
+                if len(compressed) < len(data):
+                    variants.append((filename + '.br', compressed))
+                    sizes['br'] = len(compressed)
+        for variant, content in variants:
+            path = os.path.join(self.output_dir, variant)
+            if not os.path.exists(path):
+                with open(path + '.tmp', 'wb') as f:
+                    f.write(content)
+                os.replace(path + '.tmp', path)
+        self.written[filename] = sizes
+        return filename
+
+    def rewrite_urls(self, css: str, source: str) -> str:
+        """Point url() references of a stylesheet at hashed copies next to the bundle."""
+        def replace(match):
+            ref = match.group(2).strip()
+            if ref.startswith(('data:', 'http:', 'https:', '//', '#', '/')):
+                return match.group(0)
+            path = posixpath.normpath(posixpath.join(posixpath.dirname(source), re.split(r'[?#]', ref)[0]))
+            if not os.path.exists(os.path.join(self.static_dir, path)):
+                logger.warning('%s references missing %s', source, path)
+                return f'url(/static/{path})'
+            return f'url({self.write(path, self.read(path))})'
+        return _CSS_URL.sub(replace, css)
+
+    def build_page(self, name: str, page: Dict) -> Dict:
+        libraries = [VENDOR_LIBRARIES[library] for library in page['vendor']]
+        entry = {'css': None, 'js': None, 'external_css': [], 'external_js': [], 'preconnect': []}
+
+        styles = []
+        for library in libraries:
+            if library.css and self.vendored(library.css):
+                styles.append((library.css, self.read(library.css).decode()))
+            elif library.cdn_css:
+                entry['external_css'].append(library.cdn_css)
+                entry['preconnect'].extend(library.preconnect)
+        styles += [(path, self.read(path).decode()) for path in page['css']]
+        css = '\n'.join(minify_css(self.rewrite_urls(text, path)) for path, text in styles)
+        entry['css'] = self.write(f'{name}.css', css.encode())
+
+        scripts = []
+        for library in libraries:
+            if library.js and self.vendored(library.js):
+                # Libraries ship minified; their source map is not vendored
+                scripts.append(_SOURCE_MAP.sub('', self.read(library.js).decode()).strip())
+            elif library.cdn_js:
+                entry['external_js'].append(library.cdn_js)
+        scripts += [minify_js(self.read(path).decode()) for path in page['js']]
+        entry['js'] = self.write(f'{name}.js', ';\n'.join(scripts).encode())
+        return entry
+
+    def build(self, pages: Dict[str, Dict] = PAGES) -> Dict:
+        """Build every page and swap in the new manifest; returns it."""
+        os.makedirs(self.output_dir, exist_ok=True)
+        manifest_path = os.path.join(self.output_dir, MANIFEST)
+        previous = load_manifest(manifest_path) or {}
+
+        manifest = {
+            'pages': {name: self.build_page(name, page) for name, page in pages.items()},
+            'files': self.written,
+            # The previous build's files stay for pages still open on it, and go with the next build
+            'stale': sorted(set(previous.get('files', {})) - set(self.written))
+        }
+        with open(manifest_path + '.tmp', 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(manifest_path + '.tmp', manifest_path)
+
+        for filename in set(previous.get('stale', [])) - set(self.written):
+            for variant in (filename, filename + '.gz', filename + '.br'):
+                if os.path.exists(os.path.join(self.output_dir, variant)):
+                    os.remove(os.path.join(self.output_dir, variant))
+        return manifest
+
+
+def build_assets(static_dir: str, output_dir: str) -> Dict:
+    """Build the page bundles from static_dir into output_dir."""
+    return AssetBuilder(static_dir, output_dir).build()
+
+
+def download(url: str, headers: Optional[Dict[str, str]] = None) -> bytes:
+    request = urllib.request.Request(url, headers=headers or {})
+    with urllib.request.urlopen(request, timeout=30) as response:
+        return response.read()
+
+
+def fetch_vendor(static_dir: str, force: bool = False) -> List[str]:
+    """Download the vendored libraries (and the Inter font files) into static_dir; returns the paths written."""
+    written = []
+
+    def save(path: str, data: bytes):
+        target = os.path.join(static_dir, path)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target, 'wb') as f:
+            f.write(data)
+        written.append(path)
+
+    for library in VENDOR_LIBRARIES.values():
+        for path, url in library.files.items():
+            if force or not os.path.exists(os.path.join(static_dir, path)):
+                save(path, download(url))
+
+    fonts = VENDOR_LIBRARIES['inter']
+    if force or not os.path.exists(os.path.join(static_dir, fonts.css)):
+        css = download(fonts.cdn_css, {'User-Agent': FONTS_USER_AGENT}).decode()
+        directory = posixpath.dirname(fonts.css)
+
+        def localize(match):
+            url = match.group(2)
+            filename = posixpath.basename(url.split('?')[0])
+            save(posixpath.join(directory, filename), download(url))
+            return f'url({filename})'
+
+        # The stylesheet last, so a failed font download leaves the library unvendored
+        css = _CSS_URL.sub(localize, css)
+        save(fonts.css, css.encode())
+    return written
+
+
+# --- Serving ----------------------------------------------------------------
+
+def load_manifest(path: str) -> Optional[Dict]:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+class AssetManifest:
+    """The built manifest, reloaded when a new build replaces it."""
+
+    def __init__(self, directory: str):
+        self.path = os.path.join(directory, MANIFEST)
+        self._mtime: Optional[float] = None
+        self._data: Optional[Dict] = None
+
+    def data(self) -> Optional[Dict]:
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            return None
+        if mtime != self._mtime:
+            self._data, self._mtime = load_manifest(self.path), mtime
+        return self._data
+
+    def page(self, name: Optional[str]) -> Optional[Dict]:
+        return ((self.data() or {}).get('pages') or {}).get(name)
+
+
+def asset_bundle(page: Optional[str]) -> Optional[Dict]:
+    """Stylesheet and script URLs of a page's bundle, or None to use the source files."""
+    manifest: Optional[AssetManifest] = current_app.extensions.get('assets')
+    entry = manifest.page(page) if manifest else None
+    if entry is None:
+        return None
+    return {
+        'preconnect': list(dict.fromkeys(entry['preconnect'])),
+        'css': entry['external_css'] + [url_for('assets.get_asset', filename=entry['css'])],
+        'js': entry['external_js'] + [url_for('assets.get_asset', filename=entry['js'])]
+    }
+
+
+def init_assets(app):
+    """Serve the built bundles to the templates (none while ASSETS_ENABLED is off)."""
+    if app.config.get('ASSETS_ENABLED', True):
+        app.extensions['assets'] = AssetManifest(app.config['ASSETS_DIR'])
+    app.jinja_env.globals['asset_bundle'] = asset_bundle
@@ -0,0 +1,97 @@
+"""
+CLI Commands
+Flask CLI commands for offline data processing (run with `flask --app run <command>`).
+"""
+
+import json
+from datetime import datetime
+
+import click
+from flask import current_app
+
+
+def register_commands(app):
+    """Register CLI commands on the application."""
+    
+    @app.cli.command('ingest')
+    @click.option('--full', is_flag=True, help='Rebuild all aggregates from scratch.')
+    @click.option('--verify', is_flag=True, help='Check the incremental result against a full recompute.')
+    @click.option('--data-dir', default=None, help='Override the configured DATA_DIR.')
+    @click.option('--profile', is_flag=True, help='Sample the run and write a profile to PROFILE_DIR.')
+    def ingest(full, verify, data_dir, profile):
+        """Fold new or changed data files into the persisted aggregates."""
+        from app.profiling import Profile, profiler
+        from app.services.ingest_service import ingest_service
+        
+        def progress(stage, fraction, rows, persist=True):
+            click.echo(f'[{fraction * 100:5.1f}%] {stage} ({rows:,} rows)', err=True)
+        
+        run_profile = Profile(f"ingest-{datetime.utcnow():%Y%m%dT%H%M%S}") if profile else None
+        if run_profile:
+            profiler.attach(run_profile)
+        try:
+            outcome = ingest_service.run(
+                data_dir or current_app.config.get('DATA_DIR'),
+                full=full,
+                verify=verify,
+                progress=progress
+            )
+        finally:
+            if run_profile:
+                profiler.detach()
+                paths = run_profile.write(current_app.config['PROFILE_DIR'])
+                click.echo(f"Profile: {paths['collapsed']} ({run_profile.samples} samples)", err=True)
+        click.echo(json.dumps(outcome['summary'], indent=2))
+        if verify and not outcome['summary']['verification']['matches']:
+            raise SystemExit(1)
+    
+    @app.cli.command('phone-index')
+    @click.option('--data-dir', default=None, help='Override the configured DATA_DIR.')
+    @click.option('--partitions', default=None, type=int, help='Spill partitions (defaults to PHONE_INDEX_PARTITIONS).')
+    def phone_index(data_dir, partitions):
+        """Rebuild the phone -> record count index through hash-partitioned spill files."""
+        from app.services.phone_index import phone_index_service
+        
+        def progress(stage, fraction, rows, persist=True):
+            click.echo(f'[{fraction * 100:5.1f}%] {stage} ({rows:,} rows)', err=True)
+        
+        summary = phone_index_service.build(
+            data_dir or current_app.config.get('DATA_DIR'),
+            spill_dir=current_app.config.get('PHONE_INDEX_SPILL_DIR'),
+            partitions=partitions or current_app.config.get('PHONE_INDEX_PARTITIONS', 64),
+            progress=progress
+        )
+        click.echo(json.dumps(summary, indent=2))
+    
+    @app.cli.command('train-model')
+    @click.option('--output-dir', default=None, help='Artifact directory (defaults to MODEL_DIR).')
+    @click.option('--chunk-size', default=5000, show_default=True, help='Cube rows fetched per chunk.')
+    @click.option('--trace-memory', is_flag=True, help='Also report peak Python heap (slower).')
+    def train_model(output_dir, chunk_size, trace_memory):
+        """Fit the risk model from the ingested aggregates and write a versioned artifact."""
+        from app.ml.training import train
+        
+        report = train(output_dir or current_app.config.get('MODEL_DIR'), chunk_size=chunk_size,
+                       trace_memory=trace_memory)
+        click.echo(json.dumps(report, indent=2))
+    
+    @app.cli.command('assets-vendor')
+    @click.option('--force', is_flag=True, help='Download again even if the files exist.')
+    def assets_vendor(force):
+        """Download Inter, Leaflet and Chart.js into app/static/vendor for the bundles."""
+        from app.assets import fetch_vendor
+        
+        for path in fetch_vendor(current_app.static_folder, force=force):
+            click.echo(path)
+    
+    @app.cli.command('assets-build')
+    @click.option('--output-dir', default=None, help='Output directory (defaults to ASSETS_DIR).')
+    def assets_build(output_dir):
+        """Write the minified, fingerprinted and precompressed page bundles and their manifest."""
+        from app.assets import build_assets
+        
+        manifest = build_assets(current_app.static_folder, output_dir or current_app.config['ASSETS_DIR'])
+        for page, entry in manifest['pages'].items():
+            external = entry['external_css'] + entry['external_js']
+            click.echo(f"{page}: {entry['css']} {entry['js']}" + (f' (+{len(external)} CDN)' if external else ''))
+        click.echo(json.dumps(manifest['files'], indent=2))
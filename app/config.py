@@ -16,6 +16,18 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or \
         'sqlite:///' + os.path.join(basedir, '..', 'instance', 'aadhaar_dashboard.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Read replicas (comma-separated URLs), one bind each: GET requests read from them round-robin
+    # unless the client wrote within READ_YOUR_WRITES_SECONDS; writes, jobs and the CLI use the primary
+    DATABASE_REPLICA_URLS = [u.strip() for u in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if u.strip()]
+    SQLALCHEMY_BINDS = {f'replica{i + 1}': url for i, url in enumerate(DATABASE_REPLICA_URLS)}
+    READ_YOUR_WRITES_SECONDS = float(os.environ.get('READ_YOUR_WRITES_SECONDS', 5))
+    
+    # AnomalyLog writes: queued and inserted by a background thread in batches of up to
+    # ANOMALY_LOG_BATCH_SIZE rows (0 writes each request's rows synchronously), waiting at most
+    # ANOMALY_LOG_FLUSH_MS to fill one; submissions beyond ANOMALY_LOG_QUEUE_SIZE queued rows are refused
+    ANOMALY_LOG_BATCH_SIZE = int(os.environ.get('ANOMALY_LOG_BATCH_SIZE', 500))
+    ANOMALY_LOG_FLUSH_MS = float(os.environ.get('ANOMALY_LOG_FLUSH_MS', 200))
+    ANOMALY_LOG_QUEUE_SIZE = int(os.environ.get('ANOMALY_LOG_QUEUE_SIZE', 50000))
     
     # Cache settings (for future Redis integration)
     CACHE_TYPE = 'simple'
@@ -23,6 +35,81 @@ class Config:
     
     # Data paths
     DATA_DIR = os.environ.get('DATA_DIR') or os.path.join(basedir, '..', '..', 'api_data_aadhar_demographic')
+    
+    # Background analysis jobs
+    JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))
+    JOB_STALE_SECONDS = int(os.environ.get('JOB_STALE_SECONDS', 600))
+    # Phone index builds: spill directory for the hash partitions (a temporary one under it per
+    # build) and the partition count; each partition must fit in memory when it is counted
+    PHONE_INDEX_SPILL_DIR = os.environ.get('PHONE_INDEX_SPILL_DIR') or os.path.join(basedir, '..', 'instance', 'spill')
+    PHONE_INDEX_PARTITIONS = int(os.environ.get('PHONE_INDEX_PARTITIONS', 64))
+    # Processes scoring duplicate candidate pairs in a linkage job (defaults to the CPU count)
+    LINKAGE_WORKERS = int(os.environ.get('LINKAGE_WORKERS', 0)) or None
+    
+    # Regional partitioning: a node serves only the records of REGION_STATES (comma-separated;
+    # empty serves every state). PARTITION_NODES ("north=http://host:port,south=...") makes this
+    # instance a coordinator that scatters /api/cluster/* queries to those nodes and merges them
+    REGION_NAME = os.environ.get('REGION_NAME', '')
+    REGION_STATES = [s.strip() for s in os.environ.get('REGION_STATES', '').split(',') if s.strip()]
+    PARTITION_NODES = dict(
+        node.strip().split('=', 1) for node in os.environ.get('PARTITION_NODES', '').split(',') if '=' in node
+    )
+    PARTITION_TIMEOUT_SECONDS = float(os.environ.get('PARTITION_TIMEOUT_SECONDS', 10))
+    
+    # Token-bucket rate limits per client and endpoint class, as "<burst>/<seconds>" (a burst of
+    # that many requests, refilled over that many seconds); an empty value leaves the class unlimited
+    # Reverse proxies in front of the app (1 on Render and Vercel): the client address is taken
+    # from that many X-Forwarded-For entries; 0 uses the socket peer. Never set it higher than
+    # the real number of proxies, or clients can pick their own address
+    PROXY_FIX_HOPS = int(os.environ.get('PROXY_FIX_HOPS', 0))
+    RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    RATE_LIMITS = {
+        'prediction': os.environ.get('RATE_LIMIT_PREDICTION', '120/60'),
+        'export': os.environ.get('RATE_LIMIT_EXPORT', '10/60'),
+        'jobs': os.environ.get('RATE_LIMIT_JOBS', '20/60')
+    }
+    
+    # Built page bundles (flask assets-build), served from /assets; pages use the source files until
+    # a manifest is built
+    ASSETS_ENABLED = os.environ.get('ASSETS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    ASSETS_DIR = os.environ.get('ASSETS_DIR') or os.path.join(basedir, 'static', 'dist')
+    
+    # Request instrumentation and the /metrics endpoint
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    
+    # Sampling profiler: PROFILING_ENABLED exposes /api/profiling to switch it on at runtime
+    PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+    PROFILE_DIR = os.environ.get('PROFILE_DIR') or os.path.join(basedir, '..', 'instance', 'profiles')
+    PROFILE_INTERVAL_MS = float(os.environ.get('PROFILE_INTERVAL_MS', 5))
+    # GIL switch interval while sampling (0 leaves the interpreter's 5ms). Lower values make samples
+    # of pure-Python code more accurate but apply to every thread in the worker, not just sampled ones
+    PROFILE_SWITCH_INTERVAL_MS = float(os.environ.get('PROFILE_SWITCH_INTERVAL_MS', 0))
+    PROFILING_POLL_SECONDS = float(os.environ.get('PROFILING_POLL_SECONDS', 2))
+    
+    # Trained risk model artifacts (the latest in MODEL_DIR is loaded unless MODEL_PATH is set)
+    MODEL_DIR = os.environ.get('MODEL_DIR') or os.path.join(basedir, '..', 'instance', 'models')
+    MODEL_PATH = os.environ.get('MODEL_PATH')
+    
+    # Prediction memoization (size 0 disables). A non-zero quantum rounds rates to that step for more
+    # cache hits, and the scores and attributions returned are those of the rounded rates
+    PREDICTION_CACHE_SIZE = int(os.environ.get('PREDICTION_CACHE_SIZE', 4096))
+    PREDICTION_CACHE_STRIPES = int(os.environ.get('PREDICTION_CACHE_STRIPES', 16))
+    PREDICTION_CACHE_QUANTUM = float(os.environ.get('PREDICTION_CACHE_QUANTUM', 0))
+    # Time allowed for exact attributions on /prediction/api/predict before the linear fallback
+    PREDICTION_EXPLAIN_BUDGET_MS = float(os.environ.get('PREDICTION_EXPLAIN_BUDGET_MS', 25))
+    
+    # ASGI serving mode (asgi.py): async driver URL (derived from SQLALCHEMY_DATABASE_URI when unset),
+    # async connection pool size and threads running the bridged Flask routes
+    ASYNC_DATABASE_URI = os.environ.get('ASYNC_DATABASE_URL')
+    ASYNC_POOL_SIZE = int(os.environ.get('ASYNC_POOL_SIZE', 10))
+    ASGI_WSGI_THREADS = int(os.environ.get('ASGI_WSGI_THREADS', 2))
+    
+    # Change events (/api/events): broker poll interval and keep-alive under ASGI, reconnect
+    # interval for the one-shot WSGI responses, and how long events stay replayable
+    EVENT_POLL_SECONDS = float(os.environ.get('EVENT_POLL_SECONDS', 0.5))
+    EVENT_HEARTBEAT_SECONDS = float(os.environ.get('EVENT_HEARTBEAT_SECONDS', 15))
+    EVENT_RETRY_MS = int(os.environ.get('EVENT_RETRY_MS', 5000))
+    EVENT_RETENTION_SECONDS = int(os.environ.get('EVENT_RETENTION_SECONDS', 3600))
 
 
 class DevelopmentConfig(Config):
@@ -41,3 +128,4 @@ class TestingConfig(Config):
     """Testing configuration."""
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    RATE_LIMIT_ENABLED = False
@@ -0,0 +1,105 @@
+"""
+Read Replica Routing
+Sends the reads of GET requests to replica engines and everything else to the primary.
+
+DATABASE_REPLICA_URLS adds one Flask-SQLAlchemy bind per replica, and the
+session picks an engine per statement. Flushes, INSERT/UPDATE/DELETE,
+SELECT ... FOR UPDATE and anything outside a GET/HEAD request (writes,
+background jobs, the CLI, the event broker) go to the primary. A session
+that has written reads from the primary from then on, so a request always
+sees its own writes. Replicas are picked round-robin, once per session.
+
+Replication lag could still hide a write from the client's next request
+(the task list right after a PATCH), so a request that wrote sets a
+`db_primary_until` cookie, and that client's reads stay on the primary for
+READ_YOUR_WRITES_SECONDS.
+
+The native async handlers of asgi.py keep reading from the primary.
+"""
+
+import itertools
+import math
+import threading
+import time
+from typing import List, Optional
+
+from flask import current_app, g, has_app_context, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy.sql.dml import UpdateBase
+
+from app.instrumentation import metrics
+
+STICKY_COOKIE = 'db_primary_until'
+
+READ_METHODS = ('GET', 'HEAD')
+
+metrics.counter('db_sessions_routed_total', 'Request sessions whose reads went to the primary or a replica.')
+
+
+class ReplicaRouter:
+    """Round-robin replica choice and the read-your-writes window, per app."""
+
+    def __init__(self, bind_keys: List[str], sticky_seconds: float):
+        self.bind_keys = list(bind_keys)
+        self.sticky_seconds = sticky_seconds
+        self._cycle = itertools.cycle(self.bind_keys)
+        self._lock = threading.Lock()
+
+    def replica_for_request(self) -> Optional[str]:
+        """The replica bind the current request may read from, or None for the primary."""
+        if not self.bind_keys or not has_request_context() or request.method not in READ_METHODS:
+            return None
+        if g.get('db_wrote'):
+            return None
+        try:
+            if float(request.cookies.get(STICKY_COOKIE, 0)) > time.time():
+                return None
+        except ValueError:
+            pass
+        with self._lock:
+            return next(self._cycle)
+
+
+class RoutingSession(Session):
+    """Flask-SQLAlchemy session that reads from a replica when the request allows it."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        engine = super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+        if bind is not None or engine is not self._db.engines.get(None):
+            # Explicit connections and models on their own bind are left alone
+            return engine
+        if self._flushing or isinstance(clause, UpdateBase) or getattr(clause, '_for_update_arg', None):
+            self._wrote()
+            return engine
+        if self.info.get('wrote'):
+            return engine
+        if 'replica' not in self.info:
+            router = current_app.extensions.get('db_routing') if has_app_context() else None
+            self.info['replica'] = router.replica_for_request() if router else None
+            if router and has_request_context():
+                target = 'replica' if self.info['replica'] else 'primary'
+                metrics.record([('db_sessions_routed_total', (('target', target),), 1)], [])
+        replica = self.info['replica']
+        return self._db.engines[replica] if replica else engine
+
+    def _wrote(self):
+        self.info['wrote'] = True
+        if has_request_context():
+            g.db_wrote = True
+
+
+def _mark_sticky(response):
+    router = current_app.extensions['db_routing']
+    if g.get('db_wrote'):
+        until = time.time() + router.sticky_seconds
+        response.set_cookie(STICKY_COOKIE, f'{until:.3f}', max_age=math.ceil(router.sticky_seconds),
+                            httponly=True, samesite='Lax')
+    return response
+
+
+def init_db_routing(app):
+    """Route GET reads to the configured replicas and keep writers' reads on the primary."""
+    bind_keys = [key for key in (app.config.get('SQLALCHEMY_BINDS') or {}) if key.startswith('replica')]
+    app.extensions['db_routing'] = ReplicaRouter(bind_keys, app.config.get('READ_YOUR_WRITES_SECONDS', 5))
+    if bind_keys:
+        app.after_request(_mark_sticky)
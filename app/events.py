@@ -0,0 +1,287 @@
+"""
+Change Events
+Small deltas pushed to the dashboard and to-do pages over Server-Sent Events.
+
+Changes are recorded as ChangeEvent rows in the same transaction as the
+change itself: TodoTask and AnomalyLog rows through a session hook, and
+aggregate refreshes by the ingest run calling publish(). The table doubles
+as the pub/sub channel between gunicorn workers and as the replay log for
+clients reconnecting with Last-Event-ID.
+
+Under the ASGI app one EventBroker thread per process polls the table every
+EVENT_POLL_SECONDS and fans new events out to that process's subscribers,
+so an idle subscriber costs one queue and no thread or query. The WSGI
+route answers each connection with the events since Last-Event-ID and
+closes it; EventSource reconnects after `retry`, which turns the same
+client code into a cheap poll.
+"""
+
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.extensions import db
+from app.models import AnomalyLog, ChangeEvent, TodoTask
+
+logger = logging.getLogger(__name__)
+
+TOPICS = ('tasks', 'anomalies', 'aggregates')
+
+# Events kept in memory per process for Last-Event-ID replay
+REPLAY_EVENTS = 1000
+
+# Undelivered events a subscriber may fall behind by before it is told to reset
+SUBSCRIBER_QUEUE = 256
+
+# Ids below the last seen one that are re-read, for transactions that commit out of id order
+RESCAN_IDS = 64
+
+PRUNE_EVERY_SECONDS = 60
+
+
+def parse_topics(value: Optional[str]) -> Tuple[str, ...]:
+    """Topics from a comma-separated query parameter (all when empty); raises ValueError."""
+    if not value:
+        return TOPICS
+    topics = tuple(t.strip() for t in value.split(',') if t.strip())
+    unknown = [t for t in topics if t not in TOPICS]
+    if unknown:
+        raise ValueError(f'Unknown topics: {unknown}. Use any of {list(TOPICS)}')
+    return topics
+
+
+def parse_event_id(value: Optional[str]) -> Optional[int]:
+    try:
+        return int(value) if value else None
+    except ValueError:
+        return None
+
+
+def format_event(event_id: int, topic: str, data: str) -> str:
+    """One SSE message (data is JSON text, so it never spans lines)."""
+    return f'id: {event_id}\nevent: {topic}\ndata: {data}\n\n'
+
+
+def format_reset(last_id: int) -> str:
+    """Tell the client it missed events and must refetch, resuming after last_id."""
+    return f'id: {last_id}\nevent: reset\ndata: {{}}\n\n'
+
+
+def publish(topic: str, data: Dict):
+    """Record an event in the current transaction (the caller commits)."""
+    db.session.add(ChangeEvent(topic=topic, data=json.dumps(data, default=str)))
+
+
+def events_after(after_id: int, topics: Iterable[str], limit: int = REPLAY_EVENTS) -> Optional[List[ChangeEvent]]:
+    """Stored events after an id, or None if some of them were already pruned."""
+    oldest = db.session.execute(db.select(db.func.min(ChangeEvent.id))).scalar()
+    if oldest is not None and after_id < oldest - 1:
+        return None
+    return db.session.execute(
+        db.select(ChangeEvent)
+        .where(ChangeEvent.id > after_id, ChangeEvent.topic.in_(list(topics)))
+        .order_by(ChangeEvent.id)
+        .limit(limit)
+    ).scalars().all()
+
+
+def last_event_id() -> int:
+    return db.session.execute(db.select(db.func.coalesce(db.func.max(ChangeEvent.id), 0))).scalar()
+
+
+def _collect_changes(session, flush_context):
+    # Pre-flush state is still visible here, with ids assigned to new rows
+    pending = session.info.setdefault('change_events', [])
+    for obj in session.new:
+        if isinstance(obj, TodoTask):
+            pending.append(('tasks', {'op': 'upsert', 'task': obj.to_dict()}))
+    for obj in session.dirty:
+        if isinstance(obj, TodoTask) and session.is_modified(obj):
+            pending.append(('tasks', {'op': 'upsert', 'task': obj.to_dict()}))
+    for obj in session.deleted:
+        if isinstance(obj, TodoTask):
+            pending.append(('tasks', {'op': 'delete', 'id': obj.id}))
+
+    logged = [obj for obj in session.new if isinstance(obj, AnomalyLog)]
+    if logged:
+        by_state, by_type = Counter(), Counter()
+        for obj in logged:
+            by_state[obj.state] += obj.count or 1
+            by_type[obj.anomaly_type] += obj.count or 1
+        pending.append(('anomalies', {
+            'count': sum(by_state.values()),
+            'by_state': dict(by_state),
+            'by_type': dict(by_type)
+        }))
+
+
+def _record_changes(session, flush_context):
+    # Adding rows here is allowed; commit flushes them in the same transaction
+    pending = session.info.pop('change_events', None)
+    for topic, data in pending or ():
+        session.add(ChangeEvent(topic=topic, data=json.dumps(data, default=str)))
+
+
+class Subscription:
+    """One live client: a bounded queue on its event loop."""
+
+    __slots__ = ('topics', 'loop', 'queue', 'lagged')
+
+    def __init__(self, topics: Iterable[str], loop: asyncio.AbstractEventLoop):
+        self.topics = frozenset(topics)
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue(SUBSCRIBER_QUEUE)
+        self.lagged = False
+
+
+class EventBroker:
+    """Polls the event table from one thread and fans new events out to subscribers."""
+
+    def __init__(self):
+        self.poll_seconds = 0.5
+        self.retention_seconds = 3600
+        self.last_id = 0
+        self._app = None
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._subscribers: Dict[asyncio.AbstractEventLoop, Set[Subscription]] = {}
+        # (id, topic, data) of recent events, oldest first
+        self._recent: deque = deque(maxlen=REPLAY_EVENTS)
+        self._seen: Set[int] = set()
+
+    def configure(self, app):
+        self._app = app
+        self.poll_seconds = app.config.get('EVENT_POLL_SECONDS', 0.5)
+        self.retention_seconds = app.config.get('EVENT_RETENTION_SECONDS', 3600)
+
+    @property
+    def started(self) -> bool:
+        return self._thread is not None
+
+    def start(self):
+        """Load the replay buffer and start polling (idempotent)."""
+        with self._lock:
+            if self._thread is not None:
+                return
+            with self._app.app_context():
+                rows = db.session.execute(
+                    db.select(ChangeEvent.id, ChangeEvent.topic, ChangeEvent.data)
+                    .order_by(ChangeEvent.id.desc()).limit(REPLAY_EVENTS)
+                ).all()
+                db.session.remove()
+            for row in reversed(rows):
+                self._remember(tuple(row))
+            self._thread = threading.Thread(target=self._run, name='event-broker', daemon=True)
+            self._thread.start()
+
+    def subscribe(self, topics: Iterable[str], loop: asyncio.AbstractEventLoop) -> Subscription:
+        subscription = Subscription(topics, loop)
+        with self._lock:
+            self._subscribers.setdefault(loop, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.loop)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.loop]
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return sum(len(s) for s in self._subscribers.values())
+
+    def replay(self, after_id: int, topics: Iterable[str]) -> Optional[List[Tuple[int, str, str]]]:
+        """Buffered events after an id, or None if the buffer no longer reaches back that far."""
+        if after_id >= self.last_id:
+            return []
+        topics = set(topics)
+        with self._lock:
+            recent = list(self._recent)
+        if recent and after_id < recent[0][0] - 1:
+            return None
+        return [e for e in recent if e[0] > after_id and e[1] in topics]
+
+    def _remember(self, item: Tuple[int, str, str]):
+        if len(self._recent) == self._recent.maxlen:
+            self._seen.discard(self._recent[0][0])
+        self._recent.append(item)
+        self._seen.add(item[0])
+        self.last_id = max(self.last_id, item[0])
+
+    def _poll(self):
+        with self._app.app_context():
+            rows = db.session.execute(
+                db.select(ChangeEvent.id, ChangeEvent.topic, ChangeEvent.data)
+                .where(ChangeEvent.id > self.last_id - RESCAN_IDS)
+                .order_by(ChangeEvent.id)
+            ).all()
+            db.session.remove()
+        with self._lock:
+            new = [tuple(row) for row in rows if row[0] not in self._seen]
+            if not new:
+                return
+            for item in new:
+                self._remember(item)
+            loops = [(loop, list(subscribers)) for loop, subscribers in self._subscribers.items()]
+        for loop, subscribers in loops:
+            loop.call_soon_threadsafe(_fan_out, subscribers, new)
+
+    def _prune(self):
+        cutoff = datetime.utcnow() - timedelta(seconds=self.retention_seconds)
+        with self._app.app_context():
+            db.session.execute(db.delete(ChangeEvent).where(ChangeEvent.created_at < cutoff))
+            db.session.commit()
+            db.session.remove()
+
+    def _run(self):
+        pruned_at = 0.0
+        while True:
+            time.sleep(self.poll_seconds)
+            try:
+                self._poll()
+                if time.monotonic() - pruned_at > PRUNE_EVERY_SECONDS:
+                    self._prune()
+                    pruned_at = time.monotonic()
+            except Exception:
+                # A locked or briefly unavailable database must not end the broker
+                logger.exception('Event broker poll failed')
+
+
+def _fan_out(subscribers: List[Subscription], events: List[Tuple[int, str, str]]):
+    # Runs on the subscribers' event loop: one callback per loop, not per subscriber
+    for subscription in subscribers:
+        if subscription.lagged:
+            continue
+        for item in events:
+            if item[1] not in subscription.topics:
+                continue
+            if subscription.queue.full():
+                # Too far behind: the stream sends a reset instead of the backlog
+                subscription.lagged = True
+                break
+            subscription.queue.put_nowait(item)
+
+
+event_broker = EventBroker()
+
+_session_hooks_installed = False
+
+
+def init_events(app):
+    """Record TodoTask and AnomalyLog changes as events, and size the broker."""
+    global _session_hooks_installed
+    event_broker.configure(app)
+    if not _session_hooks_installed:
+        event.listen(Session, 'after_flush', _collect_changes)
+        event.listen(Session, 'after_flush_postexec', _record_changes)
+        _session_hooks_installed = True
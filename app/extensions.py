@@ -4,4 +4,6 @@ Flask Extensions
 
 from flask_sqlalchemy import SQLAlchemy
 
-db = SQLAlchemy()
+from app.db_routing import RoutingSession
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
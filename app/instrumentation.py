@@ -0,0 +1,279 @@
+"""
+Request Instrumentation
+Per-endpoint latency, DB and serialization metrics in Prometheus text format.
+
+Every request gets a thread-local RequestStats. SQLAlchemy cursor events add
+each query's count and time to it, and the app's JSON provider adds the
+time spent encoding responses. When the response is ready, the totals go
+into the endpoint's histograms. Metrics are held per process; under
+gunicorn each worker reports its own series.
+
+Recording takes no lock: each thread queues its batches on a buffer of
+its own, which is applied to the series under the registry lock once it
+holds FLUSH_BATCHES of them, and whenever /metrics is scraped, so a scrape
+sees every request that finished before it.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from typing import Dict, List, Optional, Tuple
+
+from flask import request
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Upper bounds (seconds) of the latency buckets
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100, 250)
+
+# Batches a thread queues before applying them to the series itself
+FLUSH_BATCHES = 256
+
+
+class Histogram:
+    """Fixed-bucket histogram for one label set."""
+
+    __slots__ = ('bounds', 'counts', 'sum', 'count')
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels: Tuple[Tuple[str, str], ...]) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(str(value))}"' for name, value in labels) + '}'
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _BufferLocal(threading.local):
+    buffer: Optional[List] = None
+
+
+class MetricsRegistry:
+    """Thread-safe store of counters and histograms keyed by metric name and labels."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # name -> (type, help, bucket bounds)
+        self._meta: Dict[str, Tuple[str, str, Optional[Tuple[float, ...]]]] = {}
+        self._series: Dict[str, Dict[Tuple[Tuple[str, str], ...], object]] = {}
+        # Each thread's batches not yet applied to the series, and the thread owning the buffer
+        self._local = _BufferLocal()
+        self._buffers: List[Tuple[threading.Thread, List]] = []
+
+    def counter(self, name: str, help_text: str):
+        self._meta[name] = ('counter', help_text, None)
+        self._series.setdefault(name, {})
+
+    def histogram(self, name: str, help_text: str, bounds: Tuple[float, ...]):
+        self._meta[name] = ('histogram', help_text, tuple(bounds))
+        self._series.setdefault(name, {})
+
+    def record(self, counters: List[Tuple[str, tuple, float]], observations: List[Tuple[str, tuple, float]]):
+        """Queue a batch of counter increments and histogram observations on this thread's buffer."""
+        buffer = self._local.buffer
+        if buffer is None:
+            buffer = self._local.buffer = []
+            with self._lock:
+                self._buffers.append((threading.current_thread(), buffer))
+        buffer.append((counters, observations))
+        if len(buffer) >= FLUSH_BATCHES:
+            with self._lock:
+                self._apply(buffer)
+
+    def _apply(self, buffer: List):
+        # Under the lock. Taken by count, as the thread owning the buffer may append meanwhile
+        batches = buffer[:]
+        del buffer[:len(batches)]
+        meta, all_series = self._meta, self._series
+        for counters, observations in batches:
+            for name, labels, amount in counters:
+                series = all_series[name]
+                series[labels] = series.get(labels, 0) + amount
+            for name, labels, value in observations:
+                series = all_series[name]
+                histogram = series.get(labels)
+                if histogram is None:
+                    histogram = series[labels] = Histogram(meta[name][2])
+                # Histogram.observe, inlined: this loop runs once per observation
+                histogram.counts[bisect_left(histogram.bounds, value)] += 1
+                histogram.sum += value
+                histogram.count += 1
+
+    def _flush(self):
+        # Under the lock. Buffers of finished threads are applied one last time and dropped
+        for _, buffer in self._buffers:
+            self._apply(buffer)
+        self._buffers = [(thread, buffer) for thread, buffer in self._buffers if thread.is_alive()]
+
+    def clear(self):
+        with self._lock:
+            self._flush()
+            for series in self._series.values():
+                series.clear()
+
+    def render(self) -> str:
+        """All series in the Prometheus text exposition format (0.0.4)."""
+        lines = []
+        with self._lock:
+            self._flush()
+            for name, (kind, help_text, bounds) in self._meta.items():
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} {kind}')
+                for labels, value in sorted(self._series[name].items()):
+                    if kind == 'counter':
+                        lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(bounds + (float('inf'),), value.counts):
+                        cumulative += count
+                        bucket_labels = labels + (('le', _format_value(bound)),)
+                        lines.append(f'{name}_bucket{_format_labels(bucket_labels)} {cumulative}')
+                    lines.append(f'{name}_sum{_format_labels(labels)} {_format_value(value.sum)}')
+                    lines.append(f'{name}_count{_format_labels(labels)} {value.count}')
+        return '\n'.join(lines) + '\n'
+
+
+class RequestStats:
+    """Start time and DB and serialization totals for the request running on this thread."""
+
+    __slots__ = ('started', 'queries', 'query_started', 'query_seconds', 'serialize_seconds')
+
+    def __init__(self, started: float):
+        self.started = started
+        self.queries = 0
+        # A request runs its statements one at a time, on its own thread
+        self.query_started = 0.0
+        self.query_seconds = 0.0
+        self.serialize_seconds = 0.0
+
+
+class _RequestLocal(threading.local):
+    # A class default, so the hooks read it without getattr on threads that never set it
+    stats: Optional[RequestStats] = None
+
+
+_local = _RequestLocal()
+
+# (endpoint, method, status) -> label tuples of the request's series, built once per combination
+_labels: Dict[Tuple[str, str, int], Tuple[tuple, tuple, tuple]] = {}
+
+
+metrics = MetricsRegistry()
+metrics.counter('http_requests_total', 'Requests handled, by endpoint, method and status.')
+metrics.histogram('http_request_duration_seconds', 'Time from request start to response, by endpoint.',
+                  LATENCY_BUCKETS)
+metrics.histogram('http_request_db_queries', 'SQL statements executed per request, by endpoint.',
+                  QUERY_COUNT_BUCKETS)
+metrics.histogram('http_request_db_seconds', 'Time spent executing SQL per request, by endpoint.',
+                  LATENCY_BUCKETS)
+metrics.histogram('http_request_serialize_seconds', 'Time spent encoding JSON per request, by endpoint.',
+                  LATENCY_BUCKETS)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # Listened with retval=True (CURSOR_HOOKS), which spares SQLAlchemy wrapping the hook
+    stats = _local.stats
+    if stats is not None:
+        stats.query_started = time.perf_counter()
+    return statement, parameters
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _local.stats
+    if stats is not None and stats.query_started:
+        stats.queries += 1
+        stats.query_seconds += time.perf_counter() - stats.query_started
+        stats.query_started = 0.0
+
+
+# (event, listener, retval) of the SQLAlchemy cursor events, installed on every Engine
+CURSOR_HOOKS = (
+    ('before_cursor_execute', _before_cursor_execute, True),
+    ('after_cursor_execute', _after_cursor_execute, False)
+)
+
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """JSON provider that charges the time spent building JSON responses to the current request."""
+
+    def response(self, *args, **kwargs):
+        # Timed here rather than in dumps, which also runs for the session serializer on
+        # every request: one timing per jsonify instead of two
+        started = time.perf_counter()
+        response = super().response(*args, **kwargs)
+        stats = _local.stats
+        if stats is not None:
+            stats.serialize_seconds += time.perf_counter() - started
+        return response
+
+
+def _timed(dispatch):
+    """Wrap Flask.full_dispatch_request to record each request's totals once it has its response."""
+    # One wrapper rather than before/after/teardown hooks: Flask dispatches every hook through
+    # ensure_sync, which costs more than the metrics themselves on cheap routes. The stats
+    # are kept on the thread-local rather than g for the same reason
+    def full_dispatch_request():
+        stats = _local.stats = RequestStats(time.perf_counter())
+        try:
+            response = dispatch()
+        finally:
+            # Requests that never produced a response must not leak stats into the next one
+            _local.stats = None
+        elapsed = time.perf_counter() - stats.started
+
+        current = request._get_current_object()
+        key = (current.endpoint or 'unmatched', current.method, response.status_code)
+        labels = _labels.get(key)
+        if labels is None:
+            endpoint_labels = (('endpoint', key[0]),)
+            method_labels = endpoint_labels + (('method', key[1]),)
+            labels = _labels[key] = (method_labels + (('status', str(key[2])),), method_labels, endpoint_labels)
+        status_labels, method_labels, endpoint_labels = labels
+        metrics.record(
+            [('http_requests_total', status_labels, 1)],
+            [
+                ('http_request_duration_seconds', method_labels, elapsed),
+                ('http_request_db_queries', endpoint_labels, stats.queries),
+                ('http_request_db_seconds', endpoint_labels, stats.query_seconds),
+                ('http_request_serialize_seconds', endpoint_labels, stats.serialize_seconds)
+            ]
+        )
+        return response
+    return full_dispatch_request
+
+
+_engine_hooks_installed = False
+
+
+def init_instrumentation(app):
+    """Install the request timing, JSON provider and SQLAlchemy cursor events."""
+    global _engine_hooks_installed
+    if not app.config.get('METRICS_ENABLED', True):
+        return
+    app.json = TimedJSONProvider(app)
+    app.full_dispatch_request = _timed(app.full_dispatch_request)
+    if not _engine_hooks_installed:
+        for name, hook, retval in CURSOR_HOOKS:
+            event.listen(Engine, name, hook, retval=retval)
+        _engine_hooks_installed = True
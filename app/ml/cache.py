@@ -0,0 +1,113 @@
+"""
+Prediction Cache
+Bounded, thread-safe LRU memoization of risk predictions.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+# Integer features; every other numeric feature is a rate and gets quantized
+COUNT_FEATURES = ('records', 'anomalies')
+
+
+class _Stripe:
+    """One independently locked LRU segment."""
+
+    __slots__ = ('lock', 'entries', 'hits', 'misses')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+
+class PredictionCache:
+    """
+    LRU cache split into lock stripes by key hash.
+
+    Threads only contend when their keys land in the same stripe, and the
+    prediction itself runs outside any lock (two threads missing on the same
+    key may both compute it; the results are identical). Keys include the
+    model version, so a new model never serves old entries.
+    """
+
+    def __init__(self, capacity: int = 4096, stripes: int = 16, quantum: float = 0):
+        self.configure(capacity, stripes, quantum)
+
+    def configure(self, capacity: int = 4096, stripes: int = 16, quantum: float = 0):
+        """Resize the cache (dropping all entries) and set the rate quantum (0 disables quantization)."""
+        self.capacity = max(capacity, 0)
+        self.quantum = quantum
+        self._stripes = [_Stripe() for _ in range(max(stripes, 1))]
+        self._stripe_capacity = -(-self.capacity // len(self._stripes))
+
+    def canonical(self, features: Dict[str, Any]) -> Tuple[Tuple[str, Any], ...]:
+        """Sorted (name, value) tuple with counts as ints and rates quantized."""
+        items = []
+        for name, value in features.items():
+            if name in COUNT_FEATURES:
+                value = int(value)
+            elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                value = float(value)
+                if self.quantum:
+                    value = round(round(value / self.quantum) * self.quantum, 10)
+            items.append((name, value))
+        return tuple(sorted(items))
+
+    def get_or_compute(self, version: Hashable, features: Dict[str, Any],
+                       compute: Callable[[Dict[str, Any]], Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Cached compute(features) for the canonical form of `features`.
+
+        compute receives the canonical (quantized) features so every input
+        in one bucket gets the same answer. Callers get their own copy.
+        """
+        canonical = self.canonical(features)
+        if not self.capacity:
+            return compute(dict(canonical))
+        key = (version, canonical)
+        stripe = self._stripes[hash(key) % len(self._stripes)]
+
+        with stripe.lock:
+            result = stripe.entries.get(key)
+            if result is not None:
+                stripe.entries.move_to_end(key)
+                stripe.hits += 1
+                return dict(result)
+            stripe.misses += 1
+
+        result = compute(dict(canonical))
+        with stripe.lock:
+            stripe.entries[key] = result
+            stripe.entries.move_to_end(key)
+            while len(stripe.entries) > self._stripe_capacity:
+                stripe.entries.popitem(last=False)
+        return dict(result)
+
+    def clear(self):
+        """Drop all entries and reset the counters."""
+        for stripe in self._stripes:
+            with stripe.lock:
+                stripe.entries.clear()
+                stripe.hits = stripe.misses = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and occupancy, summed over stripes."""
+        hits = misses = size = 0
+        for stripe in self._stripes:
+            with stripe.lock:
+                hits += stripe.hits
+                misses += stripe.misses
+                size += len(stripe.entries)
+        lookups = hits + misses
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / lookups, 4) if lookups else 0.0,
+            'size': size,
+            'capacity': self.capacity,
+            'stripes': len(self._stripes),
+            'quantum': self.quantum
+        }
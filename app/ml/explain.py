@@ -0,0 +1,143 @@
+"""
+Explainability
+Feature attributions for the risk model.
+
+shapley_attributions computes exact Shapley values by evaluating the model
+on every coalition of the rate features (2^4 = 16 evaluations per row),
+batched over all rows so a trained backend scores them in one call. Absent
+features take the baseline value: a record set with no anomalies, so
+attributions sum to score(x) - score(clean). linear_attributions is the
+cheap fallback using the model's linear weights, ignoring the clip at 1.0.
+"""
+
+import time
+from itertools import combinations
+from math import factorial
+from typing import Any, Callable, Dict, List, Optional
+
+EXPLAIN_FEATURES = ('anomaly_rate', 'invalid_pin_rate', 'duplicate_rate', 'missing_dob_rate')
+
+FEATURE_LABELS = {
+    'anomaly_rate': 'Overall Anomaly Rate',
+    'invalid_pin_rate': 'Invalid PIN Rate',
+    'duplicate_rate': 'Duplicate Rate',
+    'missing_dob_rate': 'Missing DOB Rate'
+}
+
+BASELINE = {name: 0.0 for name in EXPLAIN_FEATURES}
+
+# Model inputs scored per predict_batch call between deadline checks
+CHUNK_INPUTS = 4096
+INTERACTIVE_CHUNK_INPUTS = 4
+
+
+def rate_features(features: Dict[str, Any]) -> Dict[str, float]:
+    """The rate features the model scores, derived from request/aggregate features."""
+    records = max(float(features.get('records', 1) or 1), 1.0)
+    return {
+        'anomaly_rate': float(features.get('anomalies', 0)) / records,
+        'invalid_pin_rate': float(features.get('invalid_pin_rate', 0)),
+        'duplicate_rate': float(features.get('duplicate_rate', 0)),
+        'missing_dob_rate': float(features.get('missing_dob_rate', 0))
+    }
+
+
+def _coalition_weights(n: int) -> Dict[int, float]:
+    return {size: factorial(size) * factorial(n - size - 1) / factorial(n) for size in range(n)}
+
+
+def shapley_attributions(predict_batch: Callable[[List[Dict[str, float]]], List[float]],
+                         rows: List[Dict[str, float]],
+                         baseline: Optional[Dict[str, float]] = None,
+                         deadline: Optional[float] = None,
+                         chunk: int = CHUNK_INPUTS) -> Optional[List[Dict[str, float]]]:
+    """
+    Exact Shapley values for each row of rate features.
+
+    Returns None if time.monotonic() passes `deadline` before all
+    coalitions are scored.
+    """
+    baseline = baseline or BASELINE
+    names = EXPLAIN_FEATURES
+    n = len(names)
+    masks = [frozenset(c) for size in range(n + 1) for c in combinations(range(n), size)]
+
+    inputs = []
+    for rates in rows:
+        for mask in masks:
+            inputs.append({
+                name: (rates[name] if i in mask else baseline[name]) for i, name in enumerate(names)
+            })
+
+    scores = []
+    for start in range(0, len(inputs), chunk):
+        if deadline is not None and time.monotonic() > deadline:
+            return None
+        scores.extend(predict_batch(inputs[start:start + chunk]))
+
+    weights = _coalition_weights(n)
+    results = []
+    for r in range(len(rows)):
+        value = dict(zip(masks, scores[r * len(masks):(r + 1) * len(masks)]))
+        attributions = {}
+        for i, name in enumerate(names):
+            total = 0.0
+            for mask, score in value.items():
+                if i not in mask:
+                    total += weights[len(mask)] * (value[mask | {i}] - score)
+            attributions[name] = total
+        results.append(attributions)
+    return results
+
+
+def linear_attributions(weights: Dict[str, float], scale: float, rows: List[Dict[str, float]],
+                        baseline: Optional[Dict[str, float]] = None) -> List[Dict[str, float]]:
+    """Weight x (value - baseline) attributions for a linear scorer."""
+    baseline = baseline or BASELINE
+    return [
+        {name: scale * weights.get(name, 0.0) * (rates[name] - baseline[name]) for name in EXPLAIN_FEATURES}
+        for rates in rows
+    ]
+
+
+def format_attributions(rates: Dict[str, float], attributions: Dict[str, float]) -> List[Dict[str, Any]]:
+    """Attributions as display rows, largest absolute contribution first."""
+    rows = [
+        {
+            'feature': FEATURE_LABELS[name],
+            'value': f'{rates[name] * 100:.1f}%',
+            'attribution': round(attributions[name], 4)
+        }
+        for name in EXPLAIN_FEATURES
+    ]
+    rows.sort(key=lambda r: abs(r['attribution']), reverse=True)
+    return rows
+
+
+def explain_batch(predictor, feature_rows: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+    """Shapley attributions for many scored rows (used at aggregate refresh)."""
+    rates = [rate_features(features) for features in feature_rows]
+    attributions = shapley_attributions(predictor.predict_batch, rates)
+    return [format_attributions(r, a) for r, a in zip(rates, attributions)]
+
+
+def explain(predictor, features: Dict[str, Any], budget_ms: float = 25.0) -> Dict[str, Any]:
+    """
+    Attributions for one interactive prediction within a latency budget.
+
+    Falls back to the linear attributions when Shapley values cannot be
+    finished in time.
+    """
+    started = time.monotonic()
+    rates = rate_features(features)
+    attributions = shapley_attributions(predictor.predict_batch, [rates], deadline=started + budget_ms / 1000,
+                                        chunk=INTERACTIVE_CHUNK_INPUTS)
+    method = 'shapley'
+    if attributions is None:
+        attributions = linear_attributions(predictor.weights, predictor.scale, [rates])
+        method = 'linear'
+    return {
+        'method': method,
+        'attributions': format_attributions(rates, attributions[0]),
+        'elapsed_ms': round((time.monotonic() - started) * 1000, 2)
+    }
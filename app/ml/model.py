@@ -3,17 +3,66 @@ ML Model Service
 Handles model loading and prediction with fallback to dummy model.
 """
 
+import json
 import os
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
+
+from app.ml.cache import PredictionCache
+from app.ml.explain import FEATURE_LABELS, linear_attributions
+from app.profiling import profiler
 
 
 class RiskPredictor:
     """Risk prediction model for Aadhaar anomaly assessment."""
     
+    # Rule-based weights over the rate features, and the scale applied before clipping
+    WEIGHTS = {
+        'anomaly_rate': 0.35,
+        'invalid_pin_rate': 0.25,
+        'duplicate_rate': 0.25,
+        'missing_dob_rate': 0.15
+    }
+    SCALE = 5
+    
     def __init__(self, model_path: Optional[str] = None):
         self.model = None
         self.model_path = model_path
-        print("Using rule-based fallback predictor")
+        self.weights = dict(self.WEIGHTS)
+        self.intercept = 0.0
+        self.scale = self.SCALE
+        self.model_type = 'rule_based'
+        # Part of every prediction cache key; change it whenever predictions change
+        self.version = 'rule_based-2'
+        if model_path and os.path.exists(model_path):
+            self.load(model_path)
+        else:
+            print("Using rule-based fallback predictor")
+    
+    def load(self, model_path: str):
+        """Load a trained artifact written by app.ml.training."""
+        with open(model_path) as f:
+            artifact = json.load(f)
+        if artifact.get('model_type') != 'linear':
+            raise ValueError(f"Unsupported model type: {artifact.get('model_type')}")
+        self.model = artifact
+        self.model_path = model_path
+        self.weights = dict(artifact['weights'])
+        self.intercept = artifact['intercept']
+        self.scale = artifact['scale']
+        self.model_type = artifact['model_type']
+        self.version = artifact['version']
+        print(f"Loaded risk model {self.version}")
+    
+    def score_rates(self, rates: Dict[str, float]) -> float:
+        """Risk score in [0, 1] from the rate features."""
+        score = self.intercept + sum(rates.get(name, 0) * weight for name, weight in self.weights.items())
+        # Normalize to 0-1 range
+        return min(max(score * self.scale, 0.0), 1.0)
+    
+    def predict_batch(self, rows: List[Dict[str, float]]) -> List[float]:
+        """Unrounded scores for many rate-feature rows at once."""
+        with profiler.stage(f'RiskPredictor {self.model_type}'):
+            return [self.score_rates(rates) for rates in rows]
     
     def predict(self, features: Dict[str, Any]) -> Dict[str, Any]:
         """Make a risk prediction based on input features."""
@@ -26,23 +75,13 @@ class RiskPredictor:
         # Calculate composite risk score
         anomaly_rate = anomalies / max(records, 1)
         
-        # Weighted scoring
-        weights = {
-            'anomaly_rate': 0.35,
-            'invalid_pin_rate': 0.25,
-            'duplicate_rate': 0.25,
-            'missing_dob_rate': 0.15
+        rates = {
+            'anomaly_rate': anomaly_rate,
+            'invalid_pin_rate': invalid_pin_rate,
+            'duplicate_rate': duplicate_rate,
+            'missing_dob_rate': missing_dob_rate
         }
-        
-        score = (
-            anomaly_rate * weights['anomaly_rate'] +
-            invalid_pin_rate * weights['invalid_pin_rate'] +
-            duplicate_rate * weights['duplicate_rate'] +
-            missing_dob_rate * weights['missing_dob_rate']
-        )
-        
-        # Normalize to 0-1 range
-        score = min(score * 5, 1.0)
+        score = self.score_rates(rates)
         
         # Determine risk category
         if score >= 0.7:
@@ -60,38 +99,21 @@ class RiskPredictor:
         
         confidence = min(max(confidence, 0.65), 0.95)
         
-        # Identify top contributing features
-        contributions = []
-        if invalid_pin_rate > 0.05:
-            contributions.append({
-                "feature": "Invalid PIN Rate",
-                "value": f"{invalid_pin_rate * 100:.1f}%",
-                "contribution": round(invalid_pin_rate * 100, 1)
-            })
-        if duplicate_rate > 0.03:
-            contributions.append({
-                "feature": "Duplicate Rate", 
-                "value": f"{duplicate_rate * 100:.1f}%",
-                "contribution": round(duplicate_rate * 100, 1)
-            })
-        if anomaly_rate > 0.02:
-            contributions.append({
-                "feature": "Overall Anomaly Rate",
-                "value": f"{anomaly_rate * 100:.1f}%",
-                "contribution": round(anomaly_rate * 100, 1)
-            })
-        if missing_dob_rate > 0.02:
-            contributions.append({
-                "feature": "Missing DOB Rate",
-                "value": f"{missing_dob_rate * 100:.1f}%",
-                "contribution": round(missing_dob_rate * 100, 1)
-            })
+        # Rank features by their share of this model's score (weight x rate), not fixed cut-offs
+        attributions = linear_attributions(self.weights, self.scale, [rates])[0]
+        contributions = [
+            {
+                "feature": FEATURE_LABELS[name],
+                "value": f"{rates[name] * 100:.1f}%",
+                "contribution": round(attribution * 100, 1)
+            }
+            for name, attribution in sorted(attributions.items(), key=lambda kv: kv[1], reverse=True)
+            if round(attribution * 100, 1) > 0
+        ]
         
         if not contributions:
             contributions = [{"feature": "General Assessment", "value": "Normal", "contribution": 100}]
         
-        contributions.sort(key=lambda x: x['contribution'], reverse=True)
-        
         return {
             "prediction": prediction,
             "score": round(score, 2),
@@ -99,14 +121,23 @@ class RiskPredictor:
             "recommended_action": action,
             "top_features": contributions[:3],
             "state": features.get('state', 'Unknown'),
-            "model_type": "rule_based"
+            "model_type": self.model_type,
+            "model_version": self.version
         }
 
 
-# Create singleton instance
+# Create singleton instances
 predictor = RiskPredictor()
+prediction_cache = PredictionCache()
 
 
 def get_prediction(features: Dict[str, Any]) -> Dict[str, Any]:
-    """Get risk prediction for given features."""
-    return predictor.predict(features)
+    """Get risk prediction for given features (memoized per model version)."""
+    return prediction_cache.get_or_compute(predictor.version, features, predictor.predict)
+
+
+def get_cache_stats() -> Dict[str, Any]:
+    """Prediction cache counters, with the model version they apply to."""
+    stats = prediction_cache.stats()
+    stats['model_version'] = predictor.version
+    return stats
@@ -0,0 +1,223 @@
+"""
+Model Training
+Offline training of the risk model from the persisted aggregates.
+
+Training rows are district-months from the month level of the rollup cube:
+the four rate features RiskPredictor scores for month t, and the anomaly
+rate of month t+1 as the target. Cells are streamed in chunks ordered by
+district, so memory holds one district's months plus the 5x5 normal
+equations, whatever the number of source records behind the cube.
+
+The fit is ridge-regularised least squares solved on CPU. Artifacts are
+JSON, named by a hash of their content, so the same aggregates always
+produce the same artifact and version.
+"""
+
+import hashlib
+import json
+import os
+import resource
+import time
+import tracemalloc
+from datetime import date, datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from app.extensions import db
+from app.models import TrendBucket
+from app.services.analytics_service import ANOMALOUS_KEY, RECORDS_KEY
+from app.services.sketches import KLLSketch
+
+FEATURES = ('anomaly_rate', 'invalid_pin_rate', 'duplicate_rate', 'missing_dob_rate')
+
+# Anomaly keys behind each rate feature (anomaly_rate uses the anomalous-record count)
+FEATURE_KEYS = {
+    'anomaly_rate': ANOMALOUS_KEY,
+    'invalid_pin_rate': 'invalid_pincodes',
+    'duplicate_rate': 'duplicate_ids',
+    'missing_dob_rate': 'missing_dob'
+}
+
+# District-months with fewer records are too noisy to learn from
+MIN_TRAIN_RECORDS = 20
+
+RIDGE_LAMBDA = 1e-6
+
+# Share of training rows scored as High Risk (score >= 0.7) after calibration
+HIGH_RISK_SHARE = 0.1
+
+CHUNK_SIZE = 5000
+
+ARTIFACT_PREFIX = 'risk_model-'
+
+
+def _next_month(day: date) -> date:
+    return date(day.year + day.month // 12, day.month % 12 + 1, 1)
+
+
+def iter_district_months(chunk_size: int = CHUNK_SIZE) -> Iterator[Tuple[str, str, date, Dict[str, int]]]:
+    """Yield (state, district, month, counts) from the month-level cube, one district at a time."""
+    kinds = [RECORDS_KEY] + list(FEATURE_KEYS.values())
+    rows = db.session.execute(
+        db.select(TrendBucket.state, TrendBucket.district, TrendBucket.bucket,
+                  TrendBucket.anomaly_type, TrendBucket.count)
+        .where(
+            TrendBucket.level == 'month',
+            TrendBucket.state != '*',
+            TrendBucket.district != '*',
+            TrendBucket.anomaly_type.in_(kinds)
+        )
+        .order_by(TrendBucket.state, TrendBucket.district, TrendBucket.bucket)
+        .execution_options(yield_per=chunk_size)
+    )
+    current = None
+    counts: Dict[str, int] = {}
+    for state, district, bucket, kind, count in rows:
+        key = (state, district, bucket)
+        if key != current:
+            if current is not None:
+                yield current + (counts,)
+            current, counts = key, {}
+        counts[kind] = count
+    if current is not None:
+        yield current + (counts,)
+
+
+def training_rows(chunk_size: int = CHUNK_SIZE) -> Iterator[Tuple[List[float], float, int]]:
+    """Yield (features of month t, anomaly rate of month t+1, records in month t)."""
+    previous = None
+    for state, district, month, counts in iter_district_months(chunk_size):
+        records = counts.get(RECORDS_KEY, 0)
+        if (previous and previous[0] == (state, district) and _next_month(previous[1]) == month
+                and records >= MIN_TRAIN_RECORDS):
+            target = counts.get(ANOMALOUS_KEY, 0) / records
+            yield previous[2], target, previous[3]
+        if records >= MIN_TRAIN_RECORDS:
+            features = [counts.get(FEATURE_KEYS[name], 0) / records for name in FEATURES]
+            previous = ((state, district), month, features, records)
+        else:
+            previous = None
+
+
+def solve(matrix: List[List[float]], vector: List[float]) -> List[float]:
+    """Solve a small dense linear system by Gaussian elimination with partial pivoting."""
+    n = len(vector)
+    a = [row[:] + [vector[i]] for i, row in enumerate(matrix)]
+    for col in range(n):
+        pivot = max(range(col, n), key=lambda r: abs(a[r][col]))
+        if abs(a[pivot][col]) < 1e-12:
+            raise ValueError('Training data is degenerate (singular normal equations)')
+        a[col], a[pivot] = a[pivot], a[col]
+        for r in range(col + 1, n):
+            factor = a[r][col] / a[col][col]
+            for c in range(col, n + 1):
+                a[r][c] -= factor * a[col][c]
+    x = [0.0] * n
+    for r in range(n - 1, -1, -1):
+        x[r] = (a[r][n] - sum(a[r][c] * x[c] for c in range(r + 1, n))) / a[r][r]
+    return x
+
+
+def fit(chunk_size: int = CHUNK_SIZE) -> Dict:
+    """Fit the linear model from streamed normal equations, then calibrate its score scale."""
+    n = len(FEATURES) + 1
+    xtx = [[0.0] * n for _ in range(n)]
+    xty = [0.0] * n
+    yy = y_sum = 0.0
+    rows = source_records = 0
+
+    for features, target, records in training_rows(chunk_size):
+        x = [1.0] + features
+        for i in range(n):
+            xi = x[i]
+            xty[i] += xi * target
+            row = xtx[i]
+            for j in range(n):
+                row[j] += xi * x[j]
+        yy += target * target
+        y_sum += target
+        rows += 1
+        source_records += records
+
+    if rows < n:
+        raise ValueError(f'Not enough training rows: {rows} (need consecutive months for at least {n} districts)')
+
+    for i in range(1, n):
+        xtx[i][i] += RIDGE_LAMBDA * rows
+    beta = solve(xtx, xty)
+
+    # R^2 from the sufficient statistics
+    sse = yy - 2 * sum(b * v for b, v in zip(beta, xty)) + sum(
+        beta[i] * beta[j] * xtx[i][j] for i in range(n) for j in range(n))
+    sst = yy - y_sum * y_sum / rows
+    r2 = 1 - sse / sst if sst > 0 else 0.0
+
+    # Second pass: scale predictions so the riskiest HIGH_RISK_SHARE of rows score >= 0.7.
+    # A quantile sketch keeps this pass in constant memory too.
+    predictions = KLLSketch()
+    for features, _, _ in training_rows(chunk_size):
+        predictions.add(beta[0] + sum(b * f for b, f in zip(beta[1:], features)))
+    cut = predictions.quantile(1 - HIGH_RISK_SHARE)
+    scale = 0.7 / cut if cut and cut > 0 else 1.0
+
+    return {
+        'model_type': 'linear',
+        'features': list(FEATURES),
+        'intercept': beta[0],
+        'weights': dict(zip(FEATURES, beta[1:])),
+        'scale': scale,
+        'metrics': {'r2': round(r2, 4), 'training_rows': rows, 'source_records': source_records}
+    }
+
+
+def write_artifact(model: Dict, output_dir: str) -> Tuple[str, str]:
+    """Write a content-addressed artifact, returning (version, path)."""
+    payload = json.dumps(model, sort_keys=True)
+    version = 'linear-' + hashlib.sha256(payload.encode('utf-8')).hexdigest()[:12]
+    artifact = dict(model, version=version, trained_at=datetime.utcnow().isoformat())
+    os.makedirs(output_dir, exist_ok=True)
+    path = os.path.join(output_dir, f'{ARTIFACT_PREFIX}{version}.json')
+    with open(path, 'w') as f:
+        json.dump(artifact, f, indent=2, sort_keys=True)
+    return version, path
+
+
+def latest_artifact(model_dir: Optional[str]) -> Optional[str]:
+    """Most recently written artifact in a directory."""
+    if not model_dir or not os.path.isdir(model_dir):
+        return None
+    paths = [os.path.join(model_dir, n) for n in os.listdir(model_dir)
+             if n.startswith(ARTIFACT_PREFIX) and n.endswith('.json')]
+    return max(paths, key=os.path.getmtime) if paths else None
+
+
+def train(output_dir: str, chunk_size: int = CHUNK_SIZE, trace_memory: bool = False) -> Dict:
+    """
+    Fit and write an artifact, reporting wall time and peak memory.
+
+    trace_memory adds the peak Python heap used by the fit (tracemalloc
+    slows the fit several times over, so it is opt-in).
+    """
+    started = time.perf_counter()
+    if trace_memory:
+        tracemalloc.start()
+    try:
+        model = fit(chunk_size)
+        traced_peak = tracemalloc.get_traced_memory()[1] if trace_memory else None
+    finally:
+        if trace_memory:
+            tracemalloc.stop()
+    version, path = write_artifact(model, output_dir)
+    report = {
+        'version': version,
+        'path': path,
+        'metrics': model['metrics'],
+        'weights': model['weights'],
+        'intercept': model['intercept'],
+        'scale': model['scale'],
+        'wall_seconds': round(time.perf_counter() - started, 3),
+        # ru_maxrss is KiB on Linux
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    }
+    if traced_peak is not None:
+        report['peak_traced_mb'] = round(traced_peak / 2 ** 20, 2)
+    return report
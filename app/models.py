@@ -2,6 +2,7 @@
 Database Models
 """
 
+import json
 from datetime import datetime
 from app.extensions import db
 
@@ -39,6 +40,11 @@ class TodoTask(db.Model):
 class AnomalyLog(db.Model):
     """Model for logging detected anomalies."""
     __tablename__ = 'anomaly_logs'
+    __table_args__ = (
+        # Supports filtered exports and drilldowns without full table scans
+        db.Index('ix_anomaly_logs_state_type_detected', 'state', 'anomaly_type', 'detected_at'),
+        db.Index('ix_anomaly_logs_detected_at', 'detected_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     state = db.Column(db.String(100), nullable=False)
@@ -92,3 +98,255 @@ class StateStats(db.Model):
             'missing_dob_count': self.missing_dob_count,
             'last_updated': self.last_updated.isoformat() if self.last_updated else None
         }
+
+
+class AnalysisJob(db.Model):
+    """Background analysis run with persisted progress and result."""
+    __tablename__ = 'analysis_jobs'
+    __table_args__ = (
+        # At most one queued/running job per parameter set, across all workers
+        db.Index(
+            'uq_analysis_jobs_active_key', 'params_key', unique=True,
+            sqlite_where=db.text("status IN ('queued', 'running')"),
+            postgresql_where=db.text("status IN ('queued', 'running')")
+        ),
+        db.Index('ix_analysis_jobs_kind_status_finished', 'kind', 'status', 'finished_at'),
+    )
+    
+    id = db.Column(db.String(36), primary_key=True)
+    kind = db.Column(db.String(50), nullable=False, default='analysis')
+    params_key = db.Column(db.String(64), nullable=False)
+    params = db.Column(db.Text)  # JSON
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, completed, failed
+    stage = db.Column(db.String(100))
+    progress = db.Column(db.Float, default=0.0)
+    rows_processed = db.Column(db.Integer, default=0)
+    result = db.Column(db.Text)  # JSON
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'stage': self.stage,
+            'progress': round(self.progress or 0.0, 4),
+            'rows_processed': self.rows_processed,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+
+class DistrictStats(db.Model):
+    """Aggregated district statistics for drilldown queries."""
+    __tablename__ = 'district_stats'
+    __table_args__ = (
+        db.UniqueConstraint('state', 'district', name='uq_district_stats_state_district'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    state = db.Column(db.String(100), nullable=False)
+    district = db.Column(db.String(100), nullable=False)
+    total_records = db.Column(db.Integer, default=0)
+    total_anomalies = db.Column(db.Integer, default=0)
+    anomaly_rate = db.Column(db.Float, default=0.0)
+    last_updated = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'state': self.state,
+            'district': self.district,
+            'total_records': self.total_records,
+            'total_anomalies': self.total_anomalies,
+            'anomaly_rate': self.anomaly_rate,
+            'last_updated': self.last_updated.isoformat() if self.last_updated else None
+        }
+
+
+class ProcessedShard(db.Model):
+    """Manifest entry for a data file already folded into the aggregates."""
+    __tablename__ = 'processed_shards'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    path = db.Column(db.String(1024), nullable=False, unique=True)
+    size = db.Column(db.BigInteger, nullable=False)
+    mtime = db.Column(db.Float, nullable=False)
+    sha256 = db.Column(db.String(64), nullable=False)
+    row_start = db.Column(db.BigInteger, nullable=False)
+    row_end = db.Column(db.BigInteger, nullable=False)
+    partial = db.Column(db.Text)  # JSON-serialised AnalysisAccumulator for this shard
+    processed_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'path': self.path,
+            'size': self.size,
+            'sha256': self.sha256,
+            'row_start': self.row_start,
+            'row_end': self.row_end,
+            'processed_at': self.processed_at.isoformat() if self.processed_at else None
+        }
+
+
+class AggregateSnapshot(db.Model):
+    """Named, JSON-serialised global aggregate state (e.g. correlation counts)."""
+    __tablename__ = 'aggregate_snapshots'
+    
+    name = db.Column(db.String(100), primary_key=True)
+    data = db.Column(db.Text, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class AadhaarIdIndex(db.Model):
+    """Hashed Aadhaar IDs already seen, for cross-shard duplicate detection."""
+    __tablename__ = 'aadhaar_id_index'
+    
+    id_hash = db.Column(db.BigInteger, primary_key=True, autoincrement=False)
+    shard_id = db.Column(db.Integer, nullable=False, index=True)
+
+
+class TrendBucket(db.Model):
+    """Pre-bucketed counts: (level, bucket) x state x district x anomaly type.
+    
+    level is 'day', 'week' (ISO, Monday start) or 'month'; bucket is the
+    first day of the period. state/district '*' hold the all-India and
+    state-wide rollups so range queries never scan finer rows.
+    """
+    __tablename__ = 'trend_buckets'
+    __table_args__ = (
+        db.UniqueConstraint('level', 'state', 'district', 'anomaly_type', 'bucket',
+                            name='uq_trend_buckets_key'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    level = db.Column(db.String(10), nullable=False)
+    bucket = db.Column(db.Date, nullable=False)
+    state = db.Column(db.String(100), nullable=False)
+    district = db.Column(db.String(100), nullable=False)
+    anomaly_type = db.Column(db.String(50), nullable=False)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    
+    def to_dict(self):
+        return {
+            'level': self.level,
+            'bucket': self.bucket.isoformat() if self.bucket else None,
+            'state': self.state,
+            'district': self.district,
+            'anomaly_type': self.anomaly_type,
+            'count': self.count
+        }
+
+
+class SketchBucket(db.Model):
+    """Mergeable sketches for one shard x month x state x district.
+    
+    distinct_ids is a HyperLogLog over hashed Aadhaar IDs and ages a KLL
+    quantile sketch (both JSON). As in TrendBucket, state/district '*' hold
+    the state-wide and all-India rollups; bucket is NULL for undated records.
+    """
+    __tablename__ = 'sketch_buckets'
+    __table_args__ = (
+        db.Index('ix_sketch_buckets_scope', 'state', 'district', 'bucket'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    shard_id = db.Column(db.Integer, nullable=False, index=True)
+    bucket = db.Column(db.Date)
+    state = db.Column(db.String(100), nullable=False)
+    district = db.Column(db.String(100), nullable=False)
+    records = db.Column(db.Integer, nullable=False, default=0)
+    distinct_ids = db.Column(db.Text, nullable=False)
+    ages = db.Column(db.Text, nullable=False)
+
+
+class PhoneLink(db.Model):
+    """A normalised mobile number shared by several records of one state (phone index rows)."""
+    __tablename__ = 'phone_links'
+    __table_args__ = (
+        db.UniqueConstraint('phone', 'state', name='uq_phone_links_phone_state'),
+        # Threshold queries read the top of these in order
+        db.Index('ix_phone_links_records', 'records'),
+        db.Index('ix_phone_links_state_records', 'state', 'records'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    phone = db.Column(db.String(20), nullable=False)
+    state = db.Column(db.String(100), nullable=False)
+    records = db.Column(db.Integer, nullable=False)
+    aadhaar_ids = db.Column(db.Integer, nullable=False)  # distinct IDs among the records
+    
+    def to_dict(self):
+        return {
+            'phone': self.phone,
+            'state': self.state,
+            'records': self.records,
+            'aadhaar_ids': self.aadhaar_ids
+        }
+
+
+class RiskScore(db.Model):
+    """Precomputed RiskPredictor output for a state or district, ranked within its scope."""
+    __tablename__ = 'risk_scores'
+    __table_args__ = (
+        db.UniqueConstraint('scope', 'state', 'district', name='uq_risk_scores_key'),
+        # Leaderboards read the top of these in order
+        db.Index('ix_risk_scores_scope_rank', 'scope', 'rank'),
+        db.Index('ix_risk_scores_scope_state_rank', 'scope', 'state', 'rank'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    scope = db.Column(db.String(10), nullable=False)  # state, district
+    state = db.Column(db.String(100), nullable=False)
+    district = db.Column(db.String(100), nullable=False)  # '*' for state scores
+    rank = db.Column(db.Integer, nullable=False)
+    score = db.Column(db.Float, nullable=False)
+    prediction = db.Column(db.String(50))
+    confidence = db.Column(db.Float)
+    records = db.Column(db.Integer, default=0)
+    anomalies = db.Column(db.Integer, default=0)
+    top_features = db.Column(db.Text)  # JSON
+    attributions = db.Column(db.Text)  # JSON, Shapley values from app.ml.explain
+    scored_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'scope': self.scope,
+            'state': self.state,
+            'district': self.district if self.scope == 'district' else None,
+            'rank': self.rank,
+            'score': self.score,
+            'prediction': self.prediction,
+            'confidence': self.confidence,
+            'records': self.records,
+            'anomalies': self.anomalies,
+            'top_features': json.loads(self.top_features) if self.top_features else [],
+            'attributions': json.loads(self.attributions) if self.attributions else [],
+            'scored_at': self.scored_at.isoformat() if self.scored_at else None
+        }
+
+
+class ChangeEvent(db.Model):
+    """A change pushed to live subscribers (task edits, logged anomalies, aggregate refreshes)."""
+    __tablename__ = 'change_events'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    topic = db.Column(db.String(32), nullable=False)
+    data = db.Column(db.Text, nullable=False)  # JSON delta
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'topic': self.topic,
+            'data': json.loads(self.data),
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
@@ -0,0 +1,361 @@
+"""
+Sampling Profiler
+Opt-in, runtime-toggled stack sampling for requests and analysis jobs.
+
+A daemon thread snapshots the Python stacks of the threads attached to a
+Profile every PROFILE_INTERVAL_MS (sys._current_frames), so unprofiled
+threads pay nothing and profiled ones only pay for the GIL hand-offs.
+
+The sampler needs the GIL to take a sample, and a thread running pure
+Python only yields it every switch interval (5ms by default), so samples
+lean towards code that releases the GIL (I/O, sqlite, numpy). Setting
+PROFILE_SWITCH_INTERVAL_MS below 5 removes most of that bias, but
+sys.setswitchinterval is process-wide: while anything is sampled, every
+thread in the worker hands the GIL over more often (about 2% less
+throughput for four CPU-bound threads at 0.5ms).
+Code can push coarse stage labels (ingest stages, model backends) that are
+prepended to every stack sampled inside them.
+
+What to profile lives in the 'profiling' aggregate snapshot, so a toggle
+reaches every gunicorn worker within PROFILING_POLL_SECONDS: a sample rate
+per blueprint for a limited time, and analysis jobs to profile ('next' or a
+queued job id). Each profile is written to PROFILE_DIR as a collapsed-stack
+file (flamegraph.pl / speedscope input) and a per-function summary.
+"""
+
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from flask import g, request
+
+from app.extensions import db
+from app.models import AggregateSnapshot
+
+PROFILING_SNAPSHOT = 'profiling'
+
+# Longest a blueprint can be sampled per toggle
+MAX_DURATION_SECONDS = 3600
+
+# Sampled request profiles are rewritten at most this often
+FLUSH_SECONDS = 10
+
+SUMMARY_FUNCTIONS = 100
+
+# Seconds the sampler keeps ticking with no thread attached before it sleeps
+IDLE_SECONDS = 5
+
+
+class Profile:
+    """Collapsed-stack sample counts for one profiling target."""
+
+    def __init__(self, name: str, meta: Optional[Dict] = None):
+        self.name = name
+        self.meta = dict(meta or {})
+        self.started_at = datetime.utcnow()
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        # Never flushed: the first sampled request writes the files
+        self.last_flush = float('-inf')
+        self._lock = threading.Lock()
+
+    def add(self, stack: tuple):
+        with self._lock:
+            self.stacks[stack] += 1
+            self.samples += 1
+
+    def summary(self) -> List[Dict]:
+        """Per-function self and inclusive sample counts, hottest (self) first."""
+        own, inclusive = Counter(), Counter()
+        with self._lock:
+            items = list(self.stacks.items())
+        for stack, count in items:
+            own[stack[-1]] += count
+            for frame in set(stack):
+                inclusive[frame] += count
+        total = sum(count for _, count in items) or 1
+        rows = [
+            {
+                'function': frame,
+                'self_samples': own[frame],
+                'total_samples': inclusive[frame],
+                'self_pct': round(own[frame] / total * 100, 2),
+                'total_pct': round(inclusive[frame] / total * 100, 2)
+            }
+            for frame in inclusive
+        ]
+        rows.sort(key=lambda r: (-r['self_samples'], -r['total_samples'], r['function']))
+        return rows[:SUMMARY_FUNCTIONS]
+
+    def write(self, directory: str) -> Dict[str, str]:
+        """Write <name>.collapsed and <name>.summary.json, returning their paths."""
+        os.makedirs(directory, exist_ok=True)
+        base = os.path.join(directory, self.name)
+        with self._lock:
+            lines = [f"{';'.join(stack)} {count}" for stack, count in sorted(self.stacks.items())]
+            samples = self.samples
+        with open(base + '.collapsed', 'w') as f:
+            f.write('\n'.join(lines) + ('\n' if lines else ''))
+        with open(base + '.summary.json', 'w') as f:
+            json.dump({
+                'name': self.name,
+                'started_at': self.started_at.isoformat(),
+                'written_at': datetime.utcnow().isoformat(),
+                'samples': samples,
+                'interval_ms': profiler.interval * 1000,
+                'meta': self.meta,
+                'functions': self.summary()
+            }, f, indent=2)
+        self.last_flush = time.monotonic()
+        return {'collapsed': base + '.collapsed', 'summary': base + '.summary.json'}
+
+
+class SamplingProfiler:
+    """Samples the stacks of attached threads from one background thread."""
+
+    def __init__(self, interval: float = 0.005, switch_interval: Optional[float] = None):
+        self.interval = interval
+        # Process-wide GIL switch interval while anything is sampled (None leaves it alone)
+        self.switch_interval = switch_interval
+        self._lock = threading.Lock()
+        # thread id -> (profile, stage stack)
+        self._attached: Dict[int, tuple] = {}
+        self._labels: Dict[object, str] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._wake = threading.Event()
+        # Interpreter switch interval to restore once nothing is sampled (None: not changed)
+        self._switch_interval: Optional[float] = None
+
+    def attach(self, profile: Profile):
+        """Start sampling the calling thread into `profile`."""
+        with self._lock:
+            if not self._attached and self.switch_interval:
+                self._switch_interval = sys.getswitchinterval()
+                sys.setswitchinterval(min(self._switch_interval, self.switch_interval))
+            self._attached[threading.get_ident()] = (profile, [])
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def detach(self):
+        """Stop sampling the calling thread."""
+        with self._lock:
+            self._attached.pop(threading.get_ident(), None)
+            if not self._attached and self._switch_interval is not None:
+                sys.setswitchinterval(self._switch_interval)
+                self._switch_interval = None
+
+    @contextmanager
+    def stage(self, name: str):
+        """Label samples taken inside the block (a no-op for unprofiled threads)."""
+        entry = self._attached.get(threading.get_ident())
+        if entry is None:
+            yield
+            return
+        entry[1].append(f'[{name}]')
+        try:
+            yield
+        finally:
+            entry[1].pop()
+
+    def _label(self, frame) -> str:
+        code = frame.f_code
+        label = self._labels.get(code)
+        if label is None:
+            module = frame.f_globals.get('__name__', '?')
+            label = self._labels[code] = f'{module}:{code.co_qualname}'
+        return label
+
+    def _run(self):
+        idle_since = time.monotonic()
+        while True:
+            with self._lock:
+                attached = dict(self._attached)
+            if not attached:
+                # Keep ticking through short gaps between sampled requests: waking up on
+                # attach would put every sample at the start of a request
+                if time.monotonic() - idle_since > IDLE_SECONDS:
+                    self._wake.clear()
+                    self._wake.wait()
+                    idle_since = time.monotonic()
+                time.sleep(self.interval)
+                continue
+            idle_since = time.monotonic()
+            frames = sys._current_frames()
+            for ident, (profile, stages) in attached.items():
+                frame = frames.get(ident)
+                if frame is None:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(self._label(frame))
+                    frame = frame.f_back
+                stack.reverse()
+                profile.add(tuple(stages) + tuple(stack))
+            del frames
+            time.sleep(self.interval)
+
+
+class ProfilingControl:
+    """Reads and updates the shared profiling settings, cached per process."""
+
+    def __init__(self):
+        self.poll_seconds = 2.0
+        self._cached = ({}, 0.0)
+        # (blueprint, settings updated_at) -> Profile for this process
+        self._request_profiles: Dict[tuple, Profile] = {}
+        self._lock = threading.Lock()
+
+    def _load(self) -> Dict:
+        snapshot = db.session.get(AggregateSnapshot, PROFILING_SNAPSHOT)
+        return json.loads(snapshot.data) if snapshot else {}
+
+    def _store(self, settings: Dict):
+        settings['updated_at'] = datetime.utcnow().isoformat()
+        snapshot = db.session.get(AggregateSnapshot, PROFILING_SNAPSHOT)
+        if snapshot is None:
+            db.session.add(AggregateSnapshot(name=PROFILING_SNAPSHOT, data=json.dumps(settings)))
+        else:
+            snapshot.data = json.dumps(settings)
+        db.session.commit()
+        self._cached = (settings, time.monotonic())
+
+    def settings(self) -> Dict:
+        """Current settings, re-read from the database every poll_seconds."""
+        settings, loaded_at = self._cached
+        if time.monotonic() - loaded_at >= self.poll_seconds:
+            settings = self._load()
+            self._cached = (settings, time.monotonic())
+        return settings
+
+    def enable_blueprint(self, blueprint: str, rate: float, duration: int) -> Dict:
+        settings = self._load()
+        until = datetime.utcnow() + timedelta(seconds=duration)
+        settings.setdefault('blueprints', {})[blueprint] = {'rate': rate, 'until': until.isoformat()}
+        self._store(settings)
+        return settings
+
+    def enable_job(self, job: str) -> Dict:
+        settings = self._load()
+        jobs = settings.setdefault('jobs', [])
+        if job not in jobs:
+            jobs.append(job)
+        self._store(settings)
+        return settings
+
+    def disable(self, blueprint: Optional[str] = None) -> Dict:
+        """Stop sampling one blueprint, or everything when none is given."""
+        settings = self._load()
+        if blueprint:
+            settings.get('blueprints', {}).pop(blueprint, None)
+        else:
+            settings = {}
+        self._store(settings)
+        return settings
+
+    def request_profile(self, blueprint: Optional[str]) -> Optional[Profile]:
+        """The profile to sample this request into, if it is picked."""
+        settings = self.settings()
+        target = settings.get('blueprints', {}).get(blueprint)
+        if (not target or datetime.fromisoformat(target['until']) < datetime.utcnow()
+                or random.random() >= target['rate']):
+            return None
+        key = (blueprint, settings['updated_at'])
+        profile = self._request_profiles.get(key)
+        if profile is None:
+            with self._lock:
+                profile = self._request_profiles.get(key)
+                if profile is None:
+                    from app.ml.model import predictor
+                    name = f"request-{blueprint}-{datetime.utcnow():%Y%m%dT%H%M%S}-{os.getpid()}"
+                    profile = Profile(name, {'blueprint': blueprint, 'rate': target['rate'], 'pid': os.getpid(),
+                                             'model_version': predictor.version})
+                    self._request_profiles[key] = profile
+        return profile
+
+    def flush(self, directory: str):
+        """Write this process's request profiles, forgetting those from earlier settings."""
+        current = self.settings().get('updated_at')
+        with self._lock:
+            for key, profile in list(self._request_profiles.items()):
+                if profile.samples:
+                    profile.write(directory)
+                if key[1] != current:
+                    del self._request_profiles[key]
+
+    def claim_job(self, job_id: str) -> bool:
+        """Whether job_id should be profiled; consumes its (or the 'next') entry."""
+        settings = self._load()
+        jobs = settings.get('jobs', [])
+        for entry in (job_id, 'next'):
+            if entry in jobs:
+                jobs.remove(entry)
+                self._store(settings)
+                return True
+        return False
+
+
+def profiles(directory: str) -> List[Dict]:
+    """Written profiles in a directory, newest first."""
+    if not os.path.isdir(directory):
+        return []
+    found = []
+    for name in os.listdir(directory):
+        if name.endswith('.summary.json'):
+            path = os.path.join(directory, name)
+            found.append({
+                'name': name[:-len('.summary.json')],
+                'written_at': datetime.utcfromtimestamp(os.path.getmtime(path)).isoformat()
+            })
+    found.sort(key=lambda p: p['written_at'], reverse=True)
+    return found
+
+
+profiler = SamplingProfiler()
+profiling_control = ProfilingControl()
+
+
+def profile_job(app, job_id: str, kind: str) -> Optional[Profile]:
+    """Attach a profile to the calling job thread if the job was selected."""
+    if not app.config.get('PROFILING_ENABLED') or not profiling_control.claim_job(job_id):
+        return None
+    from app.ml.model import predictor
+    profile = Profile(f'job-{job_id}', {'job_id': job_id, 'kind': kind, 'model_version': predictor.version})
+    profiler.attach(profile)
+    return profile
+
+
+def _start_request():
+    profile = profiling_control.request_profile(request.blueprint)
+    if profile is not None:
+        g.profile = profile
+        profiler.attach(profile)
+
+
+def _finish_request(exc=None):
+    from flask import current_app
+    profile = g.pop('profile', None)
+    if profile is None:
+        return
+    profiler.detach()
+    if time.monotonic() - profile.last_flush >= FLUSH_SECONDS:
+        profile.write(current_app.config['PROFILE_DIR'])
+
+
+def init_profiling(app):
+    """Install the request hooks when profiling is enabled for this deployment."""
+    profiler.interval = app.config.get('PROFILE_INTERVAL_MS', 5) / 1000
+    profiler.switch_interval = (app.config.get('PROFILE_SWITCH_INTERVAL_MS') or 0) / 1000 or None
+    profiling_control.poll_seconds = app.config.get('PROFILING_POLL_SECONDS', 2.0)
+    if not app.config.get('PROFILING_ENABLED'):
+        return
+    app.before_request(_start_request)
+    app.teardown_request(_finish_request)
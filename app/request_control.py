@@ -0,0 +1,184 @@
+"""
+Request Control
+Single-flight coalescing for expensive reads and token-bucket rate limits for costly endpoints.
+
+Coalescing: when many identical requests arrive together (everyone opening
+the analysis page after a deploy), the first one computes the payload and
+the others wait for it and share the result, instead of each building the
+same report. Nothing is cached; a request arriving after the computation
+finished starts a new one.
+
+Rate limiting: each client (remote address, read from X-Forwarded-For
+behind PROXY_FIX_HOPS proxies) gets one token bucket per endpoint class
+(prediction, export, jobs). A bucket holds up to `capacity` tokens and
+refills at capacity/period per second; a request takes one or is answered
+429 with Retry-After. Limits are set per class in RATE_LIMITS
+as "<capacity>/<period seconds>".
+
+Both are per process: under gunicorn each worker coalesces and limits on
+its own, so a client's effective limit is the configured one times the
+worker count.
+"""
+
+import math
+import threading
+import time
+from functools import wraps
+from typing import Callable, Dict, Hashable, Optional, Tuple
+
+from flask import current_app, jsonify, request
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+from app.instrumentation import metrics
+
+# Longest a coalesced request waits for the leader before computing on its own
+COALESCE_WAIT_SECONDS = 30
+
+# Buckets kept before full (idle) ones are dropped
+MAX_BUCKETS = 100000
+
+metrics.counter('coalesced_requests_total', 'Requests served by another in-flight computation, by name.')
+metrics.counter('rate_limited_requests_total', 'Requests refused by the rate limiter, by endpoint class.')
+
+
+class _Call:
+    """One in-flight computation and the requests waiting on it."""
+
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """Runs at most one computation per key at a time, sharing its result with concurrent callers."""
+
+    def __init__(self):
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Tuple, compute: Callable):
+        """compute()'s result, or that of an identical computation already in flight."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            if call.done.wait(COALESCE_WAIT_SECONDS):
+                metrics.record([('coalesced_requests_total', (('name', str(key[0])),), 1)], [])
+                if call.error is not None:
+                    raise call.error
+                return call.result
+            return compute()
+        try:
+            call.result = compute()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+
+def parse_limit(value: str) -> Tuple[float, float]:
+    """(capacity, refill per second) from "<capacity>/<period seconds>"; raises ValueError."""
+    capacity, _, period = value.partition('/')
+    capacity, period = float(capacity), float(period or 1)
+    if capacity <= 0 or period <= 0:
+        raise ValueError(f'Invalid rate limit: {value}')
+    return capacity, capacity / period
+
+
+class RateLimiter:
+    """Token buckets keyed by (endpoint class, client)."""
+
+    def __init__(self, limits: Dict[str, str]):
+        self.limits = {name: parse_limit(value) for name, value in limits.items() if value}
+        # (endpoint class, client) -> [tokens, last refill]
+        self._buckets: Dict[Tuple[str, str], list] = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, endpoint_class: str, client: str) -> Tuple[bool, float, float]:
+        """
+        Take one token for a client; returns (allowed, tokens left, seconds until the next token).
+
+        Classes without a configured limit are always allowed.
+        """
+        limit = self.limits.get(endpoint_class)
+        if limit is None:
+            return True, math.inf, 0.0
+        capacity, rate = limit
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get((endpoint_class, client))
+            if bucket is None:
+                if len(self._buckets) >= MAX_BUCKETS:
+                    self._prune(now)
+                bucket = self._buckets[(endpoint_class, client)] = [capacity, now]
+            tokens = min(capacity, bucket[0] + (now - bucket[1]) * rate)
+            bucket[1] = now
+            if tokens >= 1:
+                bucket[0] = tokens - 1
+                return True, bucket[0], 0.0
+            bucket[0] = tokens
+            return False, tokens, (1 - tokens) / rate
+
+    def _prune(self, now: float):
+        # A bucket that has refilled completely is the same as no bucket
+        for key, (tokens, last) in list(self._buckets.items()):
+            capacity, rate = self.limits[key[0]]
+            if tokens + (now - last) * rate >= capacity:
+                del self._buckets[key]
+
+
+def rate_limited(endpoint_class: str):
+    """Decorate a route so each client may call it at the rate configured for endpoint_class."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            limiter: Optional[RateLimiter] = current_app.extensions.get('rate_limiter')
+            if limiter is None or endpoint_class not in limiter.limits:
+                return view(*args, **kwargs)
+            allowed, remaining, retry_after = limiter.acquire(endpoint_class, request.remote_addr or 'unknown')
+            if not allowed:
+                metrics.record([('rate_limited_requests_total', (('endpoint_class', endpoint_class),), 1)], [])
+                response = jsonify({
+                    'success': False,
+                    'error': f'Rate limit exceeded for {endpoint_class} requests, retry in {math.ceil(retry_after)}s'
+                })
+                response.status_code = 429
+                response.headers['Retry-After'] = str(math.ceil(retry_after))
+                return response
+            response = current_app.make_response(view(*args, **kwargs))
+            response.headers['X-RateLimit-Remaining'] = str(int(remaining))
+            return response
+        return wrapper
+    return decorator
+
+
+def init_request_control(app):
+    """
+    Set up the rate limiter from RATE_LIMITS (none when RATE_LIMIT_ENABLED is off).
+
+    Behind PROXY_FIX_HOPS proxies, ProxyFix sets remote_addr to the client
+    address the nearest of them saw; without it every client shares the
+    proxy's bucket.
+    """
+    hops = app.config.get('PROXY_FIX_HOPS', 0)
+    if hops:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=hops, x_proto=hops)
+    if app.config.get('RATE_LIMIT_ENABLED', True):
+        app.extensions['rate_limiter'] = RateLimiter(app.config.get('RATE_LIMITS') or {})
+
+
+# Singleton instance
+single_flight = SingleFlight()
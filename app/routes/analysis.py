@@ -3,12 +3,54 @@ Analysis Routes
 Analysis page with anomaly detection and statistical patterns.
 """
 
-from flask import Blueprint, render_template, jsonify, request
+from datetime import datetime
+from flask import Blueprint, render_template, jsonify, request, Response, stream_with_context, current_app
+from app.request_control import rate_limited, single_flight
 from app.services.mock_data import get_mock_analysis_report
+from app.services.anomaly_log_writer import MAX_ROWS_PER_REQUEST, anomaly_log_row, anomaly_log_writer
+from app.services.export_service import EXPORT_FORMATS, parse_export_date, stream_export
+from app.services.job_service import job_manager
+from app.services.pattern_service import PHONE_SHARE_THRESHOLD
+from app.services.phone_index import phone_index_service
 
 analysis_bp = Blueprint('analysis', __name__)
 
 
+def get_latest_report():
+    """Serve the latest completed analysis run, falling back to mock data."""
+    return single_flight.do(('analysis_report',), load_latest_report)
+
+
+def load_latest_report():
+    report = job_manager.latest_result('analysis')
+    if report is None:
+        return get_mock_analysis_report()
+    return report
+
+
+def anomalies_page(report, anomaly_type=None, page=1, per_page=50):
+    """One page of the report's anomaly counts, optionally of one type."""
+    anomalies = report.get('anomaly_frequency', [])
+    if anomaly_type:
+        anomalies = [a for a in anomalies if a['type'] == anomaly_type]
+    start = (page - 1) * per_page
+    return {
+        'anomalies': anomalies[start:start + per_page],
+        'total': len(anomalies),
+        'page': page,
+        'per_page': per_page,
+        'total_pages': (len(anomalies) + per_page - 1) // per_page
+    }
+
+
+def distributions(report):
+    """Distribution data for charts."""
+    return {
+        'age_distribution': report.get('age_distribution', {}),
+        'gender_distribution': report.get('gender_distribution', {})
+    }
+
+
 @analysis_bp.route('/')
 def index():
     """Render the analysis page."""
@@ -19,7 +61,7 @@ def index():
 def get_report():
     """Get full analysis report."""
     try:
-        data = get_mock_analysis_report()
+        data = get_latest_report()
         return jsonify({
             'success': True,
             'data': data
@@ -40,32 +82,16 @@ def get_anomalies():
     per_page = request.args.get('per_page', 50, type=int)
     
     try:
-        report = get_mock_analysis_report()
-        anomalies = report.get('anomaly_frequency', [])
+        report = get_latest_report()
         
         # Filter by state if provided
         if state:
             # In production, would filter by state
             pass
         
-        # Filter by type if provided
-        if anomaly_type:
-            anomalies = [a for a in anomalies if a['type'] == anomaly_type]
-        
-        # Paginate
-        start = (page - 1) * per_page
-        end = start + per_page
-        paginated = anomalies[start:end]
-        
         return jsonify({
             'success': True,
-            'data': {
-                'anomalies': paginated,
-                'total': len(anomalies),
-                'page': page,
-                'per_page': per_page,
-                'total_pages': (len(anomalies) + per_page - 1) // per_page
-            }
+            'data': anomalies_page(report, anomaly_type, page, per_page)
         })
     except Exception as e:
         return jsonify({
@@ -78,12 +104,180 @@ def get_anomalies():
 def get_distributions():
     """Get distribution data for charts."""
     try:
-        report = get_mock_analysis_report()
+        report = get_latest_report()
+        return jsonify({
+            'success': True,
+            'data': distributions(report)
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@analysis_bp.route('/api/anomalies/export')
+@rate_limited('export')
+def export_anomalies():
+    """Stream every matching anomaly record as NDJSON or CSV."""
+    fmt = request.args.get('format', 'ndjson').lower()
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({
+            'success': False,
+            'error': f'Unsupported format: {fmt}. Use one of {list(EXPORT_FORMATS)}'
+        }), 400
+    
+    try:
+        resolved = request.args.get('resolved', None)
+        filters = {
+            'state': request.args.get('state', None),
+            'district': request.args.get('district', None),
+            'type': request.args.get('type', None),
+            'severity': request.args.get('severity', None),
+            'resolved': None if resolved is None else resolved.lower() in ('1', 'true', 'yes'),
+            'date_from': parse_export_date(request.args.get('from', None)),
+            'date_to': parse_export_date(request.args.get('to', None), end=True)
+        }
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': f'Invalid date format: {str(e)}'
+        }), 400
+    
+    filename = f"anomalies_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{fmt}"
+    return Response(
+        stream_with_context(stream_export(filters, fmt)),
+        mimetype=EXPORT_FORMATS[fmt],
+        headers={
+            'Content-Disposition': f'attachment; filename={filename}',
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
+
+@analysis_bp.route('/api/anomalies/log', methods=['POST'])
+def log_anomalies():
+    """Queue one anomaly (an object) or several (a list) for the batched AnomalyLog writer."""
+    data = request.get_json(silent=True)
+    items = data if isinstance(data, list) else [data]
+    if not data or len(items) > MAX_ROWS_PER_REQUEST:
+        return jsonify({
+            'success': False,
+            'error': f'Request body must be an anomaly or a list of 1-{MAX_ROWS_PER_REQUEST} anomalies'
+        }), 400
+    
+    try:
+        rows = [anomaly_log_row(item) for item in items]
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    
+    try:
+        if not anomaly_log_writer.submit(rows):
+            return jsonify({
+                'success': False,
+                'error': 'Anomaly log queue is full, retry later'
+            }), 503
+        return jsonify({
+            'success': True,
+            'data': {'queued': len(rows)}
+        }), 202
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@analysis_bp.route('/api/jobs', methods=['POST'])
+@rate_limited('jobs')
+def submit_job():
+    """Submit a background analysis run (deduplicated against active runs)."""
+    data = request.get_json(silent=True) or {}
+    mode = data.get('mode', 'incremental')
+    if mode not in ('incremental', 'full', 'memory'):
+        return jsonify({
+            'success': False,
+            'error': f'Invalid mode: {mode}'
+        }), 400
+    
+    try:
+        params = {'mode': mode, 'verify': bool(data.get('verify', False))}
+        job, created = job_manager.submit(current_app._get_current_object(), 'analysis', params)
+        return jsonify({
+            'success': True,
+            'data': {
+                'job': job.to_dict(),
+                'deduplicated': not created
+            }
+        }), 202 if created else 200
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@analysis_bp.route('/api/jobs')
+def list_jobs():
+    """List recent analysis runs."""
+    try:
+        limit = min(request.args.get('limit', 20, type=int), 100)
+        jobs = job_manager.recent(limit=limit)
+        return jsonify({
+            'success': True,
+            'data': {
+                'jobs': [j.to_dict() for j in jobs],
+                'total': len(jobs)
+            }
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@analysis_bp.route('/api/jobs/<job_id>')
+def get_job(job_id):
+    """Poll the status and progress of an analysis run."""
+    try:
+        job = job_manager.status(job_id)
+        
+        if not job:
+            return jsonify({
+                'success': False,
+                'error': 'Job not found'
+            }), 404
+        
+        return jsonify({
+            'success': True,
+            'data': job
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@analysis_bp.route('/api/phones/shared')
+def get_shared_phones():
+    """Mobile numbers linked to at least min_records records of a state, from the phone index."""
+    try:
+        min_records = max(request.args.get('min_records', PHONE_SHARE_THRESHOLD, type=int), 2)
+        state = request.args.get('state')
+        limit = min(max(request.args.get('limit', 100, type=int), 1), 1000)
+        
         return jsonify({
             'success': True,
             'data': {
-                'age_distribution': report.get('age_distribution', {}),
-                'gender_distribution': report.get('gender_distribution', {})
+                'min_records': min_records,
+                'numbers': phone_index_service.shared(min_records, state, limit),
+                'by_state': phone_index_service.by_state(min_records) if not state else None,
+                'index': phone_index_service.summary()
             }
         })
     except Exception as e:
@@ -91,3 +285,23 @@ def get_distributions():
             'success': False,
             'error': str(e)
         }), 500
+
+
+@analysis_bp.route('/api/phones/jobs', methods=['POST'])
+@rate_limited('jobs')
+def submit_phone_index_job():
+    """Rebuild the phone index in the background (deduplicated against an active build)."""
+    try:
+        job, created = job_manager.submit(current_app._get_current_object(), 'phone_index', {})
+        return jsonify({
+            'success': True,
+            'data': {
+                'job': job.to_dict(),
+                'deduplicated': not created
+            }
+        }), 202 if created else 200
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
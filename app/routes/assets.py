@@ -0,0 +1,37 @@
+"""
+Asset Routes
+Built page bundles, precompressed and cached as immutable.
+"""
+
+import mimetypes
+import os
+from flask import Blueprint, abort, current_app, request, send_file
+from werkzeug.security import safe_join
+
+assets_bp = Blueprint('assets', __name__)
+
+# Built file names change with their content, so clients may keep them for a year
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+# Precompressed variants, preferred in this order
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+@assets_bp.route('/assets/<path:filename>')
+def get_asset(filename):
+    """Serve a built asset, as its .br or .gz variant when the client accepts one."""
+    path = safe_join(current_app.config['ASSETS_DIR'], filename)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    encoding = None
+    for name, suffix in ENCODINGS:
+        if request.accept_encodings[name] and os.path.isfile(path + suffix):
+            path, encoding = path + suffix, name
+            break
+    response = send_file(path, mimetype=mimetype, conditional=True)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.headers['Cache-Control'] = IMMUTABLE
+    response.vary.add('Accept-Encoding')
+    return response
@@ -0,0 +1,127 @@
+"""
+Cluster Routes
+National dashboard and analysis queries answered by scatter-gather over the regional nodes.
+"""
+
+from datetime import date
+from flask import Blueprint, jsonify, request
+from app.routes.dashboard import trend_params
+from app.services.partition_service import node_status, partition_coordinator
+
+cluster_bp = Blueprint('cluster', __name__)
+
+
+def gathered(data):
+    """The response for a merged result: 502 when no node answered."""
+    if data['nodes'] and not any(node['ok'] for node in data['nodes']):
+        return jsonify({
+            'success': False,
+            'error': 'No partition node answered',
+            'data': data
+        }), 502
+    return jsonify({
+        'success': True,
+        'data': data
+    })
+
+
+@cluster_bp.route('/api/cluster/nodes')
+def get_nodes():
+    """Get each node's URL, region and states, and whether it answered."""
+    try:
+        results = partition_coordinator.info()
+        nodes = [dict(result.to_dict(), url=partition_coordinator.nodes[result.node], **(result.data or {}))
+                 for result in results]
+        return jsonify({
+            'success': True,
+            'data': dict(node_status(results), nodes=nodes)
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@cluster_bp.route('/api/cluster/summary')
+def get_summary():
+    """Get national summary statistics merged from every region."""
+    try:
+        return gathered(partition_coordinator.summary())
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@cluster_bp.route('/api/cluster/states')
+def get_states():
+    """Get per-state totals from every region."""
+    try:
+        return gathered(partition_coordinator.states())
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@cluster_bp.route('/api/cluster/report')
+def get_report():
+    """Get the analysis report over every region's records."""
+    try:
+        return gathered(partition_coordinator.report())
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@cluster_bp.route('/api/cluster/trends')
+def get_trends():
+    """Get a trend series summed over the regions holding the scope."""
+    try:
+        params = trend_params(request.args)
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+
+    try:
+        return gathered(partition_coordinator.trends(**params))
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@cluster_bp.route('/api/cluster/estimates')
+def get_estimates():
+    """Get distinct IDs and age percentiles from the regions' sketches merged together."""
+    try:
+        date_from = request.args.get('from', None)
+        date_to = request.args.get('to', None)
+        date_from = date.fromisoformat(date_from) if date_from else None
+        date_to = date.fromisoformat(date_to) if date_to else None
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': f'Invalid date format: {str(e)}'
+        }), 400
+
+    try:
+        return gathered(partition_coordinator.estimates(
+            state=request.args.get('state', None),
+            district=request.args.get('district', None),
+            date_from=date_from,
+            date_to=date_to
+        ))
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
@@ -3,7 +3,15 @@ Dashboard Routes
 Main dashboard page with India map and summary statistics.
 """
 
+from datetime import date
+from typing import Dict, List
 from flask import Blueprint, render_template, jsonify, request
+from app.request_control import single_flight
+from app.services.analytics_service import ANOMALY_LABELS
+from app.services.trend_service import query_trends
+from app.services.sketch_service import sketch_service
+from app.services.risk_service import risk_service
+from app.models import RiskScore, StateStats
 from app.services.mock_data import (
     get_mock_dashboard_summary,
     get_mock_state_data,
@@ -13,6 +21,46 @@ from app.services.mock_data import (
 dashboard_bp = Blueprint('dashboard', __name__)
 
 
+def state_map_rows(scores: Dict[str, RiskScore], stats: List[StateStats]) -> List[Dict]:
+    """Map rows coloured by the precomputed risk scores, or mock data before any ingest."""
+    if not scores:
+        return get_mock_all_states_data()
+    return [risk_service.state_map_row(row, scores.get(row.state)) for row in stats]
+
+
+def load_state_map_rows() -> List[Dict]:
+    scores = risk_service.state_scores()
+    stats = StateStats.query.all() if scores else []
+    return state_map_rows(scores, stats)
+
+
+def trend_params(args) -> Dict:
+    """query_trends arguments from the request args; raises ValueError with the error to return."""
+    try:
+        date_from = args.get('from', None)
+        date_to = args.get('to', None)
+        date_from = date.fromisoformat(date_from) if date_from else None
+        date_to = date.fromisoformat(date_to) if date_to else None
+    except ValueError as e:
+        raise ValueError(f'Invalid date format: {str(e)}')
+    
+    granularity = args.get('granularity', 'auto')
+    if granularity not in ('auto', 'day', 'week', 'month'):
+        raise ValueError(f'Invalid granularity: {granularity}')
+    
+    # Accept either the anomaly key or its display label
+    anomaly_type = args.get('type', None)
+    labels_to_keys = {label: key for key, label in ANOMALY_LABELS.items()}
+    return {
+        'date_from': date_from,
+        'date_to': date_to,
+        'state': args.get('state', None),
+        'district': args.get('district', None),
+        'anomaly_type': labels_to_keys.get(anomaly_type, anomaly_type),
+        'level': granularity
+    }
+
+
 @dashboard_bp.route('/')
 def index():
     """Render the main dashboard page."""
@@ -41,7 +89,7 @@ def get_summary():
 def get_all_states():
     """Get data for all states (for map coloring)."""
     try:
-        data = get_mock_all_states_data()
+        data = single_flight.do(('dashboard_states',), load_state_map_rows)
         return jsonify({
             'success': True,
             'data': data
@@ -102,3 +150,86 @@ def get_state_districts():
             'success': False,
             'error': str(e)
         }), 500
+
+
+@dashboard_bp.route('/api/dashboard/trends')
+def get_trends():
+    """Get a time series of records and anomalies from the rollup cube."""
+    try:
+        params = trend_params(request.args)
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    
+    try:
+        data = query_trends(**params)
+        return jsonify({
+            'success': True,
+            'data': data
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@dashboard_bp.route('/api/dashboard/bootstrap')
+def get_bootstrap():
+    """Get the summary, map states and trends for the first dashboard paint in one call."""
+    try:
+        params = trend_params(request.args)
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    
+    try:
+        return jsonify({
+            'success': True,
+            'data': {
+                'summary': get_mock_dashboard_summary(),
+                'states': single_flight.do(('dashboard_states',), load_state_map_rows),
+                'trends': query_trends(**params)
+            }
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@dashboard_bp.route('/api/dashboard/estimates')
+def get_estimates():
+    """Get approximate distinct IDs and age percentiles from the stored sketches."""
+    try:
+        date_from = request.args.get('from', None)
+        date_to = request.args.get('to', None)
+        date_from = date.fromisoformat(date_from) if date_from else None
+        date_to = date.fromisoformat(date_to) if date_to else None
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': f'Invalid date format: {str(e)}'
+        }), 400
+    
+    try:
+        state = request.args.get('state', None)
+        district = request.args.get('district', None)
+        data = single_flight.do(
+            ('dashboard_estimates', state, district, date_from, date_to),
+            lambda: sketch_service.estimates(state=state, district=district, date_from=date_from, date_to=date_to)
+        )
+        return jsonify({
+            'success': True,
+            'data': data
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
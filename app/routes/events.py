@@ -0,0 +1,40 @@
+"""
+Event Routes
+Server-Sent Events channel for task, anomaly and aggregate deltas.
+"""
+
+from flask import Blueprint, Response, current_app, jsonify, request
+from app.events import events_after, format_event, format_reset, last_event_id, parse_event_id, parse_topics
+
+events_bp = Blueprint('events', __name__)
+
+
+@events_bp.route('/api/events')
+def get_events():
+    """
+    Events since the client's Last-Event-ID as one SSE response.
+
+    The response ends after the batch and `retry` sets when EventSource
+    reconnects, so a sync worker is never held by an idle subscriber. The
+    ASGI app serves this path as a long-lived stream instead.
+    """
+    try:
+        topics = parse_topics(request.args.get('topics', None))
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    
+    after = parse_event_id(request.headers.get('Last-Event-ID') or request.args.get('after', None))
+    body = f"retry: {current_app.config.get('EVENT_RETRY_MS', 5000)}\n\n"
+    if after is None:
+        # First connection: start from now
+        body += f'id: {last_event_id()}\n\n'
+    else:
+        events = events_after(after, topics)
+        if events is None:
+            body += format_reset(last_event_id())
+        else:
+            body += ''.join(format_event(e.id, e.topic, e.data) for e in events)
+    return Response(body, mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
@@ -0,0 +1,15 @@
+"""
+Metrics Routes
+Prometheus scrape endpoint for the request instrumentation.
+"""
+
+from flask import Blueprint, Response
+from app.instrumentation import metrics
+
+metrics_bp = Blueprint('metrics', __name__)
+
+
+@metrics_bp.route('/metrics')
+def get_metrics():
+    """Request latency, DB and serialization metrics for this process."""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,92 @@
+"""
+Partition Routes
+This instance's partial aggregates, fetched and merged by a coordinator.
+"""
+
+import hashlib
+import json
+from datetime import date
+from flask import Blueprint, Response, current_app, jsonify, request
+from app.extensions import db
+from app.models import AggregateSnapshot
+from app.services.analytics_service import AnalysisAccumulator
+from app.services.ingest_service import GLOBAL_SNAPSHOT
+from app.services.sketch_service import sketch_service
+from app.services.trend_service import recent_spikes
+
+partition_bp = Blueprint('partition', __name__)
+
+
+def region_info():
+    return {
+        'region': current_app.config.get('REGION_NAME') or None,
+        'states': sorted(current_app.config.get('REGION_STATES') or [])
+    }
+
+
+@partition_bp.route('/api/partition/info')
+def get_info():
+    """Get the region and states this instance serves (no states: all of them)."""
+    return jsonify({
+        'success': True,
+        'data': region_info()
+    })
+
+
+@partition_bp.route('/api/partition/accumulator')
+def get_accumulator():
+    """
+    Get the persisted accumulator snapshot and the recent spikes.
+
+    The snapshot is spliced into the response as stored, and the ETag
+    follows its last update, so an unchanged one costs a 304.
+    """
+    try:
+        info = region_info()
+        snapshot = db.session.get(AggregateSnapshot, GLOBAL_SNAPSHOT)
+        version = snapshot.updated_at.isoformat() if snapshot and snapshot.updated_at else 'empty'
+        etag = '"%s"' % hashlib.sha1(f"{info['states']}|{version}".encode()).hexdigest()[:20]
+        if etag in request.if_none_match:
+            return Response(status=304, headers={'ETag': etag})
+
+        accumulator = snapshot.data if snapshot else json.dumps(AnalysisAccumulator().to_dict())
+        head = json.dumps({'success': True, 'data': dict(info, spikes=recent_spikes())})
+        body = head[:-2] + ', "accumulator": ' + accumulator + '}}'
+        return Response(body, mimetype='application/json', headers={'ETag': etag})
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@partition_bp.route('/api/partition/sketches')
+def get_sketches():
+    """Get the merged HyperLogLog and KLL sketches of a scope, for merging with other regions'."""
+    try:
+        date_from = request.args.get('from', None)
+        date_to = request.args.get('to', None)
+        date_from = date.fromisoformat(date_from) if date_from else None
+        date_to = date.fromisoformat(date_to) if date_to else None
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': f'Invalid date format: {str(e)}'
+        }), 400
+
+    try:
+        data = sketch_service.partial(
+            state=request.args.get('state', None),
+            district=request.args.get('district', None),
+            date_from=date_from,
+            date_to=date_to
+        )
+        return jsonify({
+            'success': True,
+            'data': data
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
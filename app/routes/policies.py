@@ -1,10 +1,14 @@
 """
 Policies Routes
-Policy recommendations page.
+Policy recommendations page, district-name resolution and duplicate linkage.
 """
 
-from flask import Blueprint, render_template, jsonify, request
-from app.services.mock_data import get_mock_policy_recommendations
+from flask import Blueprint, current_app, render_template, jsonify, request
+from app.request_control import rate_limited
+from app.services.district_normalizer import district_normalizer
+from app.services.job_service import job_manager
+from app.services.linkage_service import MIN_PAIR_SCORE
+from app.services.policy_service import policy_service
 
 policies_bp = Blueprint('policies', __name__)
 
@@ -21,15 +25,8 @@ def get_recommendations():
     try:
         severity = request.args.get('severity', None)
         
-        recommendations = get_mock_policy_recommendations()
-        
-        # Filter by severity if provided
-        if severity:
-            recommendations = [r for r in recommendations if r['severity'] == severity]
-        
-        # Sort by severity
-        severity_order = {'critical': 0, 'high': 1, 'medium': 2, 'low': 3}
-        recommendations.sort(key=lambda x: severity_order.get(x['severity'], 4))
+        # Precomputed at aggregate refresh, already sorted by severity
+        recommendations = policy_service.recommendations(severity)
         
         return jsonify({
             'success': True,
@@ -49,8 +46,7 @@ def get_recommendations():
 def get_policy_detail(policy_id):
     """Get details for a specific policy."""
     try:
-        recommendations = get_mock_policy_recommendations()
-        policy = next((r for r in recommendations if r['id'] == policy_id), None)
+        policy = policy_service.get(policy_id)
         
         if not policy:
             return jsonify({
@@ -67,3 +63,112 @@ def get_policy_detail(policy_id):
             'success': False,
             'error': str(e)
         }), 500
+
+
+@policies_bp.route('/api/districts/resolve', methods=['POST'])
+def resolve_districts():
+    """
+    Resolve a batch of raw district names to canonical districts.
+
+    Takes {"districts": [...], "states": [...]} (states optional, same
+    length). Each distinct value is resolved once; unresolved entries are
+    null.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        districts = data.get('districts')
+        states = data.get('states')
+        columns = [districts] if states is None else [districts, states]
+        if (not all(isinstance(c, list) and all(v is None or isinstance(v, str) for v in c) for c in columns)
+                or len(columns[-1]) != len(districts)):
+            return jsonify({
+                'success': False,
+                'error': 'districts must be a list of strings, and states a list of the same length'
+            }), 400
+
+        matches = district_normalizer.resolve_column(districts, states)
+        
+        return jsonify({
+            'success': True,
+            'data': {
+                'matches': [m.to_dict() if m else None for m in matches],
+                'resolved': sum(1 for m in matches if m),
+                'total': len(matches)
+            }
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@policies_bp.route('/api/duplicates/jobs', methods=['POST'])
+@rate_limited('jobs')
+def submit_linkage_job():
+    """
+    Start a duplicate linkage run (Policy 2) in the background.
+
+    Takes {"state": ..., "min_score": 0.7, "create_tasks": true}, all
+    optional. Poll the returned job at /analysis/api/jobs/<id>.
+    """
+    data = request.get_json(silent=True) or {}
+    state = data.get('state')
+    min_score = data.get('min_score', MIN_PAIR_SCORE)
+    if (state is not None and not isinstance(state, str)) or not isinstance(min_score, (int, float)) \
+            or not 0 < min_score <= 1:
+        return jsonify({
+            'success': False,
+            'error': 'state must be a string and min_score a number in (0, 1]'
+        }), 400
+    
+    try:
+        params = {'state': state, 'min_score': float(min_score), 'create_tasks': bool(data.get('create_tasks', True))}
+        job, created = job_manager.submit(current_app._get_current_object(), 'linkage', params)
+        return jsonify({
+            'success': True,
+            'data': {
+                'job': job.to_dict(),
+                'deduplicated': not created
+            }
+        }), 202 if created else 200
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@policies_bp.route('/api/duplicates')
+def get_duplicate_pairs():
+    """Scored candidate duplicate pairs from the latest linkage run, best first."""
+    try:
+        min_score = request.args.get('min_score', 0.0, type=float)
+        page = max(request.args.get('page', 1, type=int), 1)
+        per_page = min(max(request.args.get('per_page', 50, type=int), 1), 500)
+        
+        result = job_manager.latest_result('linkage')
+        if result is None:
+            return jsonify({
+                'success': True,
+                'data': {'pairs': [], 'total': 0, 'stats': None, 'generated_at': None}
+            })
+        
+        pairs = [p for p in result['pairs'] if p['score'] >= min_score]
+        start = (page - 1) * per_page
+        return jsonify({
+            'success': True,
+            'data': {
+                'pairs': pairs[start:start + per_page],
+                'total': len(pairs),
+                'page': page,
+                'per_page': per_page,
+                'stats': result['stats'],
+                'generated_at': result['generated_at']
+            }
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
@@ -3,8 +3,11 @@ Prediction Routes
 ML prediction page with risk assessment form.
 """
 
-from flask import Blueprint, render_template, jsonify, request
-from app.ml.model import get_prediction
+from flask import Blueprint, current_app, render_template, jsonify, request
+from app.ml.explain import explain
+from app.ml.model import get_cache_stats, get_prediction, prediction_cache, predictor
+from app.request_control import rate_limited
+from app.services.risk_service import risk_service
 from app.services.mock_data import get_mock_prediction
 
 prediction_bp = Blueprint('prediction', __name__)
@@ -17,6 +20,7 @@ def index():
 
 
 @prediction_bp.route('/api/predict', methods=['POST'])
+@rate_limited('prediction')
 def predict():
     """Make a risk prediction based on input features."""
     try:
@@ -50,6 +54,14 @@ def predict():
         # Get prediction from ML model
         result = get_prediction(features)
         
+        # Attributions only on request, within the configured latency budget, for the
+        # features the score was computed on (rates rounded to PREDICTION_CACHE_QUANTUM)
+        if data.get('explain'):
+            result['explanation'] = explain(
+                predictor, dict(prediction_cache.canonical(features)),
+                budget_ms=current_app.config.get('PREDICTION_EXPLAIN_BUDGET_MS', 25)
+            )
+        
         return jsonify({
             'success': True,
             'data': result
@@ -67,6 +79,58 @@ def predict():
         }), 500
 
 
+@prediction_bp.route('/api/cache')
+def get_cache():
+    """Get prediction cache hit/miss counters."""
+    return jsonify({
+        'success': True,
+        'data': get_cache_stats()
+    })
+
+
+@prediction_bp.route('/api/leaderboard')
+def get_leaderboard():
+    """Get the top-K riskiest districts (or states) from the precomputed scores."""
+    scope = request.args.get('scope', 'district')
+    if scope not in ('district', 'state'):
+        return jsonify({
+            'success': False,
+            'error': f'Invalid scope: {scope}'
+        }), 400
+    
+    try:
+        k = int(request.args.get('k', 10))
+        min_records = int(request.args.get('min_records', 0))
+    except ValueError:
+        return jsonify({
+            'success': False,
+            'error': 'k and min_records must be integers'
+        }), 400
+    if k < 1:
+        return jsonify({
+            'success': False,
+            'error': 'k must be positive'
+        }), 400
+    
+    try:
+        state = request.args.get('state', None)
+        leaders = risk_service.leaderboard(k=k, state=state, scope=scope, min_records=min_records)
+        return jsonify({
+            'success': True,
+            'data': {
+                'scope': scope,
+                'state': state,
+                'leaderboard': leaders,
+                'total': len(leaders)
+            }
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
 @prediction_bp.route('/api/states')
 def get_states():
     """Get list of available states for the form."""
@@ -0,0 +1,68 @@
+"""
+Profiling Routes
+Runtime control of the sampling profiler (registered when PROFILING_ENABLED).
+"""
+
+from flask import Blueprint, current_app, jsonify, request
+from app.profiling import MAX_DURATION_SECONDS, profiles, profiling_control
+
+profiling_bp = Blueprint('profiling', __name__)
+
+
+@profiling_bp.route('/api/profiling')
+def get_profiling():
+    """Current profiling settings and the profiles written so far."""
+    directory = current_app.config['PROFILE_DIR']
+    profiling_control.flush(directory)
+    return jsonify({
+        'success': True,
+        'data': {
+            'settings': profiling_control.settings(),
+            'profiles': profiles(directory)
+        }
+    })
+
+
+@profiling_bp.route('/api/profiling', methods=['POST'])
+def enable_profiling():
+    """
+    Sample a fraction of one blueprint's requests for a while, or profile a job.
+
+    Body: {"blueprint": "analysis", "rate": 0.1, "duration": 300}
+       or {"job": "next"} / {"job": "<queued job id>"}
+    """
+    data = request.get_json(silent=True) or {}
+    if data.get('job'):
+        settings = profiling_control.enable_job(str(data['job']))
+        return jsonify({'success': True, 'data': settings})
+    
+    blueprint = data.get('blueprint')
+    if blueprint not in current_app.blueprints:
+        return jsonify({
+            'success': False,
+            'error': f'Unknown blueprint: {blueprint}. Use one of {sorted(current_app.blueprints)}'
+        }), 400
+    try:
+        rate = float(data.get('rate', 0.1))
+        duration = int(data.get('duration', 300))
+    except (TypeError, ValueError):
+        return jsonify({
+            'success': False,
+            'error': 'rate and duration must be numbers'
+        }), 400
+    if not 0 < rate <= 1 or not 0 < duration <= MAX_DURATION_SECONDS:
+        return jsonify({
+            'success': False,
+            'error': f'rate must be in (0, 1] and duration in (0, {MAX_DURATION_SECONDS}] seconds'
+        }), 400
+    
+    settings = profiling_control.enable_blueprint(blueprint, rate, duration)
+    return jsonify({'success': True, 'data': settings})
+
+
+@profiling_bp.route('/api/profiling', methods=['DELETE'])
+def disable_profiling():
+    """Stop sampling one blueprint (?blueprint=) or everything."""
+    settings = profiling_control.disable(request.args.get('blueprint', None))
+    profiling_control.flush(current_app.config['PROFILE_DIR'])
+    return jsonify({'success': True, 'data': settings})
@@ -12,6 +12,32 @@ from datetime import datetime
 todo_bp = Blueprint('todo', __name__)
 
 
+def task_query(status=None, priority=None, state=None):
+    """Select tasks matching the list filters, newest first."""
+    query = db.select(TodoTask)
+    if status:
+        query = query.where(TodoTask.status == status)
+    if priority:
+        query = query.where(TodoTask.priority == priority)
+    if state:
+        query = query.where(TodoTask.state == state)
+    return query.order_by(TodoTask.created_at.desc())
+
+
+def task_list(tasks, status=None, priority=None, state=None):
+    """Task list payload, falling back to (filtered) mock data if there are no database records."""
+    if tasks:
+        return {'tasks': [t.to_dict() for t in tasks], 'total': len(tasks)}
+    mock_tasks = get_mock_tasks()
+    if status:
+        mock_tasks = [t for t in mock_tasks if t['status'] == status]
+    if priority:
+        mock_tasks = [t for t in mock_tasks if t['priority'] == priority]
+    if state:
+        mock_tasks = [t for t in mock_tasks if t['state'] == state]
+    return {'tasks': mock_tasks, 'total': len(mock_tasks)}
+
+
 @todo_bp.route('/')
 def index():
     """Render the to-do page."""
@@ -27,54 +53,16 @@ def get_tasks():
     
     try:
         # Try to get from database first
-        query = TodoTask.query
-        
-        if status:
-            query = query.filter(TodoTask.status == status)
-        if priority:
-            query = query.filter(TodoTask.priority == priority)
-        if state:
-            query = query.filter(TodoTask.state == state)
-        
-        tasks = query.order_by(TodoTask.created_at.desc()).all()
-        
-        if tasks:
-            return jsonify({
-                'success': True,
-                'data': {
-                    'tasks': [t.to_dict() for t in tasks],
-                    'total': len(tasks)
-                }
-            })
-        else:
-            # Fall back to mock data if no database records
-            mock_tasks = get_mock_tasks()
-            
-            # Apply filters to mock data
-            if status:
-                mock_tasks = [t for t in mock_tasks if t['status'] == status]
-            if priority:
-                mock_tasks = [t for t in mock_tasks if t['priority'] == priority]
-            if state:
-                mock_tasks = [t for t in mock_tasks if t['state'] == state]
-            
-            return jsonify({
-                'success': True,
-                'data': {
-                    'tasks': mock_tasks,
-                    'total': len(mock_tasks)
-                }
-            })
+        tasks = db.session.execute(task_query(status, priority, state)).scalars().all()
+        data = task_list(tasks, status, priority, state)
     except Exception as e:
         # If database error, use mock data
         mock_tasks = get_mock_tasks()
-        return jsonify({
-            'success': True,
-            'data': {
-                'tasks': mock_tasks,
-                'total': len(mock_tasks)
-            }
-        })
+        data = {'tasks': mock_tasks, 'total': len(mock_tasks)}
+    return jsonify({
+        'success': True,
+        'data': data
+    })
 
 
 @todo_bp.route('/api/tasks', methods=['POST'])
@@ -0,0 +1,357 @@
+"""
+Aggregate Store
+Compact columnar storage for the district x anomaly-type x day counts.
+
+A Counter keyed by (day, state, district, type) string tuples costs a few
+hundred bytes per cell. DailyCounts keeps one int64 key per cell (interned
+state, district and type codes plus the day ordinal, packed so that sorting
+keys groups cells by series and orders each series by day) in a sorted
+array, next to an int64 count array. Increments go to a small pending dict
+that is merged into the arrays in batches.
+
+Each store owns its code tables, so the strings it interns (raw district
+spellings included) go away with it instead of accumulating for the life
+of the process. Merging re-keys the other store's rows into this store's
+codes, unless both tables already agree.
+
+Filters, sorts and top-N work on whole columns with C-level iterators
+(map/compress over arrays, heapq), and rows only become tuples or dicts
+when they leave the store: items(), to_dicts() and to_dict().
+"""
+
+import heapq
+import threading
+from array import array
+from bisect import bisect_left
+from datetime import date
+from itertools import compress, repeat
+from operator import and_, eq, ge, le, neg, rshift
+from typing import Collection, Dict, Iterator, List, Optional, Tuple
+
+# Key layout, high to low bits: state | district | type | day ordinal
+DAY_BITS = 22
+KIND_BITS = 6
+DISTRICT_BITS = 20
+STATE_BITS = 12
+
+KIND_SHIFT = DAY_BITS
+DISTRICT_SHIFT = KIND_SHIFT + KIND_BITS
+STATE_SHIFT = DISTRICT_SHIFT + DISTRICT_BITS
+
+FIELDS = {
+    # field -> (shift, mask)
+    'day': (0, (1 << DAY_BITS) - 1),
+    'kind': (KIND_SHIFT, (1 << KIND_BITS) - 1),
+    'district': (DISTRICT_SHIFT, (1 << DISTRICT_BITS) - 1),
+    'state': (STATE_SHIFT, (1 << STATE_BITS) - 1)
+}
+
+# Pending cells merged into the arrays once they exceed this, or a quarter of the rows
+PENDING_ROWS = 65536
+
+
+class Interner:
+    """Bidirectional string <-> small int code table."""
+
+    __slots__ = ('name', 'limit', 'values', 'codes', '_lock')
+
+    def __init__(self, name: str, bits: int):
+        self.name = name
+        self.limit = 1 << bits
+        self.values: List[str] = []
+        self.codes: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def code(self, value: str) -> int:
+        code = self.codes.get(value)
+        if code is None:
+            with self._lock:
+                code = self.codes.get(value)
+                if code is None:
+                    if len(self.values) >= self.limit:
+                        raise ValueError(f'More than {self.limit} distinct {self.name} values')
+                    code = len(self.values)
+                    self.values.append(value)
+                    self.codes[value] = code
+        return code
+
+    def get(self, value: str) -> Optional[int]:
+        """Code of a value, without interning it."""
+        return self.codes.get(value)
+
+    def __getitem__(self, code: int) -> str:
+        return self.values[code]
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+
+class DailyCounts:
+    """(day, state, district, type) -> count, as sorted packed keys and counts."""
+
+    __slots__ = ('keys', 'counts', 'states', 'districts', 'kinds', '_pending')
+
+    def __init__(self):
+        self.keys = array('q')
+        self.counts = array('q')
+        self.states = Interner('state', STATE_BITS)
+        self.districts = Interner('district', DISTRICT_BITS)
+        self.kinds = Interner('anomaly type', KIND_BITS)
+        self._pending: Dict[int, int] = {}
+
+    def cell(self, day: date, state: str, district: str) -> int:
+        """Packed key of a (day, state, district) cell, before the type is added."""
+        state_code = self.states.codes.get(state)
+        if state_code is None:
+            state_code = self.states.code(state)
+        district_code = self.districts.codes.get(district)
+        if district_code is None:
+            district_code = self.districts.code(district)
+        return state_code << STATE_SHIFT | district_code << DISTRICT_SHIFT | day.toordinal()
+
+    def increment(self, cell: int, kind: str, count: int = 1):
+        kind_code = self.kinds.codes.get(kind)
+        if kind_code is None:
+            kind_code = self.kinds.code(kind)
+        key = cell | kind_code << KIND_SHIFT
+        pending = self._pending
+        pending[key] = pending.get(key, 0) + count
+        if len(pending) > PENDING_ROWS and len(pending) > len(self.keys) >> 2:
+            self._flush()
+
+    def add(self, day: date, state: str, district: str, kind: str, count: int = 1):
+        self.increment(self.cell(day, state, district), kind, count)
+
+    def _flush(self):
+        if self._pending:
+            pending, self._pending = self._pending, {}
+            keys = array('q', sorted(pending))
+            self._merge_sorted(keys, array('q', map(pending.__getitem__, keys)))
+
+    def _merge_sorted(self, keys: array, counts: array):
+        """
+        Add sorted, unique (key, delta) columns.
+
+        Every step runs over whole arrays in C: timsort merges the two sorted
+        runs, a key in both runs becomes two adjacent rows that are folded,
+        and rows whose count ends at zero (folded or emptied by a
+        subtraction) are dropped.
+        """
+        if self.keys:
+            all_keys, all_counts = self.keys + keys, self.counts + counts
+            order = sorted(range(len(all_keys)), key=all_keys.__getitem__)
+            keys = array('q', map(all_keys.__getitem__, order))
+            counts = array('q', map(all_counts.__getitem__, order))
+            for i in compress(range(1, len(keys)), map(eq, keys[1:], keys[:-1])):
+                counts[i - 1] += counts[i]
+                counts[i] = 0
+        if 0 in counts:
+            rows = array('q', compress(range(len(counts)), counts))
+            keys = array('q', map(keys.__getitem__, rows))
+            counts = array('q', map(counts.__getitem__, rows))
+        self.keys, self.counts = keys, counts
+
+    def merge(self, other: 'DailyCounts', sign: int = 1) -> 'DailyCounts':
+        """Add (or with sign=-1 subtract) another store's counts."""
+        self._flush()
+        other._flush()
+        keys, counts = self._translate(other)
+        self._merge_sorted(keys, array('q', counts if sign > 0 else map(neg, counts)))
+        return self
+
+    def _translate(self, other: 'DailyCounts') -> Tuple[array, array]:
+        """Another store's keys in this store's codes, sorted, and their counts."""
+        tables = []
+        for mine, theirs in ((self.states, other.states), (self.districts, other.districts),
+                             (self.kinds, other.kinds)):
+            if mine is theirs:
+                tables.append(None)
+                continue
+            codes = list(map(mine.code, theirs.values))
+            # Same values under the same codes, as when merging into an empty store
+            tables.append(None if codes == list(range(len(codes))) else codes)
+        if tables == [None, None, None]:
+            return array('q', other.keys), array('q', other.counts)
+
+        states, districts, kinds = (table or range(len(interner)) for table, interner in
+                                    zip(tables, (other.states, other.districts, other.kinds)))
+        district_mask, kind_mask, day_mask = FIELDS['district'][1], FIELDS['kind'][1], FIELDS['day'][1]
+        keys = array('q', [
+            states[key >> STATE_SHIFT] << STATE_SHIFT
+            | districts[key >> DISTRICT_SHIFT & district_mask] << DISTRICT_SHIFT
+            | kinds[key >> KIND_SHIFT & kind_mask] << KIND_SHIFT
+            | key & day_mask
+            for key in other.keys
+        ])
+        order = sorted(range(len(keys)), key=keys.__getitem__)
+        return array('q', map(keys.__getitem__, order)), array('q', map(other.counts.__getitem__, order))
+
+    def __len__(self) -> int:
+        self._flush()
+        return len(self.keys)
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes held by the key and count arrays."""
+        self._flush()
+        return (self.keys.buffer_info()[1] * self.keys.itemsize
+                + self.counts.buffer_info()[1] * self.counts.itemsize)
+
+    def column(self, field: str) -> array:
+        """One key field's codes for every row (day ordinals for 'day')."""
+        self._flush()
+        shift, mask = FIELDS[field]
+        return array('q', map(and_, map(rshift, self.keys, repeat(shift)), repeat(mask)))
+
+    def _take(self, rows) -> 'DailyCounts':
+        if not isinstance(rows, range):
+            rows = array('q', rows)
+        subset = DailyCounts()
+        # The subset's codes are this store's
+        subset.states, subset.districts, subset.kinds = self.states, self.districts, self.kinds
+        subset.keys = array('q', map(self.keys.__getitem__, rows))
+        subset.counts = array('q', map(self.counts.__getitem__, rows))
+        return subset
+
+    def filter(self, state: Optional[str] = None, district: Optional[str] = None,
+               kinds: Optional[Collection[str]] = None, date_from: Optional[date] = None,
+               date_to: Optional[date] = None, min_count: Optional[int] = None) -> 'DailyCounts':
+        """Rows matching every given condition, as a new store."""
+        self._flush()
+        start, stop = 0, len(self.keys)
+        if state is not None:
+            code = self.states.get(state)
+            if code is None:
+                return DailyCounts()
+            # State is the top key field, so its rows are one contiguous run
+            start = bisect_left(self.keys, code << STATE_SHIFT)
+            stop = bisect_left(self.keys, (code + 1) << STATE_SHIFT)
+        keys = self.keys[start:stop]
+
+        masks = []
+        if district is not None:
+            code = self.districts.get(district)
+            if code is None:
+                return DailyCounts()
+            masks.append(map(eq, self._codes(keys, 'district'), repeat(code)))
+        if kinds is not None:
+            codes = {self.kinds.get(kind) for kind in kinds} - {None}
+            masks.append(map(codes.__contains__, self._codes(keys, 'kind')))
+        if date_from is not None:
+            masks.append(map(ge, self._codes(keys, 'day'), repeat(date_from.toordinal())))
+        if date_to is not None:
+            masks.append(map(le, self._codes(keys, 'day'), repeat(date_to.toordinal())))
+        if min_count is not None:
+            masks.append(map(ge, self.counts[start:stop], repeat(min_count)))
+
+        rows = range(start, stop)
+        if not masks:
+            return self._take(rows)
+        mask = masks[0]
+        for other in masks[1:]:
+            mask = map(and_, mask, other)
+        return self._take(compress(rows, mask))
+
+    @staticmethod
+    def _codes(keys: array, field: str):
+        shift, mask = FIELDS[field]
+        return map(and_, map(rshift, keys, repeat(shift)), repeat(mask))
+
+    def sort(self, by: str = 'count', reverse: bool = True) -> List[int]:
+        """Row indices ordered by count or by one key field's code."""
+        column = self.counts if by == 'count' else self.column(by)
+        return sorted(range(len(column)), key=column.__getitem__, reverse=reverse)
+
+    def top(self, n: int) -> List[int]:
+        """Row indices of the n largest counts, largest first."""
+        self._flush()
+        return heapq.nlargest(n, range(len(self.counts)), key=self.counts.__getitem__)
+
+    def row(self, index: int) -> Tuple[Tuple[date, str, str, str], int]:
+        key = self.keys[index]
+        return tuple(self._decode(f, key >> FIELDS[f][0] & FIELDS[f][1])
+                     for f in ('day', 'state', 'district', 'kind')), self.counts[index]
+
+    def _decode(self, field: str, code: int):
+        if field == 'day':
+            return date.fromordinal(code)
+        return {'state': self.states, 'district': self.districts, 'kind': self.kinds}[field][code]
+
+    def items(self) -> Iterator[Tuple[Tuple[date, str, str, str], int]]:
+        """((day, state, district, type), count) for every row, in key order."""
+        self._flush()
+        days: Dict[int, date] = {}
+        states, districts, kinds = self.states.values, self.districts.values, self.kinds.values
+        day_mask = FIELDS['day'][1]
+        for key, count in zip(self.keys, self.counts):
+            ordinal = key & day_mask
+            day = days.get(ordinal)
+            if day is None:
+                day = days[ordinal] = date.fromordinal(ordinal)
+            yield (day, states[key >> STATE_SHIFT], districts[key >> DISTRICT_SHIFT & FIELDS['district'][1]],
+                   kinds[key >> KIND_SHIFT & FIELDS['kind'][1]]), count
+
+    def sum_by(self, *fields: str) -> Dict[tuple, int]:
+        """Counts summed over the other key fields, keyed by the given ones."""
+        self._flush()
+        mask = 0
+        for field in fields:
+            shift, bits = FIELDS[field]
+            mask |= bits << shift
+        totals: Dict[int, int] = {}
+        for key, count in zip(map(and_, self.keys, repeat(mask)), self.counts):
+            totals[key] = totals.get(key, 0) + count
+        return {
+            tuple(self._decode(f, key >> FIELDS[f][0] & FIELDS[f][1]) for f in fields): count
+            for key, count in totals.items()
+        }
+
+    def to_dicts(self, rows: Optional[List[int]] = None) -> List[Dict]:
+        """JSON rows for the given indices (all rows when None)."""
+        self._flush()
+        rows = range(len(self.keys)) if rows is None else rows
+        result = []
+        for index in rows:
+            (day, state, district, kind), count = self.row(index)
+            result.append({'date': day.isoformat(), 'state': state, 'district': district,
+                           'anomaly_type': kind, 'count': count})
+        return result
+
+    def to_dict(self) -> Dict[str, int]:
+        """'day|state|district|type' -> count, the persisted form."""
+        self._flush()
+        days: Dict[int, str] = {}
+        states, districts, kinds = self.states.values, self.districts.values, self.kinds.values
+        day_mask, district_mask, kind_mask = FIELDS['day'][1], FIELDS['district'][1], FIELDS['kind'][1]
+        data = {}
+        for key, count in zip(self.keys, self.counts):
+            ordinal = key & day_mask
+            day = days.get(ordinal)
+            if day is None:
+                day = days[ordinal] = date.fromordinal(ordinal).isoformat()
+            data[f'{day}|{states[key >> STATE_SHIFT]}|{districts[key >> DISTRICT_SHIFT & district_mask]}'
+                 f'|{kinds[key >> KIND_SHIFT & kind_mask]}'] = count
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, int]) -> 'DailyCounts':
+        # Distinct strings pack to distinct keys, so rows only need sorting
+        store = cls()
+        kinds = store.kinds.codes
+        # (day, state, district) prefix -> packed cell, repeated across a cell's types
+        cells: Dict[str, int] = {}
+        keys = array('q')
+        for key in data:
+            prefix, kind = key.rsplit('|', 1)
+            cell = cells.get(prefix)
+            if cell is None:
+                day, state, district = prefix.split('|')
+                cell = cells[prefix] = store.cell(date.fromisoformat(day), state, district)
+            kind_code = kinds.get(kind)
+            if kind_code is None:
+                kind_code = store.kinds.code(kind)
+            keys.append(cell | kind_code << KIND_SHIFT)
+        counts = array('q', data.values())
+        order = sorted(range(len(keys)), key=keys.__getitem__)
+        store._merge_sorted(array('q', map(keys.__getitem__, order)), array('q', map(counts.__getitem__, order)))
+        return store
@@ -3,45 +3,591 @@ Analytics Service
 Provides anomaly detection and statistical analysis.
 """
 
+import csv
+import math
 import os
-from typing import Dict, List, Optional
+import re
+from collections import Counter
+from datetime import date, datetime
+from functools import lru_cache
+from itertools import combinations
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence
+
+from app.profiling import profiler
+from app.services.aggregate_store import DailyCounts
+from app.services.district_normalizer import district_normalizer
+from app.services.mock_data import DISTRICTS_BY_STATE
+from app.services.pattern_service import PatternDetector, detect_spikes
+
+# Canonical record fields and the CSV column names they may appear under
+FIELD_ALIASES = {
+    'aadhaar_id': ['aadhaar_id', 'aadhaar', 'aadhaar_number', 'uid'],
+    'name': ['name', 'full_name', 'resident_name'],
+    'dob': ['dob', 'date_of_birth', 'birth_date'],
+    'age': ['age'],
+    'gender': ['gender', 'sex'],
+    'phone': ['phone', 'mobile', 'mobile_number', 'phone_number'],
+    'pincode': ['pincode', 'pin_code', 'pin'],
+    'state': ['state', 'state_name'],
+    'district': ['district', 'district_name'],
+    'address': ['address', 'full_address'],
+    'centre': ['enrolment_centre', 'enrollment_centre', 'enrollment_center', 'centre_id', 'center_id'],
+    'date': ['date', 'enrolment_date', 'enrollment_date']
+}
+
+ANOMALY_LABELS = {
+    'duplicate_ids': "Duplicate Aadhaar ID",
+    'invalid_pincodes': "Invalid PIN Code",
+    'missing_dob': "Missing DOB",
+    'invalid_phone': "Invalid Phone Format",
+    'impossible_age': "Impossible Age (0 or 150+)",
+    'district_mismatch': "District-State Mismatch",
+    'inconsistent_gender': "Inconsistent Gender Labels"
+}
+
+AGE_BUCKETS = [(5, "0-5"), (18, "5-17"), (31, "18-30"), (46, "31-45"), (61, "46-60")]
+
+GENDER_LABELS = {
+    'm': 'Male', 'male': 'Male',
+    'f': 'Female', 'female': 'Female',
+    'o': 'Other', 't': 'Other', 'other': 'Other', 'transgender': 'Other', 'third gender': 'Other'
+}
+
+DATE_FORMATS = ('%Y-%m-%d', '%d-%m-%Y', '%d/%m/%Y', '%Y/%m/%d')
+
+PINCODE_RE = re.compile(r'^[1-9][0-9]{5}$')
+PHONE_RE = re.compile(r'^[6-9][0-9]{9}$')
+
+# Lower-cased canonical districts per state for mismatch checks
+_DISTRICT_LOOKUP = {
+    state: {d.lower() for d in districts}
+    for state, districts in DISTRICTS_BY_STATE.items()
+}
+
+# Version of what check_record flags and the pattern detector keeps. Bump it with any change
+# to the checks, the tables they use (DISTRICT_ALIASES, the district normalizer) or the
+# detector's state: the ingest manifest stores it, and shards processed under another
+# version are scanned again
+CHECKS_VERSION = 3
+
+# Pseudo anomaly types under which time buckets count all records and
+# records with at least one anomaly
+RECORDS_KEY = 'records'
+ANOMALOUS_KEY = 'anomalous_records'
+
+# Minimum |phi| between two anomaly flags before a warning is raised
+CORRELATION_THRESHOLD = 0.3
+
+
+@lru_cache(maxsize=65536)
+def _parse_date_cached(value: str) -> Optional[date]:
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        pass
+    for fmt in DATE_FORMATS[1:]:
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+def parse_date(value: Optional[str]) -> Optional[date]:
+    """Parse a date string in any of the supported formats."""
+    if not value:
+        return None
+    # Dates repeat heavily across records, so parsed values are cached
+    return _parse_date_cached(value.strip()[:10])
+
+
+def normalize_phone(value: Optional[str]) -> str:
+    """Strip formatting and the +91 / 0 trunk prefix from a phone number."""
+    digits = re.sub(r'\D', '', value or '')
+    if len(digits) == 12 and digits.startswith('91'):
+        digits = digits[2:]
+    elif len(digits) == 11 and digits.startswith('0'):
+        digits = digits[1:]
+    return digits
+
+
+_NON_DIGIT_RE = re.compile(r'[^0-9\n]+')
+_TRUNK_PREFIX_RE = re.compile(r'^(?:91|0)(?=[0-9]{10}$)', re.MULTILINE)
+
+
+def normalize_phones(values: Sequence[Optional[str]]) -> List[str]:
+    """normalize_phone() over a whole column, as two regex passes over the joined values."""
+    joined = '\n'.join(v or '' for v in values)
+    if joined.count('\n') != len(values) - 1:
+        # A value with an embedded newline would shift the split
+        return [normalize_phone(v) for v in values]
+    return _TRUNK_PREFIX_RE.sub('', _NON_DIGIT_RE.sub('', joined)).split('\n') if values else []
+
+
+def invalid_phone_mask(values: Sequence[Optional[str]], normalized: Optional[List[str]] = None) -> List[bool]:
+    """Per value, whether check_record() would flag it as invalid_phone."""
+    if normalized is None:
+        normalized = normalize_phones(values)
+    return [bool(v) and m is None for v, m in zip(values, map(PHONE_RE.match, normalized))]
+
+
+def resolve_columns(header: Iterable[str]) -> Dict[str, str]:
+    """Resolve which CSV column backs each canonical field."""
+    lowered = {h.strip().lower(): h for h in header if h}
+    columns = {}
+    for field, aliases in FIELD_ALIASES.items():
+        for alias in aliases:
+            if alias in lowered:
+                columns[field] = lowered[alias]
+                break
+    return columns
+
+
+def record_age(record: Dict[str, str]) -> Optional[int]:
+    """Compute age in years from DOB (relative to the record date) or the age field."""
+    dob = parse_date(record.get('dob'))
+    if dob:
+        ref = parse_date(record.get('date')) or date.today()
+        return ref.year - dob.year - ((ref.month, ref.day) < (dob.month, dob.day))
+    age = record.get('age')
+    if age:
+        try:
+            return int(float(age))
+        except ValueError:
+            return None
+    return None
+
+
+def district_mismatch(state: Optional[str], district: Optional[str]) -> bool:
+    """Whether a district does not belong to a known state, allowing renames and misspellings."""
+    if state not in _DISTRICT_LOOKUP or not district or district.lower() in _DISTRICT_LOOKUP[state]:
+        return False
+    return district_normalizer.resolve(district, state) is None
+
+
+def check_record(record: Dict[str, str], seen_ids: Optional[set] = None, check_phone: bool = True) -> List[str]:
+    """
+    Return the anomaly keys raised by a single normalised record.
+
+    check_phone=False leaves invalid_phone to a column-wise invalid_phone_mask().
+    """
+    flags = []
+
+    aadhaar_id = record.get('aadhaar_id')
+    if aadhaar_id and seen_ids is not None:
+        if aadhaar_id in seen_ids:
+            flags.append('duplicate_ids')
+        else:
+            seen_ids.add(aadhaar_id)
+
+    if 'pincode' in record and not PINCODE_RE.match(record['pincode']):
+        flags.append('invalid_pincodes')
+
+    if 'dob' in record and not record['dob'] and not record.get('age'):
+        flags.append('missing_dob')
+
+    phone = record.get('phone')
+    if check_phone and phone and not PHONE_RE.match(normalize_phone(phone)):
+        flags.append('invalid_phone')
+
+    if 'dob' in record or 'age' in record:
+        age = record_age(record)
+        if age is not None and (age < 0 or age >= 150 or (age == 0 and not record.get('dob'))):
+            flags.append('impossible_age')
+
+    if district_mismatch(record.get('state'), record.get('district')):
+        flags.append('district_mismatch')
+
+    if 'gender' in record and record['gender'] and record['gender'].lower() not in GENDER_LABELS:
+        flags.append('inconsistent_gender')
+
+    return flags
+
+
+def age_bucket(age: Optional[int]) -> Optional[str]:
+    """Map an age onto the report's age distribution buckets."""
+    if age is None or age < 0 or age >= 150:
+        return None
+    for upper, label in AGE_BUCKETS:
+        if age < upper:
+            return label
+    return "60+"
+
+
+def gender_label(value: Optional[str]) -> str:
+    """Map a raw gender value onto the report's gender labels."""
+    return GENDER_LABELS.get((value or '').lower(), 'Not Specified')
+
+
+class AnalysisAccumulator:
+    """Mergeable partial aggregates produced by one pass over a set of records."""
+
+    def __init__(self, track_daily: bool = False):
+        self.track_daily = track_daily
+        self.total_records = 0
+        self.anomaly_counts = Counter()
+        self.state_records = Counter()
+        self.state_anomalies = Counter()
+        self.state_type_counts: Dict[str, Counter] = {}
+        self.district_records = Counter()
+        self.district_anomalies = Counter()
+        # (state, district, type) -> count, for per-district risk features
+        self.district_type_counts = Counter()
+        self.age_distribution = Counter()
+        self.gender_distribution = Counter()
+        # Sufficient statistics for phi correlation between anomaly flags
+        self.pair_counts = Counter()
+        # (date, state, district, type) -> count; only kept for per-shard partials
+        # since the rollup cube, not the global snapshot, is its long-term home
+        self.daily_counts = DailyCounts()
+        self.patterns = PatternDetector()
+
+    def add(self, record: Dict[str, str], flags: List[str]):
+        """Fold one record and its anomaly flags into the aggregates."""
+        state = record.get('state') or 'Unknown'
+        district = record.get('district') or 'Unknown'
+
+        self.total_records += 1
+        self.state_records[state] += 1
+        self.district_records[(state, district)] += 1
+
+        bucket = age_bucket(record_age(record)) if ('dob' in record or 'age' in record) else None
+        if bucket:
+            self.age_distribution[bucket] += 1
+        if 'gender' in record:
+            self.gender_distribution[gender_label(record['gender'])] += 1
+
+        phone = record.get('phone')
+        self.patterns.observe(record, normalize_phone(phone) if phone else None)
+
+        day = parse_date(record.get('date')) if self.track_daily else None
+        if day:
+            daily = self.daily_counts
+            cell = daily.cell(day, state, district)
+            daily.increment(cell, RECORDS_KEY)
+            if flags:
+                daily.increment(cell, ANOMALOUS_KEY)
+            for flag in flags:
+                daily.increment(cell, flag)
+
+        if flags:
+            self.state_anomalies[state] += 1
+            self.district_anomalies[(state, district)] += 1
+            type_counts = self.state_type_counts.setdefault(state, Counter())
+            for flag in flags:
+                self.anomaly_counts[flag] += 1
+                type_counts[flag] += 1
+                self.district_type_counts[(state, district, flag)] += 1
+            for pair in combinations(sorted(flags), 2):
+                self.pair_counts[pair] += 1
+
+    # Counter attributes, and whether their keys are (a, b) tuples
+    _COUNTERS = {
+        'anomaly_counts': False,
+        'state_records': False,
+        'state_anomalies': False,
+        'district_records': True,
+        'district_anomalies': True,
+        'district_type_counts': True,
+        'age_distribution': False,
+        'gender_distribution': False,
+        'pair_counts': True
+    }
+
+    def _apply(self, other: 'AnalysisAccumulator', sign: int) -> 'AnalysisAccumulator':
+        self.total_records += sign * other.total_records
+        for name in self._COUNTERS:
+            mine = getattr(self, name)
+            if sign > 0:
+                mine.update(getattr(other, name))
+            else:
+                mine.subtract(getattr(other, name))
+                setattr(self, name, +mine)
+        for state, counts in other.state_type_counts.items():
+            mine = self.state_type_counts.setdefault(state, Counter())
+            if sign > 0:
+                mine.update(counts)
+            else:
+                mine.subtract(counts)
+                self.state_type_counts[state] = +mine
+        if sign > 0:
+            self.patterns.merge(other.patterns)
+        else:
+            self.patterns.subtract(other.patterns)
+        if self.track_daily:
+            self.daily_counts.merge(other.daily_counts, sign)
+        return self
+
+    def merge(self, other: 'AnalysisAccumulator') -> 'AnalysisAccumulator':
+        """Merge another accumulator's aggregates into this one."""
+        return self._apply(other, 1)
+
+    def subtract(self, other: 'AnalysisAccumulator') -> 'AnalysisAccumulator':
+        """Remove a previously merged accumulator's aggregates from this one."""
+        return self._apply(other, -1)
+
+    def to_dict(self) -> Dict:
+        """Serialise to plain JSON-compatible types."""
+        data = {'total_records': self.total_records}
+        for name, tuple_keys in self._COUNTERS.items():
+            counter = getattr(self, name)
+            data[name] = {('|'.join(k) if tuple_keys else k): v for k, v in counter.items()}
+        data['state_type_counts'] = {s: dict(c) for s, c in self.state_type_counts.items()}
+        data['patterns'] = self.patterns.to_dict()
+        if self.track_daily:
+            data['daily_counts'] = self.daily_counts.to_dict()
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'AnalysisAccumulator':
+        """Rebuild an accumulator serialised with to_dict()."""
+        accumulator = cls(track_daily='daily_counts' in data)
+        accumulator.total_records = data.get('total_records', 0)
+        for name, tuple_keys in cls._COUNTERS.items():
+            items = data.get(name, {})
+            setattr(accumulator, name, Counter(
+                {(tuple(k.split('|')) if tuple_keys else k): v for k, v in items.items()}
+            ))
+        accumulator.state_type_counts = {
+            s: Counter(c) for s, c in data.get('state_type_counts', {}).items()
+        }
+        accumulator.daily_counts = DailyCounts.from_dict(data.get('daily_counts', {}))
+        accumulator.patterns = PatternDetector.from_dict(data.get('patterns'))
+        return accumulator
+
+    def diff(self, other: 'AnalysisAccumulator') -> List[str]:
+        """Describe every aggregate that differs from another accumulator."""
+        differences = []
+        if self.total_records != other.total_records:
+            differences.append(f'total_records: {self.total_records} != {other.total_records}')
+        for name in self._COUNTERS:
+            mine, theirs = getattr(self, name), getattr(other, name)
+            for key in set(mine) | set(theirs):
+                if mine.get(key, 0) != theirs.get(key, 0):
+                    differences.append(f'{name}[{key}]: {mine.get(key, 0)} != {theirs.get(key, 0)}')
+        for state in set(self.state_type_counts) | set(other.state_type_counts):
+            mine = self.state_type_counts.get(state, Counter())
+            theirs = other.state_type_counts.get(state, Counter())
+            if +mine != +theirs:
+                differences.append(f'state_type_counts[{state}]: {dict(mine)} != {dict(theirs)}')
+        mine, theirs = self.patterns.phone_counts, other.patterns.phone_counts
+        if (mine.table if mine else None) != (theirs.table if theirs else None):
+            differences.append('patterns.phone_counts: sketch tables differ')
+        if self.patterns.po_box != other.patterns.po_box:
+            differences.append(f'patterns.po_box: {dict(self.patterns.po_box)} != {dict(other.patterns.po_box)}')
+        for state in set(self.patterns.sequential_runs) | set(other.patterns.sequential_runs):
+            mine = self.patterns.sequential_runs.get(state, [0, 0, 0])
+            theirs = other.patterns.sequential_runs.get(state, [0, 0, 0])
+            # Longest run is only an upper bound after subtraction
+            if (mine[0], mine[2]) != (theirs[0], theirs[2]):
+                differences.append(f'patterns.sequential_runs[{state}]: {mine} != {theirs}')
+        return differences
+
+    def spikes(self) -> List[Dict]:
+        """Rolling z-score spikes over this accumulator's own daily counts."""
+        # Keys sort by series, then day, which is the order detect_spikes needs
+        cells = (
+            ((state, district, kind), day, count)
+            for (day, state, district, kind), count in self.daily_counts.filter(kinds=ANOMALY_LABELS).items()
+        )
+        return detect_spikes(cells, ANOMALY_LABELS)
+
+    def correlation_warnings(self) -> List[Dict]:
+        """Phi coefficients between anomaly flags, strongest first."""
+        n = self.total_records
+        warnings = []
+        if n == 0:
+            return warnings
+        for (a, b), both in self.pair_counts.items():
+            count_a = self.anomaly_counts[a]
+            count_b = self.anomaly_counts[b]
+            denom = math.sqrt(count_a * (n - count_a) * count_b * (n - count_b))
+            if not denom:
+                continue
+            phi = (n * both - count_a * count_b) / denom
+            if abs(phi) < CORRELATION_THRESHOLD:
+                continue
+            warnings.append({
+                "warning": f"High correlation between {ANOMALY_LABELS[a]} and {ANOMALY_LABELS[b]}",
+                "correlation": round(phi, 2),
+                "severity": "high" if abs(phi) >= 0.7 else "medium" if abs(phi) >= 0.5 else "low"
+            })
+        warnings.sort(key=lambda w: abs(w['correlation']), reverse=True)
+        return warnings
+
+    def to_report(self, spikes: Optional[List[Dict]] = None) -> Dict:
+        """
+        Render the aggregates in the shape of the analysis report.
+
+        Spikes come from the caller (e.g. the rollup cube) or, when daily
+        counts are tracked, from this accumulator itself.
+        """
+        if spikes is None and self.track_daily:
+            spikes = self.spikes()
+        anomaly_frequency = [
+            {"type": ANOMALY_LABELS[key], "count": count}
+            for key, count in self.anomaly_counts.items()
+        ]
+        anomaly_frequency.sort(key=lambda x: x["count"], reverse=True)
+
+        state_anomaly_distribution = [
+            {"state": state, "anomalies": count}
+            for state, count in self.state_anomalies.most_common(10)
+        ]
+
+        return {
+            "age_distribution": {label: self.age_distribution.get(label, 0)
+                                 for _, label in AGE_BUCKETS + [(None, "60+")]},
+            "gender_distribution": {label: self.gender_distribution.get(label, 0)
+                                    for label in ("Male", "Female", "Other", "Not Specified")},
+            "anomaly_frequency": anomaly_frequency,
+            "correlation_warnings": self.correlation_warnings(),
+            "state_anomaly_distribution": state_anomaly_distribution,
+            "suspicious_patterns": self.patterns.patterns(spikes),
+            "total_records_analyzed": self.total_records,
+            "analysis_date": datetime.now().isoformat()
+        }
 
 
 class AnalyticsService:
     """Service for processing and analyzing Aadhaar data."""
-    
+
     def __init__(self, data_dir: Optional[str] = None):
         self.data_dir = data_dir
-    
+        # States this instance serves when it is one regional partition (None: all)
+        self.states: Optional[frozenset] = None
+
+    def configure(self, states: Optional[Iterable[str]] = None):
+        """Restrict every scan to the records of `states` (a regional partition); empty lifts it."""
+        self.states = frozenset(states) if states else None
+
+    def list_data_files(self, data_dir: Optional[str] = None) -> List[str]:
+        """List the CSV data files under the data directory, oldest name first."""
+        data_dir = data_dir or self.data_dir
+        if not data_dir or not os.path.isdir(data_dir):
+            return []
+        files = []
+        for root, _, names in os.walk(data_dir):
+            files.extend(os.path.join(root, n) for n in names if n.lower().endswith('.csv'))
+        return sorted(files)
+
+    def iter_records(self, path: str, on_bytes: Optional[Callable[[int], None]] = None) -> Iterator[Dict[str, str]]:
+        """Yield normalised records from one CSV file (of this partition's states, when configured)."""
+        with open(path, newline='', encoding='utf-8', errors='replace') as f:
+            lines = f
+            if on_bytes:
+                def counted(source):
+                    for line in source:
+                        on_bytes(len(line))
+                        yield line
+                lines = counted(f)
+            reader = csv.reader(lines)
+            header = next(reader, None)
+            if not header:
+                return
+            columns = resolve_columns(header)
+            index = {field: header.index(column) for field, column in columns.items()}
+            width = len(header)
+            states = self.states
+            for row in reader:
+                if len(row) < width:
+                    row = row + [''] * (width - len(row))
+                record = {field: row[i].strip() for field, i in index.items()}
+                if states is None or (record.get('state') or 'Unknown') in states:
+                    yield record
+
     def get_aggregated_stats_by_state(self, state: Optional[str] = None) -> List[Dict]:
         """Get aggregated statistics grouped by state."""
-        return []
-    
+        from app.models import StateStats
+        query = StateStats.query
+        if state:
+            query = query.filter(StateStats.state == state)
+        return [s.to_dict() for s in query.order_by(StateStats.total_anomalies.desc()).all()]
+
     def detect_anomalies(self, data) -> Dict:
         """Detect various anomalies in the dataset."""
-        anomalies = {
-            'duplicate_ids': [],
-            'invalid_pincodes': [],
-            'missing_dob': [],
-            'invalid_phone': [],
-            'impossible_age': [],
-            'district_mismatch': [],
-            'inconsistent_gender': []
-        }
+        anomalies = {key: [] for key in ANOMALY_LABELS}
+        records = list(data)
+        invalid_phones = invalid_phone_mask([r.get('phone') for r in records])
+        seen_ids = set()
+        for i, record in enumerate(records):
+            for flag in check_record(record, seen_ids, check_phone=False):
+                anomalies[flag].append(i)
+            if invalid_phones[i]:
+                anomalies['invalid_phone'].append(i)
         return anomalies
-    
+
     def calculate_correlation_warnings(self, data) -> List[Dict]:
         """Calculate correlation between different anomaly types."""
-        return []
-    
+        accumulator = AnalysisAccumulator()
+        seen_ids = set()
+        for record in data:
+            accumulator.add(record, check_record(record, seen_ids))
+        return accumulator.correlation_warnings()
+
     def get_distribution_stats(self, data) -> Dict:
         """Get distribution statistics for various fields."""
+        accumulator = AnalysisAccumulator()
+        for record in data:
+            accumulator.add(record, [])
+        report = accumulator.to_report()
         return {
-            'age_distribution': {},
-            'gender_distribution': {},
-            'state_distribution': {}
+            'age_distribution': report['age_distribution'],
+            'gender_distribution': report['gender_distribution'],
+            'state_distribution': dict(accumulator.state_records)
         }
 
+    def compute_accumulator(self, files: List[str],
+                            progress: Optional[Callable[[str, float, int], None]] = None,
+                            track_daily: bool = False) -> AnalysisAccumulator:
+        """Aggregate the given files in order with one pass and a fresh duplicate-ID set."""
+        total_bytes = sum(os.path.getsize(p) for p in files) or 1
+        bytes_done = 0
+
+        def on_bytes(n):
+            nonlocal bytes_done
+            bytes_done += n
+
+        accumulator = AnalysisAccumulator(track_daily=track_daily)
+        seen_ids = set()
+        for path in files:
+            if progress:
+                progress(f'scanning {os.path.basename(path)}', bytes_done / total_bytes * 0.95,
+                         accumulator.total_records)
+            for record in self.iter_records(path, on_bytes):
+                accumulator.add(record, check_record(record, seen_ids))
+                if progress and accumulator.total_records % 50000 == 0:
+                    progress(f'scanning {os.path.basename(path)}', bytes_done / total_bytes * 0.95,
+                             accumulator.total_records)
+            accumulator.patterns.finish()
+        return accumulator
+
+    def run_analysis(self, data_dir: Optional[str] = None,
+                     progress: Optional[Callable[[str, float, int], None]] = None) -> Dict:
+        """
+        Run anomaly detection, distributions and correlations in a single pass.
+
+        progress(stage, fraction, rows_processed) is called periodically.
+        Falls back to the mock report when no data files are available.
+        """
+        files = self.list_data_files(data_dir)
+        if not files:
+            from app.services.mock_data import get_mock_analysis_report
+            if progress:
+                progress('completed', 1.0, 0)
+            return get_mock_analysis_report()
+
+        # Daily counts feed the spike detector
+        with profiler.stage('scan'):
+            accumulator = self.compute_accumulator(files, progress, track_daily=True)
+        if progress:
+            progress('correlations', 0.97, accumulator.total_records)
+        with profiler.stage('report'):
+            report = accumulator.to_report()
+        if progress:
+            progress('completed', 1.0, accumulator.total_records)
+        return report
+
 
 # Singleton instance
 analytics_service = AnalyticsService()
@@ -0,0 +1,207 @@
+"""
+Anomaly Log Writer
+Batches AnomalyLog inserts on a background thread.
+
+Routes hand rows to submit(), which only queues them, and answer at once.
+One writer thread per process drains the queue and inserts each batch in
+one transaction: up to ANOMALY_LOG_BATCH_SIZE rows, or whatever arrived
+within ANOMALY_LOG_FLUSH_MS of the first. One commit per batch instead of
+one per request is what keeps bursts cheap, on SQLite in particular, where
+every commit syncs the file and writers queue behind one lock.
+
+The queue is bounded: past ANOMALY_LOG_QUEUE_SIZE rows submit() refuses
+new ones (the route answers 503) instead of growing while the database
+falls behind. Rows still queued at exit are written by an atexit hook. The
+'anomalies' change event is recorded per batch by the session hook in
+app/events.py.
+"""
+
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from app.extensions import db
+from app.instrumentation import metrics
+from app.models import AnomalyLog
+from app.services.analytics_service import ANOMALY_LABELS
+
+SEVERITIES = ('low', 'medium', 'high', 'critical')
+
+# Rows accepted in one submission
+MAX_ROWS_PER_REQUEST = 1000
+
+logger = logging.getLogger(__name__)
+
+metrics.counter('anomaly_log_rows_total', 'AnomalyLog rows by outcome: queued, written, refused or failed.')
+metrics.counter('anomaly_log_batches_total', 'AnomalyLog insert transactions committed.')
+
+
+def anomaly_log_row(data: Dict) -> Dict:
+    """A validated AnomalyLog row from a request payload; raises ValueError with the error to return."""
+    if not isinstance(data, dict):
+        raise ValueError('Each anomaly must be an object')
+    state = data.get('state')
+    anomaly_type = data.get('anomaly_type')
+    if not state or not anomaly_type:
+        raise ValueError('state and anomaly_type are required')
+    # Accept either the anomaly key or its display label
+    labels_to_keys = {label: key for key, label in ANOMALY_LABELS.items()}
+    anomaly_type = labels_to_keys.get(anomaly_type, anomaly_type)
+    if anomaly_type not in ANOMALY_LABELS:
+        raise ValueError(f'Invalid anomaly_type: {anomaly_type}')
+    severity = data.get('severity')
+    if severity is not None and severity not in SEVERITIES:
+        raise ValueError(f'Invalid severity: {severity}')
+    count = data.get('count', 1)
+    if not isinstance(count, int) or count < 1:
+        raise ValueError(f'Invalid count: {count}')
+    detected_at = data.get('detected_at')
+    try:
+        detected_at = datetime.fromisoformat(detected_at) if detected_at else datetime.utcnow()
+    except (TypeError, ValueError):
+        raise ValueError(f'Invalid detected_at: {detected_at}')
+    return {
+        'state': state,
+        'district': data.get('district'),
+        'anomaly_type': anomaly_type,
+        'severity': severity,
+        'count': count,
+        'details': data.get('details'),
+        'detected_at': detected_at
+    }
+
+
+class AnomalyLogWriter:
+    """Bounded queue of AnomalyLog rows and the thread that writes them in batches."""
+
+    def __init__(self):
+        self.app = None
+        self.batch_size = 500
+        self.flush_seconds = 0.2
+        self.queue_size = 50000
+        self._rows: deque = deque()
+        self._cond = threading.Condition()
+        # Rows taken off the queue but not yet committed
+        self._in_flight = 0
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._stopping = False
+
+    def configure(self, app):
+        self.app = app
+        self.batch_size = app.config.get('ANOMALY_LOG_BATCH_SIZE', 500)
+        self.flush_seconds = app.config.get('ANOMALY_LOG_FLUSH_MS', 200) / 1000
+        self.queue_size = app.config.get('ANOMALY_LOG_QUEUE_SIZE', 50000)
+
+    def submit(self, rows: List[Dict]) -> bool:
+        """
+        Queue validated rows for the writer; False (nothing queued) when the queue is full.
+
+        With batching off (ANOMALY_LOG_BATCH_SIZE=0) the rows are written
+        in the caller's session and transaction instead.
+        """
+        if not self.batch_size:
+            try:
+                db.session.add_all([AnomalyLog(**row) for row in rows])
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+            metrics.record([('anomaly_log_rows_total', (('outcome', 'written'),), len(rows)),
+                            ('anomaly_log_batches_total', (), 1)], [])
+            return True
+        with self._cond:
+            if len(self._rows) + len(rows) > self.queue_size:
+                metrics.record([('anomaly_log_rows_total', (('outcome', 'refused'),), len(rows))], [])
+                return False
+            self._ensure_thread()
+            self._rows.extend(rows)
+            self._cond.notify_all()
+        metrics.record([('anomaly_log_rows_total', (('outcome', 'queued'),), len(rows))], [])
+        return True
+
+    def pending(self) -> int:
+        """Rows queued or being written."""
+        with self._cond:
+            return len(self._rows) + self._in_flight
+
+    def flush(self, timeout: float = 10.0) -> bool:
+        """Wait until every queued row is committed (or failed); False on timeout."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            self._cond.notify_all()
+            while self._rows or self._in_flight:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def _ensure_thread(self):
+        # Started on first use, and again in a forked worker, where the parent's thread does not exist
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        self._pid = os.getpid()
+        self._thread = threading.Thread(target=self._run, name='anomaly-log-writer', daemon=True)
+        self._thread.start()
+
+    def _take_batch(self) -> List[Dict]:
+        with self._cond:
+            while not self._rows:
+                if self._stopping:
+                    return []
+                self._cond.wait()
+            # Give a small first batch a moment to fill
+            deadline = time.monotonic() + self.flush_seconds
+            while len(self._rows) < self.batch_size and not self._stopping:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch = [self._rows.popleft() for _ in range(min(self.batch_size, len(self._rows)))]
+            self._in_flight = len(batch)
+            return batch
+
+    def _write(self, batch: List[Dict]):
+        with self.app.app_context():
+            try:
+                db.session.add_all([AnomalyLog(**row) for row in batch])
+                db.session.commit()
+                metrics.record([('anomaly_log_rows_total', (('outcome', 'written'),), len(batch)),
+                                ('anomaly_log_batches_total', (), 1)], [])
+            except Exception:
+                db.session.rollback()
+                logger.exception('Writing %d anomaly log rows failed', len(batch))
+                metrics.record([('anomaly_log_rows_total', (('outcome', 'failed'),), len(batch))], [])
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            if not batch:
+                return
+            try:
+                self._write(batch)
+            finally:
+                with self._cond:
+                    self._in_flight = 0
+                    self._cond.notify_all()
+
+    def close(self, timeout: float = 10.0):
+        """Write what is still queued and stop the thread."""
+        if self._thread is None or self._pid != os.getpid():
+            return
+        self.flush(timeout)
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+
+
+# Singleton instance
+anomaly_log_writer = AnomalyLogWriter()
+atexit.register(anomaly_log_writer.close)
@@ -0,0 +1,184 @@
+"""
+District Normalizer
+Resolves messy district strings to the canonical names in DISTRICTS_BY_STATE.
+
+A raw string is normalised (case, punctuation, "district" suffixes) and
+looked up among the canonical names and the known renames and spellings in
+DISTRICT_ALIASES ("Prayagraj" -> "Allahabad", "Bengaluru" -> "Bangalore").
+Anything else is matched through a trigram index: candidates sharing a
+trigram are scored by Dice similarity, and a best match that is too weak
+or too close to a different district is left unresolved.
+
+Results are cached per raw (district, state) pair in a bounded LRU cache,
+and resolve_many()/resolve_column() resolve each distinct value once, so a
+column of millions of rows with a few thousand spellings costs a few
+thousand lookups.
+"""
+
+import re
+from collections import Counter
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from app.services.mock_data import DISTRICTS_BY_STATE
+
+# Renamed districts and common alternate spellings, per state
+DISTRICT_ALIASES = {
+    "Uttar Pradesh": {"Prayagraj": "Allahabad", "Kanpur Nagar": "Kanpur", "Benares": "Varanasi",
+                      "Banaras": "Varanasi"},
+    "Maharashtra": {"Bombay": "Mumbai", "Mumbai City": "Mumbai", "Mumbai Suburban": "Mumbai", "Poona": "Pune",
+                    "Chhatrapati Sambhajinagar": "Aurangabad"},
+    "West Bengal": {"Calcutta": "Kolkata", "Burdwan": "Bardhaman", "Purba Bardhaman": "Bardhaman",
+                    "Hugli": "Hooghly"},
+    "Andhra Pradesh": {"Vizag": "Visakhapatnam", "Bezawada": "Vijayawada"},
+    "Tamil Nadu": {"Madras": "Chennai", "Trichy": "Tiruchirappalli", "Tiruchi": "Tiruchirappalli"},
+    "Karnataka": {"Bengaluru": "Bangalore", "Bengaluru Urban": "Bangalore", "Bangalore Urban": "Bangalore",
+                  "Mysuru": "Mysore", "Hubballi": "Hubli", "Mangaluru": "Mangalore", "Dakshina Kannada": "Mangalore",
+                  "Belagavi": "Belgaum", "Kalaburagi": "Gulbarga", "Ballari": "Bellary"},
+    "Gujarat": {"Baroda": "Vadodara", "Amdavad": "Ahmedabad"},
+    "Kerala": {"Trivandrum": "Thiruvananthapuram", "Cochin": "Kochi", "Ernakulam": "Kochi",
+               "Calicut": "Kozhikode", "Trichur": "Thrissur", "Quilon": "Kollam", "Palghat": "Palakkad",
+               "Cannanore": "Kannur"},
+    "Telangana": {"Hanamkonda": "Warangal", "Mahabubnagar": "Mahbubnagar"},
+    "Assam": {"Gauhati": "Guwahati", "Kamrup Metropolitan": "Guwahati"},
+    "Punjab": {"SAS Nagar": "Mohali", "Sahibzada Ajit Singh Nagar": "Mohali"},
+    "Madhya Pradesh": {},
+    "Rajasthan": {},
+    "Bihar": {},
+    "Delhi": {}
+}
+
+# Lowest Dice similarity accepted for a trigram match
+FUZZY_THRESHOLD = 0.6
+
+# A runner-up (another district) within this score of the best makes the match ambiguous
+AMBIGUITY_MARGIN = 0.1
+
+# Raw (district, state) pairs kept in the resolution cache
+CACHE_SIZE = 65536
+
+_NON_ALNUM_RE = re.compile(r'[^a-z0-9]+')
+_SUFFIX_RE = re.compile(r'\s+(district|dist|distt|zila|jila)$')
+
+
+def normalize_key(value: Optional[str]) -> str:
+    """Lower-case words with punctuation and a trailing "district" removed."""
+    key = _NON_ALNUM_RE.sub(' ', (value or '').lower()).strip()
+    return _SUFFIX_RE.sub('', key)
+
+
+def trigrams(key: str) -> frozenset:
+    padded = f'  {key} '
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+class DistrictMatch:
+    """A canonical district a raw string resolved to."""
+
+    __slots__ = ('state', 'district', 'score', 'method')
+
+    def __init__(self, state: str, district: str, score: float, method: str):
+        self.state = state
+        self.district = district
+        self.score = score
+        # 'exact', 'alias' or 'fuzzy'
+        self.method = method
+
+    def to_dict(self) -> Dict:
+        return {'state': self.state, 'district': self.district, 'score': self.score, 'method': self.method}
+
+
+class DistrictNormalizer:
+    """Exact, alias and trigram lookup of district names, with a bounded cache."""
+
+    def __init__(self, districts_by_state: Dict[str, List[str]] = DISTRICTS_BY_STATE,
+                 aliases: Dict[str, Dict[str, str]] = DISTRICT_ALIASES, cache_size: int = CACHE_SIZE):
+        # (state, canonical district, spelling is an alias) per indexed spelling
+        self._entries: List[Tuple[str, str, bool]] = []
+        self._grams: List[frozenset] = []
+        self._exact: Dict[str, List[int]] = {}
+        self._index: Dict[str, List[int]] = {}
+        for state, districts in districts_by_state.items():
+            spellings = [(district, district, False) for district in districts]
+            spellings += [(alias, canonical, True) for alias, canonical in aliases.get(state, {}).items()]
+            for spelling, canonical, is_alias in spellings:
+                key = normalize_key(spelling)
+                entry = len(self._entries)
+                self._entries.append((state, canonical, is_alias))
+                self._grams.append(trigrams(key))
+                self._exact.setdefault(key, []).append(entry)
+                for gram in self._grams[entry]:
+                    self._index.setdefault(gram, []).append(entry)
+        self._cached = lru_cache(maxsize=cache_size)(self._resolve)
+
+    def resolve(self, district: Optional[str], state: Optional[str] = None) -> Optional[DistrictMatch]:
+        """
+        The canonical district for a raw string, within `state` when given.
+
+        None when nothing matches well enough, or when the best matches are
+        different districts (in different states, without `state`).
+        """
+        if not district:
+            return None
+        return self._cached(district, state)
+
+    def resolve_many(self, pairs: Iterable[Tuple[Optional[str], Optional[str]]]
+                     ) -> Dict[Tuple[Optional[str], Optional[str]], Optional[DistrictMatch]]:
+        """Resolve each distinct (district, state) pair once."""
+        return {pair: self.resolve(*pair) for pair in set(pairs)}
+
+    def resolve_column(self, districts: Sequence[Optional[str]],
+                       states: Optional[Sequence[Optional[str]]] = None) -> List[Optional[DistrictMatch]]:
+        """Matches for a whole column (and its state column), at the cost of its distinct values."""
+        pairs = list(zip(districts, states)) if states is not None else [(d, None) for d in districts]
+        resolved = self.resolve_many(pairs)
+        return [resolved[pair] for pair in pairs]
+
+    def cache_info(self):
+        return self._cached.cache_info()
+
+    def _resolve(self, district: str, state: Optional[str]) -> Optional[DistrictMatch]:
+        key = normalize_key(district)
+        if not key:
+            return None
+
+        named = self._exact.get(key, ())
+        exact = [e for e in named if state is None or self._entries[e][0] == state]
+        if exact:
+            found = {self._entries[e][:2] for e in exact}
+            if len(found) > 1:
+                return None
+            entry_state, canonical, is_alias = self._entries[exact[0]]
+            return DistrictMatch(entry_state, canonical, 1.0, 'alias' if is_alias else 'exact')
+        if named:
+            # The exact name of a district in another state is not a misspelling of one in this state
+            return None
+
+        grams = trigrams(key)
+        shared = Counter()
+        for gram in grams:
+            for entry in self._index.get(gram, ()):
+                shared[entry] += 1
+
+        # Best score per canonical district, over its name and aliases
+        scores: Dict[Tuple[str, str], float] = {}
+        for entry, count in shared.items():
+            target = self._entries[entry][:2]
+            if state is not None and target[0] != state:
+                continue
+            score = 2 * count / (len(grams) + len(self._grams[entry]))
+            if score > scores.get(target, 0.0):
+                scores[target] = score
+        if not scores:
+            return None
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        (best_state, best_district), best = ranked[0]
+        if best < FUZZY_THRESHOLD:
+            return None
+        if len(ranked) > 1 and best - ranked[1][1] < AMBIGUITY_MARGIN:
+            return None
+        return DistrictMatch(best_state, best_district, round(best, 3), 'fuzzy')
+
+
+# Singleton instance
+district_normalizer = DistrictNormalizer()
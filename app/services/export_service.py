@@ -0,0 +1,125 @@
+"""
+Export Service
+Streams anomaly records as NDJSON or CSV without materialising the result set.
+"""
+
+import csv
+import io
+import json
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterator, Optional
+
+from app.extensions import db
+from app.models import AnomalyLog
+
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv'
+}
+
+EXPORT_COLUMNS = [
+    'id', 'state', 'district', 'anomaly_type', 'severity', 'count',
+    'details', 'detected_at', 'resolved', 'resolved_at'
+]
+
+# Rows fetched per database round trip and bytes buffered per yielded chunk
+FETCH_SIZE = 2000
+CHUNK_BYTES = 64 * 1024
+
+
+def parse_export_date(value: Optional[str], end: bool = False) -> Optional[datetime]:
+    """
+    Parse an ISO date/datetime query parameter.
+
+    For the end of the range (end=True) a plain date is inclusive, like the
+    trends' `to`: it returns the next midnight, so `to=2024-03-31` keeps all
+    of March 31. A datetime is an exclusive bound as given.
+    """
+    if not value:
+        return None
+    try:
+        day = date.fromisoformat(value)
+    except ValueError:
+        return datetime.fromisoformat(value)
+    start = datetime.combine(day, datetime.min.time())
+    return start + timedelta(days=1) if end else start
+
+
+def build_export_query(filters: Dict):
+    """Build a column-only SELECT with all filters pushed into the WHERE clause."""
+    query = db.select(*[getattr(AnomalyLog, c) for c in EXPORT_COLUMNS])
+
+    if filters.get('state'):
+        query = query.where(AnomalyLog.state == filters['state'])
+    if filters.get('district'):
+        query = query.where(AnomalyLog.district == filters['district'])
+    if filters.get('type'):
+        query = query.where(AnomalyLog.anomaly_type == filters['type'])
+    if filters.get('severity'):
+        query = query.where(AnomalyLog.severity == filters['severity'])
+    if filters.get('resolved') is not None:
+        query = query.where(AnomalyLog.resolved == filters['resolved'])
+    if filters.get('date_from'):
+        query = query.where(AnomalyLog.detected_at >= filters['date_from'])
+    if filters.get('date_to'):
+        query = query.where(AnomalyLog.detected_at < filters['date_to'])
+
+    # Ordering by primary key keeps the scan on the clustered index
+    return query.order_by(AnomalyLog.id)
+
+
+def iter_anomaly_rows(filters: Dict) -> Iterator[tuple]:
+    """Yield raw row tuples from AnomalyLog using a server-side cursor."""
+    query = build_export_query(filters)
+    result = db.session.execute(query.execution_options(yield_per=FETCH_SIZE))
+    try:
+        for row in result:
+            yield tuple(row)
+    finally:
+        result.close()
+
+
+def _serialize_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def stream_ndjson(rows: Iterator[tuple]) -> Iterator[str]:
+    """Encode rows as newline-delimited JSON, yielding ~64KB chunks."""
+    encode = json.JSONEncoder(ensure_ascii=False, separators=(',', ':')).encode
+    buffer = []
+    size = 0
+    for row in rows:
+        line = encode(dict(zip(EXPORT_COLUMNS, map(_serialize_value, row)))) + '\n'
+        buffer.append(line)
+        size += len(line)
+        if size >= CHUNK_BYTES:
+            yield ''.join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+def stream_csv(rows: Iterator[tuple]) -> Iterator[str]:
+    """Encode rows as CSV with a header line, yielding ~64KB chunks."""
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(EXPORT_COLUMNS)
+    for row in rows:
+        writer.writerow([_serialize_value(v) for v in row])
+        if output.tell() >= CHUNK_BYTES:
+            yield output.getvalue()
+            output.seek(0)
+            output.truncate(0)
+    if output.tell():
+        yield output.getvalue()
+
+
+def stream_export(filters: Dict, fmt: str = 'ndjson') -> Iterator[str]:
+    """Stream filtered anomaly records in the requested format."""
+    rows = iter_anomaly_rows(filters)
+    if fmt == 'csv':
+        return stream_csv(rows)
+    return stream_ndjson(rows)
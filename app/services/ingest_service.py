@@ -0,0 +1,430 @@
+"""
+Ingest Service
+Incremental (delta) ingestion of data files into the persisted aggregates.
+
+Each data file is a shard. The manifest (ProcessedShard) records its path,
+size, mtime, content hash and row range, together with the shard's partial
+AnalysisAccumulator. A run only scans new or changed shards: their partials
+are merged into the global snapshot (a changed shard's old partial is
+subtracted first), and only the StateStats/DistrictStats rows they touch are
+rewritten. The manifest's fingerprint records the CHECKS_VERSION and the
+REGION_STATES the partials were computed under; when either differs, every
+shard is scanned again.
+"""
+
+import hashlib
+import json
+import os
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from app.events import publish
+from app.extensions import db
+from app.profiling import profiler
+from app.models import (
+    AadhaarIdIndex, AggregateSnapshot, DistrictStats, PhoneLink, ProcessedShard, RiskScore, SketchBucket,
+    StateStats, TrendBucket
+)
+from app.services.analytics_service import CHECKS_VERSION, AnalysisAccumulator, analytics_service, check_record
+from app.services import trend_service
+from app.services.policy_service import policy_service
+from app.services.risk_service import risk_service
+from app.services.sketch_service import ShardSketches, sketch_service
+
+GLOBAL_SNAPSHOT = 'global'
+MANIFEST_SNAPSHOT = 'manifest'
+
+# Records per batched ID-index lookup
+ID_BATCH_SIZE = 2000
+
+
+def file_sha256(path: str) -> str:
+    """Content hash of a data file, read in 1MB blocks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def id_hash(aadhaar_id: str) -> int:
+    """Signed 64-bit hash of an Aadhaar ID (fits an SQL BIGINT)."""
+    digest = hashlib.blake2b(aadhaar_id.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big', signed=True)
+
+
+class _IndexedSeenIds:
+    """Set-like view over IDs seen in earlier shards plus the current shard."""
+
+    def __init__(self, prior_hashes: set, current_hashes: set):
+        self.prior = prior_hashes
+        self.current = current_hashes
+
+    def __contains__(self, aadhaar_id: str) -> bool:
+        h = id_hash(aadhaar_id)
+        return h in self.prior or h in self.current
+
+    def add(self, aadhaar_id: str):
+        self.current.add(id_hash(aadhaar_id))
+
+
+def load_snapshot(name: str = GLOBAL_SNAPSHOT) -> AnalysisAccumulator:
+    """Load a persisted accumulator snapshot (empty when missing)."""
+    snapshot = db.session.get(AggregateSnapshot, name)
+    if snapshot is None:
+        return AnalysisAccumulator()
+    return AnalysisAccumulator.from_dict(json.loads(snapshot.data))
+
+
+def save_snapshot(accumulator: AnalysisAccumulator, name: str = GLOBAL_SNAPSHOT):
+    """Persist an accumulator snapshot (caller commits)."""
+    snapshot = db.session.get(AggregateSnapshot, name)
+    data = json.dumps(accumulator.to_dict())
+    if snapshot is None:
+        db.session.add(AggregateSnapshot(name=name, data=data))
+    else:
+        snapshot.data = data
+        snapshot.updated_at = datetime.utcnow()
+
+
+def manifest_fingerprint() -> Dict:
+    """What every shard's partial depends on besides the file itself: the checks and this node's states."""
+    return {'checks_version': CHECKS_VERSION, 'region_states': sorted(analytics_service.states or [])}
+
+
+def load_fingerprint() -> Optional[Dict]:
+    """The fingerprint the manifest's partials were computed under (None before one was stored)."""
+    snapshot = db.session.get(AggregateSnapshot, MANIFEST_SNAPSHOT)
+    return json.loads(snapshot.data) if snapshot else None
+
+
+def save_fingerprint(fingerprint: Dict):
+    """Record the fingerprint of a manifest whose partials are all current (caller commits)."""
+    snapshot = db.session.get(AggregateSnapshot, MANIFEST_SNAPSHOT)
+    if snapshot is None:
+        db.session.add(AggregateSnapshot(name=MANIFEST_SNAPSHOT, data=json.dumps(fingerprint)))
+    else:
+        snapshot.data = json.dumps(fingerprint)
+        snapshot.updated_at = datetime.utcnow()
+
+
+class IngestService:
+    """Keeps the shard manifest and persisted aggregates in sync with the data directory."""
+
+    def plan(self, data_dir: Optional[str]) -> Dict[str, List]:
+        """
+        Classify data files as new, changed, unchanged or removed against the manifest.
+
+        When the manifest's fingerprint differs from manifest_fingerprint(),
+        every known file is changed ('outdated' lists them).
+        """
+        files = analytics_service.list_data_files(data_dir)
+        manifest = {s.path: s for s in ProcessedShard.query.all()}
+        plan = {'new': [], 'changed': [], 'unchanged': [], 'removed': [], 'cascaded': [], 'outdated': []}
+        outdated = bool(manifest) and load_fingerprint() != manifest_fingerprint()
+
+        for path in files:
+            stat = os.stat(path)
+            shard = manifest.pop(path, None)
+            if shard is None:
+                plan['new'].append(path)
+            elif outdated:
+                plan['outdated'].append(path)
+                plan['changed'].append(path)
+            elif shard.size == stat.st_size and shard.mtime == stat.st_mtime:
+                plan['unchanged'].append(path)
+            elif file_sha256(path) == shard.sha256:
+                # Touched but identical content: refresh the cheap fingerprint only
+                shard.mtime = stat.st_mtime
+                plan['unchanged'].append(path)
+            else:
+                plan['changed'].append(path)
+        plan['removed'] = sorted(manifest)
+
+        # Duplicate flags depend on file order (first occurrence wins), so any
+        # shard after the earliest affected one must be re-scanned as well.
+        # Appending newer dated drops therefore only ever scans the new files.
+        affected = plan['new'] + plan['changed'] + plan['removed']
+        if affected:
+            cutoff = min(affected)
+            plan['cascaded'] = [p for p in plan['unchanged'] if p > cutoff]
+            plan['unchanged'] = [p for p in plan['unchanged'] if p <= cutoff]
+            plan['changed'] = sorted(plan['changed'] + plan['cascaded'])
+        else:
+            plan['cascaded'] = []
+        return plan
+
+    def _prior_hashes(self, batch: List[Dict]) -> set:
+        hashes = list({id_hash(r['aadhaar_id']) for r in batch if r.get('aadhaar_id')})
+        if not hashes:
+            return set()
+        return set(db.session.execute(
+            db.select(AadhaarIdIndex.id_hash).where(AadhaarIdIndex.id_hash.in_(hashes))
+        ).scalars())
+
+    def _process_shard(self, path: str, shard: ProcessedShard, accumulator: AnalysisAccumulator,
+                       on_rows: Optional[Callable[[int], None]] = None,
+                       on_bytes: Optional[Callable[[int], None]] = None) -> AnalysisAccumulator:
+        """
+        Scan one shard, returning its partial accumulator and storing its IDs and sketches.
+
+        Shared-phone candidates are admitted against the counts already in
+        `accumulator`, which the partial is merged into afterwards.
+        """
+        partial = AnalysisAccumulator(track_daily=True)
+        partial.patterns.base = accumulator.patterns
+        sketches = ShardSketches()
+        current = set()
+
+        def flush(batch):
+            seen = _IndexedSeenIds(self._prior_hashes(batch), current)
+            for record in batch:
+                partial.add(record, check_record(record, seen))
+                aadhaar_id = record.get('aadhaar_id')
+                sketches.add(record, id_hash(aadhaar_id) if aadhaar_id else None)
+            if on_rows:
+                on_rows(len(batch))
+
+        batch = []
+        for record in analytics_service.iter_records(path, on_bytes):
+            batch.append(record)
+            if len(batch) >= ID_BATCH_SIZE:
+                flush(batch)
+                batch = []
+        if batch:
+            flush(batch)
+        partial.patterns.finish()
+
+        if current:
+            db.session.execute(
+                db.insert(AadhaarIdIndex),
+                [{'id_hash': h, 'shard_id': shard.id} for h in current]
+            )
+        sketches.save(shard.id)
+        return partial
+
+    def _publish_refresh(self, accumulator: AnalysisAccumulator, changed_states: set, scores_before: Dict):
+        """Publish the map rows of states whose stats or risk score/rank changed in this run."""
+        scores = risk_service.state_scores()
+        changed = set(changed_states) | (set(scores_before) - set(scores)) | {
+            state for state, row in scores.items() if scores_before.get(state) != (row.score, row.rank, row.prediction)
+        }
+        if not changed:
+            return
+        stats = {s.state: s for s in StateStats.query.filter(StateStats.state.in_(changed))}
+        publish('aggregates', {
+            'states': [risk_service.state_map_row(stats[state], scores.get(state))
+                       for state in sorted(changed) if state in stats],
+            'removed_states': sorted(state for state in changed if state not in stats),
+            'total_records': accumulator.total_records
+        })
+
+    def _refresh_stats(self, accumulator: AnalysisAccumulator, states: set, districts: set):
+        """Rewrite StateStats/DistrictStats rows for the touched keys only."""
+        now = datetime.utcnow()
+        existing = {s.state: s for s in StateStats.query.filter(StateStats.state.in_(states))} if states else {}
+        for state in states:
+            records = accumulator.state_records.get(state, 0)
+            anomalies = accumulator.state_anomalies.get(state, 0)
+            type_counts = accumulator.state_type_counts.get(state, {})
+            row = existing.get(state)
+            if not records:
+                if row is not None:
+                    db.session.delete(row)
+                continue
+            if row is None:
+                row = StateStats(state=state)
+                db.session.add(row)
+            row.total_records = records
+            row.total_anomalies = anomalies
+            row.anomaly_rate = round(anomalies / records * 100, 2) if records else 0.0
+            row.invalid_pin_count = type_counts.get('invalid_pincodes', 0)
+            row.duplicate_count = type_counts.get('duplicate_ids', 0)
+            row.missing_dob_count = type_counts.get('missing_dob', 0)
+            row.last_updated = now
+
+        by_state = {}
+        for state, district in districts:
+            by_state.setdefault(state, set()).add(district)
+        for state, names in by_state.items():
+            rows = {d.district: d for d in DistrictStats.query.filter(
+                DistrictStats.state == state, DistrictStats.district.in_(names))}
+            for district in names:
+                records = accumulator.district_records.get((state, district), 0)
+                anomalies = accumulator.district_anomalies.get((state, district), 0)
+                row = rows.get(district)
+                if not records:
+                    if row is not None:
+                        db.session.delete(row)
+                    continue
+                if row is None:
+                    row = DistrictStats(state=state, district=district)
+                    db.session.add(row)
+                row.total_records = records
+                row.total_anomalies = anomalies
+                row.anomaly_rate = round(anomalies / records * 100, 2) if records else 0.0
+                row.last_updated = now
+
+    def reset(self):
+        """Drop the manifest and all persisted aggregates (for a full rebuild)."""
+        for model in (AadhaarIdIndex, ProcessedShard, AggregateSnapshot, DistrictStats, StateStats,
+                      TrendBucket, SketchBucket, RiskScore, PhoneLink):
+            db.session.execute(db.delete(model))
+        db.session.commit()
+
+    def run(self, data_dir: Optional[str], full: bool = False, verify: bool = False,
+            progress: Optional[Callable[..., None]] = None) -> Dict:
+        """
+        Fold new and changed shards into the persisted aggregates.
+
+        full=True rebuilds from scratch. verify=True additionally recomputes
+        everything in memory and reports any aggregate that differs.
+        """
+        if full:
+            self.reset()
+
+        plan = self.plan(data_dir)
+        delta = sorted(plan['new'] + plan['changed'])
+        total_bytes = sum(os.path.getsize(p) for p in delta) or 1
+        bytes_done = 0
+        rows_done = 0
+
+        def on_bytes(n):
+            nonlocal bytes_done
+            bytes_done += n
+
+        def on_rows(n, path):
+            nonlocal rows_done
+            rows_done += n
+            if progress:
+                # Mid-shard: report live progress without committing the open transaction
+                progress(f'ingesting {os.path.basename(path)}', bytes_done / total_bytes * 0.9,
+                         rows_done, persist=False)
+
+        accumulator = load_snapshot()
+        touched_states, touched_districts = set(), set()
+        # Every state whose StateStats row is rewritten, for the aggregates event
+        changed_states = set()
+
+        # Removed shards and the old version of changed shards leave the aggregates first
+        for path in plan['removed'] + plan['changed']:
+            shard = ProcessedShard.query.filter_by(path=path).first()
+            old = AnalysisAccumulator.from_dict(json.loads(shard.partial or '{}'))
+            accumulator.subtract(old)
+            trend_service.apply_deltas(trend_service.expand_deltas(old.daily_counts, -1))
+            touched_states.update(old.state_records)
+            touched_districts.update(old.district_records)
+            db.session.execute(db.delete(AadhaarIdIndex).where(AadhaarIdIndex.shard_id == shard.id))
+            sketch_service.delete_shard(shard.id)
+            if path in plan['removed']:
+                db.session.delete(shard)
+            else:
+                # Already subtracted: an interrupted run must not subtract it again
+                shard.partial, shard.sha256, shard.size = None, '', -1
+        if plan['removed'] or plan['changed']:
+            save_snapshot(accumulator)
+            self._refresh_stats(accumulator, touched_states, touched_districts)
+            changed_states |= touched_states
+            touched_states, touched_districts = set(), set()
+        db.session.commit()
+
+        # Delta shards all sort after the unchanged ones, so row ranges stay contiguous
+        next_row = db.session.execute(
+            db.select(db.func.max(ProcessedShard.row_end)).where(ProcessedShard.path.in_(plan['unchanged']))
+        ).scalar() or 0
+
+        for path in delta:
+            if progress:
+                progress(f'ingesting {os.path.basename(path)}', bytes_done / total_bytes * 0.9, rows_done)
+            stat = os.stat(path)
+            shard = ProcessedShard.query.filter_by(path=path).first()
+            if shard is None:
+                shard = ProcessedShard(path=path, row_start=next_row, row_end=next_row)
+                db.session.add(shard)
+            shard.size, shard.mtime = stat.st_size, stat.st_mtime
+            shard.sha256 = file_sha256(path)
+            db.session.flush()
+
+            with profiler.stage('scan shard'):
+                partial = self._process_shard(path, shard, accumulator, lambda n: on_rows(n, path), on_bytes)
+            shard.row_start = next_row
+            shard.row_end = next_row + partial.total_records
+            next_row = shard.row_end
+            shard.partial = json.dumps(partial.to_dict())
+            shard.processed_at = datetime.utcnow()
+
+            with profiler.stage('merge shard'):
+                accumulator.merge(partial)
+                trend_service.apply_deltas(trend_service.expand_deltas(partial.daily_counts))
+                touched_states.update(partial.state_records)
+                touched_districts.update(partial.district_records)
+
+                # Each shard commits on its own so an interrupted run resumes cleanly
+                save_snapshot(accumulator)
+                self._refresh_stats(accumulator, touched_states, touched_districts)
+                db.session.commit()
+            changed_states |= touched_states
+            touched_states, touched_districts = set(), set()
+
+        # Only now are all partials current; an interrupted run re-scans everything again
+        if load_fingerprint() != manifest_fingerprint():
+            save_fingerprint(manifest_fingerprint())
+            db.session.commit()
+
+        # Derived views are precomputed here so requests only read them
+        scores_before = {state: (row.score, row.rank, row.prediction)
+                         for state, row in risk_service.state_scores().items()}
+        with profiler.stage('refresh policies'):
+            policy_service.refresh(accumulator)
+        with profiler.stage('refresh risk scores'):
+            risk_service.refresh(accumulator)
+        self._publish_refresh(accumulator, changed_states, scores_before)
+        db.session.commit()
+
+        summary = {
+            'processed_shards': delta,
+            'new_shards': len(plan['new']),
+            'changed_shards': len(plan['changed']) - len(plan['cascaded']) - len(plan['outdated']),
+            'cascaded_shards': len(plan['cascaded']),
+            'outdated_shards': len(plan['outdated']),
+            'removed_shards': len(plan['removed']),
+            'unchanged_shards': len(plan['unchanged']),
+            'rows_processed': rows_done,
+            'total_records': accumulator.total_records
+        }
+
+        with profiler.stage('spikes'):
+            spikes = trend_service.recent_spikes()
+
+        if verify:
+            if progress:
+                progress('verifying against full recompute', 0.9, rows_done)
+            files = analytics_service.list_data_files(data_dir)
+            with profiler.stage('verify'):
+                expected = analytics_service.compute_accumulator(files, track_daily=True)
+            differences = accumulator.diff(expected)
+            expected_daily = {(day.isoformat(), kind): count
+                              for (day, kind), count in expected.daily_counts.sum_by('day', 'kind').items()}
+            actual_daily = trend_service.daily_cube()
+            for key in set(expected_daily) | set(actual_daily):
+                if expected_daily.get(key, 0) != actual_daily.get(key, 0):
+                    differences.append(f'trend_buckets[day {key}]: '
+                                       f'{actual_daily.get(key, 0)} != {expected_daily.get(key, 0)}')
+            sketched = db.session.execute(
+                db.select(db.func.coalesce(db.func.sum(SketchBucket.records), 0))
+                .where(SketchBucket.state == '*', SketchBucket.district == '*')
+            ).scalar()
+            if sketched != expected.total_records:
+                differences.append(f'sketch_buckets records: {sketched} != {expected.total_records}')
+            summary['verification'] = {
+                'matches': not differences,
+                'differences': differences[:100]
+            }
+
+        if progress:
+            progress('completed', 1.0, rows_done)
+        return {'summary': summary, 'accumulator': accumulator, 'spikes': spikes}
+
+
+# Singleton instance
+ingest_service = IngestService()
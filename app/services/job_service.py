@@ -0,0 +1,298 @@
+"""
+Job Service
+Runs analysis jobs in a background worker pool with persisted progress.
+"""
+
+import hashlib
+import json
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Optional, Tuple
+
+from sqlalchemy.exc import IntegrityError
+
+from app.extensions import db
+from app.models import AnalysisJob
+from app.profiling import profile_job, profiler
+
+ACTIVE_STATUSES = ('queued', 'running')
+
+# Minimum seconds between progress writes for a running job
+PROGRESS_INTERVAL = 0.5
+
+
+def params_key(kind: str, params: Dict) -> str:
+    """Stable hash of a job's kind and parameters, used for deduplication."""
+    payload = json.dumps({'kind': kind, 'params': params}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class JobManager:
+    """Submits, deduplicates and tracks background jobs."""
+
+    def __init__(self):
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._runners: Dict[str, Callable] = {}
+        # Parsed result of the latest completed job per kind: kind -> (job_id, result)
+        self._latest: Dict[str, Tuple[str, Dict]] = {}
+        # Live progress of jobs running in this process: job_id -> progress fields
+        self._live: Dict[str, Dict] = {}
+
+    def register(self, kind: str, runner: Callable):
+        """
+        Register runner(app, params, progress) -> result for a job kind.
+
+        progress(stage, fraction, rows, persist=True) commits the shared
+        session, so runners that write must only call it between their own
+        commits, passing persist=False mid-transaction (the update is then
+        only visible to polls served by this process).
+        """
+        self._runners[kind] = runner
+
+    def _get_executor(self, app) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=app.config.get('JOB_WORKERS', 2),
+                    thread_name_prefix='analysis-job'
+                )
+            return self._executor
+
+    def _expire_stale(self, app):
+        """Fail active jobs whose worker stopped heartbeating (e.g. process restart)."""
+        cutoff = datetime.utcnow() - timedelta(seconds=app.config.get('JOB_STALE_SECONDS', 600))
+        stale = AnalysisJob.query.filter(
+            AnalysisJob.status.in_(ACTIVE_STATUSES),
+            AnalysisJob.updated_at < cutoff
+        ).all()
+        for job in stale:
+            job.status = 'failed'
+            job.error = 'Job worker stopped responding'
+            job.finished_at = datetime.utcnow()
+        if stale:
+            db.session.commit()
+
+    def submit(self, app, kind: str, params: Optional[Dict] = None) -> Tuple[AnalysisJob, bool]:
+        """
+        Submit a job, returning (job, created).
+
+        An identical queued or running job is returned instead of starting a
+        duplicate; the partial unique index makes this hold across processes.
+        """
+        if kind not in self._runners:
+            raise ValueError(f'Unknown job kind: {kind}')
+        params = params or {}
+        key = params_key(kind, params)
+
+        self._expire_stale(app)
+        existing = AnalysisJob.query.filter(
+            AnalysisJob.params_key == key,
+            AnalysisJob.status.in_(ACTIVE_STATUSES)
+        ).first()
+        if existing:
+            return existing, False
+
+        job = AnalysisJob(
+            id=str(uuid.uuid4()),
+            kind=kind,
+            params_key=key,
+            params=json.dumps(params, sort_keys=True, default=str),
+            status='queued',
+            stage='queued'
+        )
+        db.session.add(job)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Lost the race against a concurrent identical submission
+            db.session.rollback()
+            existing = AnalysisJob.query.filter(
+                AnalysisJob.params_key == key,
+                AnalysisJob.status.in_(ACTIVE_STATUSES)
+            ).first()
+            if existing:
+                return existing, False
+            raise
+
+        self._get_executor(app).submit(self._run, app, job.id, kind, params)
+        return job, True
+
+    def _run(self, app, job_id: str, kind: str, params: Dict):
+        with app.app_context():
+            job = db.session.get(AnalysisJob, job_id)
+            job.status = 'running'
+            job.stage = 'starting'
+            job.started_at = job.updated_at = datetime.utcnow()
+            db.session.commit()
+
+            last_write = 0.0
+
+            def progress(stage: str, fraction: float, rows: int = 0, persist: bool = True):
+                nonlocal last_write
+                live = {
+                    'stage': stage,
+                    'progress': min(max(fraction, 0.0), 1.0),
+                    'rows_processed': rows,
+                    'updated_at': datetime.utcnow()
+                }
+                self._live[job_id] = live
+                now = time.monotonic()
+                if not persist or (now - last_write < PROGRESS_INTERVAL and fraction < 1.0):
+                    return
+                last_write = now
+                for field, value in live.items():
+                    setattr(job, field, value)
+                db.session.commit()
+
+            profile = None
+            try:
+                profile = profile_job(app, job_id, kind)
+                result = self._runners[kind](app, params, progress)
+                job.result = json.dumps(result, default=str)
+                job.status = 'completed'
+                job.stage = 'completed'
+                job.progress = 1.0
+            except Exception as e:
+                db.session.rollback()
+                job = db.session.get(AnalysisJob, job_id)
+                job.status = 'failed'
+                job.error = str(e)
+                app.logger.exception('Job %s failed', job_id)
+            finally:
+                if profile is not None:
+                    profiler.detach()
+                    paths = profile.write(app.config['PROFILE_DIR'])
+                    app.logger.info('Job %s profile written to %s', job_id, paths['collapsed'])
+                job.finished_at = job.updated_at = datetime.utcnow()
+                db.session.commit()
+                db.session.remove()
+                self._live.pop(job_id, None)
+
+    def get(self, job_id: str) -> Optional[AnalysisJob]:
+        """Get a job by id."""
+        return db.session.get(AnalysisJob, job_id)
+
+    def status(self, job_id: str) -> Optional[Dict]:
+        """Job status, overlaid with live progress when it runs in this process."""
+        job = self.get(job_id)
+        if job is None:
+            return None
+        data = job.to_dict()
+        live = self._live.get(job_id)
+        if live and job.status == 'running':
+            data.update(live)
+            data['progress'] = round(live['progress'], 4)
+            data['updated_at'] = live['updated_at'].isoformat()
+        return data
+
+    def recent_query(self, kind: Optional[str] = None, limit: int = 20):
+        query = db.select(AnalysisJob)
+        if kind:
+            query = query.where(AnalysisJob.kind == kind)
+        return query.order_by(AnalysisJob.created_at.desc()).limit(limit)
+
+    def recent(self, kind: Optional[str] = None, limit: int = 20):
+        """List the most recently created jobs."""
+        return db.session.execute(self.recent_query(kind, limit)).scalars().all()
+
+    def latest_query(self, kind: str = 'analysis'):
+        """Select the id of the latest completed job of a kind."""
+        return (
+            db.select(AnalysisJob.id)
+            .where(AnalysisJob.kind == kind, AnalysisJob.status == 'completed')
+            .order_by(AnalysisJob.finished_at.desc())
+            .limit(1)
+        )
+
+    def cached_result(self, kind: str, job_id: str) -> Optional[Dict]:
+        """The parsed result of job_id if it is the one kept in memory."""
+        cached = self._latest.get(kind)
+        if cached and cached[0] == job_id:
+            return cached[1]
+        return None
+
+    def remember_result(self, kind: str, job_id: str, raw: str) -> Dict:
+        """Parse a job's stored result and keep it as the latest for its kind."""
+        result = json.loads(raw)
+        self._latest[kind] = (job_id, result)
+        return result
+
+    def latest_result(self, kind: str = 'analysis') -> Optional[Dict]:
+        """Result of the latest completed job, parsed once and kept in memory."""
+        latest_id = db.session.execute(self.latest_query(kind)).scalar()
+        if latest_id is None:
+            return None
+        cached = self.cached_result(kind, latest_id)
+        if cached is not None:
+            return cached
+        return self.remember_result(kind, latest_id, db.session.get(AnalysisJob, latest_id).result)
+
+
+def run_analysis_job(app, params: Dict, progress: Callable) -> Dict:
+    """
+    Runner for the 'analysis' job kind.
+
+    mode 'incremental' (default) folds only new/changed data files into the
+    persisted aggregates, 'full' rebuilds them, 'memory' recomputes without
+    persisting. verify=True checks the persisted result against a recompute.
+    """
+    from app.services.analytics_service import analytics_service
+    from app.services.ingest_service import ingest_service
+    
+    data_dir = app.config.get('DATA_DIR')
+    mode = params.get('mode', 'incremental')
+    if mode == 'memory' or not analytics_service.list_data_files(data_dir):
+        return analytics_service.run_analysis(data_dir=data_dir, progress=progress)
+    
+    outcome = ingest_service.run(
+        data_dir,
+        full=(mode == 'full'),
+        verify=bool(params.get('verify')),
+        progress=progress
+    )
+    report = outcome['accumulator'].to_report(spikes=outcome['spikes'])
+    report['ingest'] = outcome['summary']
+    return report
+
+
+def run_linkage_job(app, params: Dict, progress: Callable) -> Dict:
+    """
+    Runner for the 'linkage' job kind.
+
+    Scores candidate duplicate pairs over the data files (one state when
+    params['state'] is set) and, unless create_tasks is false, adds review
+    tasks for the best of them.
+    """
+    from app.services.linkage_service import MIN_PAIR_SCORE, linkage_service
+
+    return linkage_service.run(
+        app.config.get('DATA_DIR'),
+        state=params.get('state'),
+        min_score=params.get('min_score', MIN_PAIR_SCORE),
+        create_tasks=params.get('create_tasks', True),
+        workers=app.config.get('LINKAGE_WORKERS'),
+        progress=progress
+    )
+
+
+def run_phone_index_job(app, params: Dict, progress: Callable) -> Dict:
+    """Runner for the 'phone_index' job kind: rebuilds the phone -> record count index."""
+    from app.services.phone_index import phone_index_service
+
+    return phone_index_service.build(
+        app.config.get('DATA_DIR'),
+        spill_dir=app.config.get('PHONE_INDEX_SPILL_DIR'),
+        partitions=app.config.get('PHONE_INDEX_PARTITIONS', 64),
+        progress=progress
+    )
+
+
+# Singleton instance
+job_manager = JobManager()
+job_manager.register('analysis', run_analysis_job)
+job_manager.register('linkage', run_linkage_job)
+job_manager.register('phone_index', run_phone_index_job)
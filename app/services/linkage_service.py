@@ -0,0 +1,411 @@
+"""
+Linkage Service
+Candidate duplicate pairs for Policy 2 without comparing every pair of records.
+
+Each record is placed in a handful of blocks: exact blocking keys (valid
+PIN code, DOB year and the Soundex code of one of the name tokens) and one
+key per LSH band of a MinHash signature over its name trigrams
+and address tokens. Only records sharing a block are compared, so a typo
+in the PIN or the name still meets its duplicate through the bands, while
+the number of comparisons grows with block sizes rather than with the
+square of the record count.
+
+Blocks are scored independently on a process pool (LINKAGE_WORKERS). A pair
+sharing several blocks is scored only in the first of them, so workers
+never emit the same pair twice and need no shared state. Each task carries
+only the records of its own blocks, and at most TASKS_IN_FLIGHT_PER_WORKER
+tasks per worker are queued at a time, so the pool adds a few tasks' worth
+of records to memory rather than a copy of the dataset per worker.
+"""
+
+import hashlib
+import multiprocessing
+import os
+import re
+import time
+from array import array
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime
+from functools import lru_cache
+from operator import mul
+from typing import Callable, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple, Union
+
+from app.services.analytics_service import (
+    PINCODE_RE, analytics_service, gender_label, normalize_phone, parse_date
+)
+
+# MinHash signature length, split into LSH_BANDS bands of equal width; two
+# records become candidates with probability 1 - (1 - J^r)^b for Jaccard J
+MINHASH_SIZE = 32
+LSH_BANDS = 8
+
+# Lowest similarity score of an emitted pair
+MIN_PAIR_SCORE = 0.7
+
+# Pairs at or above this score become high-priority review tasks
+HIGH_PRIORITY_SCORE = 0.9
+
+# Blocks with more records than this are skipped (counted in the stats)
+MAX_BLOCK_SIZE = 500
+
+# Comparisons handed to a worker at a time
+PAIRS_PER_TASK = 50000
+
+# Tasks submitted to the pool ahead of their results, per worker
+TASKS_IN_FLIGHT_PER_WORKER = 2
+
+# Pairs kept in a linkage run's result
+MAX_RESULT_PAIRS = 5000
+
+# Review tasks created by one run
+MAX_REVIEW_TASKS = 200
+
+# Weight of each field's similarity in a pair's score
+SCORE_WEIGHTS = {'name': 0.4, 'dob': 0.2, 'address': 0.15, 'pincode': 0.1, 'phone': 0.1, 'gender': 0.05}
+_WEIGHTS = tuple(SCORE_WEIGHTS.values())
+
+# Record fields carried into linkage, in tuple order
+FIELDS = ('aadhaar_id', 'name', 'dob', 'gender', 'phone', 'pincode', 'state', 'district', 'address')
+_ID, _NAME, _DOB, _GENDER, _PHONE, _PIN, _STATE, _DISTRICT, _ADDRESS = range(len(FIELDS))
+
+# Distinct shingles whose hash values are kept (names and addresses repeat heavily)
+SHINGLE_CACHE_SIZE = 1 << 18
+
+_NON_ALNUM_RE = re.compile(r'[^a-z0-9]+')
+_SOUNDEX_CODES = {c: str(d) for d, letters in enumerate(
+    ['aeiouy', 'bfpv', 'cgjkqsxz', 'dt', 'l', 'mn', 'r'], start=0) for c in letters}
+
+
+def tokens(value: Optional[str]) -> List[str]:
+    """Lower-case alphanumeric words."""
+    return _NON_ALNUM_RE.sub(' ', (value or '').lower()).split()
+
+
+def soundex(word: str) -> str:
+    """American Soundex code of a word ('' for a word without letters)."""
+    letters = [c for c in word.lower() if 'a' <= c <= 'z']
+    if not letters:
+        return ''
+    code = letters[0].upper()
+    previous = _SOUNDEX_CODES.get(letters[0], '')
+    for c in letters[1:]:
+        digit = _SOUNDEX_CODES.get(c)
+        if digit is None:
+            # h and w do not separate letters with the same code
+            continue
+        if digit != '0' and digit != previous:
+            code += digit
+            if len(code) == 4:
+                break
+        previous = digit
+    return code.ljust(4, '0')
+
+
+def name_trigrams(name: str) -> frozenset:
+    key = ' '.join(tokens(name))
+    padded = f' {key} '
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+def shingles(name: str, address: str) -> frozenset:
+    """Name trigrams and address words, the sets MinHash estimates Jaccard similarity over."""
+    return name_trigrams(name) | frozenset('@' + t for t in tokens(address))
+
+
+@lru_cache(maxsize=SHINGLE_CACHE_SIZE)
+def _shingle_hashes(item: str) -> array:
+    # MINHASH_SIZE independent 32-bit hashes from one extendable-output digest
+    return array('I', hashlib.shake_128(item.encode('utf-8')).digest(4 * MINHASH_SIZE))
+
+
+def minhash(items: Iterable[str]) -> List[int]:
+    """MinHash signature of a set of strings."""
+    rows = list(map(_shingle_hashes, items))
+    if len(rows) < 2:
+        return list(rows[0]) if rows else []
+    return list(map(min, *rows))
+
+
+def block_keys(record: Sequence[str]) -> Tuple[int, ...]:
+    """Sorted keys of the blocks a record (in FIELDS order) belongs to."""
+    keys = []
+    name = tokens(record[_NAME])
+    dob = parse_date(record[_DOB])
+    if name and dob and PINCODE_RE.match(record[_PIN]):
+        # One key per name token, so reordered names still share a block
+        keys.extend(hash(('key', record[_PIN], dob.year, code)) for code in {soundex(t) for t in name})
+    signature = minhash(shingles(record[_NAME], record[_ADDRESS]))
+    if signature:
+        width = MINHASH_SIZE // LSH_BANDS
+        for band in range(LSH_BANDS):
+            keys.append(hash((band, *signature[band * width:(band + 1) * width])))
+    return tuple(sorted(set(keys)))
+
+
+def _dice(a: frozenset, b: frozenset) -> float:
+    if not a or not b:
+        return 0.0
+    return 2 * len(a & b) / (len(a) + len(b))
+
+
+def features(record: Sequence[str]) -> Tuple:
+    """What score_pair compares of a record (in FIELDS order), computed once per record."""
+    gender = gender_label(record[_GENDER])
+    return (
+        name_trigrams(record[_NAME]),
+        frozenset(tokens(record[_ADDRESS])),
+        parse_date(record[_DOB]),
+        record[_PIN],
+        None if gender == 'Not Specified' else gender,
+        normalize_phone(record[_PHONE])
+    )
+
+
+def similarity(a: Tuple, b: Tuple) -> Tuple[float, Tuple[float, ...]]:
+    """Unrounded score of two features() tuples, and its signals in SCORE_WEIGHTS order."""
+    dob_a, dob_b = a[2], b[2]
+    if dob_a is None or dob_b is None:
+        dob = 0.5
+    else:
+        dob = 1.0 if dob_a == dob_b else 0.5 if dob_a.year == dob_b.year else 0.0
+    signals = (
+        _dice(a[0], b[0]),
+        dob,
+        _dice(a[1], b[1]),
+        0.5 if not a[3] or not b[3] else float(a[3] == b[3]),
+        0.5 if not a[5] or not b[5] else float(a[5] == b[5]),
+        0.5 if a[4] is None or b[4] is None else float(a[4] == b[4])
+    )
+    return sum(map(mul, _WEIGHTS, signals)), signals
+
+
+def _signals_dict(signals: Tuple[float, ...]) -> Dict[str, float]:
+    return {field: round(value, 3) for field, value in zip(SCORE_WEIGHTS, signals)}
+
+
+def score_pair(a: Sequence[str], b: Sequence[str]) -> Tuple[float, Dict[str, float]]:
+    """
+    Weighted similarity of two records (in FIELDS order) and its per-field signals.
+
+    Names compare by trigram Dice, addresses by word Dice; a DOB scores 1
+    when equal and 0.5 for the same year, other fields 1 when equal. A field
+    missing on either side contributes half its weight.
+    """
+    score, signals = similarity(features(a), features(b))
+    return round(score, 4), _signals_dict(signals)
+
+
+def link_blocks(records: Union[Sequence[Tuple], Mapping[int, Tuple]], blocks: Sequence[Tuple[int, Sequence[int]]],
+                min_score: float = MIN_PAIR_SCORE) -> Tuple[int, List[Tuple]]:
+    """
+    Score the pairs within blocks of (key, record indexes).
+
+    records[i] is (fields tuple, block keys); a mapping needs only the
+    records of these blocks. Returns the number of pairs
+    compared and the (score, i, j, signals) of those scoring at least
+    min_score. A pair is only compared in the lowest-keyed block it shares.
+    """
+    compared = 0
+    found = []
+    # Record index -> (block key set, features), for the records of these blocks
+    prepared = {}
+    for _, members in blocks:
+        for i in members:
+            if i not in prepared:
+                fields, keys = records[i]
+                prepared[i] = (frozenset(keys), features(fields))
+    for key, members in blocks:
+        for x, i in enumerate(members):
+            keys_i, features_i = prepared[i]
+            for j in members[x + 1:]:
+                keys_j, features_j = prepared[j]
+                if min(keys_i & keys_j) != key:
+                    continue
+                compared += 1
+                score, signals = similarity(features_i, features_j)
+                if score >= min_score:
+                    found.append((round(score, 4), i, j, _signals_dict(signals)))
+    return compared, found
+
+
+def _partition(blocks: List[Tuple[int, List[int]]], budget: int) -> List[List[Tuple[int, List[int]]]]:
+    """Group blocks into tasks of about `budget` comparisons each."""
+    tasks, current, pairs = [], [], 0
+    for block in blocks:
+        current.append(block)
+        pairs += len(block[1]) * (len(block[1]) - 1) // 2
+        if pairs >= budget:
+            tasks.append(current)
+            current, pairs = [], 0
+    if current:
+        tasks.append(current)
+    return tasks
+
+
+def _pair_dict(score: float, a: Sequence[str], b: Sequence[str], signals: Dict[str, float]) -> Dict:
+    return {
+        'score': score,
+        'same_id': a[_ID] == b[_ID],
+        'signals': signals,
+        'records': [dict(zip(FIELDS, a)), dict(zip(FIELDS, b))]
+    }
+
+
+class LinkageService:
+    """Blocks records, scores candidate pairs in parallel and queues them for review."""
+
+    def load_records(self, data_dir: Optional[str] = None, state: Optional[str] = None) -> List[Tuple[str, ...]]:
+        """Records of the data files as FIELDS tuples, optionally for one state."""
+        records = []
+        for path in analytics_service.list_data_files(data_dir):
+            for record in analytics_service.iter_records(path):
+                if state and record.get('state') != state:
+                    continue
+                records.append(tuple(record.get(field, '') for field in FIELDS))
+        return records
+
+    def candidate_pairs(self, records: Sequence[Sequence[str]], min_score: float = MIN_PAIR_SCORE,
+                        workers: Optional[int] = None,
+                        progress: Optional[Callable[[str, float, int], None]] = None) -> Dict:
+        """
+        Scored candidate pairs among records (FIELDS tuples), best first.
+
+        Returns {'pairs': [(score, i, j, signals)], 'stats': {...}} where i
+        and j index into records.
+        """
+        workers = workers or os.cpu_count() or 1
+        started = time.perf_counter()
+        keyed = []
+        blocks: Dict[int, List[int]] = {}
+        for index, record in enumerate(records):
+            keys = block_keys(record)
+            keyed.append((tuple(record), keys))
+            for key in keys:
+                blocks.setdefault(key, []).append(index)
+            if progress and index % 50000 == 0:
+                progress('blocking', 0.5 * index / max(len(records), 1), index)
+        blocked = time.perf_counter()
+
+        shared = [(key, members) for key, members in blocks.items() if 1 < len(members) <= MAX_BLOCK_SIZE]
+        oversized = {key for key, members in blocks.items() if len(members) > MAX_BLOCK_SIZE}
+        for key in oversized:
+            # A pair is scored in its first shared block, which must be one that is scored at all
+            for index in blocks[key]:
+                fields, keys = keyed[index]
+                keyed[index] = (fields, tuple(k for k in keys if k != key))
+        # Largest blocks first, so the pool is not left waiting on one big task at the end
+        shared.sort(key=lambda block: len(block[1]), reverse=True)
+        tasks = _partition(shared, PAIRS_PER_TASK)
+
+        compared, found = 0, []
+        if workers > 1 and len(tasks) > 1:
+            scored = 0
+
+            def collect(futures):
+                nonlocal compared, scored
+                for future in futures:
+                    count, pairs = future.result()
+                    compared += count
+                    found.extend(pairs)
+                    scored += 1
+                    if progress:
+                        progress('scoring pairs', 0.5 + 0.5 * scored / len(tasks), len(records))
+
+            # Spawned, not forked: linkage runs on a job thread of a multi-threaded server process
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+                pending = set()
+                for task in tasks:
+                    if len(pending) >= workers * TASKS_IN_FLIGHT_PER_WORKER:
+                        finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        collect(finished)
+                    members = {i: keyed[i] for _, block in task for i in block}
+                    pending.add(pool.submit(link_blocks, members, task, min_score))
+                collect(wait(pending).done)
+        else:
+            for done, task in enumerate(tasks, start=1):
+                count, pairs = link_blocks(keyed, task, min_score)
+                compared += count
+                found.extend(pairs)
+                if progress:
+                    progress('scoring pairs', 0.5 + 0.5 * done / len(tasks), len(records))
+        found.sort(key=lambda pair: (-pair[0], pair[1], pair[2]))
+        finished = time.perf_counter()
+
+        n = len(records)
+        all_pairs = n * (n - 1) // 2
+        return {
+            'pairs': found,
+            'stats': {
+                'records': n,
+                'blocks': len(shared),
+                'oversized_blocks': len(oversized),
+                'compared_pairs': compared,
+                'all_pairs': all_pairs,
+                'reduction_ratio': round(1 - compared / all_pairs, 6) if all_pairs else 0.0,
+                'candidate_pairs': len(found),
+                'workers': workers if len(tasks) > 1 else 1,
+                'blocking_seconds': round(blocked - started, 3),
+                'scoring_seconds': round(finished - blocked, 3)
+            }
+        }
+
+    def create_review_tasks(self, pairs: Sequence[Dict], limit: int = MAX_REVIEW_TASKS) -> int:
+        """Add a Policy 2 review task per pair (best first) that has none yet; returns the number created."""
+        from app.extensions import db
+        from app.models import TodoTask
+
+        proposed = {}
+        for pair in pairs:
+            a, b = pair['records']
+            title = f"Review possible duplicate: {a['aadhaar_id']} / {b['aadhaar_id']}"
+            if title not in proposed:
+                proposed[title] = pair
+            if len(proposed) == limit:
+                break
+        existing = set(db.session.execute(
+            db.select(TodoTask.title).where(TodoTask.title.in_(list(proposed)))
+        ).scalars())
+
+        created = 0
+        for title, pair in proposed.items():
+            if title in existing:
+                continue
+            a, b = pair['records']
+            signals = ', '.join(f'{field} {value:.2f}' for field, value in pair['signals'].items())
+            db.session.add(TodoTask(
+                title=title,
+                description=(
+                    f"Similarity {pair['score']:.2f} ({signals}).\n"
+                    f"A: {a['name']}, DOB {a['dob'] or '-'}, PIN {a['pincode'] or '-'}, {a['district']}, {a['state']}\n"
+                    f"B: {b['name']}, DOB {b['dob'] or '-'}, PIN {b['pincode'] or '-'}, {b['district']}, {b['state']}"
+                ),
+                status='pending',
+                priority='high' if pair['score'] >= HIGH_PRIORITY_SCORE else 'medium',
+                state=a['state'],
+                anomaly_type='duplicate_ids',
+                assigned_to='Verification Team'
+            ))
+            created += 1
+        db.session.commit()
+        return created
+
+    def run(self, data_dir: Optional[str] = None, state: Optional[str] = None,
+            min_score: float = MIN_PAIR_SCORE, create_tasks: bool = True, workers: Optional[int] = None,
+            progress: Optional[Callable[[str, float, int], None]] = None) -> Dict:
+        """Link the records of the data files and queue the best pairs for review."""
+        records = self.load_records(data_dir, state)
+        linked = self.candidate_pairs(records, min_score=min_score, workers=workers, progress=progress)
+        pairs = [_pair_dict(score, records[i], records[j], signals)
+                 for score, i, j, signals in linked['pairs'][:MAX_RESULT_PAIRS]]
+        tasks = self.create_review_tasks(pairs) if create_tasks and pairs else 0
+        if progress:
+            progress('completed', 1.0, len(records))
+        return {
+            'pairs': pairs,
+            'stats': {**linked['stats'], 'tasks_created': tasks, 'state': state, 'min_score': min_score},
+            'generated_at': datetime.utcnow().isoformat()
+        }
+
+
+# Singleton instance
+linkage_service = LinkageService()
@@ -0,0 +1,321 @@
+"""
+Partition Service
+Scatter-gather of dashboard and analysis queries across regional app instances.
+
+Each node is an ordinary instance whose scans are restricted to its
+REGION_STATES, so its snapshot, rollup cube and sketches hold only its
+region's records. /api/partition/* exposes those partials: the raw
+accumulator snapshot (behind an ETag, so an unchanged one is not sent
+again) and the merged HyperLogLog and KLL sketches of a scope.
+
+A coordinator (PARTITION_NODES set) sends a query to the nodes in
+parallel and merges what comes back: counters and trend buckets sum,
+sketches merge. The payloads have the same shape a single national
+instance returns. State-scoped queries go only to the nodes that own the
+state. A node that errors or times out is listed in the response's
+`nodes` status and the result is marked incomplete instead of failing.
+
+Duplicate-ID detection runs inside each node, so an Aadhaar ID repeated
+in two regions is not flagged.
+"""
+
+import json
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from app.services.analytics_service import ANOMALY_LABELS, AnalysisAccumulator
+from app.services.sketch_service import HLL_PRECISION, KLL_K, describe_estimates
+from app.services.sketches import HyperLogLog, KLLSketch
+from app.services.trend_service import choose_level
+
+DEFAULT_TIMEOUT_SECONDS = 10.0
+
+# How long a node's region and states are trusted before /api/partition/info is asked again
+INFO_TTL_SECONDS = 30
+
+# States listed in the cluster summary
+MOST_AFFECTED_STATES = 5
+
+
+class NodeResult:
+    """One node's answer to a scattered request."""
+
+    __slots__ = ('node', 'ok', 'status', 'data', 'error', 'ms', 'etag')
+
+    def __init__(self, node: str, ok: bool, status: Optional[int] = None, data=None,
+                 error: Optional[str] = None, ms: float = 0.0, etag: Optional[str] = None):
+        self.node = node
+        self.ok = ok
+        self.status = status
+        self.data = data
+        self.error = error
+        self.ms = ms
+        self.etag = etag
+
+    def to_dict(self) -> Dict:
+        return {'node': self.node, 'ok': self.ok, 'status': self.status, 'error': self.error, 'ms': self.ms}
+
+
+def node_status(results: List[NodeResult]) -> Dict:
+    """The per-node status block every cluster response carries."""
+    return {
+        'nodes': [result.to_dict() for result in results],
+        'complete': all(result.ok for result in results)
+    }
+
+
+def merge_trends(partials: List[Dict]) -> Dict:
+    """Sum trend series from several nodes bucket by bucket, recomputing the rates."""
+    buckets: Dict[str, Dict] = {}
+    for partial in partials:
+        for point in partial['series']:
+            merged = buckets.setdefault(point['bucket'], {'records': 0, 'anomalies': 0, 'by_type': {}})
+            merged['records'] += point['records']
+            merged['anomalies'] += point['anomalies']
+            for kind, count in point['by_type'].items():
+                merged['by_type'][kind] = merged['by_type'].get(kind, 0) + count
+    series = []
+    for bucket, merged in sorted(buckets.items()):
+        records, anomalies = merged['records'], merged['anomalies']
+        series.append({
+            'bucket': bucket,
+            'records': records,
+            'anomalies': anomalies,
+            'anomaly_rate': round(anomalies / records * 100, 2) if records else 0.0,
+            'by_type': merged['by_type']
+        })
+    params = {k: v for k, v in partials[0].items() if k != 'series'} if partials else {}
+    return dict(params, series=series)
+
+
+def merge_sketches(partials: List[Dict]) -> Tuple[int, int, HyperLogLog, KLLSketch]:
+    """Merge the /api/partition/sketches payloads of several nodes."""
+    records = buckets = 0
+    hll = HyperLogLog(HLL_PRECISION)
+    kll = KLLSketch(KLL_K)
+    for partial in partials:
+        records += partial['records']
+        buckets += partial['buckets']
+        hll.merge(HyperLogLog.from_dict(partial['distinct_ids']))
+        kll.merge(KLLSketch.from_dict(partial['ages']))
+    return records, buckets, hll, kll
+
+
+def state_rows(accumulator: AnalysisAccumulator, owners: Dict[str, List[str]]) -> List[Dict]:
+    """Per-state totals (the StateStats columns) from a merged accumulator, most anomalies first."""
+    rows = []
+    for state, records in accumulator.state_records.items():
+        anomalies = accumulator.state_anomalies.get(state, 0)
+        by_type = accumulator.state_type_counts.get(state, {})
+        rows.append({
+            'state': state,
+            'total_records': records,
+            'total_anomalies': anomalies,
+            'anomaly_rate': round(anomalies / records * 100, 2) if records else 0.0,
+            'by_type': {ANOMALY_LABELS.get(k, k): v for k, v in by_type.items()},
+            'nodes': owners.get(state, [])
+        })
+    rows.sort(key=lambda row: (-row['total_anomalies'], row['state']))
+    return rows
+
+
+class PartitionCoordinator:
+    """Sends queries to the regional nodes in parallel and merges their partial results."""
+
+    def __init__(self):
+        self.nodes: Dict[str, str] = {}
+        self.timeout = DEFAULT_TIMEOUT_SECONDS
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        # node -> (fetched at, info dict)
+        self._info: Dict[str, Tuple[float, Dict]] = {}
+        # node -> (etag, accumulator, spikes) of its last snapshot
+        self._partials: Dict[str, Tuple[str, AnalysisAccumulator, List[Dict]]] = {}
+        # (node, etag) pairs -> merged accumulator
+        self._merged: Optional[Tuple[Tuple, AnalysisAccumulator]] = None
+
+    def configure(self, nodes: Dict[str, str], timeout: float = DEFAULT_TIMEOUT_SECONDS):
+        """Set the node name -> base URL map; clears everything cached from the previous one."""
+        with self._lock:
+            self.nodes = {name: url.rstrip('/') for name, url in nodes.items()}
+            self.timeout = timeout
+            self._info.clear()
+            self._partials.clear()
+            self._merged = None
+            if self._executor is None and self.nodes:
+                self._executor = ThreadPoolExecutor(max_workers=max(4, 2 * len(self.nodes)),
+                                                    thread_name_prefix='scatter')
+
+    def _fetch(self, node: str, path: str, params: Optional[Dict] = None,
+               etag: Optional[str] = None) -> NodeResult:
+        query = urllib.parse.urlencode({k: v for k, v in (params or {}).items() if v is not None})
+        url = f'{self.nodes[node]}{path}' + (f'?{query}' if query else '')
+        request = urllib.request.Request(url, headers={'Accept': 'application/json'})
+        if etag:
+            request.add_header('If-None-Match', etag)
+        started = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                body = json.loads(response.read())
+                status, etag = response.status, response.headers.get('ETag')
+        except urllib.error.HTTPError as e:
+            ms = round((time.perf_counter() - started) * 1000, 1)
+            if e.code == 304:
+                return NodeResult(node, True, 304, ms=ms, etag=etag)
+            try:
+                error = json.loads(e.read()).get('error') or str(e)
+            except ValueError:
+                error = str(e)
+            return NodeResult(node, False, e.code, error=error, ms=ms)
+        except (OSError, ValueError) as e:
+            return NodeResult(node, False, error=str(getattr(e, 'reason', e)),
+                              ms=round((time.perf_counter() - started) * 1000, 1))
+        ms = round((time.perf_counter() - started) * 1000, 1)
+        if not body.get('success'):
+            return NodeResult(node, False, status, error=body.get('error'), ms=ms)
+        return NodeResult(node, True, status, data=body.get('data'), ms=ms, etag=etag)
+
+    def scatter(self, path: str, params: Optional[Dict] = None, nodes: Optional[List[str]] = None,
+                etags: Optional[Dict[str, str]] = None) -> List[NodeResult]:
+        """GET `path` from each node (all of them by default) in parallel, in node order."""
+        nodes = list(self.nodes) if nodes is None else nodes
+        etags = etags or {}
+        futures = [self._executor.submit(self._fetch, node, path, params, etags.get(node)) for node in nodes]
+        return [future.result() for future in futures]
+
+    def info(self) -> List[NodeResult]:
+        """Each node's region and states, refreshed when older than INFO_TTL_SECONDS."""
+        now = time.monotonic()
+        with self._lock:
+            stale = [node for node in self.nodes
+                     if node not in self._info or now - self._info[node][0] > INFO_TTL_SECONDS]
+        fetched = {result.node: result for result in self.scatter('/api/partition/info', nodes=stale)}
+        with self._lock:
+            for node, result in fetched.items():
+                if result.ok:
+                    self._info[node] = (now, result.data)
+        return [fetched.get(node) or NodeResult(node, True, 200, data=self._info[node][1])
+                for node in self.nodes]
+
+    def owners(self, state: Optional[str]) -> List[str]:
+        """
+        Nodes that may hold records of `state` (every node without one).
+
+        A node serving all states, or one whose info is unknown, is always asked.
+        """
+        if not state:
+            return list(self.nodes)
+        self.info()
+        with self._lock:
+            return [node for node in self.nodes
+                    if node not in self._info or not self._info[node][1]['states']
+                    or state in self._info[node][1]['states']]
+
+    def accumulator(self) -> Tuple[AnalysisAccumulator, List[Dict], Dict[str, List[str]], List[NodeResult]]:
+        """
+        The national accumulator merged from every node's snapshot, with the nodes' spikes.
+
+        Unchanged snapshots answer 304 and are reused from the last fetch,
+        and the merge itself is reused while no node's snapshot changed.
+        Returns the accumulator, the spikes, state -> owning nodes and the
+        per-node results.
+        """
+        with self._lock:
+            etags = {node: partial[0] for node, partial in self._partials.items()}
+        results = self.scatter('/api/partition/accumulator', etags=etags)
+        with self._lock:
+            for result in results:
+                if result.ok and result.status != 304:
+                    data = result.data
+                    self._partials[result.node] = (result.etag, AnalysisAccumulator.from_dict(data['accumulator']),
+                                                   data['spikes'])
+            live = [result.node for result in results if result.ok and result.node in self._partials]
+            key = tuple((node, self._partials[node][0]) for node in live)
+            if self._merged is None or self._merged[0] != key:
+                merged = AnalysisAccumulator()
+                for node in live:
+                    merged.merge(self._partials[node][1])
+                self._merged = (key, merged)
+            spikes = [spike for node in live for spike in self._partials[node][2]]
+            owners: Dict[str, List[str]] = {}
+            for node in live:
+                for state in self._partials[node][1].state_records:
+                    owners.setdefault(state, []).append(node)
+            return self._merged[1], spikes, owners, results
+
+    def summary(self) -> Dict:
+        """National totals and the most affected states, with each node's share."""
+        accumulator, _, _, results = self.accumulator()
+        total_records = accumulator.total_records
+        total_anomalies = sum(accumulator.state_anomalies.values())
+        with self._lock:
+            regions = [{
+                'node': result.node,
+                'records': self._partials[result.node][1].total_records if result.ok else None,
+                'anomalies': sum(self._partials[result.node][1].state_anomalies.values()) if result.ok else None
+            } for result in results]
+        return dict({
+            'total_records': total_records,
+            'total_anomalies': total_anomalies,
+            'anomaly_rate': round(total_anomalies / total_records * 100, 2) if total_records else 0.0,
+            'most_affected_states': [
+                {'state': state, 'anomaly_count': count}
+                for state, count in accumulator.state_anomalies.most_common(MOST_AFFECTED_STATES)
+            ],
+            'regions': regions
+        }, **node_status(results))
+
+    def states(self) -> Dict:
+        accumulator, _, owners, results = self.accumulator()
+        return dict({'states': state_rows(accumulator, owners)}, **node_status(results))
+
+    def report(self) -> Dict:
+        """The analysis report over every node's records, with every node's spikes."""
+        accumulator, spikes, _, results = self.accumulator()
+        spikes = sorted(spikes, key=lambda spike: (-spike['z_score'], spike['pattern']))
+        return dict(accumulator.to_report(spikes=spikes), **node_status(results))
+
+    def trends(self, date_from: Optional[date] = None, date_to: Optional[date] = None,
+               state: Optional[str] = None, district: Optional[str] = None,
+               anomaly_type: Optional[str] = None, level: str = 'auto') -> Dict:
+        """
+        A trend series summed over the owning nodes.
+
+        The date range and granularity are resolved here, so every node
+        answers with the same buckets whatever its own clock says.
+        """
+        date_to = date_to or date.today()
+        date_from = date_from or (date_to - timedelta(days=90))
+        if level == 'auto':
+            level = choose_level(date_from, date_to)
+        params = {
+            'from': date_from.isoformat(), 'to': date_to.isoformat(), 'granularity': level,
+            'state': state, 'district': district, 'type': anomaly_type
+        }
+        results = self.scatter('/api/dashboard/trends', params, nodes=self.owners(state))
+        merged = merge_trends([result.data for result in results if result.ok])
+        return dict(merged, **node_status(results))
+
+    def estimates(self, state: Optional[str] = None, district: Optional[str] = None,
+                  date_from: Optional[date] = None, date_to: Optional[date] = None) -> Dict:
+        """Distinct IDs and age quantiles from the owning nodes' sketches merged together."""
+        if not state:
+            district = None
+        params = {
+            'state': state, 'district': district,
+            'from': date_from.isoformat() if date_from else None,
+            'to': date_to.isoformat() if date_to else None
+        }
+        results = self.scatter('/api/partition/sketches', params, nodes=self.owners(state))
+        merged = merge_sketches([result.data for result in results if result.ok])
+        return dict(describe_estimates(*merged, state, district, date_from, date_to), **node_status(results))
+
+
+# Singleton instance
+partition_coordinator = PartitionCoordinator()
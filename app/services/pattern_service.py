@@ -0,0 +1,265 @@
+"""
+Pattern Service
+Streaming detection of suspicious enrolment patterns in constant memory.
+
+PatternDetector observes records during the ingest pass (it rides along in
+AnalysisAccumulator) and reports in the `suspicious_patterns` shape of the
+analysis report: pattern / affected_records / risk_level.
+
+Shared numbers are counted in a count-min sketch, created with the first
+phone observed, and a number becomes a candidate the moment its estimate
+reaches PHONE_SHARE_THRESHOLD. The sketch never undercounts, so every number
+that truly reaches the threshold is a candidate, however large the input.
+A shard's detector admits against the counts of the detector it will be
+merged into (`base`), so a number split across files is caught too.
+"""
+
+import math
+import re
+from collections import Counter, deque
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from app.services.sketches import CountMinSketch
+
+# Records sharing one mobile number before it is reported
+PHONE_SHARE_THRESHOLD = 50
+PHONE_SHARE_CRITICAL = 100
+
+# Consecutive Aadhaar IDs from one enrolment centre before a run is reported
+SEQUENTIAL_RUN_THRESHOLD = 20
+SEQUENTIAL_RUN_CRITICAL = 100
+
+# Rolling z-score spike detection over daily district counts
+SPIKE_WINDOW_DAYS = 14
+SPIKE_MIN_HISTORY = 7
+SPIKE_Z_THRESHOLD = 3.0
+SPIKE_MIN_COUNT = 10
+
+PO_BOX_RE = re.compile(r'\bp\.?\s*o\.?\s*box\b', re.IGNORECASE)
+
+RISK_ORDER = {'critical': 0, 'high': 1, 'medium': 2, 'low': 3}
+
+
+class PatternDetector:
+    """Mergeable streaming state for the suspicious-pattern checks."""
+
+    def __init__(self):
+        # Keys are "state|phone" so shared numbers are reported per state; no sketch until a phone is seen
+        self.phone_counts: Optional[CountMinSketch] = None
+        self.phone_candidates: Set[str] = set()
+        # Detector this one will be merged into, whose counts admission adds to (not serialised)
+        self.base: Optional['PatternDetector'] = None
+        # Open run per centre: centre -> [state, first_id, last_id, length]
+        self._open_runs: Dict[str, list] = {}
+        # Closed runs at or above the threshold: state -> [total records, longest run, runs]
+        self.sequential_runs: Dict[str, List[int]] = {}
+        self.po_box = Counter()
+
+    def observe(self, record: Dict[str, str], phone: Optional[str] = None):
+        """Fold one normalised record (and its normalised phone) into the pattern state."""
+        state = record.get('state') or 'Unknown'
+
+        if phone:
+            key = f'{state}|{phone}'
+            if self.phone_counts is None:
+                self.phone_counts = CountMinSketch()
+            count = self.phone_counts.add(key)
+            if key not in self.phone_candidates:
+                base = self.base.phone_counts if self.base is not None else None
+                if base is not None:
+                    count += base.estimate(key)
+                if count >= PHONE_SHARE_THRESHOLD:
+                    self.phone_candidates.add(key)
+
+        centre = record.get('centre')
+        aadhaar_id = record.get('aadhaar_id')
+        if centre and aadhaar_id and aadhaar_id.isdigit():
+            value = int(aadhaar_id)
+            run = self._open_runs.get(centre)
+            if run and value == run[2] + 1:
+                run[2] = value
+                run[3] += 1
+            else:
+                if run:
+                    self._close_run(run)
+                self._open_runs[centre] = [state, value, value, 1]
+
+        address = record.get('address')
+        if address and PO_BOX_RE.search(address):
+            self.po_box[state] += 1
+
+    def _close_run(self, run: list):
+        state, _, _, length = run
+        if length >= SEQUENTIAL_RUN_THRESHOLD:
+            totals = self.sequential_runs.setdefault(state, [0, 0, 0])
+            totals[0] += length
+            totals[1] = max(totals[1], length)
+            totals[2] += 1
+
+    def finish(self):
+        """Close open runs at the end of a file; runs do not span files."""
+        for run in self._open_runs.values():
+            self._close_run(run)
+        self._open_runs = {}
+
+    def merge(self, other: 'PatternDetector') -> 'PatternDetector':
+        """Merge another detector's state into this one."""
+        if other.phone_counts is not None:
+            if self.phone_counts is None:
+                self.phone_counts = CountMinSketch(other.phone_counts.width, other.phone_counts.depth)
+            self.phone_counts.merge(other.phone_counts)
+        self.phone_candidates |= other.phone_candidates
+        for state, (records, longest, runs) in other.sequential_runs.items():
+            totals = self.sequential_runs.setdefault(state, [0, 0, 0])
+            totals[0] += records
+            totals[1] = max(totals[1], longest)
+            totals[2] += runs
+        self.po_box.update(other.po_box)
+        return self
+
+    def subtract(self, other: 'PatternDetector') -> 'PatternDetector':
+        """
+        Remove a previously merged detector's state.
+
+        Phone counts are exact to subtract, and candidates whose estimate
+        falls below the threshold are dropped. The longest-run figure is
+        kept as an upper bound.
+        """
+        if other.phone_counts is not None and self.phone_counts is not None:
+            self.phone_counts.subtract(other.phone_counts)
+            estimate = self.phone_counts.estimate
+            self.phone_candidates = {key for key in self.phone_candidates
+                                     if estimate(key) >= PHONE_SHARE_THRESHOLD}
+        for state, (records, _, runs) in other.sequential_runs.items():
+            totals = self.sequential_runs.get(state)
+            if totals:
+                totals[0] -= records
+                totals[2] -= runs
+                if totals[2] <= 0:
+                    del self.sequential_runs[state]
+        self.po_box.subtract(other.po_box)
+        self.po_box = +self.po_box
+        return self
+
+    def to_dict(self) -> Dict:
+        """Serialise to JSON-compatible types."""
+        return {
+            'phone_counts': self.phone_counts.to_dict() if self.phone_counts is not None else None,
+            'phone_candidates': sorted(self.phone_candidates),
+            'sequential_runs': self.sequential_runs,
+            'po_box': dict(self.po_box)
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'PatternDetector':
+        """Rebuild a detector serialised with to_dict()."""
+        detector = cls()
+        if not data:
+            return detector
+        if data.get('phone_counts'):
+            detector.phone_counts = CountMinSketch.from_dict(data['phone_counts'])
+        candidates = data.get('phone_candidates') or []
+        if isinstance(candidates, dict):
+            # Snapshots written with the earlier Misra-Gries summary
+            candidates = candidates.get('counters', {})
+        detector.phone_candidates = set(candidates)
+        detector.sequential_runs = {s: list(v) for s, v in data.get('sequential_runs', {}).items()}
+        detector.po_box = Counter(data.get('po_box', {}))
+        return detector
+
+    def shared_phones(self, threshold: int = PHONE_SHARE_THRESHOLD) -> Dict[str, List[Tuple[str, int]]]:
+        """Candidate numbers whose sketch estimate meets the threshold, by state."""
+        by_state: Dict[str, List[Tuple[str, int]]] = {}
+        if self.phone_counts is None:
+            return by_state
+        for key in self.phone_candidates:
+            count = self.phone_counts.estimate(key)
+            if count >= threshold:
+                state, phone = key.split('|', 1)
+                by_state.setdefault(state, []).append((phone, count))
+        return by_state
+
+    def patterns(self, spikes: Optional[List[Dict]] = None) -> List[Dict]:
+        """Render the detected patterns, most severe first."""
+        patterns = []
+
+        for state, phones in self.shared_phones().items():
+            top = max(count for _, count in phones)
+            patterns.append({
+                "pattern": f"Same mobile number linked to {top}+ Aadhaar records in {state}",
+                "affected_records": sum(count for _, count in phones),
+                "risk_level": "critical" if top >= PHONE_SHARE_CRITICAL else "high"
+            })
+
+        for state, (records, longest, _) in self.sequential_runs.items():
+            patterns.append({
+                "pattern": f"Bulk enrollments with sequential Aadhaar IDs detected in {state}",
+                "affected_records": records,
+                "risk_level": "critical" if longest >= SEQUENTIAL_RUN_CRITICAL else "high"
+            })
+
+        po_box_total = sum(self.po_box.values())
+        if po_box_total:
+            patterns.append({
+                "pattern": "Address field contains PO Box patterns (potential fraud)",
+                "affected_records": po_box_total,
+                "risk_level": "medium"
+            })
+
+        patterns.extend(spikes or [])
+        patterns.sort(key=lambda p: (RISK_ORDER.get(p['risk_level'], 4), -p['affected_records']))
+        return patterns
+
+
+def detect_spikes(cells: Iterable[Tuple[Tuple[str, str, str], date, int]],
+                  labels: Dict[str, str], since: Optional[date] = None) -> List[Dict]:
+    """
+    Rolling z-score spike detection over daily counts.
+
+    `cells` yields ((state, district, type), day, count) sorted by series then
+    day. Each day is scored against the previous SPIKE_WINDOW_DAYS days of the
+    same series (missing days count as zero); only days on or after `since`
+    are reported. Memory is one window per series being scanned.
+    """
+    spikes = []
+    series_key = None
+    window: deque = deque()
+    last_day = None
+
+    for key, day, count in cells:
+        if key != series_key:
+            series_key, window, last_day = key, deque(), None
+        if last_day is not None:
+            gap = min((day - last_day).days - 1, SPIKE_WINDOW_DAYS)
+            window.extend([0] * gap)
+            while len(window) > SPIKE_WINDOW_DAYS:
+                window.popleft()
+        last_day = day
+
+        if len(window) >= SPIKE_MIN_HISTORY and count >= SPIKE_MIN_COUNT and (since is None or day >= since):
+            mean = sum(window) / len(window)
+            std = math.sqrt(sum((x - mean) ** 2 for x in window) / len(window)) or 1.0
+            z = (count - mean) / std
+            if z >= SPIKE_Z_THRESHOLD:
+                state, district, kind = key
+                spikes.append({
+                    "pattern": f"Unusual spike in {labels.get(kind, kind)} in {district}, {state} "
+                               f"({day.strftime('%b %Y')})",
+                    "affected_records": count,
+                    "risk_level": "high" if z >= 2 * SPIKE_Z_THRESHOLD else "medium",
+                    "z_score": round(z, 2),
+                    "date": day.isoformat()
+                })
+
+        window.append(count)
+        if len(window) > SPIKE_WINDOW_DAYS:
+            window.popleft()
+
+    # Keep the strongest spike per series
+    strongest: Dict[str, Dict] = {}
+    for spike in spikes:
+        key = spike['pattern']
+        if key not in strongest or spike['z_score'] > strongest[key]['z_score']:
+            strongest[key] = spike
+    return sorted(strongest.values(), key=lambda s: s['z_score'], reverse=True)
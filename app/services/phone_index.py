@@ -0,0 +1,222 @@
+"""
+Phone Index
+Exact normalised mobile number -> record count index, for numbers shared across records.
+
+A build streams the data files once in column batches. The phone column is
+normalised and checked for invalid_phone with whole-column regex passes,
+and each (phone, state, Aadhaar ID) row is appended to one of N spill files
+by a hash of the phone. Every number then lives in exactly one partition,
+so the partitions are counted one at a time and memory is bounded by the
+largest partition, not by the number of distinct phones.
+
+Numbers with at least MIN_INDEXED_RECORDS records in a state are stored as
+PhoneLink rows, so "numbers linked to >= N records" (overall or in one
+state) is an indexed range read. Unlike the count-min sketch in the
+pattern detector, the counts are exact and every number is kept.
+"""
+
+import json
+import os
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime
+from itertools import compress
+from typing import Callable, Dict, Iterator, List, Optional
+
+from app.extensions import db
+from app.models import AggregateSnapshot, PhoneLink
+from app.services.analytics_service import analytics_service, invalid_phone_mask, normalize_phones
+from app.services.pattern_service import PHONE_SHARE_THRESHOLD
+
+PHONE_INDEX_SNAPSHOT = 'phone_index'
+
+DEFAULT_PARTITIONS = 64
+
+# Records read per column batch
+BATCH_SIZE = 10000
+
+# Rows buffered across all partitions before they are written out
+SPILL_BUFFER_ROWS = 50000
+
+# Fewest records sharing a number in a state before it is indexed
+MIN_INDEXED_RECORDS = 2
+
+# Rows per bulk insert
+INSERT_BATCH_SIZE = 5000
+
+
+class SpillPartitions:
+    """Lines appended to `count` files by a hash of their key, read back one partition at a time."""
+
+    def __init__(self, directory: str, count: int):
+        self.count = count
+        self.rows = [0] * count
+        self._paths = [os.path.join(directory, f'part-{i:04d}.tsv') for i in range(count)]
+        self._files = [open(path, 'w', encoding='utf-8') for path in self._paths]
+        self._buffers: List[List[str]] = [[] for _ in range(count)]
+        self._buffered = 0
+
+    def add(self, key: str, line: str):
+        self._buffers[hash(key) % self.count].append(line)
+        self._buffered += 1
+        if self._buffered >= SPILL_BUFFER_ROWS:
+            self.flush()
+
+    def flush(self):
+        for index, buffer in enumerate(self._buffers):
+            if buffer:
+                self._files[index].writelines(buffer)
+                self.rows[index] += len(buffer)
+                buffer.clear()
+        self._buffered = 0
+
+    def close(self):
+        self.flush()
+        for f in self._files:
+            f.close()
+
+    def read(self, index: int) -> Iterator[str]:
+        with open(self._paths[index], encoding='utf-8') as f:
+            yield from f
+
+
+def count_partition(lines: Callable[[], Iterator[str]], min_records: int = MIN_INDEXED_RECORDS) -> Dict:
+    """
+    Count one partition of "phone\\tstate\\tid" lines.
+
+    `lines` is called once per pass: the first counts records per (phone,
+    state), the second collects distinct IDs only for the keys that reach
+    min_records.
+    """
+    counts = Counter(line[:line.rindex('\t')] for line in lines())
+    shared = {key for key, count in counts.items() if count >= min_records}
+    ids: Dict[str, set] = {key: set() for key in shared}
+    if shared:
+        for line in lines():
+            key, _, aadhaar_id = line.rstrip('\n').rpartition('\t')
+            if key in ids:
+                ids[key].add(aadhaar_id)
+    links = []
+    for key in shared:
+        phone, state = key.split('\t', 1)
+        links.append({'phone': phone, 'state': state, 'records': counts[key], 'aadhaar_ids': len(ids[key])})
+    return {'links': links, 'numbers': len({key[:key.index('\t')] for key in counts})}
+
+
+class PhoneIndexService:
+    """Builds the phone index from the data files and answers threshold queries."""
+
+    def build(self, data_dir: Optional[str], spill_dir: Optional[str] = None,
+              partitions: int = DEFAULT_PARTITIONS,
+              progress: Optional[Callable[[str, float, int], None]] = None) -> Dict:
+        """Rebuild the index (and the invalid-phone counts of the same pass), replacing the stored one."""
+        started = time.perf_counter()
+        files = analytics_service.list_data_files(data_dir)
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+
+        records = with_phone = 0
+        invalid_by_state = Counter()
+        links: List[Dict] = []
+        numbers = 0
+        with tempfile.TemporaryDirectory(prefix='phone-index-', dir=spill_dir) as directory:
+            spill = SpillPartitions(directory, partitions)
+            try:
+                for position, path in enumerate(files):
+                    batch = []
+                    for record in analytics_service.iter_records(path):
+                        batch.append(record)
+                        if len(batch) >= BATCH_SIZE:
+                            with_phone += self._spill_batch(batch, spill, invalid_by_state)
+                            records += len(batch)
+                            batch = []
+                    if batch:
+                        with_phone += self._spill_batch(batch, spill, invalid_by_state)
+                        records += len(batch)
+                    if progress:
+                        progress(f'partitioning {os.path.basename(path)}', 0.7 * (position + 1) / len(files), records)
+            finally:
+                spill.close()
+            partitioned = time.perf_counter()
+
+            for index in range(partitions):
+                counted = count_partition(lambda: spill.read(index))
+                links.extend(counted['links'])
+                numbers += counted['numbers']
+                if progress and index % 8 == 7:
+                    progress('counting partitions', 0.7 + 0.25 * (index + 1) / partitions, records)
+            largest = max(spill.rows) if spill.rows else 0
+
+        summary = {
+            'records': records,
+            'records_with_phone': with_phone,
+            'invalid_phone': sum(invalid_by_state.values()),
+            'invalid_phone_by_state': dict(invalid_by_state),
+            'distinct_numbers': numbers,
+            'indexed_links': len(links),
+            'partitions': partitions,
+            'largest_partition_rows': largest,
+            'partition_seconds': round(partitioned - started, 3),
+            'count_seconds': round(time.perf_counter() - partitioned, 3),
+            'built_at': datetime.utcnow().isoformat()
+        }
+        self._store(links, summary)
+        if progress:
+            progress('completed', 1.0, records)
+        return summary
+
+    def _spill_batch(self, batch: List[Dict[str, str]], spill: SpillPartitions, invalid_by_state: Counter) -> int:
+        """Partition one column batch, counting its invalid phones per state; returns rows spilled."""
+        raw = [record.get('phone', '') for record in batch]
+        states = [record.get('state') or 'Unknown' for record in batch]
+        normalized = normalize_phones(raw)
+        invalid_by_state.update(compress(states, invalid_phone_mask(raw, normalized)))
+        spilled = 0
+        for phone, state, record in zip(normalized, states, batch):
+            if phone:
+                spill.add(phone, f"{phone}\t{state}\t{record.get('aadhaar_id', '')}\n")
+                spilled += 1
+        return spilled
+
+    def _store(self, links: List[Dict], summary: Dict):
+        db.session.execute(db.delete(PhoneLink))
+        for start in range(0, len(links), INSERT_BATCH_SIZE):
+            db.session.execute(db.insert(PhoneLink), links[start:start + INSERT_BATCH_SIZE])
+        data = json.dumps(summary)
+        snapshot = db.session.get(AggregateSnapshot, PHONE_INDEX_SNAPSHOT)
+        if snapshot is None:
+            db.session.add(AggregateSnapshot(name=PHONE_INDEX_SNAPSHOT, data=data))
+        else:
+            snapshot.data = data
+            snapshot.updated_at = datetime.utcnow()
+        db.session.commit()
+
+    def summary(self) -> Optional[Dict]:
+        """Totals of the latest build, or None before the first one."""
+        snapshot = db.session.get(AggregateSnapshot, PHONE_INDEX_SNAPSHOT)
+        return json.loads(snapshot.data) if snapshot else None
+
+    def shared(self, min_records: int = PHONE_SHARE_THRESHOLD, state: Optional[str] = None,
+               limit: int = 100) -> List[Dict]:
+        """Numbers linked to at least min_records records of one state, most shared first."""
+        query = db.select(PhoneLink).where(PhoneLink.records >= max(min_records, MIN_INDEXED_RECORDS))
+        if state:
+            query = query.where(PhoneLink.state == state)
+        query = query.order_by(PhoneLink.records.desc(), PhoneLink.phone).limit(limit)
+        return [link.to_dict() for link in db.session.execute(query).scalars()]
+
+    def by_state(self, min_records: int = PHONE_SHARE_THRESHOLD) -> List[Dict]:
+        """Per state, how many numbers reach min_records, the records they cover and the largest count."""
+        rows = db.session.execute(
+            db.select(PhoneLink.state, db.func.count(), db.func.sum(PhoneLink.records), db.func.max(PhoneLink.records))
+            .where(PhoneLink.records >= max(min_records, MIN_INDEXED_RECORDS))
+            .group_by(PhoneLink.state)
+            .order_by(db.func.sum(PhoneLink.records).desc())
+        ).all()
+        return [{'state': state, 'numbers': numbers, 'records': records, 'max_records': top}
+                for state, numbers, records, top in rows]
+
+
+# Singleton instance
+phone_index_service = PhoneIndexService()
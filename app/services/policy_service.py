@@ -0,0 +1,293 @@
+"""
+Policy Service
+Rule-driven policy recommendations derived from the anomaly aggregates.
+
+Rules are evaluated once per aggregate refresh and the output is stored as
+the 'policies' snapshot. Each process keeps an id-indexed copy that is only
+rebuilt when the snapshot changes, so list and detail requests are lookups.
+"""
+
+import json
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from app.extensions import db
+from app.models import AggregateSnapshot
+from app.services.analytics_service import district_mismatch
+from app.services.district_normalizer import district_normalizer
+
+POLICY_SNAPSHOT = 'policies'
+
+SEVERITY_ORDER = {'critical': 0, 'high': 1, 'medium': 2, 'low': 3}
+
+# Minimum affected share of records (percent) for each severity
+SEVERITY_THRESHOLDS = [(5.0, 'critical'), (2.0, 'high'), (0.5, 'medium'), (0.0, 'low')]
+
+# States named in a policy's reason
+TOP_STATES = 3
+
+# Lowest match score of a mismatched district's suggested mapping that counts as a bulk correction
+CORRECTION_CONFIDENCE = 0.8
+
+# Suggested district-state corrections listed on a policy
+TOP_CORRECTIONS = 20
+
+POLICY_RULES = [
+    {
+        "id": 1,
+        "title": "PIN Code Validation & Correction",
+        "anomaly_types": ["invalid_pincodes"],
+        "reason": "{rate:.1f}% of records have invalid PIN codes that don't match state/district mapping",
+        "steps": [
+            "Export all records with PIN code mismatches",
+            "Cross-reference with India Post PIN database",
+            "Generate correction candidates using fuzzy matching",
+            "Queue corrected records for operator verification",
+            "Update database after manual approval"
+        ],
+        "executor": "System + Operator",
+        "expected_outcome": "95% PIN code accuracy improvement"
+    },
+    {
+        "id": 2,
+        "title": "Duplicate Aadhaar ID Resolution",
+        "anomaly_types": ["duplicate_ids"],
+        "reason": "{rate:.1f}% records flagged as potential duplicates of an existing Aadhaar ID",
+        "steps": [
+            "Run biometric matching algorithm on flagged records",
+            "Generate duplicate pairs with similarity scores",
+            "Present to verification team for manual review",
+            "Merge/invalidate confirmed duplicates",
+            "Generate audit trail for compliance"
+        ],
+        "executor": "Admin + Verification Team",
+        "expected_outcome": "Eliminate duplicate entries, improve data integrity"
+    },
+    {
+        "id": 3,
+        "title": "Mobile OTP Re-confirmation",
+        "anomaly_types": ["invalid_phone"],
+        "include_shared_phones": True,
+        "reason": "{rate:.1f}% of records have invalid phone formats or multiple Aadhaar linked to same number",
+        "steps": [
+            "Identify all records with phone format issues",
+            "Send OTP to registered numbers for re-verification",
+            "Mark non-responsive records for manual outreach",
+            "Update phone numbers post verification",
+            "Generate compliance report"
+        ],
+        "executor": "System + Call Center",
+        "expected_outcome": "Valid phone linkage for 98% records"
+    },
+    {
+        "id": 4,
+        "title": "DOB Missing/Invalid Correction",
+        "anomaly_types": ["missing_dob", "impossible_age"],
+        "reason": "{rate:.1f}% records have missing or impossible DOB values",
+        "steps": [
+            "Extract records with DOB issues",
+            "Cross-reference with enrollment documents",
+            "Request document re-submission where needed",
+            "Apply age validation rules",
+            "Update corrected DOB values"
+        ],
+        "executor": "Operator",
+        "expected_outcome": "Complete DOB coverage with validation"
+    },
+    {
+        "id": 5,
+        "title": "District-State Mapping Correction",
+        "anomaly_types": ["district_mismatch"],
+        "reason": "{rate:.1f}% records have district names not matching their assigned states",
+        "steps": [
+            "Run district-state validation check",
+            "Generate list of mismatched records",
+            "Use address parsing to determine correct mapping",
+            "Apply bulk corrections for high-confidence matches",
+            "Queue ambiguous cases for manual review"
+        ],
+        "executor": "System + Operator",
+        "expected_outcome": "100% correct district-state mapping",
+        "include_district_corrections": True
+    },
+    {
+        "id": 6,
+        "title": "Gender Field Standardisation",
+        "anomaly_types": ["inconsistent_gender"],
+        "reason": "{rate:.1f}% records have gender values outside the standard codes",
+        "steps": [
+            "Extract records with non-standard gender values",
+            "Map known variants to standard codes automatically",
+            "Queue unmapped values for operator review",
+            "Update enrolment client validation rules",
+            "Track recurrence by enrolment centre"
+        ],
+        "executor": "System + Operator",
+        "expected_outcome": "Standard gender codes for all records"
+    }
+]
+
+
+def severity_for(rate: float) -> str:
+    """Severity of a policy whose anomalies affect `rate` percent of records."""
+    for threshold, severity in SEVERITY_THRESHOLDS:
+        if rate >= threshold:
+            return severity
+    return 'low'
+
+
+def district_corrections(accumulator) -> Dict:
+    """
+    Suggested mappings for the mismatched (state, district) pairs.
+
+    Each distinct district spelling is resolved once across all states. A
+    unique match scoring at least CORRECTION_CONFIDENCE is a bulk
+    correction; the rest need manual review.
+    """
+    mismatched = {
+        (state, district): count
+        for (state, district), count in accumulator.district_records.items()
+        if district_mismatch(state, district)
+    }
+    matches = district_normalizer.resolve_many((district, None) for _, district in mismatched)
+    high_confidence, manual_review = 0, 0
+    suggestions = []
+    for (state, district), count in mismatched.items():
+        match = matches[(district, None)]
+        if match is None or match.score < CORRECTION_CONFIDENCE:
+            manual_review += count
+            continue
+        high_confidence += count
+        suggestions.append({
+            "state": state,
+            "district": district,
+            "records": count,
+            "suggested_state": match.state,
+            "suggested_district": match.district,
+            "confidence": match.score
+        })
+    suggestions.sort(key=lambda s: s['records'], reverse=True)
+    return {
+        "high_confidence_records": high_confidence,
+        "manual_review_records": manual_review,
+        "suggestions": suggestions[:TOP_CORRECTIONS]
+    }
+
+
+def evaluate_rules(accumulator) -> List[Dict]:
+    """Evaluate every rule against an AnalysisAccumulator, most severe first."""
+    total = accumulator.total_records
+    shared_phones = {}
+    if any(rule.get('include_shared_phones') for rule in POLICY_RULES):
+        for state, phones in accumulator.patterns.shared_phones().items():
+            shared_phones[state] = sum(count for _, count in phones)
+
+    policies = []
+    for rule in POLICY_RULES:
+        by_state = {}
+        for state, type_counts in accumulator.state_type_counts.items():
+            count = sum(type_counts.get(kind, 0) for kind in rule['anomaly_types'])
+            if rule.get('include_shared_phones'):
+                count += shared_phones.get(state, 0)
+            if count:
+                by_state[state] = count
+        affected = sum(by_state.values())
+        if not affected or not total:
+            continue
+
+        rate = affected / total * 100
+        top_states = sorted(by_state.items(), key=lambda kv: kv[1], reverse=True)[:TOP_STATES]
+        reason = rule['reason'].format(rate=rate)
+        reason += ' (most affected: ' + ', '.join(state for state, _ in top_states) + ')'
+        policy = {
+            "id": rule['id'],
+            "title": rule['title'],
+            "severity": severity_for(rate),
+            "reason": reason,
+            "steps": rule['steps'],
+            "executor": rule['executor'],
+            "expected_outcome": rule['expected_outcome'],
+            "estimated_impact": affected,
+            "affected_rate": round(rate, 2),
+            "affected_states": [{"state": s, "count": c} for s, c in top_states]
+        }
+        if rule.get('include_district_corrections'):
+            policy["district_corrections"] = district_corrections(accumulator)
+        policies.append(policy)
+
+    policies.sort(key=lambda p: (SEVERITY_ORDER.get(p['severity'], 4), -p['estimated_impact']))
+    return policies
+
+
+class PolicyIndex:
+    """Precomputed recommendations indexed by id and by severity."""
+
+    def __init__(self, policies: List[Dict], generated_at: Optional[str] = None):
+        self.ordered = policies
+        self.by_id = {p['id']: p for p in policies}
+        self.by_severity: Dict[str, List[Dict]] = {}
+        for policy in policies:
+            self.by_severity.setdefault(policy['severity'], []).append(policy)
+        self.generated_at = generated_at
+
+
+class PolicyService:
+    """Refreshes and serves policy recommendations."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (snapshot updated_at, index) for this process
+        self._index = None
+
+    def refresh(self, accumulator):
+        """Re-evaluate the rules and store the result (caller commits)."""
+        now = datetime.utcnow()
+        data = json.dumps({
+            'generated_at': now.isoformat(),
+            'policies': evaluate_rules(accumulator)
+        })
+        snapshot = db.session.get(AggregateSnapshot, POLICY_SNAPSHOT)
+        if snapshot is None:
+            db.session.add(AggregateSnapshot(name=POLICY_SNAPSHOT, data=data, updated_at=now))
+        else:
+            snapshot.data = data
+            snapshot.updated_at = now
+
+    def index(self) -> PolicyIndex:
+        """The current index, rebuilt only when the snapshot has changed."""
+        updated_at = db.session.execute(
+            db.select(AggregateSnapshot.updated_at).where(AggregateSnapshot.name == POLICY_SNAPSHOT)
+        ).scalar()
+        cached = self._index
+        if cached and cached[0] == updated_at:
+            return cached[1]
+
+        with self._lock:
+            if updated_at is None:
+                # Nothing ingested yet
+                from app.services.mock_data import get_mock_policy_recommendations
+                policies = get_mock_policy_recommendations()
+                policies.sort(key=lambda p: SEVERITY_ORDER.get(p['severity'], 4))
+                index = PolicyIndex(policies)
+            else:
+                snapshot = db.session.get(AggregateSnapshot, POLICY_SNAPSHOT)
+                data = json.loads(snapshot.data)
+                index = PolicyIndex(data['policies'], data['generated_at'])
+            self._index = (updated_at, index)
+        return index
+
+    def recommendations(self, severity: Optional[str] = None) -> List[Dict]:
+        """Recommendations, most severe first, optionally for one severity."""
+        index = self.index()
+        if severity:
+            return index.by_severity.get(severity, [])
+        return index.ordered
+
+    def get(self, policy_id: int) -> Optional[Dict]:
+        """A single recommendation by id."""
+        return self.index().by_id.get(policy_id)
+
+
+# Singleton instance
+policy_service = PolicyService()
@@ -0,0 +1,138 @@
+"""
+Risk Service
+Scores every state and district with RiskPredictor when aggregates refresh.
+
+Scores are stored ranked in RiskScore together with their feature
+attributions, so the leaderboard and the map read an index instead of
+running the model (or the explainer) per request.
+"""
+
+import json
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from app.extensions import db
+from app.ml.explain import explain_batch
+from app.ml.model import predictor
+from app.models import RiskScore
+
+ALL = '*'
+
+# RiskPredictor prediction -> map severity
+RISK_SEVERITY = {
+    'High Risk Zone': 'high',
+    'Medium Risk Zone': 'medium',
+    'Low Risk Zone': 'low'
+}
+
+MAX_LEADERBOARD = 100
+
+
+def risk_features(state: str, records: int, anomalies: int, type_counts: Dict[str, int]) -> Dict:
+    """RiskPredictor features for one aggregate row."""
+    denominator = max(records, 1)
+    return {
+        'state': state,
+        'records': records,
+        'anomalies': anomalies,
+        'invalid_pin_rate': type_counts.get('invalid_pincodes', 0) / denominator,
+        'duplicate_rate': type_counts.get('duplicate_ids', 0) / denominator,
+        'missing_dob_rate': type_counts.get('missing_dob', 0) / denominator
+    }
+
+
+class RiskService:
+    """Precomputes and serves ranked risk scores."""
+
+    def _score_rows(self, scope: str, rows: List[Dict], now: datetime) -> List[Dict]:
+        scored = []
+        # Attributions are far costlier than scores, so they are computed in one batch here
+        attributions = explain_batch(predictor, [row['features'] for row in rows])
+        for row, explanation in zip(rows, attributions):
+            result = predictor.predict(row['features'])
+            scored.append({
+                'scope': scope,
+                'state': row['state'],
+                'district': row['district'],
+                'score': result['score'],
+                'prediction': result['prediction'],
+                'confidence': result['confidence'],
+                'records': row['features']['records'],
+                'anomalies': row['features']['anomalies'],
+                'top_features': json.dumps(result['top_features']),
+                'attributions': json.dumps(explanation),
+                'scored_at': now
+            })
+        # Ties go to the larger absolute problem
+        scored.sort(key=lambda r: (-r['score'], -r['anomalies'], r['state'], r['district']))
+        for rank, row in enumerate(scored, 1):
+            row['rank'] = rank
+        return scored
+
+    def refresh(self, accumulator):
+        """Re-score every state and district and replace the ranked table (caller commits)."""
+        now = datetime.utcnow()
+        state_rows = [
+            {
+                'state': state,
+                'district': ALL,
+                'features': risk_features(state, records, accumulator.state_anomalies.get(state, 0),
+                                          accumulator.state_type_counts.get(state, {}))
+            }
+            for state, records in accumulator.state_records.items() if records > 0
+        ]
+
+        district_types: Dict[tuple, Dict[str, int]] = {}
+        for (state, district, kind), count in accumulator.district_type_counts.items():
+            district_types.setdefault((state, district), {})[kind] = count
+        district_rows = [
+            {
+                'state': state,
+                'district': district,
+                'features': risk_features(state, records, accumulator.district_anomalies.get((state, district), 0),
+                                          district_types.get((state, district), {}))
+            }
+            for (state, district), records in accumulator.district_records.items() if records > 0
+        ]
+
+        rows = self._score_rows('state', state_rows, now) + self._score_rows('district', district_rows, now)
+        db.session.execute(db.delete(RiskScore))
+        if rows:
+            db.session.execute(db.insert(RiskScore), rows)
+
+    def leaderboard(self, k: int = 10, state: Optional[str] = None, scope: str = 'district',
+                    min_records: int = 0) -> List[Dict]:
+        """
+        Top-k riskiest districts (or states), optionally within one state.
+
+        min_records drops rows too small for their rates to mean much.
+        """
+        query = RiskScore.query.filter(RiskScore.scope == scope)
+        if state:
+            query = query.filter(RiskScore.state == state)
+        if min_records:
+            query = query.filter(RiskScore.records >= min_records)
+        return [row.to_dict() for row in query.order_by(RiskScore.rank).limit(min(k, MAX_LEADERBOARD))]
+
+    def state_map_row(self, stats, score: Optional[RiskScore]) -> Dict:
+        """One state's map colouring row: its StateStats overlaid with its risk score."""
+        return {
+            'state': stats.state,
+            'total_records': stats.total_records,
+            'total_anomalies': stats.total_anomalies,
+            'anomaly_rate': stats.anomaly_rate,
+            'severity': RISK_SEVERITY.get(score.prediction, 'low') if score else 'low',
+            'risk_score': score.score if score else None,
+            'risk_rank': score.rank if score else None
+        }
+
+    def state_scores_query(self):
+        return db.select(RiskScore).where(RiskScore.scope == 'state')
+
+    def state_scores(self) -> Dict[str, RiskScore]:
+        """State-level scores keyed by state name."""
+        return {row.state: row for row in db.session.execute(self.state_scores_query()).scalars()}
+
+
+# Singleton instance
+risk_service = RiskService()
@@ -0,0 +1,205 @@
+"""
+Sketch Service
+Approximate distinct counts and quantiles answered from mergeable sketches.
+
+Each ingested shard stores one HyperLogLog (distinct Aadhaar IDs) and one
+KLL sketch (ages) per month x state x district, plus state-wide and
+all-India rollups. A query merges the rows for its scope and date range, so
+any granularity is served without rescanning records, and removing a shard
+only deletes its rows.
+
+Error bounds: distinct counts have a relative standard error of
+1.04 / sqrt(2^HLL_PRECISION) (1.6%); the reported range is +/- 2 standard
+errors (~95%). Age quantiles are within about 1.7% in rank (99% confidence)
+at KLL_K = 200.
+"""
+
+import json
+import threading
+from collections import OrderedDict
+from datetime import date
+from typing import Dict, Optional, Tuple
+
+from app.extensions import db
+from app.models import ProcessedShard, SketchBucket
+from app.services.analytics_service import parse_date, record_age
+from app.services.sketches import HyperLogLog, KLLSketch
+
+HLL_PRECISION = 12
+KLL_K = 200
+
+ALL = '*'
+
+AGE_QUANTILES = {'p10': 0.1, 'p25': 0.25, 'p50': 0.5, 'p75': 0.75, 'p90': 0.9}
+
+# Merged query results kept per process
+CACHE_SIZE = 256
+
+
+def _month(day: Optional[date]) -> Optional[date]:
+    return day.replace(day=1) if day else None
+
+
+class ShardSketches:
+    """Sketches for one shard, built while the shard is scanned."""
+
+    def __init__(self):
+        # (month, state, district) -> [records, HyperLogLog, KLLSketch], with '*' rollups
+        self.cells: Dict[Tuple, list] = {}
+
+    def add(self, record: Dict[str, str], id_hash: Optional[int] = None):
+        """Add one normalised record; id_hash is the record's hashed Aadhaar ID."""
+        month = _month(parse_date(record.get('date')))
+        state = record.get('state') or 'Unknown'
+        keys = ((month, state, record.get('district') or 'Unknown'), (month, state, ALL), (month, ALL, ALL))
+        cells = []
+        for key in keys:
+            cell = self.cells.get(key)
+            if cell is None:
+                cell = self.cells[key] = [0, HyperLogLog(HLL_PRECISION), KLLSketch(KLL_K)]
+            cell[0] += 1
+            # HyperLogLog merges cost a full register pass, so rollups are fed directly
+            if id_hash is not None:
+                cell[1].add_hash(id_hash)
+            cells.append(cell)
+        age = record_age(record)
+        if age is not None and 0 <= age <= 150:
+            # KLL merges are cheap: ages go to the district cell and roll up in rows()
+            cells[0][2].add(age)
+
+    def rows(self, shard_id: int):
+        """Rows for SketchBucket, including the state-wide and all-India rollups."""
+        for (month, state, district), cell in self.cells.items():
+            if district != ALL:
+                self.cells[(month, state, ALL)][2].merge(cell[2])
+                self.cells[(month, ALL, ALL)][2].merge(cell[2])
+        for (month, state, district), (records, hll, kll) in self.cells.items():
+            yield {
+                'shard_id': shard_id,
+                'bucket': month,
+                'state': state,
+                'district': district,
+                'records': records,
+                'distinct_ids': json.dumps(hll.to_dict()),
+                'ages': json.dumps(kll.to_dict())
+            }
+
+    def save(self, shard_id: int):
+        """Insert this shard's rows (caller commits)."""
+        rows = list(self.rows(shard_id))
+        if rows:
+            db.session.execute(db.insert(SketchBucket), rows)
+
+
+class SketchService:
+    """Answers distinct-count and quantile queries from stored sketches."""
+
+    def __init__(self):
+        self._cache: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def delete_shard(self, shard_id: int):
+        """Remove a shard's sketches (caller commits)."""
+        db.session.execute(db.delete(SketchBucket).where(SketchBucket.shard_id == shard_id))
+
+    def _generation(self) -> Tuple:
+        # Any ingest changes the shard count or the latest processed_at
+        return tuple(db.session.execute(
+            db.select(db.func.count(ProcessedShard.id), db.func.max(ProcessedShard.processed_at))
+        ).one())
+
+    def merged(self, state: Optional[str] = None, district: Optional[str] = None,
+               date_from: Optional[date] = None, date_to: Optional[date] = None
+               ) -> Tuple[int, int, HyperLogLog, KLLSketch]:
+        """Records, buckets merged and the merged HyperLogLog and KLL sketch for a scope and date range."""
+        if not state:
+            district = None
+        query = db.select(SketchBucket.records, SketchBucket.distinct_ids, SketchBucket.ages).where(
+            SketchBucket.state == (state or ALL),
+            SketchBucket.district == (district or ALL)
+        )
+        if date_from:
+            query = query.where(SketchBucket.bucket >= _month(date_from))
+        if date_to:
+            query = query.where(SketchBucket.bucket <= date_to)
+
+        records = 0
+        buckets = 0
+        hll = HyperLogLog(HLL_PRECISION)
+        kll = KLLSketch(KLL_K)
+        for row_records, distinct_ids, ages in db.session.execute(query):
+            records += row_records
+            buckets += 1
+            hll.merge(HyperLogLog.from_dict(json.loads(distinct_ids)))
+            kll.merge(KLLSketch.from_dict(json.loads(ages)))
+        return records, buckets, hll, kll
+
+    def estimates(self, state: Optional[str] = None, district: Optional[str] = None,
+                  date_from: Optional[date] = None, date_to: Optional[date] = None) -> Dict:
+        """
+        Distinct Aadhaar IDs and age quantiles for a scope and date range.
+
+        Months are whole buckets: a range includes every month it overlaps.
+        Without a date range, undated records are included too.
+        """
+        if not state:
+            district = None
+        return self._cached(('estimates', state, district, date_from, date_to), lambda: describe_estimates(
+            *self.merged(state, district, date_from, date_to), state, district, date_from, date_to
+        ))
+
+    def partial(self, state: Optional[str] = None, district: Optional[str] = None,
+                date_from: Optional[date] = None, date_to: Optional[date] = None) -> Dict:
+        """The merged sketches of a scope, serialised for a coordinator to merge with other regions'."""
+        if not state:
+            district = None
+
+        def build():
+            records, buckets, hll, kll = self.merged(state, district, date_from, date_to)
+            return {'records': records, 'buckets': buckets, 'distinct_ids': hll.to_dict(), 'ages': kll.to_dict()}
+        return self._cached(('partial', state, district, date_from, date_to), build)
+
+    def _cached(self, key: Tuple, build) -> Dict:
+        key = key + (self._generation(),)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+        result = build()
+        with self._lock:
+            self._cache[key] = result
+            while len(self._cache) > CACHE_SIZE:
+                self._cache.popitem(last=False)
+        return result
+
+
+def describe_estimates(records: int, buckets: int, hll: HyperLogLog, kll: KLLSketch,
+                       state: Optional[str] = None, district: Optional[str] = None,
+                       date_from: Optional[date] = None, date_to: Optional[date] = None) -> Dict:
+    """The estimates payload for merged sketches (one node's, or several nodes' merged again)."""
+    distinct = hll.estimate() if buckets else 0
+    margin = 2 * hll.relative_error * distinct
+    quantiles = kll.quantiles(AGE_QUANTILES.values())
+    return {
+        'state': state,
+        'district': district,
+        'from': date_from.isoformat() if date_from else None,
+        'to': date_to.isoformat() if date_to else None,
+        'records': records,
+        'buckets_merged': buckets,
+        'distinct_ids': {
+            'estimate': distinct,
+            'low': max(0, round(distinct - margin)),
+            'high': round(distinct + margin),
+            'relative_error': round(hll.relative_error, 4)
+        },
+        'age_quantiles': {
+            name: value for name, value in zip(AGE_QUANTILES, quantiles)
+        },
+        'age_samples': kll.n,
+        'age_rank_error': round(kll.rank_error, 4)
+    }
+
+
+# Singleton instance
+sketch_service = SketchService()
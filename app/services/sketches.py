@@ -0,0 +1,333 @@
+"""
+Sketches
+Constant-memory, mergeable summaries for streaming aggregation.
+"""
+
+import base64
+import hashlib
+import math
+import operator
+import zlib
+from array import array
+from typing import Dict, Hashable, Iterable, List, Optional, Tuple
+
+# Count-min rows, each hashed with its own 4 bytes of one blake2b digest (at most 64 bytes)
+MAX_DEPTH = 16
+
+
+class CountMinSketch:
+    """
+    Count-min sketch with linear (add/subtract-able) updates.
+
+    estimate(x) never underestimates; with probability 1 - 2^-depth it
+    overestimates by at most e / width * N, where N is the total count added.
+    """
+
+    def __init__(self, width: int = 1 << 15, depth: int = 4):
+        if depth > MAX_DEPTH:
+            raise ValueError(f'depth must be at most {MAX_DEPTH}')
+        self.width = width
+        self.depth = depth
+        self.total = 0
+        self.table = array('q', bytes(8 * width * depth))
+
+    def _cells(self, key: str):
+        # Independent row hashes: CRC32 under different seeds differs only by a constant XOR for
+        # keys of one length, so keys colliding in one row would collide in every row
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=4 * self.depth).digest()
+        width = self.width
+        return [row * width + int.from_bytes(digest[4 * row:4 * row + 4], 'little') % width
+                for row in range(self.depth)]
+
+    def add(self, key: str, count: int = 1) -> int:
+        """Add count occurrences of key; returns its new estimate."""
+        table = self.table
+        estimate = None
+        for cell in self._cells(key):
+            table[cell] += count
+            if estimate is None or table[cell] < estimate:
+                estimate = table[cell]
+        self.total += count
+        return estimate
+
+    def estimate(self, key: str) -> int:
+        """Upper-bound estimate of key's count."""
+        table = self.table
+        return min(table[cell] for cell in self._cells(key))
+
+    def _check_compatible(self, other: 'CountMinSketch'):
+        if (self.width, self.depth) != (other.width, other.depth):
+            raise ValueError('Cannot combine count-min sketches of different shapes')
+
+    def merge(self, other: 'CountMinSketch') -> 'CountMinSketch':
+        """Add another sketch's counts into this one."""
+        self._check_compatible(other)
+        self.table = array('q', map(operator.add, self.table, other.table))
+        self.total += other.total
+        return self
+
+    def subtract(self, other: 'CountMinSketch') -> 'CountMinSketch':
+        """Remove a previously merged sketch's counts."""
+        self._check_compatible(other)
+        self.table = array('q', map(operator.sub, self.table, other.table))
+        self.total -= other.total
+        return self
+
+    def to_dict(self) -> Dict:
+        """Serialise to JSON-compatible types (table is zlib + base64 encoded)."""
+        return {
+            'width': self.width,
+            'depth': self.depth,
+            'total': self.total,
+            'table': base64.b64encode(zlib.compress(self.table.tobytes())).decode('ascii')
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'CountMinSketch':
+        """Rebuild a sketch serialised with to_dict()."""
+        sketch = cls(data['width'], data['depth'])
+        sketch.total = data['total']
+        sketch.table = array('q')
+        sketch.table.frombytes(zlib.decompress(base64.b64decode(data['table'])))
+        return sketch
+
+
+class HeavyHitters:
+    """
+    Misra-Gries frequent-items summary holding at most `capacity` counters.
+
+    Every item with true frequency above N / (capacity + 1) is retained, and
+    retained counts underestimate by at most that amount. Summaries merge by
+    adding counters and trimming back to capacity.
+    """
+
+    def __init__(self, capacity: int = 1024):
+        self.capacity = capacity
+        self.total = 0
+        self.counters: Dict[Hashable, int] = {}
+
+    def add(self, key: Hashable, count: int = 1):
+        """Add count occurrences of key."""
+        self.total += count
+        counters = self.counters
+        counters[key] = counters.get(key, 0) + count
+        if len(counters) > self.capacity:
+            self._trim()
+
+    def _trim(self):
+        counters = self.counters
+        if len(counters) <= self.capacity:
+            return
+        # Subtract the (capacity+1)-th largest count from every counter
+        cut = sorted(counters.values(), reverse=True)[self.capacity]
+        self.counters = {k: v - cut for k, v in counters.items() if v > cut}
+
+    def merge(self, other: 'HeavyHitters') -> 'HeavyHitters':
+        """Combine with another summary (error bounds add)."""
+        for key, count in other.counters.items():
+            self.counters[key] = self.counters.get(key, 0) + count
+        self.total += other.total
+        self._trim()
+        return self
+
+    def top(self, n: int = 10) -> List[Tuple[Hashable, int]]:
+        """The n largest retained counters."""
+        return sorted(self.counters.items(), key=lambda kv: kv[1], reverse=True)[:n]
+
+    def to_dict(self) -> Dict:
+        """Serialise to JSON-compatible types."""
+        return {'capacity': self.capacity, 'total': self.total, 'counters': self.counters}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'HeavyHitters':
+        """Rebuild a summary serialised with to_dict()."""
+        summary = cls(data['capacity'])
+        summary.total = data['total']
+        summary.counters = dict(data['counters'])
+        return summary
+
+
+class HyperLogLog:
+    """
+    HyperLogLog distinct counter over 64-bit hashes.
+
+    Uses 2^precision one-byte registers; the relative standard error is
+    1.04 / sqrt(2^precision) (about 1.6% at the default precision of 12).
+    Small cardinalities fall back to linear counting. Sketches merge by
+    taking the register-wise maximum, so the union of any shards or time
+    buckets has the same error bound as a single sketch.
+    """
+
+    def __init__(self, precision: int = 12):
+        if not 4 <= precision <= 16:
+            raise ValueError('precision must be between 4 and 16')
+        self.precision = precision
+        self.registers = bytearray(1 << precision)
+
+    @property
+    def relative_error(self) -> float:
+        """Relative standard error of estimate()."""
+        return 1.04 / math.sqrt(len(self.registers))
+
+    def add_hash(self, value: int):
+        """Add an item by its 64-bit hash (signed or unsigned)."""
+        value &= 0xFFFFFFFFFFFFFFFF
+        p = self.precision
+        index = value >> (64 - p)
+        rest = value & ((1 << (64 - p)) - 1)
+        # Position of the leftmost 1-bit in the remaining 64 - p bits
+        rank = (64 - p) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def estimate(self) -> int:
+        """Estimated number of distinct items added."""
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        total = 0.0
+        zeros = 0
+        for r in self.registers:
+            total += 2.0 ** -r
+            if not r:
+                zeros += 1
+        raw = alpha * m * m / total
+        if raw <= 2.5 * m and zeros:
+            return round(m * math.log(m / zeros))
+        return round(raw)
+
+    def merge(self, other: 'HyperLogLog') -> 'HyperLogLog':
+        """Union with another sketch of the same precision."""
+        if self.precision != other.precision:
+            raise ValueError('Cannot merge HyperLogLog sketches of different precision')
+        self.registers = bytearray(map(max, self.registers, other.registers))
+        return self
+
+    def to_dict(self) -> Dict:
+        """Serialise to JSON-compatible types (registers are zlib + base64 encoded)."""
+        return {
+            'precision': self.precision,
+            'registers': base64.b64encode(zlib.compress(bytes(self.registers))).decode('ascii')
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'HyperLogLog':
+        """Rebuild a sketch serialised with to_dict()."""
+        sketch = cls(data['precision'])
+        sketch.registers = bytearray(zlib.decompress(base64.b64decode(data['registers'])))
+        return sketch
+
+
+class KLLSketch:
+    """
+    KLL quantile sketch.
+
+    Keeps O(k log(n/k)) items in levels of compactors; an item at level h
+    stands for 2^h inputs. The normalised rank error is about 1.7% at the
+    default k=200 (with 99% confidence) and does not depend on n. Sketches
+    merge by concatenating levels and compacting. Compaction alternates the
+    kept half deterministically, so the same input always gives the same
+    sketch.
+    """
+
+    def __init__(self, k: int = 200):
+        self.k = k
+        self.n = 0
+        self.levels: List[List[float]] = [[]]
+        self._flips: List[int] = [0]
+        self._size = 0
+        self._limit = self._max_size()
+
+    @property
+    def rank_error(self) -> float:
+        """Approximate normalised rank error of quantile()."""
+        return 1.7 * 200 / self.k / 100
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self.levels) - level - 1
+        return max(2, int(math.ceil(self.k * (2 / 3) ** depth)))
+
+    def _max_size(self) -> int:
+        return sum(self._capacity(h) for h in range(len(self.levels)))
+
+    def add(self, value: float):
+        """Add one value."""
+        self.levels[0].append(value)
+        self.n += 1
+        self._size += 1
+        if self._size >= self._limit:
+            self._compress()
+
+    def _compress(self):
+        while self._size >= self._limit:
+            for h, items in enumerate(self.levels):
+                if len(items) >= self._capacity(h):
+                    break
+            else:
+                return
+            if h + 1 == len(self.levels):
+                self.levels.append([])
+                self._flips.append(0)
+                self._limit = self._max_size()
+            items.sort()
+            # An odd item out stays behind at this level
+            keep = [items.pop()] if len(items) % 2 else []
+            offset = self._flips[h]
+            self._flips[h] ^= 1
+            promoted = items[offset::2]
+            self.levels[h + 1].extend(promoted)
+            self.levels[h] = keep
+            self._size -= len(items) - len(promoted)
+
+    def merge(self, other: 'KLLSketch') -> 'KLLSketch':
+        """Combine with another sketch (the result summarises both inputs)."""
+        while len(self.levels) < len(other.levels):
+            self.levels.append([])
+            self._flips.append(0)
+        for h, items in enumerate(other.levels):
+            self.levels[h].extend(items)
+        self.n += other.n
+        self._size += other._size
+        self._limit = self._max_size()
+        self._compress()
+        return self
+
+    def quantiles(self, fractions: Iterable[float]) -> List[Optional[float]]:
+        """Values at the given ranks in [0, 1] (None for an empty sketch)."""
+        fractions = list(fractions)
+        if not self.n:
+            return [None] * len(fractions)
+        weighted = sorted(
+            (value, 1 << h) for h, items in enumerate(self.levels) for value in items
+        )
+        total = sum(w for _, w in weighted)
+        results = []
+        for fraction in fractions:
+            target = fraction * total
+            cumulative = 0
+            result = weighted[-1][0]
+            for value, weight in weighted:
+                cumulative += weight
+                if cumulative >= target:
+                    result = value
+                    break
+            results.append(result)
+        return results
+
+    def quantile(self, fraction: float) -> Optional[float]:
+        """Value at rank `fraction` in [0, 1]."""
+        return self.quantiles([fraction])[0]
+
+    def to_dict(self) -> Dict:
+        """Serialise to JSON-compatible types."""
+        return {'k': self.k, 'n': self.n, 'levels': self.levels, 'flips': self._flips}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'KLLSketch':
+        """Rebuild a sketch serialised with to_dict()."""
+        sketch = cls(data['k'])
+        sketch.n = data['n']
+        sketch.levels = [list(level) for level in data['levels']] or [[]]
+        sketch._flips = list(data.get('flips') or [0] * len(sketch.levels))
+        sketch._size = sum(len(level) for level in sketch.levels)
+        sketch._limit = sketch._max_size()
+        return sketch
@@ -0,0 +1,203 @@
+"""
+Trend Service
+Maintains the time-bucketed rollup cube and answers trend range queries from it.
+"""
+
+from collections import Counter
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import Select
+
+from app.extensions import db
+from app.models import TrendBucket
+from app.services.aggregate_store import DailyCounts
+from app.services.analytics_service import ANOMALOUS_KEY, ANOMALY_LABELS, RECORDS_KEY
+from app.services.pattern_service import SPIKE_WINDOW_DAYS, detect_spikes
+
+LEVELS = ('day', 'week', 'month')
+
+ALL = '*'
+
+# Largest span (in days) served from each level when granularity is 'auto'
+AUTO_LEVEL_MAX_DAYS = {'day': 92, 'week': 731}
+
+# Days before the latest bucket in which spikes are reported
+SPIKE_LOOKBACK_DAYS = 90
+
+
+def bucket_start(day: date, level: str) -> date:
+    """First day of the bucket containing `day` at the given level."""
+    if level == 'week':
+        return day - timedelta(days=day.weekday())
+    if level == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def choose_level(date_from: date, date_to: date) -> str:
+    """Pick the coarsest level that still gives a useful number of points."""
+    span = (date_to - date_from).days
+    for level in ('day', 'week'):
+        if span <= AUTO_LEVEL_MAX_DAYS[level]:
+            return level
+    return 'month'
+
+
+def expand_deltas(daily_counts: DailyCounts, sign: int = 1) -> Counter:
+    """
+    Roll daily (date, state, district, type) counts up to every cube cell they feed.
+
+    Each daily key contributes to 3 time levels x 3 geographic levels
+    (district, state-wide, all-India).
+    """
+    cells = Counter()
+    for (day, state, district, anomaly_type), count in daily_counts.items():
+        for level in LEVELS:
+            start = bucket_start(day, level)
+            for geo in ((state, district), (state, ALL), (ALL, ALL)):
+                cells[(level, start, geo[0], geo[1], anomaly_type)] += sign * count
+    return cells
+
+
+def apply_deltas(cells: Counter):
+    """Add signed counts to the cube, inserting missing cells (caller commits)."""
+    cells = {k: v for k, v in cells.items() if v}
+    if not cells:
+        return
+    rows = [
+        {'level': level, 'bucket': bucket, 'state': state, 'district': district,
+         'anomaly_type': anomaly_type, 'count': count}
+        for (level, bucket, state, district, anomaly_type), count in cells.items()
+    ]
+
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        # One statement executed many times keeps the compiled form cached
+        stmt = insert(TrendBucket)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['level', 'state', 'district', 'anomaly_type', 'bucket'],
+            set_={'count': TrendBucket.count + stmt.excluded.count}
+        )
+        db.session.connection().execute(stmt, rows)
+    else:
+        for row in rows:
+            existing = TrendBucket.query.filter_by(
+                level=row['level'], bucket=row['bucket'], state=row['state'],
+                district=row['district'], anomaly_type=row['anomaly_type']
+            ).first()
+            if existing:
+                existing.count += row['count']
+            else:
+                db.session.add(TrendBucket(**row))
+        db.session.flush()
+
+    # Cells emptied by a subtracted shard carry no information
+    if any(v < 0 for v in cells.values()):
+        db.session.execute(db.delete(TrendBucket).where(TrendBucket.count <= 0))
+
+
+def daily_cube(state: str = ALL, district: str = ALL) -> Counter:
+    """Day-level cells as a (date, type) -> count counter, used for verification."""
+    rows = db.session.execute(
+        db.select(TrendBucket.bucket, TrendBucket.anomaly_type, TrendBucket.count)
+        .where(TrendBucket.level == 'day', TrendBucket.state == state, TrendBucket.district == district)
+    )
+    return Counter({(b.isoformat(), t): c for b, t, c in rows})
+
+
+def recent_spikes(lookback_days: int = SPIKE_LOOKBACK_DAYS) -> List[Dict]:
+    """Rolling z-score spikes per district and anomaly type over the latest day cells."""
+    latest = db.session.execute(
+        db.select(db.func.max(TrendBucket.bucket)).where(TrendBucket.level == 'day')
+    ).scalar()
+    if latest is None:
+        return []
+    since = latest - timedelta(days=lookback_days)
+    rows = db.session.execute(
+        db.select(TrendBucket.state, TrendBucket.district, TrendBucket.anomaly_type,
+                  TrendBucket.bucket, TrendBucket.count)
+        .where(
+            TrendBucket.level == 'day',
+            TrendBucket.state != ALL,
+            TrendBucket.district != ALL,
+            TrendBucket.anomaly_type.in_(list(ANOMALY_LABELS)),
+            TrendBucket.bucket >= since - timedelta(days=SPIKE_WINDOW_DAYS)
+        )
+        .order_by(TrendBucket.state, TrendBucket.district, TrendBucket.anomaly_type, TrendBucket.bucket)
+        .execution_options(yield_per=5000)
+    )
+    cells = (((state, district, kind), bucket, count) for state, district, kind, bucket, count in rows)
+    return detect_spikes(cells, ANOMALY_LABELS, since=since)
+
+
+def trends_query(date_from: Optional[date] = None, date_to: Optional[date] = None,
+                 state: Optional[str] = None, district: Optional[str] = None,
+                 anomaly_type: Optional[str] = None, level: str = 'auto') -> Tuple[Select, Dict]:
+    """
+    The cube select for a trend range query, and the resolved parameters.
+
+    Buckets are whole periods: a week or month series includes every bucket
+    that overlaps [date_from, date_to].
+    """
+    date_to = date_to or date.today()
+    date_from = date_from or (date_to - timedelta(days=90))
+    if level == 'auto':
+        level = choose_level(date_from, date_to)
+    if level not in LEVELS:
+        raise ValueError(f'Invalid granularity: {level}')
+
+    if not state:
+        district = None
+    query = db.select(TrendBucket.bucket, TrendBucket.anomaly_type, TrendBucket.count).where(
+        TrendBucket.level == level,
+        TrendBucket.state == (state or ALL),
+        TrendBucket.district == (district or ALL),
+        TrendBucket.bucket >= bucket_start(date_from, level),
+        TrendBucket.bucket <= date_to
+    )
+    if anomaly_type:
+        query = query.where(TrendBucket.anomaly_type.in_([anomaly_type, RECORDS_KEY, ANOMALOUS_KEY]))
+
+    params = {
+        'granularity': level,
+        'from': date_from.isoformat(),
+        'to': date_to.isoformat(),
+        'state': state,
+        'district': district,
+        'anomaly_type': anomaly_type
+    }
+    return query.order_by(TrendBucket.bucket), params
+
+
+def trends_series(rows, params: Dict) -> Dict:
+    """Shape (bucket, anomaly_type, count) rows from trends_query into the API payload."""
+    by_bucket: Dict[date, Dict[str, int]] = {}
+    for bucket, kind, count in rows:
+        by_bucket.setdefault(bucket, {})[kind] = count
+
+    series = []
+    for bucket, counts in sorted(by_bucket.items()):
+        records = counts.pop(RECORDS_KEY, 0)
+        anomalous = counts.pop(ANOMALOUS_KEY, 0)
+        series.append({
+            'bucket': bucket.isoformat(),
+            'records': records,
+            'anomalies': anomalous,
+            'anomaly_rate': round(anomalous / records * 100, 2) if records else 0.0,
+            'by_type': {ANOMALY_LABELS.get(k, k): v for k, v in counts.items()}
+        })
+
+    return dict(params, series=series)
+
+
+def query_trends(date_from: Optional[date] = None, date_to: Optional[date] = None,
+                 state: Optional[str] = None, district: Optional[str] = None,
+                 anomaly_type: Optional[str] = None, level: str = 'auto') -> Dict:
+    """Time series of record and anomaly counts for a date range."""
+    query, params = trends_query(date_from, date_to, state, district, anomaly_type, level)
+    return trends_series(db.session.execute(query), params)
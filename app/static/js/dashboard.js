@@ -12,6 +12,7 @@ let statesLayer;
 let districtsLayer;
 let allDistrictsGeoJSON = null;
 let statesData = [];
+let summaryData = null;
 let districtChart;
 let isStateZoomed = false;
 
@@ -20,6 +21,7 @@ document.addEventListener('DOMContentLoaded', async () => {
     await loadSummary();
     await loadStatesData();
     initMap();
+    subscribeDashboardEvents();
 
     // Refresh button
     document.getElementById('refreshBtn')?.addEventListener('click', async () => {
@@ -43,30 +45,68 @@ async function loadSummary() {
         const result = await response.json();
 
         if (result.success) {
-            const data = result.data;
-
-            document.getElementById('totalRecords').textContent = formatNumber(data.total_records);
-            document.getElementById('totalAnomalies').textContent = formatNumber(data.total_anomalies);
-            document.getElementById('anomalyRate').textContent = `${data.anomaly_rate}%`;
-            document.getElementById('verifiedFixed').textContent = formatNumber(data.verified_fixed);
-            document.getElementById('pendingVerification').textContent = formatNumber(data.pending_verification);
-            document.getElementById('lastUpdated').textContent = new Date().toLocaleTimeString();
-
-            // Progress bar
-            const progressBar = document.getElementById('fixProgress');
-            if (progressBar) {
-                const progress = (data.verified_fixed / data.total_anomalies) * 100;
-                progressBar.style.width = `${progress}%`;
-            }
-
-            // Most affected states
-            renderAffectedStates(data.most_affected_states);
+            summaryData = result.data;
+            renderSummary(summaryData);
         }
     } catch (error) {
         console.error('Error loading summary:', error);
     }
 }
 
+function renderSummary(data) {
+    document.getElementById('totalRecords').textContent = formatNumber(data.total_records);
+    document.getElementById('totalAnomalies').textContent = formatNumber(data.total_anomalies);
+    document.getElementById('anomalyRate').textContent = `${data.anomaly_rate}%`;
+    document.getElementById('verifiedFixed').textContent = formatNumber(data.verified_fixed);
+    document.getElementById('pendingVerification').textContent = formatNumber(data.pending_verification);
+    document.getElementById('lastUpdated').textContent = new Date().toLocaleTimeString();
+
+    // Progress bar
+    const progressBar = document.getElementById('fixProgress');
+    if (progressBar) {
+        const progress = (data.verified_fixed / data.total_anomalies) * 100;
+        progressBar.style.width = `${progress}%`;
+    }
+
+    // Most affected states
+    renderAffectedStates(data.most_affected_states);
+}
+
+// Live deltas: patch the summary and map instead of refetching them
+function subscribeDashboardEvents() {
+    if (!window.EventSource) return;
+    const source = new EventSource('/api/events?topics=aggregates,anomalies');
+    source.addEventListener('aggregates', (e) => applyAggregatesDelta(JSON.parse(e.data)));
+    source.addEventListener('anomalies', (e) => applyAnomaliesDelta(JSON.parse(e.data)));
+    // Missed too many events: refetch everything
+    source.addEventListener('reset', async () => {
+        await loadSummary();
+        await loadStatesData();
+    });
+}
+
+function applyAggregatesDelta(delta) {
+    const removed = new Set(delta.removed_states || []);
+    statesData = statesData.filter(s => !removed.has(s.state));
+    delta.states.forEach(row => {
+        const index = statesData.findIndex(s => s.state === row.state);
+        if (index !== -1) {
+            statesData[index] = row;
+        } else {
+            statesData.push(row);
+        }
+    });
+    updateMapColors();
+    document.getElementById('lastUpdated').textContent = new Date().toLocaleTimeString();
+}
+
+function applyAnomaliesDelta(delta) {
+    if (!summaryData) return;
+    summaryData.total_anomalies += delta.count;
+    summaryData.anomaly_rate = Math.round(summaryData.total_anomalies / summaryData.total_records * 10000) / 100;
+    renderSummary(summaryData);
+}
+
 // Load all states data
 async function loadStatesData() {
     try {
@@ -155,6 +195,9 @@ function onEachState(feature, layer) {
             <p>Records: ${formatNumber(stateData.total_records)}</p>
             <p>Anomalies: ${formatNumber(stateData.total_anomalies)}</p>
             <p>Rate: ${stateData.anomaly_rate}%</p>`;
+        if (stateData.risk_score !== undefined && stateData.risk_score !== null) {
+            tooltipContent += `<p>Risk: ${stateData.risk_score} (#${stateData.risk_rank})</p>`;
+        }
     }
 
     tooltipContent += '</div>';
@@ -280,6 +323,37 @@ function showStatePanel(data) {
 
     // District chart
     renderDistrictChart(data.district_distribution);
+
+    loadStateEstimates(data.state);
+}
+
+// Approximate distinct IDs and median age from ingested sketches
+async function loadStateEstimates(state) {
+    const uniqueRow = document.getElementById('stateUniqueRow');
+    const ageRow = document.getElementById('stateAgeRow');
+    uniqueRow.style.display = 'none';
+    ageRow.style.display = 'none';
+
+    try {
+        const response = await fetch(`/api/dashboard/estimates?state=${encodeURIComponent(state)}`);
+        const result = await response.json();
+
+        if (result.success && result.data.buckets_merged > 0) {
+            const data = result.data;
+            const error = (data.distinct_ids.relative_error * 200).toFixed(1);
+            document.getElementById('stateUniqueIds').textContent =
+                `${formatNumber(data.distinct_ids.estimate)} (±${error}%)`;
+            uniqueRow.style.display = '';
+
+            if (data.age_quantiles.p50 !== null) {
+                document.getElementById('stateMedianAge').textContent =
+                    `${Math.round(data.age_quantiles.p50)} yrs`;
+                ageRow.style.display = '';
+            }
+        }
+    } catch (error) {
+        console.error('Error loading estimates:', error);
+    }
 }
 
 function hideStatePanel() {
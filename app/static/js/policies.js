@@ -103,11 +103,26 @@ function openPolicy(id) {
             <p><strong>Expected Outcome:</strong> ${currentPolicy.expected_outcome}</p>
             <p><strong>Estimated Impact:</strong> ${formatNumber(currentPolicy.estimated_impact)} records</p>
         </div>
+        ${renderCorrections(currentPolicy.district_corrections)}
     `;
 
     document.getElementById('policyModal').style.display = 'flex';
 }
 
+function renderCorrections(corrections) {
+    if (!corrections) return '';
+    return `
+        <div class="policy-detail-section">
+            <h4>Suggested Corrections</h4>
+            <p><strong>High confidence:</strong> ${formatNumber(corrections.high_confidence_records)} records
+               &middot; <strong>Manual review:</strong> ${formatNumber(corrections.manual_review_records)} records</p>
+            <ol class="steps-list">
+                ${corrections.suggestions.map(s => `<li>${s.district} (${s.state}) &rarr; ${s.suggested_district}, ${s.suggested_state}: ${formatNumber(s.records)} records</li>`).join('')}
+            </ol>
+        </div>
+    `;
+}
+
 function closeModal() {
     document.getElementById('policyModal').style.display = 'none';
     currentPolicy = null;
@@ -19,6 +19,7 @@ document.addEventListener('DOMContentLoaded', async () => {
     populateStateDropdown();
     await loadTasks();
     checkUrlParams();
+    subscribeTaskEvents();
 
     document.getElementById('addTaskBtn')?.addEventListener('click', () => openModal());
     document.getElementById('emptyAddBtn')?.addEventListener('click', () => openModal());
@@ -76,6 +77,29 @@ async function loadTasks() {
     }
 }
 
+// Live deltas from other users and tabs: patch the list instead of reloading it
+function subscribeTaskEvents() {
+    if (!window.EventSource) return;
+    const source = new EventSource('/api/events?topics=tasks');
+    source.addEventListener('tasks', (e) => applyTaskDelta(JSON.parse(e.data)));
+    // Missed too many events: reload the list
+    source.addEventListener('reset', () => loadTasks());
+}
+
+function applyTaskDelta(delta) {
+    const id = delta.op === 'delete' ? delta.id : delta.task.id;
+    const index = tasks.findIndex(t => t.id == id);
+    if (delta.op === 'delete') {
+        if (index !== -1) tasks.splice(index, 1);
+    } else if (index !== -1) {
+        tasks[index] = delta.task;
+    } else {
+        tasks.unshift(delta.task);
+    }
+    filterTasks();
+    updateStats();
+}
+
 function filterTasks() {
     const status = document.querySelector('#statusFilter .filter-btn.active')?.dataset.status || '';
     const priority = document.getElementById('priorityFilter').value;
@@ -203,7 +227,7 @@ async function handleSubmit(e) {
 
         if (result.success) {
             closeModal();
-            await loadTasks();
+            applyTaskDelta({ op: 'upsert', task: result.data });
         } else {
             alert('Error: ' + result.error);
         }
@@ -241,14 +265,16 @@ async function toggleStatus(id, done) {
     }
 
     try {
-        await fetch(`/todo/api/tasks/${id}`, {
+        const response = await fetch(`/todo/api/tasks/${id}`, {
             method: 'PATCH',
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify({ status: done ? 'done' : 'pending' })
         });
+        const result = await response.json();
+        if (!result.success) throw new Error(result.error);
 
-        // Wait a bit for animation to finish before consistent reload
-        setTimeout(loadTasks, 500);
+        // Wait a bit for animation to finish before applying the saved task
+        setTimeout(() => applyTaskDelta({ op: 'upsert', task: result.data }), 500);
 
     } catch (error) {
         console.error('Error updating status:', error);
@@ -0,0 +1,6 @@
+"""
+ASGI Entrypoint
+"""
+from app.asgi import create_asgi_app
+
+app = create_asgi_app()
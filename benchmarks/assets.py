@@ -0,0 +1,118 @@
+"""
+Asset benchmark: page weight and request count with the source files and with the built bundles.
+
+Every page is rendered twice in-process: with ASSETS_ENABLED off (the
+source stylesheets and scripts, libraries from their CDNs) and from a fresh
+`assets-build`. The stylesheets, scripts and the files their url()s
+reference are fetched the way a browser would, with
+`Accept-Encoding: br, gzip`.
+
+    python -m benchmarks.assets
+
+Reported per page and mode: requests on a first visit (to this server and
+to CDNs), bytes transferred from this server and their uncompressed size,
+and requests on a repeat visit, where anything not cached as immutable or
+with a max-age is revalidated. CDN responses are counted but not weighed;
+libraries in app/static/vendor are bundled and weighed with the page.
+"""
+
+import argparse
+import json
+import os
+import re
+import tempfile
+from typing import Dict, List, Optional
+
+from app import create_app
+from app.assets import build_assets
+from app.config import TestingConfig
+
+PAGES = {
+    'dashboard': '/',
+    'analysis': '/analysis/',
+    'prediction': '/prediction/',
+    'policies': '/policies/',
+    'todo': '/todo/'
+}
+
+STYLESHEETS = re.compile(r'<link\b(?=[^>]*rel="stylesheet")[^>]*href="([^"]+)"')
+SCRIPTS = re.compile(r'<script\b[^>]*src="([^"]+)"')
+CSS_URL = re.compile(r'url\(\s*[\'"]?([^\'")]+)[\'"]?\s*\)')
+
+ACCEPT = {'Accept-Encoding': 'br, gzip'}
+
+
+def cached(headers) -> bool:
+    """Whether a browser reuses the response without revalidating it."""
+    control = headers.get('Cache-Control', '')
+    if 'no-cache' in control or 'no-store' in control:
+        return False
+    match = re.search(r'max-age=(\d+)', control)
+    return 'immutable' in control or bool(match and int(match.group(1)) > 0)
+
+
+def page_weight(client, path: str) -> Dict:
+    page = client.get(path, headers=ACCEPT)
+    html = page.get_data()
+    result = {'requests': 1, 'cdn_requests': 0, 'transferred': len(html), 'raw': len(html),
+              'repeat_requests': 1}
+    queue = STYLESHEETS.findall(html.decode()) + SCRIPTS.findall(html.decode())
+    seen = set()
+    while queue:
+        url = queue.pop(0)
+        if url in seen or url.startswith('data:') or url.startswith('#'):
+            continue
+        seen.add(url)
+        if url.startswith(('http:', 'https:', '//')):
+            result['cdn_requests'] += 1
+            continue
+        response = client.get(url, headers=ACCEPT)
+        body = response.get_data()
+        result['requests'] += 1
+        result['transferred'] += len(body)
+        result['repeat_requests'] += not cached(response.headers)
+        plain = client.get(url).get_data() if response.headers.get('Content-Encoding') else body
+        result['raw'] += len(plain)
+        if url.split('?')[0].endswith('.css'):
+            base = url.rsplit('/', 1)[0]
+            queue += [ref if ref.startswith(('/', 'http:', 'https:', 'data:', '#')) else f'{base}/{ref}'
+                      for ref in CSS_URL.findall(plain.decode())]
+    return result
+
+
+def measure(directory: str, bundles: bool) -> List[Dict]:
+    assets_dir = os.path.join(directory, 'dist')
+
+    class PageConfig(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{os.path.join(directory, 'assets.db')}"
+        MODEL_DIR = None
+        ASSETS_ENABLED = bundles
+        ASSETS_DIR = assets_dir
+
+    app = create_app(PageConfig)
+    if bundles:
+        build_assets(app.static_folder, assets_dir)
+    client = app.test_client()
+    return [dict(page_weight(client, path), page=page, mode='bundles' if bundles else 'sources')
+            for page, path in PAGES.items()]
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--output', default=None, help='Write the results as JSON.')
+    options = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix='assets-') as directory:
+        results = measure(directory, bundles=False) + measure(directory, bundles=True)
+
+    print(f"\n{'page':<11} {'mode':<8} {'requests':>8} {'CDN':>4} {'transferred':>12} {'raw':>10} {'repeat':>7}")
+    for r in sorted(results, key=lambda r: (list(PAGES).index(r['page']), r['mode'] == 'bundles')):
+        print(f"{r['page']:<11} {r['mode']:<8} {r['requests']:>8} {r['cdn_requests']:>4} "
+              f"{r['transferred'] / 1024:>9.1f} KB {r['raw'] / 1024:>7.1f} KB {r['repeat_requests']:>7}")
+    if options.output:
+        with open(options.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,372 @@
+"""
+Route benchmarks: latency (min/median/mean/max) and throughput (ops) per endpoint.
+"""
+
+import pytest
+
+from benchmarks.conftest import wait_for_jobs
+
+READ_ROUTES = [
+    '/api/dashboard/summary',
+    '/api/dashboard/states',
+    '/api/dashboard/state?state=Maharashtra',
+    '/api/dashboard/state/districts?state=Maharashtra',
+    '/api/dashboard/trends',
+    '/api/dashboard/trends?state=Maharashtra&granularity=day',
+    '/api/dashboard/bootstrap',
+    '/api/dashboard/estimates',
+    '/api/dashboard/estimates?state=Maharashtra',
+    '/analysis/api/report',
+    '/analysis/api/anomalies',
+    '/analysis/api/anomalies?type=invalid_pincodes&page=2',
+    '/analysis/api/distributions',
+    '/analysis/api/jobs',
+    '/prediction/api/states',
+    '/prediction/api/leaderboard?k=20',
+    '/prediction/api/leaderboard?k=20&state=Maharashtra&min_records=10',
+    '/prediction/api/cache',
+    '/policies/api/recommendations',
+    '/policies/api/recommendations?severity=high',
+    '/policies/api/policy/1',
+    '/todo/api/tasks',
+    '/todo/api/tasks?status=pending',
+    '/todo/api/tasks/stats',
+    '/metrics'
+]
+
+PAGES = ['/', '/analysis/', '/prediction/', '/policies/', '/todo/']
+
+# Routes timed with METRICS_ENABLED on and off. Instrumentation costs a fixed 8-12 µs a request,
+# asserted to be under 2% of the median of the routes taking a millisecond or more
+METRICS_OVERHEAD_ROUTES = [
+    '/api/dashboard/states',
+    '/analysis/api/report',
+    '/prediction/api/states',
+    '/todo/api/tasks'
+]
+METRICS_OVERHEAD_LIMITED_ROUTES = ['/api/dashboard/states', '/analysis/api/report', '/todo/api/tasks']
+METRICS_OVERHEAD_LIMIT = 1.02
+METRICS_OVERHEAD_ROUNDS = 300
+METRICS_OVERHEAD_REQUESTS = 5
+METRICS_OVERHEAD_ATTEMPTS = 3
+
+PREDICT_BODY = {
+    'state': 'Maharashtra',
+    'records': 120000,
+    'anomalies': 4100,
+    'invalid_pin_rate': 0.012,
+    'duplicate_rate': 0.004,
+    'missing_dob_rate': 0.02
+}
+
+
+def fetch(client, path):
+    response = client.get(path)
+    # Read the whole body so streamed responses are timed to the last byte
+    response.get_data()
+    return response
+
+
+@pytest.mark.parametrize('path', READ_ROUTES)
+def test_read_route(benchmark, client, path):
+    response = benchmark(fetch, client, path)
+    assert response.status_code == 200
+
+
+@pytest.fixture(scope='module')
+def unmetered_app(app):
+    """The benchmark app's configuration and database with METRICS_ENABLED off."""
+    from types import SimpleNamespace
+    from app import create_app
+    from app.events import event_broker
+    from app.services.anomaly_log_writer import anomaly_log_writer
+    config = {key: value for key, value in app.config.items() if key.isupper()}
+    unmetered = create_app(SimpleNamespace(**dict(config, METRICS_ENABLED=False)))
+    # create_app binds these to the newest app; give them back to the benchmark app
+    anomaly_log_writer.configure(app)
+    event_broker.configure(app)
+    return unmetered
+
+
+@pytest.mark.parametrize('metrics', [True, False], ids=['metrics-on', 'metrics-off'])
+@pytest.mark.parametrize('path', METRICS_OVERHEAD_ROUTES)
+def test_metrics_overhead(benchmark, client, unmetered_app, path, metrics):
+    # Compare the medians within each group (--benchmark-group-by=group)
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+    from app import instrumentation
+    benchmark.group = f'metrics overhead {path}'
+    if metrics:
+        response = benchmark(fetch, client, path)
+    else:
+        # The cursor hooks are installed on every Engine; lift them so the off side pays nothing
+        for name, hook, _ in instrumentation.CURSOR_HOOKS:
+            event.remove(Engine, name, hook)
+        try:
+            response = benchmark(fetch, unmetered_app.test_client(), path)
+        finally:
+            for name, hook, retval in instrumentation.CURSOR_HOOKS:
+                event.listen(Engine, name, hook, retval=retval)
+    assert response.status_code == 200
+
+
+@pytest.mark.parametrize('path', METRICS_OVERHEAD_LIMITED_ROUTES)
+def test_metrics_overhead_ratio(client, unmetered_app, path):
+    """Median ratio of the time with metrics on to off, the two alternating so drift hits both alike."""
+    import gc
+    import random
+    import statistics
+    import time
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+    from app import instrumentation
+    sides = {True: client, False: unmetered_app.test_client()}
+    rng = random.Random(0)
+
+    def measure():
+        timings = {True: [], False: []}
+        # CPU time of this thread: other processes and stray collections would outweigh a 2% difference
+        gc.collect()
+        gc.disable()
+        try:
+            for _ in range(METRICS_OVERHEAD_ROUNDS):
+                for metered in rng.sample([True, False], 2):
+                    if not metered:
+                        for name, hook, _ in instrumentation.CURSOR_HOOKS:
+                            event.remove(Engine, name, hook)
+                    try:
+                        started = time.thread_time()
+                        for _ in range(METRICS_OVERHEAD_REQUESTS):
+                            fetch(sides[metered], path)
+                        timings[metered].append(time.thread_time() - started)
+                    finally:
+                        if not metered:
+                            for name, hook, retval in instrumentation.CURSOR_HOOKS:
+                                event.listen(Engine, name, hook, retval=retval)
+        finally:
+            gc.enable()
+        # Each round's ratio: the two sides of a round ran back to back, under the same conditions
+        return statistics.median(on / off for on, off in zip(timings[True], timings[False]))
+
+    # A run over the limit is retried: noise rarely lands on the same side three times, a real regression does
+    ratio = measure()
+    for _ in range(METRICS_OVERHEAD_ATTEMPTS - 1):
+        if ratio < METRICS_OVERHEAD_LIMIT:
+            break
+        ratio = min(ratio, measure())
+    assert ratio < METRICS_OVERHEAD_LIMIT, f'{path}: metrics add {ratio - 1:.1%} to the median'
+
+
+@pytest.mark.parametrize('path', PAGES)
+def test_page(benchmark, client, path):
+    response = benchmark(fetch, client, path)
+    assert response.status_code == 200
+
+
+@pytest.mark.parametrize('fmt', ['ndjson', 'csv'])
+def test_export(benchmark, client, fmt):
+    response = benchmark.pedantic(fetch, args=(client, f'/analysis/api/anomalies/export?format={fmt}'),
+                                  rounds=5, iterations=1)
+    assert response.status_code == 200
+
+
+def test_export_to_date_is_inclusive(app, client):
+    from datetime import datetime
+    from app.extensions import db
+    from app.models import AnomalyLog
+    with app.app_context():
+        row = AnomalyLog(state='Export Test', anomaly_type='invalid_pincodes', detected_at=datetime(2024, 3, 31, 15))
+        db.session.add(row)
+        db.session.commit()
+        row_id = row.id
+    try:
+        def exported(to):
+            body = fetch(client, f'/analysis/api/anomalies/export?format=ndjson&state=Export+Test&to={to}').get_data()
+            return len(body.splitlines())
+        assert exported('2024-03-31') == 1
+        assert exported('2024-03-30') == 0
+        assert exported('2024-03-31T15:00:00') == 0
+    finally:
+        with app.app_context():
+            db.session.execute(db.delete(AnomalyLog).where(AnomalyLog.id == row_id))
+            db.session.commit()
+
+
+def test_job_status(benchmark, client):
+    job_id = client.get('/analysis/api/jobs').get_json()['data']['jobs'][0]['id']
+    response = benchmark(fetch, client, f'/analysis/api/jobs/{job_id}')
+    assert response.status_code == 200
+
+
+def test_submit_job(benchmark, app, client):
+    # An incremental run with no new files: measures submission plus a no-op ingest
+    def submit():
+        response = client.post('/analysis/api/jobs', json={'mode': 'incremental'})
+        wait_for_jobs(app)
+        return response
+
+    response = benchmark.pedantic(submit, rounds=5, iterations=1)
+    assert response.status_code in (200, 201, 202)
+
+
+@pytest.mark.parametrize('cached', [True, False], ids=['cache-hit', 'cache-miss'])
+def test_predict(benchmark, client, cached):
+    counter = iter(range(10 ** 9))
+
+    def predict():
+        body = dict(PREDICT_BODY)
+        if not cached:
+            body['records'] += next(counter)
+        return client.post('/prediction/api/predict', json=body)
+
+    response = benchmark(predict)
+    assert response.status_code == 200
+
+
+def test_predict_explain(benchmark, client):
+    response = benchmark(client.post, '/prediction/api/predict', json=dict(PREDICT_BODY, explain=True))
+    assert response.status_code == 200
+
+
+def test_quantized_explain_adds_up(app, client):
+    # With a quantum the score is that of the rounded rates; the attributions must explain that score
+    from app.ml.explain import BASELINE
+    from app.ml.model import prediction_cache, predictor
+    capacity, stripes, quantum = prediction_cache.capacity, len(prediction_cache._stripes), prediction_cache.quantum
+    prediction_cache.configure(capacity, stripes, quantum=0.05)
+    try:
+        body = dict(PREDICT_BODY, invalid_pin_rate=0.12, duplicate_rate=0.07, missing_dob_rate=0.13, explain=True)
+        data = client.post('/prediction/api/predict', json=body).get_json()['data']
+    finally:
+        prediction_cache.configure(capacity, stripes, quantum)
+    explained = predictor.score_rates(BASELINE) + sum(row['attribution'] for row in data['explanation']['attributions'])
+    assert abs(explained - data['score']) <= 0.006
+
+
+def test_task_crud(benchmark, client):
+    # One create, update and delete cycle
+    def cycle():
+        created = client.post('/todo/api/tasks', json={'title': 'Benchmark task', 'priority': 'high'})
+        task_id = created.get_json()['data']['id']
+        client.patch(f'/todo/api/tasks/{task_id}', json={'status': 'done'})
+        return client.delete(f'/todo/api/tasks/{task_id}')
+
+    response = benchmark(cycle)
+    assert response.status_code == 200
+
+
+def test_coalesced_report_burst(benchmark, app, monkeypatch):
+    # Concurrent report requests while building it is slow: the build should run about once per burst
+    import threading
+    import time
+    from app.routes import analysis
+    builds = []
+    load = analysis.load_latest_report
+
+    def slow_load():
+        builds.append(1)
+        time.sleep(0.2)
+        return load()
+
+    monkeypatch.setattr(analysis, 'load_latest_report', slow_load)
+    clients = 16
+
+    def burst():
+        barrier = threading.Barrier(clients)
+        statuses = []
+
+        def get():
+            client = app.test_client()
+            barrier.wait()
+            statuses.append(fetch(client, '/analysis/api/report').status_code)
+
+        threads = [threading.Thread(target=get) for _ in range(clients)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return statuses
+
+    statuses = benchmark.pedantic(burst, rounds=3, iterations=1)
+    assert statuses == [200] * clients
+    assert len(builds) <= 2 * 3
+
+
+def test_rate_limited_predict(app, client):
+    from app.request_control import RateLimiter
+    previous = app.extensions.get('rate_limiter')
+    app.extensions['rate_limiter'] = RateLimiter({'prediction': '5/60'})
+    try:
+        statuses = [client.post('/prediction/api/predict', json=PREDICT_BODY).status_code for _ in range(7)]
+        refused = client.post('/prediction/api/predict', json=PREDICT_BODY)
+    finally:
+        if previous is None:
+            app.extensions.pop('rate_limiter')
+        else:
+            app.extensions['rate_limiter'] = previous
+    assert statuses == [200] * 5 + [429] * 2
+    assert refused.status_code == 429 and int(refused.headers['Retry-After']) >= 1
+    assert refused.get_json()['success'] is False
+
+
+def test_rate_limit_per_forwarded_client():
+    # Behind one proxy every request arrives from the proxy; each client still gets its own bucket
+    from flask import Flask
+    from app.request_control import init_request_control, rate_limited
+    proxied = Flask(__name__)
+    proxied.config.update(PROXY_FIX_HOPS=1, RATE_LIMITS={'prediction': '2/60'})
+    proxied.add_url_rule('/limited', 'limited', rate_limited('prediction')(lambda: 'ok'))
+    init_request_control(proxied)
+    client = proxied.test_client()
+
+    def statuses(forwarded_for):
+        return [client.get('/limited', headers={'X-Forwarded-For': forwarded_for},
+                           environ_base={'REMOTE_ADDR': '10.0.0.1'}).status_code for _ in range(3)]
+
+    assert statuses('203.0.113.5') == [200, 200, 429]
+    assert statuses('198.51.100.7') == [200, 200, 429]
+
+
+def test_checks_version_change_rescans_shards(app, monkeypatch):
+    from app.services import ingest_service as ingest
+    with app.app_context():
+        current = ingest.ingest_service.plan(app.config['DATA_DIR'])
+        monkeypatch.setattr(ingest, 'CHECKS_VERSION', ingest.CHECKS_VERSION + 1)
+        outdated = ingest.ingest_service.plan(app.config['DATA_DIR'])
+    assert current['changed'] == [] and current['outdated'] == []
+    assert outdated['changed'] == outdated['outdated'] == sorted(current['unchanged'])
+
+
+def test_region_change_rescans_shards(app):
+    from app.services.analytics_service import analytics_service
+    from app.services.ingest_service import ingest_service
+    states = analytics_service.states
+    with app.app_context():
+        try:
+            analytics_service.configure(['Maharashtra'])
+            plan = ingest_service.plan(app.config['DATA_DIR'])
+        finally:
+            analytics_service.states = states
+    assert plan['outdated'] and plan['changed'] == plan['outdated'] and not plan['unchanged']
+
+
+@pytest.mark.slow
+def test_shared_phone_in_large_input():
+    # 80 of 300k records share a number, split across two shards merged the way ingest merges them
+    from app.services.analytics_service import AnalysisAccumulator
+    from app.services.pattern_service import PatternDetector
+    shared, records = '9999999999', 300_000
+    merged = PatternDetector()
+    for shard in range(2):
+        partial = PatternDetector()
+        partial.base = merged
+        for i in range(shard * records // 2, (shard + 1) * records // 2):
+            phone = shared if i % (records // 80) == 0 else f'7{i:09d}'
+            partial.observe({'state': 'Delhi'}, phone)
+        merged.merge(PatternDetector.from_dict(partial.to_dict()))
+    accumulator = AnalysisAccumulator()
+    accumulator.patterns = merged
+    [(phone, count)] = merged.shared_phones()['Delhi']
+    assert phone == shared and count >= 80
+    patterns = accumulator.to_report()['suspicious_patterns']
+    assert any(p['pattern'] == f'Same mobile number linked to {count}+ Aadhaar records in Delhi' for p in patterns)
\ No newline at end of file
@@ -0,0 +1,351 @@
+"""
+Micro-benchmarks for the model, the anomaly detectors and the aggregation kernels.
+"""
+
+import heapq
+import random
+import tracemalloc
+from collections import Counter
+from datetime import date, timedelta
+
+import pytest
+
+from app.ml.model import RiskPredictor, get_prediction, prediction_cache
+from app.services.aggregate_store import DailyCounts
+from app.services.district_normalizer import DistrictNormalizer
+from app.services.analytics_service import (
+    ANOMALY_LABELS, PHONE_RE, AnalysisAccumulator, analytics_service, check_record, invalid_phone_mask,
+    normalize_phone, normalize_phones
+)
+from app.services.ingest_service import id_hash
+from app.services.linkage_service import FIELDS as LINKAGE_FIELDS, MIN_PAIR_SCORE, features, linkage_service, similarity
+from app.services.mock_data import DISTRICTS_BY_STATE
+from app.services.pattern_service import PatternDetector, detect_spikes
+from app.services.phone_index import SpillPartitions, count_partition
+from app.services.sketches import HyperLogLog, KLLSketch
+from benchmarks.conftest import SCALES
+from benchmarks.synthetic import linkage_dataset, write_dataset
+
+FEATURES = {
+    'state': 'Maharashtra',
+    'records': 120000,
+    'anomalies': 4100,
+    'invalid_pin_rate': 0.012,
+    'duplicate_rate': 0.004,
+    'missing_dob_rate': 0.02
+}
+
+
+@pytest.fixture(scope='session')
+def records(scale, tmp_path_factory):
+    """Parsed records, as the detectors and accumulators receive them."""
+    directory = tmp_path_factory.mktemp(f'kernel-{scale}')
+    path = write_dataset(str(directory), SCALES[scale], files=1, seed=1)[0]
+    return list(analytics_service.iter_records(path))
+
+
+@pytest.fixture(scope='session')
+def flagged(records):
+    seen = set()
+    return [(record, check_record(record, seen)) for record in records]
+
+
+@pytest.mark.parametrize('layout', ['row', 'column'])
+def test_invalid_phone_check(benchmark, records, layout):
+    """The invalid_phone check per record, and as one column pass."""
+    phones = [record.get('phone') for record in records]
+
+    def per_row():
+        return [bool(p) and not PHONE_RE.match(normalize_phone(p)) for p in phones]
+
+    check = per_row if layout == 'row' else lambda: invalid_phone_mask(phones)
+    assert benchmark(check) == per_row()
+
+
+def test_phone_index_partitions(benchmark, records, tmp_path):
+    """Spill (phone, state, id) rows to hash partitions and count them one partition at a time."""
+    phones = normalize_phones([record.get('phone') for record in records])
+    rows = [(phone, record['state'], record['aadhaar_id']) for phone, record in zip(phones, records) if phone]
+
+    def build():
+        spill = SpillPartitions(str(tmp_path), 16)
+        for phone, state, aadhaar_id in rows:
+            spill.add(phone, f'{phone}\t{state}\t{aadhaar_id}\n')
+        spill.close()
+        return [link for index in range(spill.count) for link in count_partition(lambda: spill.read(index))['links']]
+
+    links = benchmark.pedantic(build, rounds=5)
+    expected = Counter((phone, state) for phone, state, _ in rows)
+    assert {(link['phone'], link['state']): link['records'] for link in links} == {
+        key: count for key, count in expected.items() if count >= 2}
+
+
+# Distinct (day, state, district, type) cells for the daily aggregate layouts
+DAILY_CELLS = 250_000
+
+
+@pytest.fixture(scope='session')
+def daily_cells():
+    """(day ISO, state, district, type, count) for DAILY_CELLS distinct cells."""
+    rng = random.Random(0)
+    districts = [(state, district) for state, names in DISTRICTS_BY_STATE.items() for district in names]
+    kinds = list(ANOMALY_LABELS)
+    start = date(2024, 1, 1)
+    cells = {}
+    while len(cells) < DAILY_CELLS:
+        state, district = rng.choice(districts)
+        day = (start + timedelta(days=rng.randrange(730))).isoformat()
+        cells[(day, state, district, rng.choice(kinds))] = rng.randint(1, 50)
+    return [key + (count,) for key, count in cells.items()]
+
+
+def build_counter(cells):
+    # The former layout: a Counter keyed by string tuples
+    counts = Counter()
+    for day, state, district, kind, count in cells:
+        counts[(day, state, district, kind)] += count
+    return counts
+
+
+def build_dicts(cells):
+    # Rows as JSON-ready dicts, the shape the API hands around
+    return [{'date': day, 'state': state, 'district': district, 'anomaly_type': kind, 'count': count}
+            for day, state, district, kind, count in cells]
+
+
+def build_store(cells):
+    store = DailyCounts()
+    for day, state, district, kind, count in cells:
+        store.add(date.fromisoformat(day), state, district, kind, count)
+    len(store)
+    return store
+
+
+DAILY_LAYOUTS = {'store': build_store, 'counter': build_counter, 'dicts': build_dicts}
+
+
+def accumulate(flagged_records):
+    accumulator = AnalysisAccumulator(track_daily=True)
+    for record, flags in flagged_records:
+        accumulator.add(record, flags)
+    accumulator.patterns.finish()
+    return accumulator
+
+
+def test_predict(benchmark):
+    predictor = RiskPredictor()
+    result = benchmark(predictor.predict, FEATURES)
+    assert 0 <= result['score'] <= 1
+
+
+def test_predict_batch(benchmark):
+    predictor = RiskPredictor()
+    rng = random.Random(0)
+    rows = [
+        {name: rng.random() * 0.1 for name in ('anomaly_rate', 'invalid_pin_rate', 'duplicate_rate',
+                                                 'missing_dob_rate')}
+        for _ in range(1000)
+    ]
+    scores = benchmark(predictor.predict_batch, rows)
+    assert len(scores) == len(rows)
+
+
+def test_prediction_cache_hit(benchmark):
+    prediction_cache.clear()
+    get_prediction(FEATURES)
+    benchmark(get_prediction, FEATURES)
+    assert prediction_cache.stats()['hits'] > 0
+
+
+def test_check_record(benchmark, records):
+    def detect():
+        seen = set()
+        return sum(len(check_record(record, seen)) for record in records)
+
+    flags = benchmark(detect)
+    assert flags > 0
+
+
+def test_accumulator_add(benchmark, flagged):
+    accumulator = benchmark(accumulate, flagged)
+    assert accumulator.total_records == len(flagged)
+
+
+def test_pattern_detector(benchmark, records):
+    def observe():
+        detector = PatternDetector()
+        for record in records:
+            detector.observe(record, normalize_phone(record.get('phone')))
+        detector.finish()
+        return detector
+
+    detector = benchmark(observe)
+    assert detector.shared_phones()
+
+
+def test_accumulator_merge(benchmark, flagged):
+    half = len(flagged) // 2
+    left = accumulate(flagged[:half]).to_dict()
+    right = accumulate(flagged[half:])
+
+    def setup():
+        return (AnalysisAccumulator.from_dict(left), right), {}
+
+    merged = benchmark.pedantic(AnalysisAccumulator.merge, setup=setup, rounds=20)
+    assert merged.total_records == len(flagged)
+
+
+def test_accumulator_round_trip(benchmark, flagged):
+    accumulator = accumulate(flagged)
+    restored = benchmark(lambda: AnalysisAccumulator.from_dict(accumulator.to_dict()))
+    assert restored.total_records == accumulator.total_records
+
+
+def test_to_report(benchmark, flagged):
+    accumulator = accumulate(flagged)
+    report = benchmark(accumulator.to_report)
+    assert report['total_records_analyzed'] == len(flagged)
+
+
+def test_detect_spikes(benchmark):
+    rng = random.Random(0)
+    start = date(2025, 1, 1)
+    cells = []
+    for series in range(700):
+        key = (f'State {series % 36}', f'District {series}', 'invalid_pincodes')
+        for offset in range(120):
+            count = rng.randint(0, 20) + (400 if offset == 100 and series % 50 == 0 else 0)
+            cells.append((key, start + timedelta(days=offset), count))
+    spikes = benchmark(detect_spikes, cells, ANOMALY_LABELS, start + timedelta(days=90))
+    assert spikes
+
+
+@pytest.mark.parametrize('layout', list(DAILY_LAYOUTS))
+def test_daily_counts_build(benchmark, daily_cells, layout):
+    """Build time, with the retained memory per million cells in extra_info."""
+    build = DAILY_LAYOUTS[layout]
+    tracemalloc.start()
+    # Fresh strings per cell, as parsed CSV fields would be; only what the layout keeps is counted
+    built = build([(''.join(day), ''.join(state), ''.join(district), kind, count)
+                   for day, state, district, kind, count in daily_cells])
+    retained = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    benchmark.extra_info['mib_per_million_rows'] = round(retained / len(daily_cells) * 1_000_000 / 2 ** 20, 1)
+    del built
+    result = benchmark.pedantic(build, args=(daily_cells,), rounds=3)
+    assert len(result) == len(daily_cells)
+
+
+@pytest.mark.parametrize('layout', ['store', 'counter'])
+def test_daily_counts_filter_top(benchmark, daily_cells, layout):
+    """One state's invalid-PIN and missing-DOB cells since a date, top 20 as JSON rows."""
+    built = DAILY_LAYOUTS[layout](daily_cells)
+    kinds = {'invalid_pincodes', 'missing_dob'}
+    since = date(2025, 1, 1)
+
+    if layout == 'store':
+        def query():
+            subset = built.filter(state='Maharashtra', kinds=kinds, date_from=since)
+            return subset.to_dicts(subset.top(20))
+    else:
+        def query():
+            matches = [(key, count) for key, count in built.items()
+                       if key[1] == 'Maharashtra' and key[3] in kinds and key[0] >= since.isoformat()]
+            return [{'date': day, 'state': state, 'district': district, 'anomaly_type': kind, 'count': count}
+                    for (day, state, district, kind), count in heapq.nlargest(20, matches, key=lambda m: m[1])]
+
+    rows = benchmark(query)
+    assert len(rows) == 20
+
+
+def test_district_resolve_column(benchmark):
+    """A 200k-row district column with ~2k distinct spellings, on a cold cache."""
+    rng = random.Random(0)
+    pairs = [(state, district) for state, names in DISTRICTS_BY_STATE.items() for district in names]
+    spellings = []
+    for _ in range(2000):
+        state, district = rng.choice(pairs)
+        chars = list(district)
+        position = rng.randrange(len(chars))
+        # A dropped or doubled letter, or a case change
+        chars[position] = rng.choice(['', chars[position] * 2, chars[position].swapcase()])
+        spellings.append((''.join(chars), state))
+    rows = [rng.choice(spellings) for _ in range(200_000)]
+    districts, states = [d for d, _ in rows], [s for _, s in rows]
+
+    def resolve():
+        return DistrictNormalizer().resolve_column(districts, states)
+
+    matches = benchmark(resolve)
+    assert sum(1 for m in matches if m) > len(matches) * 0.9
+
+
+# Records linked per run (at most), and the subset also compared all-pairs for recall
+LINKAGE_RECORDS = 20_000
+BRUTE_FORCE_RECORDS = 2_000
+
+
+@pytest.fixture(scope='session')
+def linkage_records(scale):
+    """FIELDS tuples with re-enrolled residents, and the true duplicate index pairs."""
+    rows, truth = linkage_dataset(min(SCALES[scale], LINKAGE_RECORDS), seed=3)
+    return [tuple(row.get(field, '') for field in LINKAGE_FIELDS) for row in rows], truth
+
+
+def test_linkage_candidate_pairs(benchmark, linkage_records):
+    """Blocked pair generation; pairs/s, reduction and recall against the injected duplicates in extra_info."""
+    records, truth = linkage_records
+    result = benchmark.pedantic(linkage_service.candidate_pairs, args=(records,), kwargs={'workers': 1}, rounds=3)
+    found = {(i, j) for _, i, j, _ in result['pairs']}
+    stats = result['stats']
+    if benchmark.stats:
+        # None under --benchmark-disable
+        benchmark.extra_info['compared_pairs_per_second'] = round(stats['compared_pairs'] / benchmark.stats['min'])
+    benchmark.extra_info['reduction_ratio'] = stats['reduction_ratio']
+    benchmark.extra_info['recall'] = round(len(found & truth) / len(truth), 4)
+    benchmark.extra_info['precision'] = round(len(found & truth) / len(found), 4)
+    assert len(found & truth) > len(truth) * 0.9
+
+
+def test_linkage_brute_force_recall(benchmark, linkage_records):
+    """All-pairs scoring of a subset with the same kernel, and the share of its matches blocking also finds."""
+    records = linkage_records[0][:BRUTE_FORCE_RECORDS]
+
+    def brute_force():
+        prepared = [features(record) for record in records]
+        return {(i, j) for i in range(len(prepared)) for j in range(i + 1, len(prepared))
+                if similarity(prepared[i], prepared[j])[0] >= MIN_PAIR_SCORE}
+
+    expected = benchmark.pedantic(brute_force, rounds=1)
+    blocked = {(i, j) for _, i, j, _ in linkage_service.candidate_pairs(records, workers=1)['pairs']}
+    if benchmark.stats:
+        benchmark.extra_info['all_pairs_per_second'] = round(len(records) * (len(records) - 1) / 2 / benchmark.stats['min'])
+    benchmark.extra_info['recall'] = round(len(blocked & expected) / len(expected), 4)
+    assert len(blocked & expected) >= len(expected) * 0.95
+
+
+def test_hyperloglog_add(benchmark):
+    hashes = [id_hash(str(100000000000 + i)) for i in range(10000)]
+
+    def add():
+        sketch = HyperLogLog()
+        for value in hashes:
+            sketch.add_hash(value)
+        return sketch
+
+    sketch = benchmark(add)
+    assert abs(sketch.estimate() - len(hashes)) < len(hashes) * 0.1
+
+
+def test_kll_add(benchmark):
+    rng = random.Random(0)
+    values = [rng.randint(0, 100) for _ in range(10000)]
+
+    def add():
+        sketch = KLLSketch()
+        for value in values:
+            sketch.add(value)
+        return sketch
+
+    sketch = benchmark(add)
+    assert 40 <= sketch.quantile(0.5) <= 60
@@ -0,0 +1,187 @@
+"""
+Cluster check: regional nodes behind a scatter-gather coordinator, against one national instance.
+
+A synthetic dataset is split by state into --nodes regions. Each region gets
+its own database, ingested with REGION_STATES set, and its own gunicorn
+server; a national instance ingests everything, and a coordinator runs with
+PARTITION_NODES pointing at the regions.
+
+    python -m benchmarks.cluster --nodes 3 --records 20000
+
+The coordinator's /api/cluster/* answers are compared with the national
+instance's: record counts, per-type anomaly counts (except duplicate IDs,
+which are detected within a region), trend series and distinct-ID
+estimates must match, and age quantiles must agree within the KLL error.
+Latency of each endpoint is reported for both, and one node is then stopped
+to check the coordinator degrades to a partial, flagged answer.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from typing import Dict, List, Optional
+
+from app.services.analytics_service import ANOMALY_LABELS
+from benchmarks.loadtest import ROOT, start_server, wait_ready
+
+DUPLICATE_LABEL = ANOMALY_LABELS['duplicate_ids']
+
+
+def get(port: int, path: str, params: Optional[Dict] = None) -> Dict:
+    query = urllib.parse.urlencode(params or {})
+    url = f'http://127.0.0.1:{port}{path}' + (f'?{query}' if query else '')
+    try:
+        with urllib.request.urlopen(url, timeout=60) as response:
+            return json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return json.loads(e.read())
+
+
+def timed(port: int, path: str, params: Optional[Dict], reps: int) -> float:
+    """Median milliseconds over `reps` requests."""
+    samples = []
+    for _ in range(reps):
+        started = time.perf_counter()
+        get(port, path, params)
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def ingest(env: Dict):
+    subprocess.run([sys.executable, '-m', 'flask', '--app', 'run', 'ingest', '--full'], cwd=ROOT, env=env,
+                   check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def compare(coordinator: int, national: int, state: str) -> List[str]:
+    """Differences between the merged and the national answers (empty when they agree)."""
+    problems = []
+
+    merged = get(coordinator, '/api/cluster/report')['data']
+    expected = get(national, '/api/partition/accumulator')['data']['accumulator']
+    if merged['total_records_analyzed'] != expected['total_records']:
+        problems.append(f"report records {merged['total_records_analyzed']} != {expected['total_records']}")
+    if not merged['complete']:
+        problems.append('report incomplete')
+
+    states = {row['state']: row for row in get(coordinator, '/api/cluster/states')['data']['states']}
+    for name, records in expected['state_records'].items():
+        if states.get(name, {}).get('total_records') != records:
+            problems.append(f'state {name} records differ')
+        types = {ANOMALY_LABELS.get(k, k): v for k, v in expected['state_type_counts'].get(name, {}).items()}
+        types.pop(DUPLICATE_LABEL, None)
+        got = {k: v for k, v in states.get(name, {}).get('by_type', {}).items() if k != DUPLICATE_LABEL}
+        if got != types:
+            problems.append(f'state {name} anomaly types differ')
+
+    params = {'from': '2025-01-01', 'to': '2025-12-31', 'granularity': 'month'}
+    for scope in ({}, {'state': state}):
+        got = get(coordinator, '/api/cluster/trends', dict(params, **scope))['data']
+        want = get(national, '/api/dashboard/trends', dict(params, **scope))['data']
+        for a, b in zip(got['series'], want['series']):
+            a_types = {k: v for k, v in a['by_type'].items() if k != DUPLICATE_LABEL}
+            b_types = {k: v for k, v in b['by_type'].items() if k != DUPLICATE_LABEL}
+            if a['bucket'] != b['bucket'] or a['records'] != b['records'] or a_types != b_types:
+                problems.append(f"trend bucket {a['bucket']} {scope} differs")
+        if len(got['series']) != len(want['series']):
+            problems.append(f'trend length {scope} differs')
+
+    for scope in ({}, {'state': state}):
+        got = get(coordinator, '/api/cluster/estimates', scope)['data']
+        want = get(national, '/api/dashboard/estimates', scope)['data']
+        if (got['records'], got['distinct_ids']['estimate']) != (want['records'], want['distinct_ids']['estimate']):
+            problems.append(f'estimates {scope} differ: {got["distinct_ids"]} vs {want["distinct_ids"]}')
+        for name, value in want['age_quantiles'].items():
+            if value is not None and abs(got['age_quantiles'][name] - value) > 3:
+                problems.append(f'age {name} {scope}: {got["age_quantiles"][name]} vs {value}')
+        if scope and len(got['nodes']) != 1:
+            problems.append(f'state-scoped estimates asked {len(got["nodes"])} nodes')
+    return problems
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--nodes', type=int, default=3, help='Regional nodes.')
+    parser.add_argument('--records', type=int, default=20000, help='Synthetic records.')
+    parser.add_argument('--reps', type=int, default=20, help='Timed requests per endpoint.')
+    parser.add_argument('--port', type=int, default=8800, help='First port; nodes, national and coordinator follow.')
+    options = parser.parse_args(argv)
+
+    from app.services.mock_data import DISTRICTS_BY_STATE
+    from benchmarks.synthetic import write_dataset
+
+    states = sorted(DISTRICTS_BY_STATE)
+    regions = {f'region{i + 1}': states[i::options.nodes] for i in range(options.nodes)}
+    servers = []
+    with tempfile.TemporaryDirectory(prefix='cluster-') as directory:
+        data_dir = os.path.join(directory, 'data')
+        write_dataset(data_dir, options.records)
+        base = dict(os.environ, DATA_DIR=data_dir, PYTHONPATH=ROOT, PROFILING_ENABLED='false')
+
+        envs = {}
+        for name, region_states in regions.items():
+            envs[name] = dict(base, DATABASE_URL=f"sqlite:///{os.path.join(directory, name + '.db')}",
+                              REGION_NAME=name, REGION_STATES=','.join(region_states))
+        envs['national'] = dict(base, DATABASE_URL=f"sqlite:///{os.path.join(directory, 'national.db')}")
+        print(f'Ingesting {options.records:,} records into {options.nodes} regions and one national '
+              f'instance...', file=sys.stderr)
+        for env in envs.values():
+            ingest(env)
+
+        ports = {name: options.port + i for i, name in enumerate(envs)}
+        ports['coordinator'] = options.port + len(envs)
+        envs['coordinator'] = dict(envs['national'], PARTITION_NODES=','.join(
+            f'{name}=http://127.0.0.1:{ports[name]}' for name in regions))
+        try:
+            for name, env in envs.items():
+                servers.append((name, start_server(ports[name], 'gthread', 1, 4, env)))
+            for name, server in servers:
+                wait_ready(ports[name], server)
+
+            coordinator, national = ports['coordinator'], ports['national']
+            state = regions['region1'][0]
+            problems = compare(coordinator, national, state)
+            for problem in problems:
+                print(f'MISMATCH {problem}')
+            print(f"merged answers {'match' if not problems else 'DIFFER from'} the national instance")
+
+            print(f"\n{'endpoint':<28} {'national ms':>12} {'cluster ms':>11}")
+            pairs = [
+                ('report', '/api/partition/accumulator', '/api/cluster/report', None),
+                ('trends', '/api/dashboard/trends', '/api/cluster/trends', {'granularity': 'month'}),
+                ('trends (state)', '/api/dashboard/trends', '/api/cluster/trends', {'state': state}),
+                ('estimates', '/api/dashboard/estimates', '/api/cluster/estimates', None),
+                ('estimates (state)', '/api/dashboard/estimates', '/api/cluster/estimates', {'state': state})
+            ]
+            for label, national_path, cluster_path, params in pairs:
+                print(f'{label:<28} {timed(national, national_path, params, options.reps):>12.1f} '
+                      f'{timed(coordinator, cluster_path, params, options.reps):>11.1f}')
+
+            # One region down: the coordinator still answers, flagged incomplete
+            name, server = servers[0]
+            server.terminate()
+            server.wait(timeout=30)
+            summary = get(coordinator, '/api/cluster/summary')
+            down = [node for node in summary['data']['nodes'] if not node['ok']]
+            print(f"\nwith {name} stopped: success={summary['success']} complete={summary['data']['complete']} "
+                  f"records={summary['data']['total_records']:,} failed={[node['node'] for node in down]}")
+        finally:
+            for _, server in servers:
+                if server.poll() is None:
+                    server.terminate()
+                    try:
+                        server.wait(timeout=30)
+                    except subprocess.TimeoutExpired:
+                        server.kill()
+    return 1 if problems else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
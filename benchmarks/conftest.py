@@ -0,0 +1,104 @@
+"""
+Benchmark fixtures.
+
+Each scale gets its own synthetic dataset and SQLite database, ingested
+through a real analysis job, so routes serve the same precomputed data they
+would in production. BENCH_SCALES picks the scales (default: small,medium).
+"""
+
+import os
+import time
+
+import pytest
+from pytest_benchmark.utils import parse_compare_fail
+
+from app import create_app
+from app.config import TestingConfig
+from app.extensions import db
+from app.models import TodoTask
+from benchmarks.synthetic import write_dataset
+
+SCALES = {
+    'small': 5_000,
+    'medium': 50_000,
+    'large': 500_000
+}
+
+BASELINE_DIR = os.path.join(os.path.dirname(__file__), 'baselines')
+
+# Median slowdown against the compared baseline that fails the run
+REGRESSION_THRESHOLD = 'median:25%'
+
+JOB_TIMEOUT_SECONDS = 600
+
+
+def selected_scales():
+    names = os.environ.get('BENCH_SCALES', 'small,medium').split(',')
+    return [name.strip() for name in names if name.strip() in SCALES]
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_configure(config):
+    # Keep saved baselines next to the suite regardless of the working directory
+    if config.getoption('benchmark_storage', None) == 'file://./.benchmarks':
+        config.option.benchmark_storage = 'file://' + BASELINE_DIR
+    if config.getoption('benchmark_compare', None) and not config.getoption('benchmark_compare_fail', None):
+        config.option.benchmark_compare_fail = [parse_compare_fail(REGRESSION_THRESHOLD)]
+
+
+@pytest.fixture(scope='session', params=selected_scales())
+def scale(request):
+    return request.param
+
+
+@pytest.fixture(scope='session')
+def dataset(scale, tmp_path_factory):
+    directory = tmp_path_factory.mktemp(f'data-{scale}')
+    write_dataset(str(directory), SCALES[scale])
+    return str(directory)
+
+
+def wait_for_jobs(app, timeout: float = JOB_TIMEOUT_SECONDS):
+    """Block until no analysis job is queued or running."""
+    from app.models import AnalysisJob
+    from app.services.job_service import ACTIVE_STATUSES
+    deadline = time.monotonic() + timeout
+    with app.app_context():
+        while AnalysisJob.query.filter(AnalysisJob.status.in_(ACTIVE_STATUSES)).count():
+            if time.monotonic() > deadline:
+                raise TimeoutError('analysis job did not finish')
+            time.sleep(0.05)
+            db.session.remove()
+
+
+@pytest.fixture(scope='session')
+def app(scale, dataset, tmp_path_factory):
+    database = tmp_path_factory.mktemp(f'db-{scale}') / 'bench.db'
+
+    class BenchConfig(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = f'sqlite:///{database}'
+        DATA_DIR = dataset
+        MODEL_DIR = None
+        JOB_WORKERS = 1
+
+    app = create_app(BenchConfig)
+    from app.services.job_service import job_manager
+    with app.app_context():
+        job_manager.submit(app, 'analysis', {'mode': 'full'})
+        for i in range(200):
+            db.session.add(TodoTask(
+                title=f'Verify anomaly batch {i}',
+                description='Synthetic benchmark task',
+                status=('pending', 'in_progress', 'done')[i % 3],
+                priority=('low', 'medium', 'high')[i % 3],
+                state='Maharashtra',
+                anomaly_type='invalid_pincodes'
+            ))
+        db.session.commit()
+    wait_for_jobs(app)
+    return app
+
+
+@pytest.fixture(scope='session')
+def client(app):
+    return app.test_client()
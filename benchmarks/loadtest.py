@@ -0,0 +1,353 @@
+"""
+Load test: replay a realistic traffic mix against gunicorn configurations.
+
+For each worker class and worker count, a gunicorn server is started on the
+app (`wsgi:app`, as in render.yaml, or `asgi:app` on uvicorn workers for the
+'asgi' class) and closed-loop virtual users replay page sessions for a fixed
+duration: the dashboard's initial load, state drilldowns, predictions,
+analysis/policy reads and task CRUD, with the same requests the pages'
+JavaScript makes. Clients run in separate processes so
+they are not limited by one interpreter's GIL.
+
+    python -m benchmarks.loadtest --workers 1,2,4 --worker-classes sync,gthread,gevent,asgi
+
+Reports p50/p95/p99 latency, throughput and error rate per configuration
+(and per request with --by-request); --output writes the results as JSON.
+Without --database-url a synthetic dataset is generated and ingested first.
+"""
+
+import argparse
+import http.client
+import importlib.util
+import json
+import math
+import multiprocessing
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+STATES = ['Maharashtra', 'Uttar Pradesh', 'Bihar', 'Karnataka', 'Tamil Nadu', 'West Bengal', 'Gujarat',
+          'Rajasthan', 'Kerala', 'Delhi']
+
+# Session mix: (name, weight)
+SESSION_WEIGHTS = [
+    ('dashboard', 35),
+    ('drilldown', 25),
+    ('prediction', 15),
+    ('analysis', 10),
+    ('policies', 5),
+    ('tasks', 10)
+]
+
+READY_TIMEOUT_SECONDS = 60
+
+
+def _request(conn_holder: list, host: str, port: int, method: str, path: str,
+             body: Optional[Dict] = None) -> Tuple[int, Optional[Dict]]:
+    """One request over a kept-alive connection, reconnecting when the server closed it."""
+    payload = json.dumps(body) if body is not None else None
+    headers = {'Content-Type': 'application/json'} if payload is not None else {}
+    for attempt in range(2):
+        if conn_holder[0] is None:
+            conn_holder[0] = http.client.HTTPConnection(host, port, timeout=30)
+        conn = conn_holder[0]
+        try:
+            conn.request(method, path, body=payload, headers=headers)
+            response = conn.getresponse()
+            data = response.read()
+            if response.getheader('Connection', '').lower() == 'close':
+                conn.close()
+                conn_holder[0] = None
+            parsed = None
+            if data and response.getheader('Content-Type', '').startswith('application/json'):
+                parsed = json.loads(data)
+            return response.status, parsed
+        except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+            # Sync workers close idle keep-alive connections; retry once on a fresh one
+            conn.close()
+            conn_holder[0] = None
+            if attempt:
+                raise
+    raise RuntimeError('unreachable')
+
+
+def _session(name: str, rng: random.Random, call):
+    """Run one user session, calling call(label, method, path, body) per request."""
+    if name == 'dashboard':
+        call('page /', 'GET', '/')
+        call('summary', 'GET', '/api/dashboard/summary')
+        call('states', 'GET', '/api/dashboard/states')
+        call('trends', 'GET', '/api/dashboard/trends')
+    elif name == 'drilldown':
+        for _ in range(rng.randint(1, 3)):
+            state = rng.choice(STATES)
+            call('state', 'GET', f'/api/dashboard/state?state={state.replace(" ", "%20")}')
+            call('estimates', 'GET', f'/api/dashboard/estimates?state={state.replace(" ", "%20")}')
+            call('districts', 'GET', f'/api/dashboard/state/districts?state={state.replace(" ", "%20")}')
+    elif name == 'prediction':
+        call('page /prediction/', 'GET', '/prediction/')
+        call('prediction states', 'GET', '/prediction/api/states')
+        for _ in range(rng.randint(1, 3)):
+            records = rng.randint(1000, 500000)
+            call('predict', 'POST', '/prediction/api/predict', {
+                'state': rng.choice(STATES),
+                'records': records,
+                'anomalies': int(records * rng.uniform(0.005, 0.08)),
+                'invalid_pin_rate': round(rng.uniform(0, 0.05), 4),
+                'duplicate_rate': round(rng.uniform(0, 0.02), 4),
+                'missing_dob_rate': round(rng.uniform(0, 0.05), 4),
+                'explain': rng.random() < 0.2
+            })
+        call('leaderboard', 'GET', '/prediction/api/leaderboard?k=10&min_records=100')
+    elif name == 'analysis':
+        call('page /analysis/', 'GET', '/analysis/')
+        call('report', 'GET', '/analysis/api/report')
+        call('anomalies', 'GET', f'/analysis/api/anomalies?page={rng.randint(1, 5)}')
+    elif name == 'policies':
+        call('page /policies/', 'GET', '/policies/')
+        call('recommendations', 'GET', '/policies/api/recommendations')
+        call('policy', 'GET', f'/policies/api/policy/{rng.randint(1, 6)}')
+    elif name == 'tasks':
+        call('page /todo/', 'GET', '/todo/')
+        call('tasks', 'GET', '/todo/api/tasks')
+        created = call('create task', 'POST', '/todo/api/tasks', {
+            'title': 'Load test verification',
+            'priority': rng.choice(['low', 'medium', 'high']),
+            'state': rng.choice(STATES),
+            'anomaly_type': 'invalid_pincodes'
+        })
+        task_id = created and created.get('data', {}).get('id')
+        if task_id:
+            call('update task', 'PATCH', f'/todo/api/tasks/{task_id}', {'status': 'in_progress'})
+            call('delete task', 'DELETE', f'/todo/api/tasks/{task_id}')
+
+
+def _run_users(args: Tuple) -> List[Tuple[str, float, bool]]:
+    """Client process: `users` threads replaying sessions until `deadline`."""
+    host, port, users, start_at, warmup_until, deadline, seed, think = args
+    samples: List[Tuple[str, float, bool]] = []
+    lock = threading.Lock()
+    names = [name for name, _ in SESSION_WEIGHTS]
+    weights = [weight for _, weight in SESSION_WEIGHTS]
+
+    def user(index: int):
+        rng = random.Random(seed * 10007 + index)
+        conn = [None]
+        local = []
+
+        def call(label, method, path, body=None):
+            issued_at = time.time()
+            started = time.perf_counter()
+            try:
+                status, data = _request(conn, host, port, method, path, body)
+                ok = status < 400
+            except Exception:
+                status, data, ok = 0, None, False
+                conn[0] = None
+            # Only requests issued inside the measured window count
+            if warmup_until <= issued_at < deadline:
+                local.append((label, time.perf_counter() - started, ok))
+            return data
+
+        while time.time() < start_at:
+            time.sleep(0.01)
+        while time.time() < deadline:
+            _session(rng.choices(names, weights)[0], rng, call)
+            if think:
+                time.sleep(rng.expovariate(1 / think))
+        with lock:
+            samples.extend(local)
+
+    threads = [threading.Thread(target=user, args=(i,)) for i in range(users)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(samples: List[Tuple[str, float, bool]], seconds: float) -> Dict:
+    latencies = sorted(latency for _, latency, _ in samples)
+    errors = sum(1 for _, _, ok in samples if not ok)
+    return {
+        'requests': len(samples),
+        'errors': errors,
+        'error_rate': round(errors / len(samples), 4) if samples else 0.0,
+        'throughput_rps': round(len(samples) / seconds, 1) if seconds else 0.0,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2)
+    }
+
+
+def start_server(port: int, worker_class: str, workers: int, threads: int, env: Dict) -> subprocess.Popen:
+    # 'asgi' serves the async entry point (asgi.py) from uvicorn workers
+    app, worker = ('asgi:app', 'uvicorn.workers.UvicornWorker') if worker_class == 'asgi' else ('wsgi:app', worker_class)
+    command = [sys.executable, '-m', 'gunicorn', app, '--bind', f'127.0.0.1:{port}',
+               '--workers', str(workers), '--worker-class', worker, '--log-level', 'warning']
+    if worker_class == 'gthread':
+        command += ['--threads', str(threads)]
+    if worker_class == 'gevent':
+        command += ['--worker-connections', '1000']
+    return subprocess.Popen(command, cwd=ROOT, env=env)
+
+
+def wait_ready(port: int, server: subprocess.Popen):
+    deadline = time.monotonic() + READY_TIMEOUT_SECONDS
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f'gunicorn exited with status {server.returncode}')
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=2)
+            conn.request('GET', '/api/dashboard/summary')
+            if conn.getresponse().status == 200:
+                conn.close()
+                return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError('gunicorn did not become ready')
+
+
+def run_config(port: int, worker_class: str, workers: int, options, env: Dict) -> Dict:
+    server = start_server(port, worker_class, workers, options.threads, env)
+    try:
+        wait_ready(port, server)
+        processes = max(1, min(options.client_processes, options.users))
+        per_process = [options.users // processes + (1 if i < options.users % processes else 0)
+                       for i in range(processes)]
+        start_at = time.time() + 0.5
+        warmup_until = start_at + options.warmup
+        deadline = warmup_until + options.duration
+        jobs = [('127.0.0.1', port, users, start_at, warmup_until, deadline, options.seed + i, options.think_ms / 1000)
+                for i, users in enumerate(per_process)]
+        with multiprocessing.Pool(processes) as pool:
+            samples = [s for chunk in pool.map(_run_users, jobs) for s in chunk]
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+    result = {'worker_class': worker_class, 'workers': workers, 'users': options.users}
+    if worker_class == 'gthread':
+        result['threads'] = options.threads
+    result.update(summarize(samples, options.duration))
+    if options.by_request:
+        by_label = defaultdict(list)
+        for sample in samples:
+            by_label[sample[0]].append(sample)
+        result['by_request'] = {label: summarize(rows, options.duration) for label, rows in sorted(by_label.items())}
+    return result
+
+
+def prepare_database(records: int, directory: str) -> Dict:
+    """Generate and ingest a synthetic dataset, returning the server environment."""
+    from benchmarks.synthetic import write_dataset
+    data_dir = os.path.join(directory, 'data')
+    write_dataset(data_dir, records)
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{os.path.join(directory, 'loadtest.db')}", DATA_DIR=data_dir,
+               PYTHONPATH=ROOT)
+    subprocess.run([sys.executable, '-m', 'flask', '--app', 'run', 'ingest', '--full'], cwd=ROOT, env=env,
+                   check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    # An analysis job result backs /analysis/api/report
+    subprocess.run([sys.executable, '-c', (
+        'import time\n'
+        'from app import create_app\n'
+        'from app.services.job_service import job_manager\n'
+        'app = create_app()\n'
+        'with app.app_context():\n'
+        '    job, _ = job_manager.submit(app, "analysis", {})\n'
+        '    job_id = job.id\n'
+        'while True:\n'
+        '    with app.app_context():\n'
+        '        if job_manager.get(job_id).status in ("completed", "failed"):\n'
+        '            break\n'
+        '    time.sleep(0.2)\n'
+    )], cwd=ROOT, env=env, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return env
+
+
+def print_table(results: List[Dict]):
+    header = f"{'class':<8} {'workers':>7} {'users':>5} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} " \
+             f"{'errors':>7} {'err %':>6}"
+    print(header)
+    print('-' * len(header))
+    for r in results:
+        print(f"{r['worker_class']:<8} {r['workers']:>7} {r['users']:>5} {r['throughput_rps']:>8.1f} "
+              f"{r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} {r['p99_ms']:>8.1f} {r['errors']:>7} "
+              f"{r['error_rate'] * 100:>6.2f}")
+        for label, s in r.get('by_request', {}).items():
+            print(f"    {label:<22} {s['requests']:>7} req {s['p50_ms']:>8.1f} {s['p95_ms']:>8.1f} "
+                  f"{s['p99_ms']:>8.1f} ms  {s['error_rate'] * 100:.2f}% errors")
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--workers', default='1,2,4', help='Comma-separated gunicorn worker counts.')
+    parser.add_argument('--worker-classes', default='sync,gthread,gevent',
+                        help="Comma-separated worker classes; 'asgi' runs asgi:app on uvicorn workers "
+                             "(gevent is skipped if not installed).")
+    parser.add_argument('--threads', type=int, default=4, help='Threads per gthread worker.')
+    parser.add_argument('--users', type=int, default=32, help='Concurrent virtual users.')
+    parser.add_argument('--duration', type=float, default=20, help='Measured seconds per configuration.')
+    parser.add_argument('--warmup', type=float, default=3, help='Unmeasured seconds before each run.')
+    parser.add_argument('--think-ms', type=float, default=0,
+                        help='Mean think time between sessions (0: closed loop at full speed).')
+    parser.add_argument('--client-processes', type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    parser.add_argument('--records', type=int, default=20000, help='Synthetic records when no --database-url.')
+    parser.add_argument('--database-url', default=None, help='Serve an existing database instead.')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--by-request', action='store_true', help='Also report each request type.')
+    parser.add_argument('--output', default=None, help='Write the results as JSON.')
+    options = parser.parse_args(argv)
+
+    classes = [c.strip() for c in options.worker_classes.split(',') if c.strip()]
+    for worker_class, module in (('gevent', 'gevent'), ('asgi', 'uvicorn')):
+        if worker_class in classes and importlib.util.find_spec(module) is None:
+            print(f'{module} is not installed; skipping the {worker_class} worker class', file=sys.stderr)
+            classes.remove(worker_class)
+    worker_counts = [int(w) for w in options.workers.split(',')]
+
+    with tempfile.TemporaryDirectory(prefix='loadtest-') as directory:
+        if options.database_url:
+            env = dict(os.environ, DATABASE_URL=options.database_url, PYTHONPATH=ROOT)
+        else:
+            print(f'Preparing {options.records:,} synthetic records...', file=sys.stderr)
+            env = prepare_database(options.records, directory)
+        # Profiling, rate limits and job threads stay out of the measurement
+        env.setdefault('PROFILING_ENABLED', 'false')
+        env.setdefault('RATE_LIMIT_ENABLED', 'false')
+
+        results = []
+        for worker_class in classes:
+            for workers in worker_counts:
+                print(f'Running {worker_class} x{workers}...', file=sys.stderr)
+                results.append(run_config(options.port, worker_class, workers, options, env))
+
+    print_table(results)
+    if options.output:
+        with open(options.output, 'w') as f:
+            json.dump({'options': vars(options), 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
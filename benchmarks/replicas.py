@@ -0,0 +1,264 @@
+"""
+Replica benchmark: read latency and write throughput under a mixed load, with and without replicas.
+
+A synthetic dataset is ingested into a SQLite primary and copied to two
+SQLite replica stand-ins. While the server runs, a replicator thread
+copies the primary over the replicas every --lag-ms (SQLite's backup API),
+giving them a real replication lag. Two configurations are compared on
+gunicorn:
+
+    primary   every query on the primary, AnomalyLog rows written in the request
+    replicas  GET reads on the replicas (read-your-writes sticky), AnomalyLog rows batched
+
+    python -m benchmarks.replicas --duration 20 --readers 8 --writers 4
+
+Readers replay the dashboard, task list and report reads; writers post
+single anomalies and update tasks. Reported per configuration: read
+p50/p95/p99 and throughput, write requests/s and latency, and the rows
+actually in the primary afterwards. A read-your-writes check then updates a
+task and reads the list straight back, from the writing client and from a
+fresh one.
+"""
+
+import argparse
+import http.client
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from benchmarks.loadtest import prepare_database, start_server, wait_ready
+
+READ_PATHS = [
+    '/api/dashboard/states',
+    '/todo/api/tasks',
+    '/api/dashboard/trends',
+    '/analysis/api/report',
+    '/api/dashboard/estimates?state=Bihar'
+]
+
+STATES = ['Maharashtra', 'Uttar Pradesh', 'Bihar', 'Karnataka', 'Tamil Nadu']
+
+
+class Client:
+    """One kept-alive connection that remembers the cookies it was given."""
+
+    def __init__(self, port: int):
+        self.port = port
+        self.conn: Optional[http.client.HTTPConnection] = None
+        self.cookies: Dict[str, str] = {}
+
+    def request(self, method: str, path: str, body=None) -> Tuple[int, Optional[Dict]]:
+        headers = {'Content-Type': 'application/json'} if body is not None else {}
+        if self.cookies:
+            headers['Cookie'] = '; '.join(f'{k}={v}' for k, v in self.cookies.items())
+        for attempt in range(2):
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection('127.0.0.1', self.port, timeout=60)
+            try:
+                self.conn.request(method, path, body=json.dumps(body) if body is not None else None,
+                                  headers=headers)
+                response = self.conn.getresponse()
+                data = response.read()
+                break
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                self.conn.close()
+                self.conn = None
+                if attempt:
+                    raise
+        for header, value in response.getheaders():
+            if header.lower() == 'set-cookie':
+                name, _, rest = value.partition('=')
+                self.cookies[name] = rest.split(';', 1)[0]
+        return response.status, json.loads(data) if data else None
+
+
+class Replicator(threading.Thread):
+    """Copies the primary over each replica every `lag` seconds."""
+
+    def __init__(self, primary: str, replicas: List[str], lag: float):
+        super().__init__(daemon=True)
+        self.primary, self.replicas, self.lag = primary, replicas, lag
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.lag):
+            source = sqlite3.connect(self.primary, timeout=30)
+            try:
+                for path in self.replicas:
+                    target = sqlite3.connect(path, timeout=30)
+                    source.backup(target)
+                    target.close()
+            finally:
+                source.close()
+
+
+def percentile(samples: List[float], fraction: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def run_load(port: int, options, task_ids: List[int]) -> Dict:
+    deadline = time.monotonic() + options.duration
+    reads: List[float] = []
+    writes: List[float] = []
+    errors = {'read': 0, 'write': 0}
+    accepted = [0]
+    lock = threading.Lock()
+
+    def reader(index: int):
+        client = Client(port)
+        position = index
+        while time.monotonic() < deadline:
+            path = READ_PATHS[position % len(READ_PATHS)]
+            position += 1
+            started = time.perf_counter()
+            status, _ = client.request('GET', path)
+            elapsed = (time.perf_counter() - started) * 1000
+            with lock:
+                reads.append(elapsed)
+                errors['read'] += status != 200
+
+    def writer(index: int):
+        client = Client(port)
+        count = 0
+        while time.monotonic() < deadline:
+            count += 1
+            started = time.perf_counter()
+            if count % 10 == 0 and task_ids:
+                status, _ = client.request('PATCH', f'/todo/api/tasks/{task_ids[count % len(task_ids)]}',
+                                           {'status': 'in_progress'})
+                ok = status == 200
+            else:
+                status, _ = client.request('POST', '/analysis/api/anomalies/log', {
+                    'state': STATES[count % len(STATES)], 'anomaly_type': 'invalid_phone', 'severity': 'medium'
+                })
+                ok = status in (200, 202)
+                if ok:
+                    with lock:
+                        accepted[0] += 1
+            elapsed = (time.perf_counter() - started) * 1000
+            with lock:
+                writes.append(elapsed)
+                errors['write'] += not ok
+
+    threads = [threading.Thread(target=reader, args=(i,)) for i in range(options.readers)]
+    threads += [threading.Thread(target=writer, args=(i,)) for i in range(options.writers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return {
+        'reads': len(reads),
+        'read_rps': round(len(reads) / options.duration, 1),
+        'read_p50_ms': round(percentile(reads, 0.5), 1),
+        'read_p95_ms': round(percentile(reads, 0.95), 1),
+        'read_p99_ms': round(percentile(reads, 0.99), 1),
+        'read_errors': errors['read'],
+        'writes': len(writes),
+        'write_rps': round(len(writes) / options.duration, 1),
+        'write_p50_ms': round(percentile(writes, 0.5), 1),
+        'write_p95_ms': round(percentile(writes, 0.95), 1),
+        'write_errors': errors['write'],
+        'anomalies_accepted': accepted[0]
+    }
+
+
+def read_your_writes(port: int, task_id: int, rounds: int) -> Dict:
+    """Update a task and read the list straight back, from the writer and from a fresh client."""
+    writer = Client(port)
+    seen_by_writer = seen_by_other = 0
+    for i in range(rounds):
+        title = f'Replica check {i} {time.time()}'
+        writer.request('PATCH', f'/todo/api/tasks/{task_id}', {'title': title})
+        _, body = writer.request('GET', '/todo/api/tasks')
+        seen_by_writer += any(t['title'] == title for t in body['data']['tasks'])
+        _, body = Client(port).request('GET', '/todo/api/tasks')
+        seen_by_other += any(t['title'] == title for t in body['data']['tasks'])
+    return {'rounds': rounds, 'writer_saw_write': seen_by_writer, 'fresh_client_saw_write': seen_by_other}
+
+
+def count_rows(database: str) -> int:
+    connection = sqlite3.connect(database, timeout=30)
+    try:
+        return connection.execute('SELECT COUNT(*) FROM anomaly_logs').fetchone()[0]
+    finally:
+        connection.close()
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--records', type=int, default=20000, help='Synthetic records ingested into the primary.')
+    parser.add_argument('--duration', type=float, default=20, help='Seconds of mixed load per configuration.')
+    parser.add_argument('--readers', type=int, default=8, help='Reading client threads.')
+    parser.add_argument('--writers', type=int, default=4, help='Writing client threads.')
+    parser.add_argument('--threads', type=int, default=8, help='Threads of the gthread worker.')
+    parser.add_argument('--lag-ms', type=float, default=1000, help='Replication interval of the stand-ins.')
+    parser.add_argument('--port', type=int, default=8790)
+    parser.add_argument('--output', default=None, help='Write the results as JSON.')
+    options = parser.parse_args(argv)
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix='replicas-') as directory:
+        print(f'Preparing {options.records:,} synthetic records...', file=sys.stderr)
+        base = prepare_database(options.records, directory)
+        base['PROFILING_ENABLED'] = 'false'
+        base['RATE_LIMIT_ENABLED'] = 'false'
+        template = os.path.join(directory, 'loadtest.db')
+
+        configs = [
+            ('primary', {'ANOMALY_LOG_BATCH_SIZE': '0'}),
+            ('replicas', {'ANOMALY_LOG_BATCH_SIZE': '500'})
+        ]
+        for name, overrides in configs:
+            primary = os.path.join(directory, f'{name}-primary.db')
+            replicas = [os.path.join(directory, f'{name}-replica{i}.db') for i in (1, 2)]
+            for path in [primary] + replicas:
+                shutil.copyfile(template, path)
+            env = dict(base, DATABASE_URL=f'sqlite:///{primary}', **overrides)
+            if name == 'replicas':
+                env['DATABASE_REPLICA_URLS'] = ','.join(f'sqlite:///{path}' for path in replicas)
+
+            server = start_server(options.port, 'gthread', 1, options.threads, env)
+            replicator = Replicator(primary, replicas, options.lag_ms / 1000)
+            try:
+                wait_ready(options.port, server)
+                # A few tasks for the writers to update and the task list to return
+                setup = Client(options.port)
+                task_ids = [setup.request('POST', '/todo/api/tasks', {'title': f'Task {i}', 'priority': 'medium'})[1]
+                            ['data']['id'] for i in range(20)]
+                time.sleep(0.5)
+                replicator.start()
+                print(f'Running {name}...', file=sys.stderr)
+                result = dict(run_load(options.port, options, task_ids), config=name)
+                result.update(read_your_writes(options.port, task_ids[0], 20))
+            finally:
+                replicator.stopped.set()
+                server.terminate()
+                server.wait(timeout=30)
+            # Stopping the server flushes what the writer still had queued
+            result['anomaly_rows_in_primary'] = count_rows(primary)
+            results.append(result)
+
+    print(f"\n{'config':<9} {'reads/s':>8} {'p50':>7} {'p95':>7} {'p99':>7} {'rd err':>6} {'writes/s':>9} "
+          f"{'w p50':>7} {'w p95':>7} {'wr err':>6} {'rows':>7}/{'accepted':<8} {'RYW writer':>10} {'fresh':>6}")
+    for r in results:
+        print(f"{r['config']:<9} {r['read_rps']:>8.1f} {r['read_p50_ms']:>7.1f} {r['read_p95_ms']:>7.1f} "
+              f"{r['read_p99_ms']:>7.1f} {r['read_errors']:>6} {r['write_rps']:>9.1f} {r['write_p50_ms']:>7.1f} "
+              f"{r['write_p95_ms']:>7.1f} {r['write_errors']:>6} {r['anomaly_rows_in_primary']:>7}/"
+              f"{r['anomalies_accepted']:<8} {r['writer_saw_write']:>7}/{r['rounds']:<2} "
+              f"{r['fresh_client_saw_write']:>3}/{r['rounds']}")
+    if options.output:
+        with open(options.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,185 @@
+"""
+Deterministic synthetic enrolment data for the benchmarks.
+
+The same (records, seed) always produces the same rows, with every anomaly
+the detectors look for injected at a fixed rate.
+"""
+
+import csv
+import os
+import random
+from typing import Dict, Iterator, List, Set, Tuple
+
+from app.services.mock_data import DISTRICTS_BY_STATE
+
+COLUMNS = ['aadhaar_id', 'name', 'dob', 'gender', 'mobile', 'pincode', 'state', 'district',
+           'address', 'enrolment_centre', 'date']
+
+# Share of records carrying each injected anomaly
+DUPLICATE_RATE = 0.01
+INVALID_PIN_RATE = 0.05
+MISSING_DOB_RATE = 0.03
+INVALID_PHONE_RATE = 0.04
+MISMATCH_RATE = 0.03
+BAD_GENDER_RATE = 0.02
+
+# One number reused across a share of one state's records (a state-level ring,
+# above PHONE_SHARE_THRESHOLD at every scale)
+SHARED_PHONE = '9876543210'
+SHARED_PHONE_STATE = 'Bihar'
+SHARED_PHONE_RATE = 0.5
+
+
+def iter_records(records: int, seed: int = 0, start_id: int = 0, month: int = 1) -> Iterator[Dict[str, str]]:
+    """Yield `records` raw CSV rows (column name -> string)."""
+    rng = random.Random(seed)
+    states = sorted(DISTRICTS_BY_STATE)
+    for i in range(records):
+        state = rng.choice(states)
+        if rng.random() < MISMATCH_RATE:
+            district = rng.choice(DISTRICTS_BY_STATE[rng.choice(states)])
+        else:
+            district = rng.choice(DISTRICTS_BY_STATE[state])
+        number = start_id + i
+        if number and rng.random() < DUPLICATE_RATE:
+            number = rng.randrange(number)
+        if rng.random() < INVALID_PIN_RATE:
+            pincode = rng.choice(['01234', 'ABC123', '0123456'])
+        else:
+            pincode = str(rng.randint(100000, 899999))
+        if rng.random() < MISSING_DOB_RATE:
+            dob = ''
+        else:
+            dob = f'{rng.randint(1940, 2024)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}'
+        if rng.random() < BAD_GENDER_RATE:
+            gender = rng.choice(['X', 'unknown'])
+        else:
+            gender = rng.choice(['M', 'F', 'Male', 'Female', 'T'])
+        if rng.random() < INVALID_PHONE_RATE:
+            phone = str(rng.randint(100000, 99999999))
+        elif state == SHARED_PHONE_STATE and rng.random() < SHARED_PHONE_RATE:
+            phone = SHARED_PHONE
+        else:
+            phone = str(rng.randint(6000000000, 9999999999))
+        yield {
+            'aadhaar_id': str(100000000000 + number),
+            'name': f'Resident {number}',
+            'dob': dob,
+            'gender': gender,
+            'mobile': phone,
+            'pincode': pincode,
+            'state': state,
+            'district': district,
+            'address': f'H.No {rng.randint(1, 500)} Main Road',
+            'enrolment_centre': f'C{rng.randint(1, 300)}',
+            'date': f'2025-{month:02d}-{rng.randint(1, 28):02d}'
+        }
+
+
+def write_dataset(directory: str, records: int, files: int = 4, seed: int = 0) -> List[str]:
+    """Write `records` rows split over `files` monthly CSVs, returning their paths."""
+    os.makedirs(directory, exist_ok=True)
+    per_file = -(-records // files)
+    paths = []
+    for index in range(files):
+        count = min(per_file, records - index * per_file)
+        if count <= 0:
+            break
+        path = os.path.join(directory, f'enrolments_{index + 1:02d}.csv')
+        with open(path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=COLUMNS)
+            writer.writeheader()
+            writer.writerows(iter_records(count, seed=seed * 1000 + index, start_id=index * per_file,
+                                          month=index % 12 + 1))
+        paths.append(path)
+    return paths
+
+
+FIRST_NAMES = ['Aarav', 'Vivaan', 'Aditya', 'Arjun', 'Rohan', 'Rahul', 'Amit', 'Suresh', 'Ramesh', 'Mahesh',
+               'Priya', 'Anjali', 'Sunita', 'Kavita', 'Pooja', 'Neha', 'Lakshmi', 'Meena', 'Geeta', 'Asha',
+               'Mohammed', 'Imran', 'Farhan', 'Ayesha', 'Fatima', 'Gurpreet', 'Harpreet', 'Manoj', 'Vijay',
+               'Sanjay', 'Deepak', 'Ravi', 'Kiran', 'Sneha', 'Divya', 'Rekha', 'Anil', 'Sunil', 'Prakash', 'Ganesh']
+LAST_NAMES = ['Sharma', 'Verma', 'Gupta', 'Singh', 'Kumar', 'Yadav', 'Patel', 'Shah', 'Reddy', 'Rao', 'Nair',
+              'Pillai', 'Iyer', 'Das', 'Ghosh', 'Banerjee', 'Mukherjee', 'Khan', 'Ansari', 'Sheikh', 'Joshi',
+              'Kulkarni', 'Deshmukh', 'Patil', 'Jadhav', 'Chauhan', 'Rathore', 'Mishra', 'Tiwari', 'Pandey']
+STREETS = ['Main Road', 'Station Road', 'Gandhi Nagar', 'Nehru Street', 'Temple Street', 'Market Road',
+           'Ambedkar Colony', 'Shivaji Nagar', 'MG Road', 'Lake View']
+ABBREVIATIONS = {'Road': 'Rd', 'Street': 'St', 'Nagar': 'Ngr', 'Colony': 'Col'}
+
+# Share of linkage records that are a re-enrolment of an earlier resident
+REENROLMENT_RATE = 0.05
+
+
+def _typo(rng: random.Random, word: str) -> str:
+    """One dropped, doubled or swapped character."""
+    i = rng.randrange(len(word) - 1)
+    kind = rng.randrange(3)
+    if kind == 0:
+        return word[:i] + word[i + 1:]
+    if kind == 1:
+        return word[:i] + word[i] + word[i:]
+    return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+
+
+def linkage_dataset(records: int, seed: int = 0) -> Tuple[List[Dict[str, str]], Set[Tuple[int, int]]]:
+    """
+    Normalised records with realistic names in which REENROLMENT_RATE of
+    them re-enrol an earlier resident under a new Aadhaar ID, with typical
+    data-entry noise (name typos, abbreviated or reordered addresses, a
+    changed phone or PIN). Returns the records and the (i, j) index pairs,
+    i < j, that are the same resident.
+    """
+    rng = random.Random(seed)
+    states = sorted(DISTRICTS_BY_STATE)
+    rows: List[Dict[str, str]] = []
+    resident_of: List[int] = []
+    for i in range(records):
+        if rows and rng.random() < REENROLMENT_RATE:
+            source = rng.randrange(len(rows))
+            row = dict(rows[source])
+            name = row['name'].split()
+            if rng.random() < 0.5:
+                k = rng.randrange(len(name))
+                name[k] = _typo(rng, name[k])
+            if rng.random() < 0.1:
+                name.reverse()
+            row['name'] = ' '.join(name)
+            address = row['address']
+            if rng.random() < 0.4:
+                for full, short in ABBREVIATIONS.items():
+                    address = address.replace(full, short)
+            if rng.random() < 0.2:
+                parts = address.split(', ')
+                address = ', '.join(parts[1:] + parts[:1])
+            row['address'] = address
+            if rng.random() < 0.3:
+                row['phone'] = str(rng.randint(6000000000, 9999999999))
+            if rng.random() < 0.1:
+                row['pincode'] = row['pincode'][:5] + str(rng.randrange(10))
+            if rng.random() < 0.1:
+                row['dob'] = ''
+            row['aadhaar_id'] = str(200000000000 + i)
+            rows.append(row)
+            resident_of.append(resident_of[source])
+            continue
+        state = rng.choice(states)
+        rows.append({
+            'aadhaar_id': str(200000000000 + i),
+            'name': f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}',
+            'dob': f'{rng.randint(1940, 2024)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}',
+            'gender': rng.choice(['M', 'F']),
+            'phone': str(rng.randint(6000000000, 9999999999)),
+            'pincode': str(rng.randint(110000, 110999) + 10000 * states.index(state)),
+            'state': state,
+            'district': rng.choice(DISTRICTS_BY_STATE[state]),
+            'address': f'H.No {rng.randint(1, 500)}, {rng.choice(STREETS)}',
+            'centre': f'C{rng.randint(1, 300)}',
+            'date': f'2025-01-{rng.randint(1, 28):02d}'
+        })
+        resident_of.append(i)
+
+    members: Dict[int, List[int]] = {}
+    for i, resident in enumerate(resident_of):
+        members.setdefault(resident, []).append(i)
+    truth = {(a, b) for group in members.values() for x, a in enumerate(group) for b in group[x + 1:]}
+    return rows, truth